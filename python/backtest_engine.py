@@ -8,6 +8,11 @@ MetaTrader5の過去データに対してバックテストするためのエン
 使用方法:
     python backtest_engine.py --config <path> --symbol <symbol> --timeframe <tf> 
                               --start <date> --end <date> --output <path>
+                              [--cache-dir <dir>] [--chunk-days <n>]
+                              [--data-source mt5|file] [--data-dir <dir>]
+                              [--tick-dir <dir>] [--derive-from-m1]
+                              [--simulation-mode vectorized|loop]
+                              [--tie-break stopLoss|takeProfit|nearestToOpen]
 
 例:
     python backtest_engine.py --config ../ea/tests/strategy_123.json 
@@ -19,15 +24,107 @@ MetaTrader5の過去データに対してバックテストするためのエン
 import argparse
 import json
 import sys
+import tempfile
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-try:
-    import MetaTrader5 as mt5
-except ImportError:
-    print("エラー: MetaTrader5ライブラリがインストールされていません", file=sys.stderr)
-    print("インストール方法: pip install MetaTrader5", file=sys.stderr)
-    sys.exit(1)
+import numpy as np
+
+from bar_cache import BarCache, from_epoch_seconds, split_range, to_epoch_seconds
+from bar_store import TIMEFRAME_SECONDS, ColumnarBars
+from block_kernels import BLOCK_KERNELS, DEFAULT_DIGITS, BlockContext, lazy_kernels, sample_estimators
+from composite_evaluator import CompositeEvaluator
+from data_providers import (
+    DATA_SOURCES,
+    PROVIDER_CLASSES,
+    DataProvider,
+    FileDataProvider,
+    MT5DataProvider,
+)
+from evaluation_planner import PLANNER_SAMPLE_BARS, EvaluationPlanner
+from exit_resolver import (
+    DEFAULT_ATR_PARAMS,
+    DEFAULT_TIE_BREAK,
+    DEFAULT_TRAIL_PARAMS,
+    DEFAULT_WEEKEND_CLOSE_PARAMS,
+    EXIT_NONE,
+    EXIT_REASONS,
+    EXIT_STOP_LOSS,
+    EXIT_TAKE_PROFIT,
+    EXIT_WEEKEND_CLOSE,
+    TIE_BREAKS,
+    StopRules,
+    atr_series,
+    bar_exit,
+    exit_rules,
+    first_hits,
+    protective_levels,
+    weekend_close_mask,
+)
+from gap_index import GapIndex
+from global_guards import GlobalGuards
+from indicator_cache import IndicatorCache
+from nanpin_simulator import NanpinLadders, ladder_levels, nanpin_settings
+from resampler import bucket_start, resample_bars
+from simulation_kernels import chain_trades, epoch_to_iso, next_true_index, pair_entries_exits, prior_mean
+from strategy_arbitration import StrategyArbitration, arbitrate
+from symbol_catalog import SymbolCatalog
+from tick_store import TickStore
+
+# MetaTrader5 は MT5 データソースを使用する時点で読み込む（require_mt5）
+mt5 = None
+
+
+def require_mt5() -> Any:
+    """
+    MetaTrader5モジュールを読み込んで返す
+    
+    Raises:
+        Exception: MetaTrader5ライブラリがインストールされていない場合
+    """
+    global mt5
+    if mt5 is None:
+        try:
+            import MetaTrader5
+        except ImportError:
+            raise Exception(
+                "MetaTrader5ライブラリがインストールされていません"
+                "（インストール方法: pip install MetaTrader5）。"
+                "MT5を使用しない場合は --data-source file を指定してください"
+            )
+        mt5 = MetaTrader5
+    return mt5
+
+
+# サポートする時間軸
+SUPPORTED_TIMEFRAMES = ('M1', 'M5', 'M15', 'M30', 'H1', 'H4', 'D1')
+
+# シミュレーションモード（vectorized: 系列全体の配列演算、loop: バーごとの参照実装）
+SIMULATION_MODES = ('vectorized', 'loop')
+
+# 簡易エントリーシグナルの移動平均の期間
+ENTRY_MA_PERIOD = 20
+
+# 移動平均を計算し直すデータ欠損の最小の長さ（バー）。移動平均の期間より短い
+# 取引時間中の欠損（数本の取得漏れ）はまたいで計算し、エントリーを止めない
+GAP_RESET_MIN_BARS = ENTRY_MA_PERIOD
+
+# 簡易エグジットシグナルの間隔（バー）
+EXIT_INTERVAL_BARS = 10
+
+# ナンピンの最初のエントリーのロット（positionSize と同じく固定）
+NANPIN_BASE_LOTS = 1.0
+
+# ティックを取得する1ウィンドウの秒数（ウィンドウごとにティックストアへ書き出す）
+TICK_FETCH_WINDOW_SECONDS = 6 * 60 * 60
+
+# M1から上位時間軸を生成する1ウィンドウの秒数（すべての時間軸の秒数の倍数）
+DERIVE_WINDOW_SECONDS = 30 * 24 * 60 * 60
+
+# この秒数より新しい期間は確定前のバーを含む可能性があるため、
+# 取得済みの最終バーまでをキャッシュのカバー済み期間とする
+CACHE_SETTLE_SECONDS = 24 * 60 * 60
 
 
 class BacktestEngine:
@@ -40,7 +137,16 @@ class BacktestEngine:
         timeframe: str,
         start_date: datetime,
         end_date: datetime,
-        output_path: str
+        output_path: str,
+        cache_dir: Optional[str] = None,
+        chunk_days: Optional[int] = None,
+        data_source: str = 'mt5',
+        data_dir: Optional[str] = None,
+        tick_dir: Optional[str] = None,
+        derive_from_m1: bool = False,
+        simulation_mode: str = 'vectorized',
+        digits: Optional[int] = None,
+        tie_break: str = DEFAULT_TIE_BREAK
     ):
         """
         バックテストエンジンを初期化
@@ -52,6 +158,16 @@ class BacktestEngine:
             start_date: バックテスト開始日時
             end_date: バックテスト終了日時
             output_path: 結果出力JSONファイルのパス
+            cache_dir: 過去データキャッシュのディレクトリ（Noneの場合キャッシュ無効）
+            chunk_days: 分割取得する期間の日数（Noneの場合は一括取得）
+            data_source: 過去データの取得元（'mt5' または 'file'）
+            data_dir: data_source='file' の場合のデータファイルのディレクトリ
+            tick_dir: ティックストアのディレクトリ（指定時は期間内のティックも取得）
+            derive_from_m1: M1以外の時間軸をキャッシュ済みM1から生成する（キャッシュ有効時のみ）
+            simulation_mode: シミュレーションモード（'vectorized' または 'loop'）
+            digits: シンボルの桁数（スプレッド・SL/TPのpips換算に使用）。
+                Noneの場合は過去データの取得時にシンボル情報から取得（resolve_digits）
+            tie_break: 同じバーでSLとTPの両方に達した場合の規則（exit_resolver.TIE_BREAKS）
         """
         self.config_path = config_path
         self.symbol = symbol
@@ -62,6 +178,28 @@ class BacktestEngine:
         self.strategy_config: Optional[Dict[str, Any]] = None
         self.historical_data: Optional[Any] = None
         self.trades: List[Dict[str, Any]] = []
+        self.bar_cache: Optional[BarCache] = BarCache(cache_dir) if cache_dir else None
+        self.chunk_days = chunk_days
+        self.data_source = data_source
+        self.data_dir = data_dir
+        self._data_provider: Optional[DataProvider] = None
+        self.tick_store: Optional[TickStore] = TickStore(tick_dir) if tick_dir else None
+        self.derive_from_m1 = derive_from_m1
+        self.simulation_mode = simulation_mode
+        self.digits_override = digits
+        self.digits = digits if digits is not None else DEFAULT_DIGITS
+        self.tie_break = tie_break
+        self.gap_index: Optional[GapIndex] = None
+        self._bar_columns: Optional[ColumnarBars] = None
+        self._bar_columns_source: Optional[Any] = None
+        self._bars_since_gap: Optional[np.ndarray] = None
+        self._bars_since_gap_source: Optional[Any] = None
+        self._arbitration: Optional[StrategyArbitration] = None
+        self._arbitration_source: Optional[Any] = None
+        self._planner: Optional[EvaluationPlanner] = None
+        self._exit_series: Dict[Tuple[Any, ...], np.ndarray] = {}
+        self._indicator_cache: Optional[IndicatorCache] = None
+        self._mt5_started = False
         
     def run(self) -> None:
         """バックテスト実行のメインフロー"""
@@ -69,15 +207,20 @@ class BacktestEngine:
             print(f"バックテスト開始: {self.symbol} {self.timeframe}")
             print(f"期間: {self.start_date} - {self.end_date}")
             
-            # 1. MT5初期化
-            if not self.initialize_mt5():
-                raise Exception("MT5初期化に失敗しました")
+            # 1. MT5初期化（キャッシュのみで完結する場合・ファイルから読み込む場合は不要）
+            if self.requires_mt5():
+                if not self.initialize_mt5():
+                    raise Exception("MT5初期化に失敗しました")
+            elif self.data_source == 'mt5':
+                print("キャッシュ済みデータを使用するため、MT5への接続を省略します")
             
             # 2. ストラテジー設定を読み込み
             self.load_strategy_config()
             
             # 3. 過去データを取得
             self.fetch_historical_data()
+            if self.tick_store is not None:
+                self.ingest_ticks()
             
             # 4. バックテストシミュレーションを実行
             self.simulate_strategy()
@@ -86,15 +229,91 @@ class BacktestEngine:
             self.generate_results()
             
             # 6. クリーンアップ
-            mt5.shutdown()
+            self.shutdown_mt5()
             
             print("バックテスト完了")
             
         except Exception as e:
             print(f"エラー: {str(e)}", file=sys.stderr)
-            mt5.shutdown()
+            self.shutdown_mt5()
             sys.exit(1)
     
+    def requires_mt5(self) -> bool:
+        """
+        MT5への接続が必要かを判定
+        
+        要求された期間のデータがすべてキャッシュに存在する場合、
+        MT5ターミナルがオフラインでもバックテストを実行できます。
+        
+        Returns:
+            MT5からのデータ取得が必要な場合True
+        """
+        if self.data_source != 'mt5':
+            return False
+        if self.tick_store is not None and self.tick_store.missing_ranges(
+            self.symbol, self.start_date, self.end_date
+        ):
+            return True
+        if self.bar_cache is None:
+            return True
+        cached_symbol = self.bar_cache.find_symbol(self.symbol)
+        if cached_symbol is None:
+            return True
+        if self.bar_cache.contains(cached_symbol, self.timeframe, self.start_date, self.end_date):
+            return False
+        if self.derives_from_m1():
+            m1_start, m1_end = self.m1_source_range()
+            return not self.bar_cache.contains(cached_symbol, 'M1', m1_start, m1_end)
+        return True
+    
+    def derives_from_m1(self) -> bool:
+        """要求時間軸をキャッシュ済みM1から生成するかを返す"""
+        return self.derive_from_m1 and self.bar_cache is not None and self.timeframe != 'M1'
+    
+    def m1_source_range(self) -> Any:
+        """
+        要求期間のバーを生成するのに必要なM1の期間
+        
+        Returns:
+            (開始, 終了) のdatetime。最初と最後のバーのバケット全体を含む
+        """
+        seconds = TIMEFRAME_SECONDS[self.timeframe]
+        start_ts = bucket_start(to_epoch_seconds(self.start_date), seconds)
+        end_ts = bucket_start(to_epoch_seconds(self.end_date), seconds) + seconds - 1
+        return from_epoch_seconds(start_ts), from_epoch_seconds(end_ts)
+    
+    def shutdown_mt5(self) -> None:
+        """MT5接続を終了（初期化を試みた場合のみ）"""
+        if self._mt5_started:
+            self.get_data_provider().shutdown()
+            self._mt5_started = False
+    
+    def get_data_provider(self) -> DataProvider:
+        """
+        過去データの取得元を返す（初回呼び出し時に作成）
+        
+        MT5データソースの場合は、この時点でMetaTrader5モジュールを読み込みます。
+        キャッシュが有効な場合、シンボルカタログはキャッシュディレクトリに保存されます。
+        
+        Raises:
+            ValueError: サポートされていないデータソース、またはデータディレクトリ未指定の場合
+            Exception: MetaTrader5ライブラリがインストールされていない場合
+        """
+        if self._data_provider is None:
+            if self.data_source == 'mt5':
+                catalog_path = self.bar_cache.symbol_catalog_path() if self.bar_cache else None
+                self._data_provider = MT5DataProvider(require_mt5(), catalog_path)
+            elif self.data_source == 'file':
+                if not self.data_dir:
+                    raise ValueError("--data-source file の場合は --data-dir を指定してください")
+                self._data_provider = FileDataProvider(self.data_dir)
+            else:
+                raise ValueError(
+                    f"サポートされていないデータソース: {self.data_source} "
+                    f"（{', '.join(DATA_SOURCES)} のいずれかを指定してください）"
+                )
+        return self._data_provider
+    
     def initialize_mt5(self) -> bool:
         """
         MT5ライブラリを初期化
@@ -110,36 +329,8 @@ class BacktestEngine:
             - MT5ライブラリへの接続を初期化
             - 接続失敗時に説明的なエラーメッセージを出力
         """
-        if not mt5.initialize():
-            error = mt5.last_error()
-            error_code = error[0] if error and len(error) > 0 else 'Unknown'
-            error_msg = error[1] if error and len(error) > 1 else 'Unknown error'
-            
-            print(
-                f"MT5初期化失敗: エラーコード {error_code} - {error_msg}",
-                file=sys.stderr
-            )
-            print(
-                "MT5ターミナルが起動していることを確認してください。",
-                file=sys.stderr
-            )
-            return False
-        
-        version = mt5.version()
-        terminal_info = mt5.terminal_info()
-        
-        if terminal_info:
-            print(f"MT5初期化成功: バージョン {version}")
-            print(f"ターミナル: {terminal_info.name}, ビルド {terminal_info.build}")
-            if getattr(terminal_info, "connected", True) is False:
-                print(
-                    "Warning: MT5 terminal is not connected. Please log in and ensure the terminal is online.",
-                    file=sys.stderr
-                )
-        else:
-            print(f"MT5初期化成功: バージョン {version}")
-        
-        return True
+        self._mt5_started = True
+        return self.get_data_provider().connect()
     
     def load_strategy_config(self) -> None:
         """
@@ -211,120 +402,606 @@ class BacktestEngine:
             raise Exception(f"無効なJSON形式: {str(e)}")
     
     def fetch_historical_data(self) -> None:
-        """MT5から過去データを取得"""
-        # 時間軸をMT5定数に変換
-        timeframe_map = {
-            'M1': mt5.TIMEFRAME_M1,
-            'M5': mt5.TIMEFRAME_M5,
-            'M15': mt5.TIMEFRAME_M15,
-            'M30': mt5.TIMEFRAME_M30,
-            'H1': mt5.TIMEFRAME_H1,
-            'H4': mt5.TIMEFRAME_H4,
-            'D1': mt5.TIMEFRAME_D1
-        }
+        """
+        過去データを取得
+        
+        キャッシュが有効な場合は、要求期間のうち未取得の期間（穴）だけを
+        MT5から取得してキャッシュに追記し、要求期間全体をキャッシュから
+        読み込みます。要求期間がすべてキャッシュ済みの場合はMT5にアクセスしません。
         
-        mt5_timeframe = timeframe_map.get(self.timeframe)
-        if mt5_timeframe is None:
+        chunk_days が指定されている場合は、期間を固定長のウィンドウに分けて取得し、
+        各ウィンドウをキャッシュ（キャッシュ無効時は一時ファイル）へ書き出してから
+        次のウィンドウを取得します。メモリ上に保持するのは1ウィンドウ分のみで、
+        取得結果はメモリマップで参照します。
+        """
+        if self.timeframe not in SUPPORTED_TIMEFRAMES:
             raise ValueError(f"サポートされていない時間軸: {self.timeframe}")
-
-        requested_symbol = self.symbol
-        symbol_info = mt5.symbol_info(requested_symbol)
-        if symbol_info is None:
-            candidates = [
-                s.name
-                for s in (mt5.symbols_get() or [])
-                if s.name.lower().startswith(requested_symbol.lower())
-            ]
-            if candidates:
-                lower_map = {c.lower(): c for c in candidates}
-                if requested_symbol.lower() in lower_map:
-                    selected = lower_map[requested_symbol.lower()]
-                elif len(candidates) == 1:
-                    selected = candidates[0]
-                else:
-                    preview = ", ".join(candidates[:5])
-                    more = "" if len(candidates) <= 5 else f" (+{len(candidates) - 5} more)"
-                    raise Exception(
-                        f"シンボルが見つかりません: {requested_symbol}。"
-                        f"候補が複数あります: {preview}{more}。"
-                        "正確なシンボル名を指定してください。"
-                    )
-                self.symbol = selected
-                symbol_info = mt5.symbol_info(self.symbol)
-                if requested_symbol.lower() != self.symbol.lower():
-                    print(
-                        f"警告: シンボルが見つかりません: {requested_symbol}。{self.symbol} を使用します。",
-                        file=sys.stderr,
-                    )
-            else:
-                raise Exception(f"シンボルが見つかりません: {requested_symbol}。類似候補がありません。")
-        if not symbol_info or not symbol_info.visible:
-            if not mt5.symbol_select(self.symbol, True):
-                error = mt5.last_error()
-                raise Exception(f"Failed to select symbol: {self.symbol}. Error: {error}")
-
+        self.gap_index = None
+        
+        # キャッシュから読み込み
+        if self.bar_cache is not None:
+            rates = self.load_cached_data()
+            if rates is not None:
+                self.historical_data = rates
+                print(f"キャッシュから過去データを読み込みました: {len(rates)} バー")
+                self.gap_index = self.bar_cache.gap_index(self.symbol, self.timeframe)
+                self.resolve_digits()
+                self.validate_data_range(rates)
+                return
         
         # バーデータを取得
-        print(f"過去データを取得中...")
-        rates = mt5.copy_rates_range(
-            self.symbol,
-            mt5_timeframe,
-            self.start_date,
-            self.end_date
-        )
+        if self.derives_from_m1():
+            fetched = self.derive_timeframe_from_m1()
+            rates = self.bar_cache.load(
+                self.symbol, self.timeframe, self.start_date, self.end_date
+            )
+        else:
+            provider = self.get_data_provider()
+            self.symbol = provider.resolve_symbol(self.symbol, self.timeframe)
+            
+            print(f"過去データを取得中...")
+            if self.bar_cache is None and self.chunk_days:
+                rates = self.fetch_chunks_to_spill_file()
+                fetched = None
+            elif self.bar_cache is None:
+                rates = provider.copy_rates_range(
+                    self.symbol,
+                    self.timeframe,
+                    self.start_date,
+                    self.end_date
+                )
+                fetched = None
+            else:
+                fetched = self.top_up_cache()
+                rates = self.bar_cache.load(
+                    self.symbol, self.timeframe, self.start_date, self.end_date
+                )
         
         if rates is None or len(rates) == 0:
-            error = mt5.last_error()
+            error = self._data_provider.last_error() if self._data_provider else None
             raise Exception(
                 f"データ取得失敗: {self.symbol} {self.timeframe} "
                 f"{self.start_date} - {self.end_date}. エラー: {error}"
             )
         
         self.historical_data = rates
-        print(f"過去データを取得しました: {len(rates)} バー")
+        if self.bar_cache is not None:
+            self.gap_index = self.bar_cache.gap_index(self.symbol, self.timeframe)
+        if fetched is None:
+            print(f"過去データを取得しました: {len(rates)} バー")
+        else:
+            print(
+                f"過去データを取得しました: {len(rates)} バー"
+                f"（{PROVIDER_CLASSES[self.data_source].name}からの差分取得: {fetched} バー）"
+            )
         
-        # データ範囲を検証
-        # タイムゾーン情報を保持してdatetimeに変換
-        from datetime import timezone
-        first_time = datetime.fromtimestamp(rates[0]['time'], tz=timezone.utc)
-        last_time = datetime.fromtimestamp(rates[-1]['time'], tz=timezone.utc)
-        start_date = self.start_date
-        end_date = self.end_date
-        if start_date.tzinfo is None:
-            start_date = start_date.replace(tzinfo=timezone.utc)
-        if end_date.tzinfo is None:
-            end_date = end_date.replace(tzinfo=timezone.utc)
+        self.resolve_digits()
+        self.validate_data_range(rates)
+    
+    def resolve_digits(self) -> None:
+        """
+        シンボルの桁数を決める
+        
+        --digits の指定、データ提供元のシンボル情報、キャッシュ済みのシンボルカタログの順に使用し、
+        いずれからも取得できない場合は既定値（DEFAULT_DIGITS）を使用して警告します。
+        """
+        digits = self.digits_override
+        if digits is None and self._data_provider is not None:
+            digits = self._data_provider.symbol_digits(self.symbol)
+        if digits is None and self.bar_cache is not None:
+            catalog = SymbolCatalog.load(self.bar_cache.symbol_catalog_path())
+            digits = catalog.digits(self.symbol) if catalog is not None else None
+        if digits is None:
+            print(
+                f"警告: シンボルの桁数を取得できません: {self.symbol}。"
+                f"{DEFAULT_DIGITS} 桁として計算します（--digits で指定できます）",
+                file=sys.stderr
+            )
+            digits = DEFAULT_DIGITS
+        self.digits = digits
+        print(f"シンボルの桁数: {self.digits}")
+    
+    def fetch_windows(self, start_ts: int, end_ts: int) -> List[Any]:
+        """
+        取得期間を取得ウィンドウに分割
+        
+        Args:
+            start_ts: 取得期間の開始（UTCエポック秒、含む）
+            end_ts: 取得期間の終了（UTCエポック秒、含む）
+            
+        Returns:
+            (開始, 終了) のリスト。chunk_days 未指定の場合は期間全体の1件
+        """
+        if not self.chunk_days:
+            return [(start_ts, end_ts)]
+        return split_range(start_ts, end_ts, self.chunk_days * 24 * 60 * 60)
+    
+    def fetch_rates_window(self, start_ts: int, end_ts: int, timeframe: Optional[str] = None) -> Any:
+        """
+        1ウィンドウ分のバーをデータ提供元から取得し、取得速度を表示
+        
+        Args:
+            start_ts: ウィンドウの開始（UTCエポック秒、含む）
+            end_ts: ウィンドウの終了（UTCエポック秒、含む）
+            timeframe: 時間軸（省略時は self.timeframe）
+            
+        Returns:
+            取得したレート配列（バーが無い場合は空配列の可能性あり）
+            
+        Raises:
+            Exception: データの取得に失敗した場合
+        """
+        provider = self.get_data_provider()
+        window_from = from_epoch_seconds(start_ts)
+        window_to = from_epoch_seconds(end_ts)
+        started = time.perf_counter()
+        timeframe = timeframe or self.timeframe
+        rates = provider.copy_rates_range(self.symbol, timeframe, window_from, window_to)
+        elapsed = time.perf_counter() - started
+        if rates is None:
+            error = provider.last_error()
+            raise Exception(
+                f"データ取得失敗: {self.symbol} {timeframe} "
+                f"{window_from} - {window_to}. エラー: {error}"
+            )
+        
+        count = len(rates)
+        bars_per_sec = count / elapsed if elapsed > 0 else float('inf')
+        print(
+            f"  {window_from:%Y-%m-%d %H:%M} - {window_to:%Y-%m-%d %H:%M}: "
+            f"{count} バー ({elapsed:.2f} 秒, {bars_per_sec:,.0f} バー/秒)"
+        )
+        return rates
+    
+    def top_up_cache(
+        self,
+        timeframe: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> int:
+        """
+        キャッシュに無い期間だけをデータ提供元から取得して追記
+        
+        Args:
+            timeframe: 時間軸（省略時は self.timeframe）
+            start_date: 開始日時（省略時は self.start_date）
+            end_date: 終了日時（省略時は self.end_date）
+        
+        Returns:
+            取得してキャッシュに追加したバー数
+            
+        Raises:
+            Exception: データの取得に失敗した場合
+        """
+        timeframe = timeframe or self.timeframe
+        holes = self.bar_cache.missing_ranges(
+            self.symbol, timeframe, start_date or self.start_date, end_date or self.end_date
+        )
+        settled_ts = int(time.time()) - CACHE_SETTLE_SECONDS
+        fetched = 0
+        
+        for hole_start, hole_end in holes:
+            print(f"未取得期間を取得中: {from_epoch_seconds(hole_start)} - {from_epoch_seconds(hole_end)}")
+            for window_start, window_end in self.fetch_windows(hole_start, hole_end):
+                rates = self.fetch_rates_window(window_start, window_end, timeframe)
+                
+                covered_end = window_end
+                if window_end > settled_ts:
+                    # 直近の期間は取得できた最終バーの直前までをカバー済みとし、
+                    # 形成中の可能性があるバーは次回の実行で取得し直す
+                    last_ts = int(rates[-1]['time']) - 1 if len(rates) > 0 else settled_ts
+                    covered_end = min(window_end, max(settled_ts, last_ts))
+                
+                fetched += self.bar_cache.append(
+                    self.symbol, timeframe, window_start, covered_end, rates
+                )
+                del rates
+        
+        if self.chunk_days and fetched > 0:
+            # 分割取得したセグメントを統合し、読み込み時の連結コピーを避ける
+            self.bar_cache.compact(self.symbol, timeframe)
+        
+        return fetched
+    
+    def derive_timeframe_from_m1(self) -> int:
+        """
+        要求時間軸のバーをキャッシュ済みM1から生成してキャッシュに追記
+        
+        必要なM1が揃っていない場合は、M1の未取得期間だけをデータ提供元から取得します。
+        生成したバーは要求時間軸のキャッシュとして保存されるため、次回以降は
+        そのまま読み込まれます。M1が揃っていないバケット（直近の形成中の期間など）は
+        生成せず、次回の実行で生成します。
+        
+        Returns:
+            データ提供元から取得したM1のバー数
+        """
+        seconds = TIMEFRAME_SECONDS[self.timeframe]
+        m1_start, m1_end = self.m1_source_range()
+        
+        cached_symbol = self.bar_cache.find_symbol(self.symbol)
+        if cached_symbol is not None and self.bar_cache.contains(cached_symbol, 'M1', m1_start, m1_end):
+            if cached_symbol.lower() != self.symbol.lower():
+                print(
+                    f"警告: シンボルが見つかりません: {self.symbol}。{cached_symbol} を使用します。",
+                    file=sys.stderr,
+                )
+            self.symbol = cached_symbol
+            fetched = 0
+        else:
+            provider = self.get_data_provider()
+            self.symbol = provider.resolve_symbol(self.symbol, 'M1')
+            print(f"過去データ（M1）を取得中...")
+            fetched = self.top_up_cache('M1', m1_start, m1_end)
+        
+        derived = 0
+        holes = self.bar_cache.missing_ranges(
+            self.symbol, self.timeframe, self.start_date, self.end_date
+        )
+        for hole_start, hole_end in holes:
+            for window_start, window_end in split_range(hole_start, hole_end, DERIVE_WINDOW_SECONDS):
+                source_from = from_epoch_seconds(bucket_start(window_start, seconds))
+                source_to = from_epoch_seconds(bucket_start(window_end, seconds) + seconds - 1)
+                
+                covered_end = window_end
+                missing = self.bar_cache.missing_ranges(self.symbol, 'M1', source_from, source_to)
+                if missing:
+                    covered_end = min(window_end, bucket_start(missing[0][0], seconds) - 1)
+                if covered_end < window_start:
+                    continue
+                
+                m1 = self.bar_cache.load(self.symbol, 'M1', source_from, source_to)
+                bars = resample_bars(m1, self.timeframe) if m1 is not None else None
+                derived += self.bar_cache.append(
+                    self.symbol, self.timeframe, window_start, covered_end, bars
+                )
+        
+        print(f"M1から{self.timeframe}を生成しました: {derived} バー")
+        return fetched
+    
+    def fetch_chunks_to_spill_file(self) -> Optional[Any]:
+        """
+        キャッシュ無効時の分割取得
+        
+        各ウィンドウを一時ファイルへ追記し、最後に読み取り専用の
+        メモリマップとして返します（一時ファイルはマップ解除時に削除）。
+        
+        Returns:
+            要求期間のレート配列（メモリマップ）。バーが無い場合None
+        """
+        start_ts = to_epoch_seconds(self.start_date)
+        end_ts = to_epoch_seconds(self.end_date)
+        dtype = None
+        total = 0
+        
+        with tempfile.TemporaryFile() as spill:
+            for window_start, window_end in self.fetch_windows(start_ts, end_ts):
+                rates = self.fetch_rates_window(window_start, window_end)
+                if len(rates) == 0:
+                    continue
+                bars = ColumnarBars.wrap(rates)
+                times = bars['time']
+                rows = bars.take((times >= window_start) & (times <= window_end)).to_records()
+                if dtype is None:
+                    dtype = rows.dtype
+                spill.write(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+                total += len(rows)
+                del rates, bars, rows
+            
+            if total == 0:
+                return None
+            spill.flush()
+            return np.memmap(spill, dtype=dtype, mode='r', shape=(total,))
+    
+    def ingest_ticks(self) -> int:
+        """
+        要求期間のうちティックストアに無い期間のティックを取得して保存
+        
+        TICK_FETCH_WINDOW_SECONDS ごとに取得し、ウィンドウごとに差分符号化して
+        ストアへ書き出すため、メモリ上に保持するのは1ウィンドウ分のみです。
+        ティックに対応していないデータ提供元の場合は警告して取得しません。
+        
+        Returns:
+            取得して保存したティック数
+            
+        Raises:
+            Exception: ティックの取得に失敗した場合
+        """
+        holes = self.tick_store.missing_ranges(self.symbol, self.start_date, self.end_date)
+        if not holes:
+            print("ティックはすべて取得済みです")
+            return 0
+        
+        provider = self.get_data_provider()
+        if not provider.supports_ticks:
+            print(
+                f"警告: {provider.name}データソースはティックに対応していないため、ティックの取得を省略します"
+                "（ティックストアに保存済みの期間のみ使用します）",
+                file=sys.stderr
+            )
+            return 0
+        point = self.tick_store.point(self.symbol) or provider.symbol_point(self.symbol)
+        if not point:
+            raise Exception(f"ポイントサイズを取得できません: {self.symbol}")
+        
+        settled_ts = int(time.time()) - CACHE_SETTLE_SECONDS
+        stored = 0
+        print("ティックを取得中...")
+        for hole_start, hole_end in holes:
+            for window_start, window_end in split_range(hole_start, hole_end, TICK_FETCH_WINDOW_SECONDS):
+                window_from = from_epoch_seconds(window_start)
+                window_to = from_epoch_seconds(window_end)
+                started = time.perf_counter()
+                ticks = provider.copy_ticks_range(self.symbol, window_from, window_to)
+                elapsed = time.perf_counter() - started
+                if ticks is None:
+                    error = provider.last_error()
+                    raise Exception(
+                        f"ティック取得失敗: {self.symbol} {window_from} - {window_to}. エラー: {error}"
+                    )
+                
+                covered_end = window_end
+                if window_end > settled_ts:
+                    # 直近の期間は取得できた最終ティックの直前の秒までをカバー済みとする
+                    last_ts = int(ticks[-1]['time']) - 1 if len(ticks) > 0 else settled_ts
+                    covered_end = min(window_end, max(settled_ts, last_ts))
+                
+                count = self.tick_store.append(self.symbol, window_start, covered_end, ticks, point)
+                stored += count
+                ticks_per_sec = len(ticks) / elapsed if elapsed > 0 else float('inf')
+                print(
+                    f"  {window_from:%Y-%m-%d %H:%M} - {window_to:%Y-%m-%d %H:%M}: "
+                    f"{count} ティック ({elapsed:.2f} 秒, {ticks_per_sec:,.0f} ティック/秒)"
+                )
+                del ticks
+        
+        print(f"ティックを保存しました: {stored} ティック")
+        return stored
+    
+    def load_cached_data(self) -> Optional[Any]:
+        """
+        キャッシュから過去データを読み込み
+        
+        シンボル名はキャッシュ済みシンボルからMT5と同じ規則で解決します
+        （例: USDJPY → USDJPYm）。
+        
+        Returns:
+            キャッシュ済みのレート配列。要求期間がすべてキャッシュ済みでない場合None
+        """
+        cached_symbol = self.bar_cache.find_symbol(self.symbol)
+        if cached_symbol is None:
+            return None
+        if not self.bar_cache.contains(
+            cached_symbol, self.timeframe, self.start_date, self.end_date
+        ):
+            return None
+        rates = self.bar_cache.load(
+            cached_symbol, self.timeframe, self.start_date, self.end_date
+        )
+        if rates is None:
+            return None
+        if cached_symbol != self.symbol:
+            if cached_symbol.lower() != self.symbol.lower():
+                print(
+                    f"警告: シンボルが見つかりません: {self.symbol}。{cached_symbol} を使用します。",
+                    file=sys.stderr,
+                )
+            self.symbol = cached_symbol
+        return rates
+    
+    def validate_data_range(self, rates: Any) -> None:
+        """
+        取得したデータが要求された日付範囲をカバーしているかを検証
+        
+        データ欠損インデックス（gap_index）から要求期間内の穴を調べます。
+        週末の休場以外の穴が期間の先頭・末尾にある場合はデータ範囲の不完全、
+        期間の途中にある場合は欠損期間として警告します。キャッシュ使用時は
+        追記時に作成済みの索引を参照するため、判定は O(log n) で行われます。
+        
+        Args:
+            rates: レート配列（time昇順）
+        """
+        times = rates['time']
+        first_time = from_epoch_seconds(times[0])
+        last_time = from_epoch_seconds(times[-1])
+        start_ts = to_epoch_seconds(self.start_date)
+        end_ts = to_epoch_seconds(self.end_date)
+        if self.gap_index is None:
+            coverage = [(min(start_ts, int(times[0])), max(end_ts, int(times[-1])))]
+            self.gap_index = GapIndex.build(times, self.timeframe, coverage)
         
         print(f"データ範囲: {first_time} - {last_time}")
         
-        if first_time > start_date or last_time < end_date:
+        if self.gap_index.is_complete(start_ts, end_ts):
+            return
+        
+        # 要求期間の先頭を含む穴、または取得済み期間の末尾まで続く穴はデータ範囲の不足
+        seconds = TIMEFRAME_SECONDS[self.timeframe]
+        first_expected = -(-start_ts // seconds) * seconds
+        interval = self.gap_index.covering_interval(end_ts)
+        holes = self.gap_index.holes(start_ts, end_ts, clip=False)
+        interior = [
+            (max(s, start_ts), min(e, end_ts)) for s, e in holes
+            if s > first_expected and interval is not None and e < interval[1]
+        ]
+        
+        if len(interior) < len(holes) or not self.gap_index.covers(start_ts, end_ts):
             print(
                 f"警告: データ範囲が不完全です。"
                 f"要求: {self.start_date} - {self.end_date}, "
                 f"取得: {first_time} - {last_time}",
                 file=sys.stderr
             )
+        if interior:
+            longest = max(interior, key=lambda h: h[1] - h[0])
+            print(
+                f"警告: データに欠損期間があります: {len(interior)} 件"
+                f"（最長: {from_epoch_seconds(longest[0])} - {from_epoch_seconds(longest[1])}）",
+                file=sys.stderr
+            )
     
     def simulate_strategy(self) -> None:
         """
         ストラテジーロジックをシミュレート
         
-        注意: これは簡易的な実装です。実際のストラテジーブロックの評価は
-        将来のタスクで実装されます。
+        simulation_mode が 'vectorized' の場合は系列全体のシグナル配列から
+        配列演算でトレードを求め（simulate_vectorized）、'loop' の場合は
+        バーごとに評価する参照実装（simulate_loop）を使用します。両者の結果は同じです。
+        
+        設定の全ストラテジーのブロックがサポートされている場合、エントリーは
+        全ストラテジーを一括で調停したシグナル（strategy_arbitration）を使用し、
+        トレードに採用したストラテジーのid（strategyId）を記録します。
+        この場合は riskModel のSL/TP（exitModel の exit.trail / exit.breakEven で移動）で
+        バーの途中で、exit.weekendClose の時刻にはそのバーの終値で決済し（exit_resolver）、
+        決済理由（exitReason: stopLoss / takeProfit / trailingStop / breakEven /
+        weekendClose / signal）を記録します。
+        それ以外の場合は簡易シグナル（移動平均との比較）を使用します。
+        
+        シミュレーション後、インジケーターを計算した場合はキャッシュのヒット・ミスの統計と、
+        条件の評価でブロックごとにインジケーターを計算・スキップしたバー数を表示します。
+        
+        Raises:
+            ValueError: サポートされていないシミュレーションモード、または tie_break の場合
         """
+        if self.simulation_mode not in SIMULATION_MODES:
+            raise ValueError(
+                f"サポートされていないシミュレーションモード: {self.simulation_mode} "
+                f"（{', '.join(SIMULATION_MODES)} のいずれかを指定してください）"
+            )
+        if self.tie_break not in TIE_BREAKS:
+            raise ValueError(
+                f"サポートされていない tie_break: {self.tie_break} "
+                f"（{', '.join(TIE_BREAKS)} のいずれかを指定してください）"
+            )
         print("シミュレーション開始...")
         
+        if self.simulation_mode == 'loop':
+            self.simulate_loop()
+        else:
+            self.simulate_vectorized()
+        
+        print(f"シミュレーション完了: {len(self.trades)} トレード")
+        if self._indicator_cache is not None:
+            print(self._indicator_cache.format_stats())
+        if self._planner is not None:
+            print("条件評価（ブロックごとにインジケーターを計算したバー数）:")
+            for line in self._planner.format_stats():
+                print(f"  {line}")
+    
+    def simulate_vectorized(self) -> None:
+        """
+        シグナル配列からトレードを一括で求める
+        
+        エントリー・エグジットのシグナルを系列全体の真偽値配列として計算し、
+        ポジションの状態遷移はシグナルの位置をたどって求めます。
+        損益・時刻の文字列化も配列演算で行います。
+        """
+        bars = self.bar_columns()
+        if len(bars) == 0:
+            return
+        
+        buy, sell = self.entry_signal_arrays()
+        entry = buy | sell
+        exit_signal = self.exit_signal_array()
+        closes = np.asarray(bars['close'], dtype=np.float64)
+        
+        if self.strategy_arbitration() is None:
+            entries, exits = pair_entries_exits(entry, exit_signal)
+            exit_prices = closes[exits]
+            reasons: List[Optional[str]] = [None] * len(entries)
+            lots = np.ones(len(entries))
+            average_prices = closes[entries]
+            nanpin = np.zeros(len(entries), dtype=bool)
+        else:
+            # エントリー候補の全バーについて、SL/TPとエグジットシグナルの早い方を一括で求める
+            candidates = np.flatnonzero(entry)
+            signal_exit = next_true_index(exit_signal)[candidates + 1]
+            hit_index, hit_price, hit_reason, hit_lots, hit_average = self.protective_exits(
+                candidates, buy[candidates], signal_exit
+            )
+            exit_index = np.full(len(bars), len(bars), dtype=np.int64)
+            exit_index[candidates] = np.minimum(hit_index, signal_exit)
+            entries, exits = chain_trades(entry, exit_index)
+            trade_hits = np.searchsorted(candidates, entries)
+            protected = hit_reason[trade_hits] != EXIT_NONE
+            exit_prices = np.where(protected, hit_price[trade_hits], closes[exits])
+            reasons = [EXIT_REASONS.get(reason, 'signal') for reason in hit_reason[trade_hits].tolist()]
+            lots = hit_lots[trade_hits]
+            average_prices = hit_average[trade_hits]
+            nanpin = np.zeros(len(entries), dtype=bool)
+            for selected, _ in self.nanpin_plan(entries):
+                nanpin |= selected
+        if len(entries) == 0:
+            return
+        
+        times = np.asarray(bars['time'], dtype=np.int64)
+        strategy_ids = self.entry_strategy_ids(entries)
+        is_buy = buy[entries]
+        entry_prices = closes[entries]
+        pnl = np.where(is_buy, exit_prices - average_prices, average_prices - exit_prices) * lots
+        stamps = epoch_to_iso(np.concatenate((times[entries], times[exits]))).tolist()
+        
+        for (entry_time, entry_price, exit_time, exit_price, profit, long, strategy_id, reason,
+             size, average_price, laddered) in zip(
+            stamps[:len(entries)],
+            entry_prices.tolist(),
+            stamps[len(entries):],
+            exit_prices.tolist(),
+            pnl.tolist(),
+            is_buy.tolist(),
+            strategy_ids,
+            reasons,
+            lots.tolist(),
+            average_prices.tolist(),
+            nanpin.tolist()
+        ):
+            trade = {
+                'entryTime': entry_time,
+                'entryPrice': entry_price,
+                'exitTime': exit_time,
+                'exitPrice': exit_price,
+                'positionSize': size,  # ナンピン以外は簡略化のため 1.0 で固定
+                'profitLoss': profit,
+                'type': 'BUY' if long else 'SELL'
+            }
+            if strategy_id is not None:
+                trade['strategyId'] = strategy_id
+                trade['exitReason'] = reason
+            if laddered:
+                trade['averagePrice'] = average_price
+            self.trades.append(trade)
+    
+    def simulate_loop(self) -> None:
+        """
+        バーごとにシグナルを評価してトレードを求める（参照実装）
+        
+        simulate_vectorized の結果を検証するための実装です。
+        """
         # 簡易的なシミュレーションロジック
         # 実際の実装では、ブロックベースのロジックを評価する必要があります
         position = None  # None, 'BUY', 'SELL'
         entry_price = 0.0
         entry_time = None
+        entry_index = 0
+        plan = None  # (SL, TP, SLの移動規則, 週末決済のバー)、設定のストラテジーでエントリーした場合のみ
+        extreme = 0.0  # エントリー後の有利な方向の極値
+        ladder = None  # ナンピンの (段の価格, 段ごとのロット, バスケットのSL, TP幅)、nanpin.fixed の場合のみ
+        legs = 0  # 約定した追加エントリーの回数
+        position_size = 1.0  # 合計ロット
+        cost = 0.0  # ロット × 約定価格の合計
         
         from datetime import timezone
         
-        for i, bar in enumerate(self.historical_data):
-            current_time = datetime.fromtimestamp(bar['time'], tz=timezone.utc)
-            current_price = bar['close']
+        bars = self.bar_columns()
+        times = bars['time']
+        opens = bars['open']
+        highs = bars['high']
+        lows = bars['low']
+        closes = bars['close']
+        
+        for i in range(len(bars)):
+            bar = bars[i]
+            current_time = datetime.fromtimestamp(int(times[i]), tz=timezone.utc)
+            current_price = closes[i]
             
             # エントリー条件を評価（簡易版）
             if position is None:
@@ -333,39 +1010,357 @@ class BacktestEngine:
                     position = 'BUY'
                     entry_price = current_price
                     entry_time = current_time
+                    entry_index = i
                     
                 elif self.check_entry_signal(bar, i, 'SELL'):
                     position = 'SELL'
                     entry_price = current_price
                     entry_time = current_time
+                    entry_index = i
+                
+                if position is not None and self.strategy_arbitration() is not None:
+                    stop, target, rules, weekend = self.exit_plan(np.array([i]), np.array([position == 'BUY']))
+                    plan = (float(stop[0]), float(target[0]), rules, int(weekend[0]))
+                    extreme = float(current_price)
+                    ladder = None
+                    position_size = 1.0
+                    for _, (interval, depth, leg_lots) in self.nanpin_plan(np.array([i])):
+                        side = 1.0 if position == 'BUY' else -1.0
+                        levels = ladder_levels(np.array([entry_price]), np.array([position == 'BUY']), interval, depth)
+                        stop_distance = side * (entry_price - plan[0])
+                        ladder = (levels[0].tolist(), leg_lots.tolist(), float(levels[0, depth] - side * stop_distance),
+                                  side * (plan[1] - entry_price))
+                        legs = 0
+                        position_size = ladder[1][0]
+                        cost = ladder[1][0] * float(entry_price)
             
-            # エグジット条件を評価
+            # エグジット条件を評価（SL/TPはバーの途中で約定するため、終値のシグナルより先に判定）
             elif position is not None:
-                if self.check_exit_signal(bar, i, position):
-                    exit_price = current_price
+                reason, exit_price = EXIT_NONE, current_price
+                if plan is not None and ladder is not None:
+                    long = position == 'BUY'
+                    side = 1.0 if long else -1.0
+                    levels, leg_lots, basket_stop, target_distance = ladder
+                    # このバーで約定する段（TPで決済した場合は含めない）
+                    fills = []
+                    for level in levels[legs + 1:]:
+                        if (lows[i] <= level) if long else (highs[i] >= level):
+                            fills.append(min(float(opens[i]), level) if long else max(float(opens[i]), level))
+                        else:
+                            break
+                    reason, hit_price = bar_exit(
+                        float(opens[i]), float(highs[i]), float(lows[i]), long,
+                        basket_stop, cost / position_size + side * target_distance, self.tie_break
+                    )
+                    if reason != EXIT_TAKE_PROFIT:
+                        for fill in fills:
+                            legs += 1
+                            position_size += leg_lots[legs]
+                            cost += leg_lots[legs] * fill
+                    if reason != EXIT_NONE:
+                        exit_price = hit_price
+                    elif i == plan[3]:
+                        reason = EXIT_WEEKEND_CLOSE
+                elif plan is not None:
+                    long = position == 'BUY'
+                    stop, stop_reason = plan[2].moved_stop(0, long, plan[0], extreme)
+                    reason, hit_price = bar_exit(
+                        float(opens[i]), float(highs[i]), float(lows[i]), long,
+                        float(stop), plan[1], self.tie_break
+                    )
+                    if reason == EXIT_STOP_LOSS:
+                        reason = int(stop_reason)
+                    if reason != EXIT_NONE:
+                        exit_price = hit_price
+                    elif i == plan[3]:
+                        reason = EXIT_WEEKEND_CLOSE
+                    extreme = max(extreme, float(highs[i])) if long else min(extreme, float(lows[i]))
+                if reason != EXIT_NONE or self.check_exit_signal(bar, i, position):
                     exit_time = current_time
                     
-                    # 損益を計算
+                    # 損益を計算（ナンピンは加重平均建値 × 合計ロット）
+                    average_price = cost / position_size if ladder is not None else entry_price
                     if position == 'BUY':
-                        pnl = exit_price - entry_price
+                        pnl = (exit_price - average_price) * position_size
                     else:  # SELL
-                        pnl = entry_price - exit_price
+                        pnl = (average_price - exit_price) * position_size
                     
                     # トレードを記録
-                    self.trades.append({
+                    trade = {
                         'entryTime': entry_time.isoformat(),
                         'entryPrice': float(entry_price),
                         'exitTime': exit_time.isoformat(),
                         'exitPrice': float(exit_price),
-                        'positionSize': 1.0,  # 簡略化のため固定
+                        'positionSize': float(position_size),  # ナンピン以外は簡略化のため 1.0 で固定
                         'profitLoss': float(pnl),
                         'type': position
-                    })
+                    }
+                    strategy_id = self.entry_strategy_ids(np.array([entry_index]))[0]
+                    if strategy_id is not None:
+                        trade['strategyId'] = strategy_id
+                        trade['exitReason'] = EXIT_REASONS.get(reason, 'signal')
+                    if ladder is not None:
+                        trade['averagePrice'] = float(average_price)
+                    self.trades.append(trade)
                     
                     # ポジションをクローズ
                     position = None
+    
+    def entry_signal_arrays(self) -> Any:
+        """
+        全バーのエントリーシグナル（check_entry_signal と同じ判定）
         
-        print(f"シミュレーション完了: {len(self.trades)} トレード")
+        Returns:
+            (BUY, SELL) の真偽値配列
+        """
+        arbitration = self.strategy_arbitration()
+        if arbitration is not None:
+            return arbitration.entry_signals()
+        closes = np.asarray(self.bar_columns()['close'], dtype=np.float64)
+        average = prior_mean(closes, ENTRY_MA_PERIOD)
+        ready = self.bars_since_gap() >= ENTRY_MA_PERIOD
+        with np.errstate(invalid='ignore'):
+            return ready & (closes > average), ready & (closes < average)
+    
+    def strategy_arbitration(self) -> Optional[StrategyArbitration]:
+        """
+        設定の全ストラテジーを一括で評価した調停結果
+        
+        各ブロックのシグナルは一度だけ計算して全ストラテジーで共有し、
+        インジケーターは IndicatorCache で重複なく計算します。
+        globalGuards（セッション・曜日・最大スプレッド）は全バーのマスクとして一度だけ計算し、
+        全ストラテジーのエントリー条件に AND します（global_guards）。
+        ティックストアがある場合、スプレッドの判定にはティックのスプレッドを使用します（bar_spreads）。
+        entryRequirement は EvaluationPlanner で遅延評価し、ガード外のバーや先に評価した条件が
+        不成立のバーでは後続のブロックを評価しません（evaluation_planner()で計算・スキップしたバー数を確認できます）。
+        
+        Returns:
+            調停結果。ストラテジーが無い、またはサポートされていないブロックを
+            使用している場合None（簡易シグナルを使用）
+        """
+        if self._arbitration_source is self.historical_data:
+            return self._arbitration
+        self._arbitration = None
+        self._arbitration_source = self.historical_data
+        self._exit_series = {}
+        self._indicator_cache = None
+        self._planner = None
+        config = self.strategy_config or {}
+        if not config.get('strategies'):
+            return None
+        
+        evaluator = CompositeEvaluator(config)
+        types = evaluator.block_types
+        unsupported = [block_id for block_id in evaluator.block_ids() if types[block_id] not in BLOCK_KERNELS]
+        if unsupported:
+            print(
+                f"警告: サポートされていないブロックがあるため簡易シグナルを使用します: {', '.join(unsupported)}",
+                file=sys.stderr
+            )
+            return None
+        
+        bars = self.bar_columns()
+        if self.tick_store is not None:
+            bars = ColumnarBars({**bars.columns, 'spread': self.bar_spreads()})
+        blocks = config.get('blocks', [])
+        context = BlockContext(bars, self.timeframe, self.digits, self.indicator_cache())
+        self._planner = EvaluationPlanner(
+            lazy_kernels(blocks, evaluator.block_ids(), context), len(bars),
+            estimators=sample_estimators(blocks, evaluator.block_ids(), context, PLANNER_SAMPLE_BARS)
+        )
+        guards = GlobalGuards(config.get('globalGuards'))
+        guards.warn_ignored()
+        allowed = guards.mask(bars['time'], bars['spread'], self.timeframe, self.digits)
+        self._arbitration = arbitrate(config, None, len(bars), evaluator, allowed, self._planner)
+        return self._arbitration
+    
+    def evaluation_planner(self) -> Optional[EvaluationPlanner]:
+        """直近の strategy_arbitration() で条件を評価したプランナー（簡易シグナルの場合None）"""
+        self.strategy_arbitration()
+        return self._planner
+    
+    def entry_strategy_ids(self, entries: np.ndarray) -> List[Optional[str]]:
+        """エントリーしたバーで採用されたストラテジーのid（簡易シグナルの場合None）"""
+        arbitration = self.strategy_arbitration()
+        if arbitration is None:
+            return [None] * len(entries)
+        positions, _ = arbitration.first_entry()
+        return [arbitration.strategy_ids[position] for position in positions[entries].tolist()]
+    
+    def exit_plan(
+        self,
+        entries: np.ndarray,
+        is_long: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, StopRules, np.ndarray]:
+        """
+        エントリーしたバーごとの決済条件（採用したストラテジーの riskModel / exitModel による）
+        
+        Args:
+            entries: エントリーしたバーの位置（strategy_arbitration() が None でないこと）
+            is_long: ロングの場合 True
+            
+        Returns:
+            (SLの価格, TPの価格, SLの移動規則, exit.weekendClose で決済するバーの位置（無い場合はバー数）)
+        """
+        arbitration = self.strategy_arbitration()
+        strategies = {s['id']: s for s in self.strategy_config['strategies']}
+        bars = self.bar_columns()
+        entry_prices = np.asarray(bars['close'], dtype=np.float64)[entries]
+        rows = arbitration.first_entry()[0][entries]
+        stop = np.empty(len(entries))
+        target = np.empty(len(entries))
+        rules = StopRules(entry_prices)
+        weekend = np.full(len(entries), len(bars), dtype=np.int64)
+        for row in np.unique(rows).tolist():
+            selected = rows == row
+            strategy = strategies[arbitration.strategy_ids[row]]
+            risk_model = strategy.get('riskModel') or {}
+            exit_model = strategy.get('exitModel') or {}
+            
+            atr = None
+            if risk_model.get('type') == 'risk.atrBased':
+                params = {**DEFAULT_ATR_PARAMS, **risk_model.get('params', {})}
+                atr = self.exit_series('ATR', params['atrTimeframe'], int(params['atrPeriod']))[entries[selected]]
+            stop[selected], target[selected] = protective_levels(
+                risk_model, entry_prices[selected], is_long[selected], self.digits, atr
+            )
+            
+            params = exit_model.get('params', {})
+            atr = None
+            if exit_model.get('type') == 'exit.trail' and params.get('useAtr', False):
+                period = int(params.get('atrPeriod', DEFAULT_TRAIL_PARAMS['atrPeriod']))
+                atr = self.exit_series('ATR', self.timeframe, period)[entries[selected]]
+            strategy_rules = exit_rules(exit_model, entry_prices[selected], self.digits, atr)
+            for name in ('trail_start', 'trail_distance', 'break_even_trigger', 'break_even_offset'):
+                getattr(rules, name)[selected] = getattr(strategy_rules, name)
+            
+            if exit_model.get('type') == 'exit.weekendClose':
+                params = {**DEFAULT_WEEKEND_CLOSE_PARAMS, **params}
+                mask = self.exit_series('WEEKEND', int(params['dayOfWeek']), str(params['closeTime']))
+                weekend[selected] = next_true_index(mask)[entries[selected] + 1]
+        return stop, target, rules, weekend
+    
+    def indicator_cache(self) -> IndicatorCache:
+        """
+        実行中のバーデータのインジケーターキャッシュ
+
+        ブロックの評価と決済条件（risk.atrBased / exit.trail のATR）で共有するため、
+        同じ期間のATRは1回の実行で一度だけ計算します。
+        """
+        self.strategy_arbitration()  # バーデータが変わった場合はキャッシュを破棄
+        if self._indicator_cache is None:
+            self._indicator_cache = IndicatorCache({self.timeframe: self.bar_columns()})
+        return self._indicator_cache
+
+    def exit_series(self, kind: str, *params: Any) -> np.ndarray:
+        """
+        決済条件が参照する系列（実行中のバーデータごとに一度だけ計算）
+        
+        Args:
+            kind: 'ATR'（時間軸, 期間）または 'WEEKEND'（曜日, 決済時刻）
+        """
+        self.strategy_arbitration()  # バーデータが変わった場合はキャッシュを破棄
+        key = (kind,) + params
+        if key not in self._exit_series:
+            bars = self.bar_columns()
+            if kind == 'ATR':
+                self._exit_series[key] = atr_series(
+                    bars, self.timeframe, params[0], params[1], self.indicator_cache()
+                )
+            else:
+                self._exit_series[key] = weekend_close_mask(bars['time'], self.timeframe, params[0], params[1])
+        return self._exit_series[key]
+    
+    def protective_exits(
+        self,
+        entries: np.ndarray,
+        is_long: np.ndarray,
+        end: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        エントリーしたバーごとに、end までで最初に決済条件を満たしたバー
+        
+        SL/TP（移動したSLを含む）はバーの途中で（exit_resolver.first_hits）、
+        exit.weekendClose はそのバーの終値で決済します。
+        nanpinModel が nanpin.fixed のストラテジーは段を追加したバスケットを
+        加重平均建値に対するSL/TPで決済します（nanpin_simulator、SLは移動しません）。
+        
+        Args:
+            entries: エントリーしたバーの位置
+            is_long: ロングの場合 True
+            end: 探索する最後のバーの位置（エグジットシグナルのバー）
+            
+        Returns:
+            (決済したバーの位置, 約定価格, 決済理由, 合計ロット, 加重平均建値) の配列
+            （決済しない場合の理由は EXIT_NONE、ロット・建値は end で決済した場合の値）
+        """
+        bars = self.bar_columns()
+        closes = np.asarray(bars['close'], dtype=np.float64)
+        stop, target, rules, weekend = self.exit_plan(entries, is_long)
+        last = np.minimum(end, weekend)
+        index = np.full(len(entries), len(bars), dtype=np.int64)
+        price = np.full(len(entries), np.nan)
+        reason = np.full(len(entries), EXIT_NONE, dtype=np.int8)
+        lots = np.ones(len(entries))
+        average = closes[entries]
+
+        plain = np.ones(len(entries), dtype=bool)
+        for selected, (interval, depth, leg_lots) in self.nanpin_plan(entries):
+            plain &= ~selected
+            entry_prices = average[selected]
+            long = is_long[selected]
+            side = np.where(long, 1.0, -1.0)
+            ladders = NanpinLadders(
+                bars['open'], bars['high'], bars['low'], entries[selected], long, entry_prices,
+                interval, leg_lots, depth, last[selected]
+            )
+            hit_index, hit_price, hit_reason = ladders.exits(
+                depth, side * (entry_prices - stop[selected]), side * (target[selected] - entry_prices),
+                self.tie_break
+            )
+            index[selected], price[selected], reason[selected] = hit_index, hit_price, hit_reason
+            exit_at = np.where(hit_reason == EXIT_NONE, last[selected], hit_index)
+            _, lots[selected], average[selected] = ladders.basket(depth, exit_at, hit_reason)
+
+        # ナンピンのバスケットはSLを移動しない
+        plain_rules = StopRules(
+            rules.entry_prices[plain], rules.trail_start[plain], rules.trail_distance[plain],
+            rules.break_even_trigger[plain], rules.break_even_offset[plain]
+        )
+        index[plain], price[plain], reason[plain] = first_hits(
+            bars['open'], bars['high'], bars['low'], entries[plain], is_long[plain], stop[plain], target[plain],
+            last[plain], self.tie_break, plain_rules
+        )
+        forced = (reason == EXIT_NONE) & (weekend <= end) & (weekend < len(bars))
+        index[forced] = weekend[forced]
+        price[forced] = closes[weekend[forced]]
+        reason[forced] = EXIT_WEEKEND_CLOSE
+        return index, price, reason, lots, average
+
+    def nanpin_plan(self, entries: np.ndarray) -> List[Tuple[np.ndarray, Tuple[float, int, np.ndarray]]]:
+        """
+        エントリーしたバーのうち、採用したストラテジーが nanpin.fixed のもの
+
+        Args:
+            entries: エントリーしたバーの位置（strategy_arbitration() が None でないこと）
+
+        Returns:
+            ストラテジーごとの (対象のエントリーの真偽値配列, (段の間隔, 段数, 段ごとのロット)) のリスト
+        """
+        arbitration = self.strategy_arbitration()
+        strategies = {s['id']: s for s in self.strategy_config['strategies']}
+        rows = arbitration.first_entry()[0][entries]
+        plan = []
+        for row in np.unique(rows).tolist():
+            strategy = strategies[arbitration.strategy_ids[row]]
+            settings = nanpin_settings(strategy.get('nanpinModel'), self.digits, NANPIN_BASE_LOTS)
+            if settings is not None:
+                plan.append((rows == row, settings))
+        return plan
+    
+    def exit_signal_array(self) -> np.ndarray:
+        """全バーのエグジットシグナル（check_exit_signal と同じ判定）"""
+        return np.arange(len(self.bar_columns())) % EXIT_INTERVAL_BARS == 0
     
     def check_entry_signal(self, bar: Dict, index: int, direction: str) -> bool:
         """
@@ -382,16 +1377,20 @@ class BacktestEngine:
         Returns:
             エントリーシグナルがある場合True
         """
-        # 実際の実装では、strategy_configのブロックを評価
-        # ここでは簡易的なロジックを使用
+        # 設定のストラテジーを評価できる場合は調停結果を参照
+        arbitration = self.strategy_arbitration()
+        if arbitration is not None:
+            buy, sell = arbitration.entry_signals()
+            return bool(buy[index] if direction == 'BUY' else sell[index])
         
         # 例: 単純な移動平均クロスオーバー
-        if index < 20:
+        # 長いデータ欠損の直後は移動平均を計算し直す（穴をまたいだ平均は使わない）
+        if self.bars_since_gap()[index] < ENTRY_MA_PERIOD:
             return False
         
         # 過去20バーの平均を計算
-        recent_bars = self.historical_data[index-20:index]
-        avg_price = sum(float(b['close']) for b in recent_bars) / len(recent_bars)
+        recent_closes = self.bar_columns()['close'][index - ENTRY_MA_PERIOD:index]
+        avg_price = float(recent_closes.mean())
         
         if direction == 'BUY':
             return float(bar['close']) > avg_price
@@ -417,7 +1416,73 @@ class BacktestEngine:
         # ここでは簡易的なロジックを使用
         
         # 例: 10バー後に自動クローズ
-        return index % 10 == 0
+        return index % EXIT_INTERVAL_BARS == 0
+    
+    def bar_columns(self) -> ColumnarBars:
+        """
+        過去データを列指向で参照
+        
+        historical_data が構造化配列の場合は各フィールドのビューを、
+        キャッシュから読み込んだColumnarBarsの場合はそのまま返します（いずれもコピー無し）。
+        
+        Returns:
+            列ごとの配列を保持するColumnarBars
+        """
+        if self._bar_columns is None or self._bar_columns_source is not self.historical_data:
+            self._bar_columns = ColumnarBars.wrap(self.historical_data)
+            self._bar_columns_source = self.historical_data
+        return self._bar_columns
+    
+    def bar_spreads(self) -> np.ndarray:
+        """
+        バーごとのスプレッド（ポイント）
+        
+        ティックストアにティックがあるバーは、バー内の最後のティックのスプレッド
+        （TickStore.close_spreads）を使用し、それ以外のバーはバーの spread 列を使用します。
+        
+        Returns:
+            バーごとの整数配列
+        """
+        bars = self.bar_columns()
+        spreads = np.asarray(bars['spread'], dtype=np.int64).copy()
+        if self.tick_store is None or len(bars) == 0:
+            return spreads
+        times = np.asarray(bars['time'], dtype=np.int64)
+        ticks = self.tick_store.close_spreads(
+            self.symbol, self.timeframe,
+            from_epoch_seconds(int(times[0])),
+            from_epoch_seconds(int(times[-1]) + TIMEFRAME_SECONDS[self.timeframe] - 1)
+        )
+        if ticks is None:
+            print("警告: ティックストアに期間内のティックが無いため、バーのスプレッドを使用します", file=sys.stderr)
+            return spreads
+        tick_times, tick_spreads = ticks
+        positions = np.minimum(np.searchsorted(tick_times, times), len(tick_times) - 1)
+        found = tick_times[positions] == times
+        spreads[found] = tick_spreads[positions[found]]
+        print(f"ティックのスプレッドを使用します: {int(found.sum())} / {len(bars)} バー")
+        return spreads
+    
+    def bars_since_gap(self) -> np.ndarray:
+        """
+        各バーについて直前のデータ欠損（週末以外の、GAP_RESET_MIN_BARS 本以上の穴）の後からのバー数を返す
+        
+        インジケーターは長い欠損をまたいで計算せず、欠損の直後から計算し直します。
+        欠損の位置はデータ欠損インデックスから一括で求めるため、
+        シミュレーターはバーごとに時刻の間隔を確認する必要がありません。
+        
+        Returns:
+            バーごとの整数配列（欠損が無い場合はバーのインデックスと同じ）
+        """
+        if self._bars_since_gap is None or self._bars_since_gap_source is not self.historical_data:
+            times = self.bar_columns()['time']
+            index = self.gap_index
+            if index is None:
+                coverage = [(int(times[0]), int(times[-1]))] if len(times) > 0 else []
+                index = GapIndex.build(times, self.timeframe, coverage)
+            self._bars_since_gap = index.bars_since_reset(times, min_bars=GAP_RESET_MIN_BARS)
+            self._bars_since_gap_source = self.historical_data
+        return self._bars_since_gap
     
     def generate_results(self) -> None:
         """バックテスト結果を生成してJSONファイルに保存"""
@@ -539,9 +1604,62 @@ def main():
         required=True,
         help='結果出力パス'
     )
+    parser.add_argument(
+        '--cache-dir',
+        default=None,
+        help='過去データキャッシュのディレクトリ（指定時は取得データを保存し、再実行時に再利用）'
+    )
+    parser.add_argument(
+        '--chunk-days',
+        type=int,
+        default=None,
+        help='過去データを指定日数ごとに分割して取得（長期間のM1データでメモリ使用量を抑制）'
+    )
+    parser.add_argument(
+        '--derive-from-m1',
+        action='store_true',
+        help='M1以外の時間軸をキャッシュ済みM1から生成（--cache-dir 指定時のみ有効）'
+    )
+    parser.add_argument(
+        '--tick-dir',
+        default=None,
+        help='ティックストアのディレクトリ（指定時は期間内のティックをMT5から取得して保存）'
+    )
+    parser.add_argument(
+        '--data-source',
+        choices=DATA_SOURCES,
+        default='mt5',
+        help='過去データの取得元（mt5: MT5ターミナル、file: エクスポート済みファイル）'
+    )
+    parser.add_argument(
+        '--data-dir',
+        default=None,
+        help='--data-source file の場合のデータファイルのディレクトリ'
+    )
+    parser.add_argument(
+        '--simulation-mode',
+        choices=SIMULATION_MODES,
+        default='vectorized',
+        help='シミュレーションモード（vectorized: 系列全体の配列演算、loop: バーごとの参照実装）'
+    )
+    parser.add_argument(
+        '--digits',
+        type=int,
+        default=None,
+        help='シンボルの桁数（省略時はシンボル情報・シンボルカタログから取得）'
+    )
+    parser.add_argument(
+        '--tie-break',
+        choices=TIE_BREAKS,
+        default=DEFAULT_TIE_BREAK,
+        help='同じバーでSLとTPの両方に達した場合の規則（stopLoss: SL優先、takeProfit: TP優先、nearestToOpen: 始値に近い方）'
+    )
     
     args = parser.parse_args()
     
+    if args.data_source == 'file' and not args.data_dir:
+        parser.error("--data-source file の場合は --data-dir を指定してください")
+    
     # 日付を解析
     try:
         start_date = datetime.fromisoformat(args.start.replace('Z', '+00:00'))
@@ -557,7 +1675,16 @@ def main():
         timeframe=args.timeframe,
         start_date=start_date,
         end_date=end_date,
-        output_path=args.output
+        output_path=args.output,
+        cache_dir=args.cache_dir,
+        chunk_days=args.chunk_days,
+        data_source=args.data_source,
+        data_dir=args.data_dir,
+        tick_dir=args.tick_dir,
+        derive_from_m1=args.derive_from_m1,
+        simulation_mode=args.simulation_mode,
+        digits=args.digits,
+        tie_break=args.tie_break
     )
     
     engine.run()
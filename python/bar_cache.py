@@ -0,0 +1,528 @@
+"""
+Strategy Bricks ヒストリカルデータキャッシュ
+
+MT5から取得したレート配列（構造化NumPy配列）をローカルディスクに保存し、
+同じ条件のバックテストを再実行する際にMT5へアクセスせずに読み込めるようにします。
+
+保存形式は列ごとの NumPy .npy ファイルです（bar_store.ColumnarBars）。
+.npy はメモリマップ読み込み（mmap_mode='r'）に対応しているため、数ヶ月分のM1データでも
+全体をメモリへ展開せずに参照でき、シミュレーターには列のビューをコピー無しで渡せます。
+
+キャッシュは (シンボル, 時間軸) ごとに、取得済み期間（カバレッジ区間）と
+データ本体（セグメントファイル）を管理します。既存のカバレッジに含まれない
+期間（穴）だけをMT5から取得して追記できるため、期間を延長した再実行でも
+差分のみのダウンロードで済みます。
+
+キャッシュ構成:
+    <cache_dir>/<SYMBOL>/<TIMEFRAME>/manifest.json
+    <cache_dir>/<SYMBOL>/<TIMEFRAME>/seg_<start>_<end>/<列名>.npy
+    <cache_dir>/<SYMBOL>/<TIMEFRAME>/gaps.npz（データ欠損インデックス、gap_index.GapIndex）
+    <cache_dir>/symbols.json（ブローカーのシンボル一覧、symbol_catalog.SymbolCatalog）
+    （start/end はUTCエポック秒、区間は両端を含む）
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bar_store import ColumnarBars
+from gap_index import GapIndex
+
+# マニフェストのフォーマットバージョン（不一致の場合はキャッシュ無しとして扱う）
+CACHE_FORMAT_VERSION = 2
+
+# セグメント数がこの値を超えたら1ファイルに統合する
+MAX_SEGMENTS = 16
+
+Interval = Tuple[int, int]
+
+
+def to_epoch_seconds(value: datetime) -> int:
+    """
+    datetimeをUTCエポック秒に変換
+
+    タイムゾーン情報を持たないdatetimeはUTCとして扱います
+    （fetch_historical_dataのデータ範囲検証と同じ規約）。
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def from_epoch_seconds(value: int) -> datetime:
+    """UTCエポック秒をタイムゾーン付きdatetimeに変換"""
+    return datetime.fromtimestamp(int(value), tz=timezone.utc)
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """
+    閉区間のリストをソートし、重なり・隣接する区間を統合
+
+    バー時刻は整数秒のため、[a, b] と [b + 1, c] は隣接として統合します。
+    """
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def subtract_intervals(start: int, end: int, covered: List[Interval]) -> List[Interval]:
+    """
+    区間 [start, end] からカバー済み区間を除いた穴のリストを返す
+
+    Args:
+        start: 要求区間の開始（含む）
+        end: 要求区間の終了（含む）
+        covered: 統合済み・昇順のカバー済み区間
+    """
+    holes: List[Interval] = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end < cursor:
+            continue
+        if c_start > end:
+            break
+        if c_start > cursor:
+            holes.append((cursor, c_start - 1))
+        cursor = max(cursor, c_end + 1)
+        if cursor > end:
+            break
+    if cursor <= end:
+        holes.append((cursor, end))
+    return holes
+
+
+def split_range(start: int, end: int, chunk_seconds: int) -> List[Interval]:
+    """
+    閉区間 [start, end] を固定長のウィンドウに分割
+
+    Args:
+        start: 区間の開始（含む）
+        end: 区間の終了（含む）
+        chunk_seconds: ウィンドウの長さ（秒）
+    """
+    windows: List[Interval] = []
+    cursor = start
+    while cursor <= end:
+        window_end = min(cursor + chunk_seconds - 1, end)
+        windows.append((cursor, window_end))
+        cursor = window_end + 1
+    return windows
+
+
+def safe_name(name: str) -> str:
+    """ファイルシステムで使用できない文字を置換"""
+    return re.sub(r'[^A-Za-z0-9._#-]', '_', name)
+
+
+def atomic_write(path: str, write_func) -> None:
+    """一時ファイルへ書き込んでから置き換える"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_func(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class BarCache:
+    """(シンボル, 時間軸) ごとにカバレッジ区間を管理するバーデータのディスクキャッシュ"""
+
+    def __init__(self, cache_dir: str):
+        """
+        キャッシュを初期化
+
+        Args:
+            cache_dir: キャッシュを保存するディレクトリ（存在しない場合は作成）
+        """
+        self.cache_dir = cache_dir
+
+    def entry_dir(self, symbol: str, timeframe: str) -> str:
+        """(シンボル, 時間軸) のキャッシュディレクトリを返す"""
+        return os.path.join(self.cache_dir, safe_name(symbol), timeframe)
+
+    def _manifest_path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.entry_dir(symbol, timeframe), 'manifest.json')
+
+    def _read_manifest(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        empty = {'formatVersion': CACHE_FORMAT_VERSION, 'coverage': [], 'segments': []}
+        path = self._manifest_path(symbol, timeframe)
+        if not os.path.isfile(path):
+            return empty
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return empty
+        if manifest.get('formatVersion') != CACHE_FORMAT_VERSION:
+            return empty
+        return manifest
+
+    def _write_manifest(self, symbol: str, timeframe: str, manifest: Dict[str, Any]) -> None:
+        payload = json.dumps(manifest, indent=2).encode('utf-8')
+        atomic_write(self._manifest_path(symbol, timeframe), lambda f: f.write(payload))
+
+    def coverage(self, symbol: str, timeframe: str) -> List[Interval]:
+        """取得済み期間（統合済み・昇順の閉区間）を返す"""
+        manifest = self._read_manifest(symbol, timeframe)
+        return [(int(s), int(e)) for s, e in manifest['coverage']]
+
+    def missing_ranges(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Interval]:
+        """
+        要求期間のうちキャッシュに無い期間を返す
+
+        Returns:
+            未取得期間（UTCエポック秒の閉区間）のリスト
+        """
+        return subtract_intervals(
+            to_epoch_seconds(start_date),
+            to_epoch_seconds(end_date),
+            self.coverage(symbol, timeframe)
+        )
+
+    def contains(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> bool:
+        """要求期間がすべてキャッシュ済みかを返す"""
+        return not self.missing_ranges(symbol, timeframe, start_date, end_date)
+
+    def load(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Optional[ColumnarBars]:
+        """
+        キャッシュからバーデータを読み込み
+
+        要求期間が1つのセグメントに収まる場合は、メモリマップされた
+        読み取り専用の列配列のスライス（コピー無し）を返します。
+        期間全体がキャッシュ済みかどうかは contains() で確認してください。
+
+        Returns:
+            要求期間内のキャッシュ済みバーデータ。該当するバーが無い場合None
+        """
+        manifest = self._read_manifest(symbol, timeframe)
+        return self._load_range(
+            symbol, timeframe, manifest, to_epoch_seconds(start_date), to_epoch_seconds(end_date)
+        )
+
+    def _load_range(
+        self,
+        symbol: str,
+        timeframe: str,
+        manifest: Dict[str, Any],
+        start_ts: int,
+        end_ts: int
+    ) -> Optional[ColumnarBars]:
+        directory = self.entry_dir(symbol, timeframe)
+        parts = []
+        for segment in sorted(manifest['segments'], key=lambda s: s['start']):
+            if segment['end'] < start_ts or segment['start'] > end_ts:
+                continue
+            bars = ColumnarBars.open(os.path.join(directory, segment['file']))
+            times = bars['time']
+            lo = int(np.searchsorted(times, start_ts, side='left'))
+            hi = int(np.searchsorted(times, end_ts, side='right'))
+            if hi > lo:
+                parts.append(bars[lo:hi])
+
+        if not parts:
+            return None
+        return ColumnarBars.concatenate(parts)
+
+    def append(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_ts: int,
+        end_ts: int,
+        rates: Optional[Any]
+    ) -> int:
+        """
+        取得済み期間を追記
+
+        期間 [start_ts, end_ts] をカバー済みとして記録し、その期間内のバーを
+        新しいセグメントとして保存します。バーが0件の期間（週末など）も
+        カバー済みとして記録されるため、再取得は行われません。
+
+        Args:
+            symbol: シンボル
+            timeframe: 時間軸
+            start_ts: 取得期間の開始（UTCエポック秒、含む）
+            end_ts: 取得期間の終了（UTCエポック秒、含む）
+            rates: 取得したレート配列またはColumnarBars（None/空可）
+
+        Returns:
+            保存したバー数
+        """
+        if end_ts < start_ts:
+            return 0
+
+        manifest = self._read_manifest(symbol, timeframe)
+        previous_index = self._read_gap_index(symbol, timeframe, manifest)
+        stored = 0
+
+        if rates is not None and len(rates) > 0:
+            bars = ColumnarBars.wrap(rates)
+            times = bars['time']
+            rows = bars.take((times >= start_ts) & (times <= end_ts))
+            if len(rows) > 0:
+                rows = rows.take(np.argsort(rows['time'], kind='stable'))
+                name = f"seg_{start_ts}_{end_ts}"
+                self._write_segment(symbol, timeframe, name, rows.save)
+                manifest['segments'] = [
+                    s for s in manifest['segments'] if s['file'] != name
+                ]
+                manifest['segments'].append({
+                    'file': name,
+                    'start': start_ts,
+                    'end': end_ts,
+                    'rows': int(len(rows))
+                })
+                manifest['segments'].sort(key=lambda s: s['start'])
+                stored = int(len(rows))
+
+        manifest['coverage'] = [
+            list(interval) for interval in merge_intervals(
+                [tuple(c) for c in manifest['coverage']] + [(start_ts, end_ts)]
+            )
+        ]
+        self._write_manifest(symbol, timeframe, manifest)
+        self._update_gap_index(symbol, timeframe, manifest, previous_index, start_ts, end_ts)
+
+        if len(manifest['segments']) > MAX_SEGMENTS:
+            self.compact(symbol, timeframe)
+        return stored
+
+    def _gap_index_path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.entry_dir(symbol, timeframe), 'gaps.npz')
+
+    def _read_gap_index(
+        self,
+        symbol: str,
+        timeframe: str,
+        manifest: Dict[str, Any]
+    ) -> Optional[GapIndex]:
+        """保存済みの索引を読み込み（無い、またはカバレッジがマニフェストと異なる場合None）"""
+        path = self._gap_index_path(symbol, timeframe)
+        if not os.path.isfile(path):
+            return None
+        try:
+            index = GapIndex.load(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        if index.coverage != [tuple(c) for c in manifest['coverage']]:
+            return None
+        return index
+
+    def _write_gap_index(self, symbol: str, timeframe: str, index: GapIndex) -> None:
+        atomic_write(self._gap_index_path(symbol, timeframe), index.save)
+
+    def _neighbour_time(
+        self,
+        symbol: str,
+        timeframe: str,
+        manifest: Dict[str, Any],
+        timestamp: int,
+        before: bool
+    ) -> Optional[int]:
+        """timestamp の直前（before=False の場合は直後）のキャッシュ済みバー時刻を返す"""
+        directory = self.entry_dir(symbol, timeframe)
+        segments = sorted(manifest['segments'], key=lambda s: s['start'], reverse=before)
+        for segment in segments:
+            if (segment['start'] >= timestamp) if before else (segment['end'] <= timestamp):
+                continue
+            times = ColumnarBars.open(os.path.join(directory, segment['file']))['time']
+            if before:
+                i = int(np.searchsorted(times, timestamp, side='left')) - 1
+                if i >= 0:
+                    return int(times[i])
+            else:
+                i = int(np.searchsorted(times, timestamp, side='right'))
+                if i < len(times):
+                    return int(times[i])
+        return None
+
+    def _update_gap_index(
+        self,
+        symbol: str,
+        timeframe: str,
+        manifest: Dict[str, Any],
+        previous: Optional[GapIndex],
+        start_ts: int,
+        end_ts: int
+    ) -> None:
+        """
+        追記した期間の穴を索引に反映
+
+        追記した期間と、同じカバレッジ区間内の前後の既存バーまでの範囲だけを
+        再計算します。保存済みの索引が無い場合はキャッシュ全体から作成します。
+        """
+        if previous is None:
+            self._write_gap_index(symbol, timeframe, self.rebuild_gap_index(symbol, timeframe))
+            return
+
+        coverage = [tuple(c) for c in manifest['coverage']]
+        c_start, c_end = next((s, e) for s, e in coverage if s <= start_ts <= e)
+        before = self._neighbour_time(symbol, timeframe, manifest, start_ts, before=True)
+        after = self._neighbour_time(symbol, timeframe, manifest, end_ts, before=False)
+        lo = before if before is not None and before >= c_start else c_start
+        hi = after if after is not None and after <= c_end else c_end
+
+        bars = self._load_range(symbol, timeframe, manifest, lo, hi)
+        times = bars['time'] if bars is not None else np.empty(0, dtype=np.int64)
+        self._write_gap_index(symbol, timeframe, previous.replace(lo, hi, times, coverage))
+
+    def rebuild_gap_index(self, symbol: str, timeframe: str) -> GapIndex:
+        """キャッシュ済みの全バー時刻から索引を作成"""
+        manifest = self._read_manifest(symbol, timeframe)
+        directory = self.entry_dir(symbol, timeframe)
+        times = [
+            np.asarray(ColumnarBars.open(os.path.join(directory, segment['file']))['time'])
+            for segment in sorted(manifest['segments'], key=lambda s: s['start'])
+        ]
+        times = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+        coverage = [(int(s), int(e)) for s, e in manifest['coverage']]
+        return GapIndex.build(times, timeframe, coverage)
+
+    def gap_index(self, symbol: str, timeframe: str) -> GapIndex:
+        """
+        (シンボル, 時間軸) のデータ欠損インデックスを返す
+
+        通常は追記時に更新された gaps.npz を読み込むだけです。旧バージョンで
+        作成したキャッシュなど索引が無い・古い場合は、ここで作成して保存します。
+        """
+        manifest = self._read_manifest(symbol, timeframe)
+        index = self._read_gap_index(symbol, timeframe, manifest)
+        if index is None:
+            index = self.rebuild_gap_index(symbol, timeframe)
+            if manifest['coverage']:
+                self._write_gap_index(symbol, timeframe, index)
+        return index
+
+    def _write_segment(self, symbol: str, timeframe: str, name: str, write_func) -> None:
+        """一時ディレクトリへ列ファイルを書き込んでからセグメントとして配置"""
+        directory = self.entry_dir(symbol, timeframe)
+        os.makedirs(directory, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(suffix='.tmp', dir=directory)
+        try:
+            write_func(tmp_dir)
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp_dir, path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def compact(self, symbol: str, timeframe: str) -> None:
+        """
+        セグメントを1つに統合（追記を繰り返した後のファイル数増加を抑える）
+
+        セグメントは重複しない期間で時刻順に並んでいるため、出力ファイルを
+        メモリマップで確保して列・セグメントごとに書き込みます。統合中のメモリ使用量は
+        最大のセグメントの1列分に抑えられます。
+        """
+        manifest = self._read_manifest(symbol, timeframe)
+        segments = sorted(manifest['segments'], key=lambda s: s['start'])
+        if len(segments) <= 1:
+            return
+
+        directory = self.entry_dir(symbol, timeframe)
+        sources = [ColumnarBars.open(os.path.join(directory, s['file'])) for s in segments]
+        total = sum(len(bars) for bars in sources)
+        start_ts = segments[0]['start']
+        end_ts = max(s['end'] for s in segments)
+        name = f"seg_{start_ts}_{end_ts}"
+
+        def write_columns(target: str) -> None:
+            for column in sources[0].names:
+                merged = np.lib.format.open_memmap(
+                    os.path.join(target, f"{column}.npy"),
+                    mode='w+',
+                    dtype=sources[0][column].dtype,
+                    shape=(total,)
+                )
+                offset = 0
+                for bars in sources:
+                    merged[offset:offset + len(bars)] = bars[column]
+                    offset += len(bars)
+                merged.flush()
+                del merged
+
+        self._write_segment(symbol, timeframe, name, write_columns)
+        del sources
+
+        manifest['segments'] = [{
+            'file': name,
+            'start': start_ts,
+            'end': end_ts,
+            'rows': int(total)
+        }]
+        self._write_manifest(symbol, timeframe, manifest)
+
+        for segment in segments:
+            if segment['file'] != name:
+                shutil.rmtree(os.path.join(directory, segment['file']), ignore_errors=True)
+
+    def symbol_catalog_path(self) -> str:
+        """シンボルカタログの保存先を返す"""
+        return os.path.join(self.cache_dir, 'symbols.json')
+
+    def cached_symbols(self) -> List[str]:
+        """キャッシュ済みのシンボル一覧を返す"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.cache_dir)
+            if os.path.isdir(os.path.join(self.cache_dir, name))
+        )
+
+    def find_symbol(self, requested_symbol: str) -> Optional[str]:
+        """
+        キャッシュ済みシンボルから要求シンボルに対応する名前を探す
+
+        MT5のシンボル解決と同じ規則（大文字小文字を無視した完全一致、
+        次に前方一致の候補が1つだけの場合）で、オフライン時にも
+        "USDJPY" → "USDJPYm" のようなサフィックス付きシンボルを解決します。
+
+        Returns:
+            キャッシュ上のシンボル名。見つからない、または候補が複数の場合None
+        """
+        requested = requested_symbol.lower()
+        candidates = [
+            name for name in self.cached_symbols()
+            if name.lower().startswith(requested)
+        ]
+        for name in candidates:
+            if name.lower() == requested:
+                return name
+        if len(candidates) == 1:
+            return candidates[0]
+        return None
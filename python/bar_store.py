@@ -0,0 +1,181 @@
+"""
+Strategy Bricks 列指向バーストア
+
+バーデータを列（time, open, high, low, close, tick_volume, spread, real_volume）
+ごとの連続した配列として保持します。シミュレーターやインジケーター計算は
+列単位で参照するため、行ごとにフィールドを読み出す構造化配列よりも
+キャッシュ効率が良くなります。
+
+列は個別の .npy ファイルとして保存し、メモリマップ（mmap_mode='r'）で開きます。
+読み取り専用のマップはOSのページキャッシュを共有するため、複数のエンジン
+プロセスが同じデータセットを同時に参照してもメモリは1つ分で済みます。
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# MT5 の copy_rates_range が返すレート配列の列
+RATE_COLUMNS = ('time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume')
+
+# 列名 → dtype（MT5のレート配列と同じ）
+RATE_DTYPES = {
+    'time': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'tick_volume': np.int64,
+    'spread': np.int32,
+    'real_volume': np.int64,
+}
+
+# 時間軸 → 1バーの秒数
+TIMEFRAME_SECONDS = {
+    'M1': 60,
+    'M5': 5 * 60,
+    'M15': 15 * 60,
+    'M30': 30 * 60,
+    'H1': 60 * 60,
+    'H4': 4 * 60 * 60,
+    'D1': 24 * 60 * 60,
+}
+
+
+class BarRow:
+    """1バー分の参照（列配列へのインデックスのみを保持し、コピーしない）"""
+
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns: Dict[str, np.ndarray], index: int):
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, name: str) -> Any:
+        return self._columns[name][self._index]
+
+    def keys(self) -> List[str]:
+        return list(self._columns)
+
+
+class ColumnarBars:
+    """
+    列ごとの配列でバーデータを保持するコンテナ
+
+    構造化配列と同じ参照方法をサポートします:
+        bars['close']  → close列（コピー無しのビュー）
+        bars[i]        → i番目のバー（BarRow）
+        bars[a:b]      → 期間を切り出したColumnarBars（コピー無し）
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        """
+        Args:
+            columns: 列名 → 1次元配列（すべて同じ長さ）
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"列の長さが一致しません: {sorted(lengths)}")
+        self.columns = columns
+        self._length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def wrap(cls, data: Any) -> 'ColumnarBars':
+        """
+        レート配列をColumnarBarsとして参照
+
+        構造化配列の場合は各フィールドのビュー（コピー無し）を列として使用します。
+
+        Args:
+            data: ColumnarBars または構造化NumPy配列
+        """
+        if isinstance(data, ColumnarBars):
+            return data
+        data = np.asarray(data)
+        if data.dtype.names is None:
+            if len(data) == 0:
+                return cls({name: np.empty(0) for name in RATE_COLUMNS})
+            raise ValueError("構造化配列ではないレートデータです")
+        return cls({name: data[name] for name in data.dtype.names})
+
+    @classmethod
+    def from_records(cls, data: Any) -> 'ColumnarBars':
+        """構造化配列から連続した列配列を作成（列ごとに1回コピー）"""
+        bars = cls.wrap(data)
+        return cls({name: np.ascontiguousarray(values) for name, values in bars.columns.items()})
+
+    @classmethod
+    def open(cls, directory: str, names: Optional[Iterable[str]] = None) -> 'ColumnarBars':
+        """
+        列ファイルを読み取り専用のメモリマップとして開く
+
+        Args:
+            directory: save() で保存したディレクトリ
+            names: 開く列（Noneの場合はすべての列）
+        """
+        if names is None:
+            names = [n[:-4] for n in sorted(os.listdir(directory)) if n.endswith('.npy')]
+            names = [n for n in RATE_COLUMNS if n in names] + \
+                [n for n in names if n not in RATE_COLUMNS]
+        return cls({
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+            for name in names
+        })
+
+    @classmethod
+    def concatenate(cls, parts: Sequence['ColumnarBars']) -> 'ColumnarBars':
+        """期間順に並んだ複数のColumnarBarsを連結"""
+        if len(parts) == 1:
+            return parts[0]
+        names = list(parts[0].columns)
+        return cls({name: np.concatenate([p.columns[name] for p in parts]) for name in names})
+
+    def save(self, directory: str) -> None:
+        """各列を <directory>/<列名>.npy として保存"""
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(
+                os.path.join(directory, f"{name}.npy"),
+                np.ascontiguousarray(values),
+                allow_pickle=False
+            )
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """行を表す構造化dtype"""
+        return np.dtype([(name, values.dtype) for name, values in self.columns.items()])
+
+    def to_records(self) -> np.ndarray:
+        """構造化配列に変換（コピー）"""
+        records = np.empty(self._length, dtype=self.dtype)
+        for name, values in self.columns.items():
+            records[name] = values
+        return records
+
+    def take(self, mask_or_indices: Any) -> 'ColumnarBars':
+        """ブールマスクまたはインデックスで行を選択（コピー）"""
+        return ColumnarBars({name: values[mask_or_indices] for name, values in self.columns.items()})
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, slice):
+            return ColumnarBars({name: values[key] for name, values in self.columns.items()})
+        index = int(key)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(f"バーのインデックスが範囲外です: {key}")
+        return BarRow(self.columns, index)
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield BarRow(self.columns, i)
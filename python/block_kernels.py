@@ -0,0 +1,422 @@
+"""
+Strategy Bricks ブロックカーネル
+
+EAの各ブロック（Blocks/*.mqh）の Evaluate と同じ判定を、系列全体に対する
+配列演算として計算し、CompositeEvaluator が使う BlockSignal を返します。
+
+バー i の結果は、バー i を確定足（EAの shift=1）、バー i - 1 を shift=2 として
+評価した値です。インジケーターはすべて IndicatorCache から取得するため、
+同じパラメーターのブロック・ストラテジー間で計算を共有します。
+インジケーターの値が定まらないウォームアップ期間のバーは不成立です。
+
+EvaluationPlanner 用に、指定したバー位置の結果を返すカーネル（lazy_kernels）と、
+系列の一部だけでコストと成立率を推定する関数（sample_estimators）も作成します。
+lazy_kernels のカーネルは、漸化式を使わないインジケーターを求められたバー位置の
+周辺の範囲だけで計算します。
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from composite_evaluator import DIRECTION_LONG, DIRECTION_NEUTRAL, DIRECTION_SHORT, BlockSignal
+from evaluation_planner import BlockEstimator, BlockKernel, covering_windows
+from indicator_cache import IndicatorCache, block_indicators, indicator_window
+
+# ブロックの既定の最大スプレッド（pips、EAの DEFAULT_MAX_SPREAD_PIPS）
+DEFAULT_MAX_SPREAD_PIPS = 2.0
+
+# シンボルの桁数の既定値（FX主要通貨ペア）
+DEFAULT_DIGITS = 5
+
+# filter.volatility.stddevRange の既定の上限（EAの CFilterStdDevRange）
+DEFAULT_MAX_STDDEV = 999999.0
+
+# filter.volatility.atrRange の既定の上限（EAの CFilterAtrRange）
+DEFAULT_MAX_ATR = 100.0
+
+# trend.adxThreshold の既定のADXの下限（EAの CTrendADXThreshold）
+DEFAULT_MIN_ADX = 25.0
+
+# コストと成立率の推定で、サンプルの前にインジケーターのウォームアップとして含めるバー数
+ESTIMATE_WARMUP_BARS = 200
+
+# 確定足の1本前の値と比較するブロック（窓に1本多く含める）
+PREVIOUS_BAR_BLOCKS = frozenset({
+    'trigger.bbReentry',
+    'trigger.bbBreakout',
+    'trigger.wprLevel',
+    'trigger.stochCross',
+})
+
+
+def spread_pips(spread_points: Any, digits: int) -> Any:
+    """ポイント単位のスプレッドをpipsに変換（EAの CalculateSpreadPips と同じ規則）"""
+    return spread_points / 10.0 if digits in (3, 5) else spread_points * 1.0
+
+
+def previous(values: np.ndarray, bars: int = 1) -> np.ndarray:
+    """bars 本前のバーの値（先頭の bars 本は NaN）"""
+    result = np.full(len(values), np.nan)
+    if bars < len(values):
+        result[bars:] = values[:len(values) - bars]
+    return result
+
+
+class BlockContext:
+    """ブロックカーネルが参照するバーデータとインジケーター"""
+
+    def __init__(self, bars: Any, timeframe: str, digits: int = DEFAULT_DIGITS,
+                 cache: Optional[IndicatorCache] = None):
+        """
+        Args:
+            bars: バーデータ（ColumnarBars または構造化配列）
+            timeframe: 時間軸
+            digits: シンボルの桁数（スプレッドのpips換算に使用）
+            cache: インジケーターキャッシュ（省略時は bars から作成）
+        """
+        self.bars = bars
+        self.timeframe = timeframe
+        self.digits = digits
+        self.cache = cache if cache is not None else IndicatorCache({timeframe: bars})
+
+    def __len__(self) -> int:
+        return len(self.bars)
+
+    def indicators(self, block: Dict[str, Any]) -> List[Any]:
+        """ブロックが使うインジケーターの系列（block_indicators の順）"""
+        return [
+            self.cache.get(indicator, self.timeframe, price, **params)
+            for indicator, price, params in block_indicators(block)
+        ]
+
+    def close(self) -> np.ndarray:
+        """終値の系列"""
+        return self.cache.price(self.timeframe, 'CLOSE')
+
+
+def _spread_max(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    limit = float(block.get('params', {}).get('maxSpreadPips', DEFAULT_MAX_SPREAD_PIPS))
+    spread = spread_pips(np.asarray(context.bars['spread'], dtype=np.float64), context.digits)
+    return BlockSignal(spread <= limit)
+
+
+def _ma_relation(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    relation = block.get('params', {}).get('relation', 'closeAbove')
+    ma, = context.indicators(block)
+    close = context.close()
+    if relation in ('closeAbove', 'above'):
+        return BlockSignal(close > ma, DIRECTION_LONG)
+    if relation in ('closeBelow', 'below'):
+        return BlockSignal(close < ma, DIRECTION_SHORT)
+    return BlockSignal(np.zeros(len(context), dtype=bool))
+
+
+def _ma_cross(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    fast, slow = context.indicators(block)
+    if block.get('params', {}).get('direction', 'golden') == 'golden':
+        return BlockSignal(fast > slow, DIRECTION_LONG)
+    return BlockSignal(fast < slow, DIRECTION_SHORT)
+
+
+def _bb_reentry(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    params = block.get('params', {})
+    side = params.get('side') or params.get('direction', 'lowerToInside')
+    (_, upper, lower), = context.indicators(block)
+    close = context.close()
+    close2 = previous(close)
+    if side == 'lowerToInside':
+        return BlockSignal((close2 < previous(lower)) & (close >= lower), DIRECTION_LONG)
+    if side == 'upperToInside':
+        return BlockSignal((close2 > previous(upper)) & (close <= upper), DIRECTION_SHORT)
+    return BlockSignal(np.zeros(len(context), dtype=bool))
+
+
+def _bb_breakout(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    (_, upper, lower), = context.indicators(block)
+    close = context.close()
+    close2 = previous(close)
+    if block.get('params', {}).get('direction', 'upper') == 'upper':
+        return BlockSignal((close2 <= previous(upper)) & (close > upper), DIRECTION_LONG)
+    return BlockSignal((close2 >= previous(lower)) & (close < lower), DIRECTION_SHORT)
+
+
+def _stddev_range(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    # iStdDev(maPeriod, maShift, maMethod, appliedPrice) が min 以上 max 以下（方向は中立）
+    params = block.get('params', {})
+    deviation, = context.indicators(block)
+    shift = int(params.get('maShift', 0))
+    if shift > 0:
+        deviation = previous(deviation, shift)
+    lower = float(params.get('min', 0.0))
+    upper = float(params.get('max', DEFAULT_MAX_STDDEV))
+    return BlockSignal((deviation >= lower) & (deviation <= upper))
+
+
+def _atr_range(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    # iATR(period) が minAtr 以上 maxAtr 以下（方向は中立）
+    params = block.get('params', {})
+    atr, = context.indicators(block)
+    lower = float(params.get('minAtr', 0.0))
+    upper = float(params.get('maxAtr', DEFAULT_MAX_ATR))
+    return BlockSignal((atr >= lower) & (atr <= upper))
+
+
+def _adx_threshold(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    # ADX が minAdx 以上、方向は +DI と -DI の大きい方（等しい場合は中立）
+    (adx, plus_di, minus_di), = context.indicators(block)
+    passed = adx >= float(block.get('params', {}).get('minAdx', DEFAULT_MIN_ADX))
+    direction = np.full(len(context), DIRECTION_NEUTRAL, dtype=np.int8)
+    direction[plus_di > minus_di] = DIRECTION_LONG
+    direction[minus_di > plus_di] = DIRECTION_SHORT
+    return BlockSignal(passed, direction)
+
+
+def _sar_direction(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    (sar, _, _), = context.indicators(block)
+    close = context.close()
+    if block.get('params', {}).get('direction', 'bullish') == 'bullish':
+        return BlockSignal(close > sar, DIRECTION_LONG)
+    return BlockSignal(close < sar, DIRECTION_SHORT)
+
+
+def _sar_flip(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    # 終値とSARの上下が入れ替わるのは方向が反転したバーだけのため、反転したバーのみ判定
+    (sar, _, flips), = context.indicators(block)
+    close = context.close()
+    sar1, close1, sar2, close2 = sar[flips], close[flips], sar[flips - 1], close[flips - 1]
+    bullish = (sar2 > close2) & (sar1 < close1)
+    bearish = ~bullish & (sar2 < close2) & (sar1 > close1)
+    passed = np.zeros(len(context), dtype=bool)
+    direction = np.full(len(context), DIRECTION_NEUTRAL, dtype=np.int8)
+    passed[flips] = bullish | bearish
+    direction[flips[bullish]] = DIRECTION_LONG
+    direction[flips[bearish]] = DIRECTION_SHORT
+    return BlockSignal(passed, direction)
+
+
+def _ichimoku_cloud(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    # バー i の先行スパンは kijun 本前に計算した値（配列をずらさず位置の差で参照）
+    params = block.get('params', {})
+    (_, _, span_a, span_b), = context.indicators(block)
+    shift = int(params.get('kijun', 26))
+    close = context.close()
+    count = len(close)
+    passed = np.zeros(count, dtype=bool)
+    if shift >= count:
+        return BlockSignal(passed)
+    shifted_a, shifted_b, current = span_a[:count - shift], span_b[:count - shift], close[shift:]
+    position = params.get('position', 'above')
+    if position == 'above':
+        passed[shift:] = current > np.maximum(shifted_a, shifted_b)
+        return BlockSignal(passed, DIRECTION_LONG)
+    if position == 'below':
+        passed[shift:] = current < np.minimum(shifted_a, shifted_b)
+        return BlockSignal(passed, DIRECTION_SHORT)
+    passed[shift:] = (current >= np.minimum(shifted_a, shifted_b)) & (current <= np.maximum(shifted_a, shifted_b))
+    return BlockSignal(passed)
+
+
+def _wpr_level(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    params = block.get('params', {})
+    threshold = float(params.get('threshold', -20.0))
+    wpr, = context.indicators(block)
+    wpr2 = previous(wpr)
+    if params.get('mode', 'overbought') == 'overbought':
+        return BlockSignal((wpr2 > threshold) & (wpr <= threshold), DIRECTION_SHORT)
+    return BlockSignal((wpr2 < threshold) & (wpr >= threshold), DIRECTION_LONG)
+
+
+def _stoch_cross(context: BlockContext, block: Dict[str, Any]) -> BlockSignal:
+    (main, signal), = context.indicators(block)
+    main2, signal2 = previous(main), previous(signal)
+    if block.get('params', {}).get('direction', 'golden') == 'golden':
+        return BlockSignal((main2 <= signal2) & (main > signal), DIRECTION_LONG)
+    return BlockSignal((main2 >= signal2) & (main < signal), DIRECTION_SHORT)
+
+
+# ブロックのtypeId → カーネル
+BLOCK_KERNELS: Dict[str, Callable[[BlockContext, Dict[str, Any]], BlockSignal]] = {
+    'filter.spreadMax': _spread_max,
+    'trend.maRelation': _ma_relation,
+    'trend.maCross': _ma_cross,
+    'trigger.bbReentry': _bb_reentry,
+    'trigger.bbBreakout': _bb_breakout,
+    'filter.volatility.stddevRange': _stddev_range,
+    'filter.volatility.atrRange': _atr_range,
+    'trend.adxThreshold': _adx_threshold,
+    'trend.sarDirection': _sar_direction,
+    'trigger.sarFlip': _sar_flip,
+    'trend.ichimokuCloud': _ichimoku_cloud,
+    'trigger.wprLevel': _wpr_level,
+    'trigger.stochCross': _stoch_cross,
+}
+
+
+def _kernel(block: Dict[str, Any]) -> Callable[[BlockContext, Dict[str, Any]], BlockSignal]:
+    kernel = BLOCK_KERNELS.get(block.get('typeId', ''))
+    if kernel is None:
+        raise ValueError(f"サポートされていないブロック: {block['id']} ({block.get('typeId')})")
+    return kernel
+
+
+def block_signals(
+    blocks: Iterable[Dict[str, Any]],
+    block_ids: Iterable[str],
+    context: BlockContext
+) -> Dict[str, BlockSignal]:
+    """
+    指定したブロックの全バーの評価結果
+
+    Args:
+        blocks: 設定JSONの blocks[]
+        block_ids: 評価するブロックid
+        context: バーデータとインジケーター
+
+    Returns:
+        ブロックid → BlockSignal
+
+    Raises:
+        ValueError: カーネルの無いブロックの場合
+    """
+    definitions: Mapping[str, Dict[str, Any]] = {block['id']: block for block in blocks}
+    return {block_id: _kernel(definitions[block_id])(context, definitions[block_id]) for block_id in block_ids}
+
+
+def block_window(block: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """
+    ブロックを系列の一部（窓）で計算するのに必要な過去のバー数と窓の先頭の揃え
+
+    インジケーターごとの indicator_window に、ブロックが参照する過去のバー
+    （1本前の値、maShift、一目均衡表の kijun 本前の先行スパン）を加えます。
+
+    Returns:
+        (lookback, alignment)。漸化式のインジケーター（EMA・SMMA、ADX、SAR）と ATR を使うブロックは None
+    """
+    lookback, alignment = 0, 1
+    for indicator, _, params in block_indicators(block):
+        window = indicator_window(indicator, params)
+        if window is None:
+            return None
+        lookback = max(lookback, window[0])
+        alignment = int(np.lcm(alignment, window[1]))
+    type_id = block.get('typeId', '')
+    params = block.get('params', {})
+    if type_id in PREVIOUS_BAR_BLOCKS:
+        lookback += 1
+    elif type_id == 'filter.volatility.stddevRange':
+        lookback += max(int(params.get('maShift', 0)), 0)
+    elif type_id == 'trend.ichimokuCloud':
+        lookback += int(params.get('kijun', 26))
+    return lookback, alignment
+
+
+class LazyBlockKernel:
+    """
+    指定したバー位置の評価結果を返すカーネル（EvaluationPlanner の BlockKernel）
+
+    窓で計算できるブロック（block_window）は、バー位置とその直前の lookback 本を含む範囲
+    （covering_windows）ごとに別の BlockContext を作ってインジケーターを計算します。それ以外のブロックは
+    最初の呼び出しで系列全体を context の IndicatorCache から計算し、以降はその結果を参照します。
+    """
+
+    def __init__(self, context: BlockContext, block: Dict[str, Any]):
+        """
+        Args:
+            context: バーデータとインジケーター
+            block: ブロック定義
+
+        Raises:
+            ValueError: カーネルの無いブロックの場合
+        """
+        self.context = context
+        self.block = block
+        self.kernel = _kernel(block)
+        self.window = block_window(block)
+        self.computed_bars = 0  # インジケーターを計算したバー数（範囲の長さの合計）
+        self._signal: Optional[BlockSignal] = None
+
+    def __call__(self, indices: np.ndarray) -> BlockSignal:
+        if self.window is None:
+            return self._from_series(indices)
+        lookback, alignment = self.window
+        windows = covering_windows(indices, lookback, alignment)
+        # 各範囲に含まれるバー位置は indices の連続した区間
+        bounds = np.searchsorted(indices, windows[:, 1])
+        passed = np.zeros(len(indices), dtype=bool)
+        direction = np.full(len(indices), DIRECTION_NEUTRAL, dtype=np.int8)
+        first = 0
+        for (start, end), last in zip(windows.tolist(), bounds.tolist()):
+            window = BlockContext(self.context.bars[start:end], self.context.timeframe, self.context.digits)
+            signal = self.kernel(window, self.block)
+            positions = indices[first:last] - start
+            passed[first:last] = signal.passed[positions]
+            direction[first:last] = signal.direction if signal.direction.ndim == 0 else signal.direction[positions]
+            self.computed_bars += end - start
+            first = last
+        return BlockSignal(passed, direction)
+
+    def _from_series(self, indices: np.ndarray) -> BlockSignal:
+        # 最初に評価を求められた時点で一度だけ系列全体を計算する
+        if self._signal is None:
+            self._signal = self.kernel(self.context, self.block)
+            self.computed_bars = len(self.context)
+        signal = self._signal
+        direction = signal.direction if signal.direction.ndim == 0 else signal.direction[indices]
+        return BlockSignal(signal.passed[indices], direction)
+
+
+def lazy_kernels(
+    blocks: Iterable[Dict[str, Any]],
+    block_ids: Iterable[str],
+    context: BlockContext
+) -> Dict[str, BlockKernel]:
+    """
+    指定したバー位置の評価結果を返すカーネル（EvaluationPlanner 用、LazyBlockKernel）
+
+    SMA・LWMA・ボリンジャーバンド・標準偏差や、最高値・最安値を使うWPR・ストキャスティクス・
+    一目均衡表のブロックは、求められたバー位置を含む範囲だけでインジケーターを計算します。
+    漸化式のインジケーター（EMA・SMMA、ADX、SAR）と、決済と共有する ATR を使うブロックは、
+    最初に呼び出されたときに系列全体を IndicatorCache から取得します。どのバーでも評価まで進まなかったブロックの
+    インジケーターは計算しません。結果は block_signals の該当するバー位置と同じです。
+
+    Raises:
+        ValueError: カーネルの無いブロックの場合
+    """
+    definitions: Mapping[str, Dict[str, Any]] = {block['id']: block for block in blocks}
+    return {block_id: LazyBlockKernel(context, definitions[block_id]) for block_id in block_ids}
+
+
+def sample_estimators(
+    blocks: Iterable[Dict[str, Any]],
+    block_ids: Iterable[str],
+    context: BlockContext,
+    sample_bars: int
+) -> Dict[str, BlockEstimator]:
+    """
+    系列中央の sample_bars 本だけでブロックを評価する、コストと成立率の推定用の関数
+
+    サンプルは別の IndicatorCache で計算するため、context のキャッシュには影響しません。
+    サンプルの前の ESTIMATE_WARMUP_BARS 本はインジケーターのウォームアップとして計算し、
+    成立率には含めません。
+
+    Raises:
+        ValueError: カーネルの無いブロックの場合
+    """
+    length = len(context)
+    first = max((length - sample_bars) // 2, 0)
+    start = max(first - ESTIMATE_WARMUP_BARS, 0)
+    end = min(first + sample_bars, length)
+    sample = BlockContext(context.bars[start:end], context.timeframe, context.digits)
+    skip = first - start
+    definitions: Mapping[str, Dict[str, Any]] = {block['id']: block for block in blocks}
+
+    def estimator(block: Dict[str, Any]) -> BlockEstimator:
+        kernel = _kernel(block)
+
+        def estimate() -> BlockSignal:
+            signal = kernel(sample, block)
+            direction = signal.direction if signal.direction.ndim == 0 else signal.direction[skip:]
+            return BlockSignal(signal.passed[skip:], direction)
+        return estimate
+    return {block_id: estimator(definitions[block_id]) for block_id in block_ids}
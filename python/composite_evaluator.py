@@ -0,0 +1,168 @@
+"""
+Strategy Bricks 複合条件評価
+
+EAの CCompositeEvaluator と同じ規則で strategies[].entryRequirement を評価します。
+entryRequirement はDNF形式（ruleGroups のOR、各 ruleGroup 内の conditions のAND）で、
+各条件は blocks[] のブロックを id で参照します。
+
+EAはバーごとにツリーをたどって短絡評価しますが、ここでは ruleGroups を一度だけ
+ブロックidの並びへコンパイルし、ブロックごとのシグナル配列（成立・方向）に対する
+配列演算として系列全体を一括で評価します。結果はバーごとの短絡評価と同じです:
+
+- ruleGroup は全条件が成立（FAIL以外）した場合に成立
+- 成立した ruleGroup の方向は、条件を順に見て最後に出た NEUTRAL 以外の方向
+- entryRequirement は最初に成立した ruleGroup の方向を採用
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+# 方向（EAの TradeDirection と同じ値）
+DIRECTION_LONG = 0
+DIRECTION_SHORT = 1
+DIRECTION_NEUTRAL = 2
+
+
+class BlockSignal:
+    """1ブロックの全バーの評価結果"""
+
+    def __init__(self, passed: Any, direction: Any = DIRECTION_NEUTRAL):
+        """
+        Args:
+            passed: バーごとの成立（FAIL以外）の真偽値配列
+            direction: バーごとの方向の配列、または全バー共通の方向
+        """
+        self.passed = np.asarray(passed, dtype=bool)
+        self.direction = np.asarray(direction, dtype=np.int8)
+        if self.direction.ndim not in (0, 1):
+            raise ValueError("direction はスカラーまたは1次元配列で指定してください")
+
+
+class RequirementExpression:
+    """ブロックidの並びへコンパイルした entryRequirement"""
+
+    def __init__(self, groups: List[Tuple[str, ...]], group_ids: Optional[List[str]] = None):
+        """
+        Args:
+            groups: ruleGroup ごとの条件のブロックid（評価順）
+            group_ids: ruleGroup のid（ログ・エラーメッセージ用）
+        """
+        self.groups = [tuple(group) for group in groups]
+        self.group_ids = list(group_ids) if group_ids is not None \
+            else [f"rulegroup-{i + 1}" for i in range(len(self.groups))]
+
+    @classmethod
+    def compile(
+        cls,
+        requirement: Optional[Dict[str, Any]],
+        block_ids: Iterable[str],
+        strategy_id: str = ''
+    ) -> 'RequirementExpression':
+        """
+        entryRequirement をコンパイル
+
+        Args:
+            requirement: 設定JSONの entryRequirement（None の場合は常に不成立）
+            block_ids: blocks[] に定義されたブロックid
+            strategy_id: エラーメッセージに表示するストラテジーid
+
+        Raises:
+            ValueError: blocks[] に無いブロックを参照している場合
+        """
+        known = set(block_ids)
+        groups, group_ids = [], []
+        for number, group in enumerate((requirement or {}).get('ruleGroups', []), start=1):
+            group_id = group.get('id', f"rulegroup-{number}")
+            conditions = tuple(condition['blockId'] for condition in group.get('conditions', []))
+            missing = [block_id for block_id in conditions if block_id not in known]
+            if missing:
+                raise ValueError(
+                    f"存在しないブロックを参照しています: {strategy_id}/{group_id} → {', '.join(missing)}"
+                )
+            groups.append(conditions)
+            group_ids.append(group_id)
+        return cls(groups, group_ids)
+
+    def block_ids(self) -> List[str]:
+        """参照しているブロックid（重複無し、最初に現れた順）"""
+        return list(dict.fromkeys(block_id for group in self.groups for block_id in group))
+
+    def evaluate(self, signals: Mapping[str, BlockSignal], length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        全バーを一括で評価
+
+        Args:
+            signals: ブロックidごとの評価結果（block_ids() の全ブロックが必要）
+            length: バー数
+
+        Returns:
+            (成立の真偽値配列, 方向の配列)。不成立のバーの方向は DIRECTION_NEUTRAL
+        """
+        matched = np.zeros(length, dtype=bool)
+        direction = np.full(length, DIRECTION_NEUTRAL, dtype=np.int8)
+        # 後ろの ruleGroup から上書きし、最初に成立した ruleGroup の方向を残す
+        for group in reversed(self.groups):
+            passed = np.ones(length, dtype=bool)
+            group_direction = np.full(length, DIRECTION_NEUTRAL, dtype=np.int8)
+            for block_id in group:
+                signal = signals[block_id]
+                passed &= signal.passed
+                group_direction = np.where(
+                    signal.direction != DIRECTION_NEUTRAL, signal.direction, group_direction
+                )
+            matched |= passed
+            direction = np.where(passed, group_direction, direction).astype(np.int8, copy=False)
+        return matched, direction
+
+    def entry_signals(self, signals: Mapping[str, BlockSignal], length: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BUY・SELLのエントリーシグナル
+
+        方向が NEUTRAL のまま成立したバーはどちらにも含みません。
+
+        Returns:
+            (BUY, SELL) の真偽値配列
+        """
+        matched, direction = self.evaluate(signals, length)
+        return matched & (direction == DIRECTION_LONG), matched & (direction == DIRECTION_SHORT)
+
+
+class CompositeEvaluator:
+    """設定JSONの全ストラテジーの entryRequirement"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: ストラテジー設定JSON（strategies と blocks を使用）
+
+        Raises:
+            ValueError: blocks[] に無いブロックを参照している場合
+        """
+        self.block_types = {block['id']: block.get('typeId', '') for block in config.get('blocks', [])}
+        self.block_params = {block['id']: block.get('params', {}) for block in config.get('blocks', [])}
+        self.requirements: Dict[str, RequirementExpression] = {}
+        for strategy in config.get('strategies', []):
+            self.requirements[strategy['id']] = RequirementExpression.compile(
+                strategy.get('entryRequirement'), self.block_types, strategy['id']
+            )
+
+    def block_ids(self) -> List[str]:
+        """いずれかのストラテジーが参照するブロックid（各ブロックは一度だけ計算すればよい）"""
+        return list(dict.fromkeys(
+            block_id for requirement in self.requirements.values() for block_id in requirement.block_ids()
+        ))
+
+    def entry_signals(
+        self,
+        strategy_id: str,
+        signals: Mapping[str, BlockSignal],
+        length: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ストラテジーのBUY・SELLのエントリーシグナル
+
+        Raises:
+            KeyError: ストラテジーが無い場合
+        """
+        return self.requirements[strategy_id].entry_signals(signals, length)
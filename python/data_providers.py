@@ -0,0 +1,514 @@
+"""
+Strategy Bricks 過去データ提供元
+
+バックテストエンジンの fetch_historical_data が使用するデータ提供元です。
+
+- MT5DataProvider: MetaTrader5ターミナルから copy_rates_range で取得
+- FileDataProvider: エクスポート済みのCSV/バイナリファイルから読み込み
+  （MetaTrader5が無いLinux環境でもバックテストを実行可能）
+
+FileDataProvider が読み込むファイル（<data_dir> 直下）:
+    <SYMBOL>_<TIMEFRAME>.csv   MT5のエクスポート形式（<DATE> <TIME> <OPEN> ...、タブ区切り）
+                               または time,open,high,low,close,... のヘッダー付きCSV
+    <SYMBOL>_<TIMEFRAME>.npy   copy_rates_range の結果を np.save した構造化配列
+    <SYMBOL>_<TIMEFRAME>/      bar_store.ColumnarBars.save() で保存した列ファイル
+"""
+
+import abc
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from bar_cache import to_epoch_seconds
+from bar_store import RATE_COLUMNS, RATE_DTYPES, ColumnarBars
+from symbol_catalog import SymbolCatalog
+
+# データソース名（--data-source の選択肢、PROVIDER_CLASSES のキー）
+DATA_SOURCES = ('mt5', 'file')
+
+# CSVヘッダー（小文字、<> 除去後）→ 列名
+CSV_COLUMN_ALIASES = {
+    'date': 'date',
+    'time': 'time',
+    'datetime': 'time',
+    'open': 'open',
+    'high': 'high',
+    'low': 'low',
+    'close': 'close',
+    'tickvol': 'tick_volume',
+    'tick_volume': 'tick_volume',
+    'vol': 'real_volume',
+    'volume': 'real_volume',
+    'real_volume': 'real_volume',
+    'spread': 'spread',
+}
+
+
+class DataProvider(abc.ABC):
+    """過去データ提供元の基底クラス（copy_rates_range を実装する）"""
+
+    # 表示名
+    name = ''
+
+    # ティックを取得できるか（True の提供元は copy_ticks_range を実装する）
+    supports_ticks = False
+
+    def connect(self) -> bool:
+        """
+        データ提供元へ接続
+
+        Returns:
+            接続に成功した場合True
+        """
+        return True
+
+    def shutdown(self) -> None:
+        """データ提供元との接続を終了"""
+
+    def resolve_symbol(self, symbol: str, timeframe: str) -> str:
+        """
+        要求シンボルを提供元のシンボル名に解決
+
+        Args:
+            symbol: 要求シンボル（例: USDJPY）
+            timeframe: 時間軸（例: M1）
+
+        Returns:
+            提供元で使用するシンボル名
+        """
+        return symbol
+
+    @abc.abstractmethod
+    def copy_rates_range(
+        self,
+        symbol: str,
+        timeframe: str,
+        date_from: datetime,
+        date_to: datetime
+    ) -> Optional[Any]:
+        """
+        期間 [date_from, date_to] のバーを取得
+
+        Args:
+            symbol: resolve_symbol() で解決したシンボル
+            timeframe: 時間軸（例: M1）
+            date_from: 開始日時（含む）
+            date_to: 終了日時（含む）
+
+        Returns:
+            構造化配列またはColumnarBars。取得に失敗した場合None
+        """
+
+    def copy_ticks_range(
+        self,
+        symbol: str,
+        date_from: datetime,
+        date_to: datetime
+    ) -> Optional[Any]:
+        """
+        期間 [date_from, date_to] のティックを取得（supports_ticks が True の提供元のみ）
+
+        Returns:
+            time_msc, bid, ask, flags フィールドを持つ構造化配列。取得に失敗した場合None
+        """
+        return None
+
+    def symbol_point(self, symbol: str) -> Optional[float]:
+        """シンボルのポイントサイズを返す（不明な場合None）"""
+        return None
+
+    def symbol_digits(self, symbol: str) -> Optional[int]:
+        """シンボルの桁数を返す（不明な場合None）"""
+        return None
+
+    def last_error(self) -> Any:
+        """直近のエラー情報を返す"""
+        return None
+
+
+class MT5DataProvider(DataProvider):
+    """MetaTrader5ターミナルから過去データを取得"""
+
+    name = 'MT5'
+    supports_ticks = True
+
+    def __init__(self, mt5_module: Any, catalog_path: Optional[str] = None):
+        """
+        Args:
+            mt5_module: MetaTrader5モジュール（呼び出し側で遅延インポートしたもの）
+            catalog_path: シンボルカタログの保存先（Noneの場合は実行中のみ保持）
+        """
+        self.mt5 = mt5_module
+        self.catalog_path = catalog_path
+        self._catalog: Optional[SymbolCatalog] = None
+        self._catalog_refreshed = False
+
+    def connect(self) -> bool:
+        """
+        MT5ライブラリを初期化
+
+        MT5ターミナルへの接続を確立します。接続が失敗した場合は、
+        詳細なエラー情報を標準エラー出力に出力します。
+        """
+        mt5 = self.mt5
+        if not mt5.initialize():
+            error = mt5.last_error()
+            error_code = error[0] if error and len(error) > 0 else 'Unknown'
+            error_msg = error[1] if error and len(error) > 1 else 'Unknown error'
+
+            print(
+                f"MT5初期化失敗: エラーコード {error_code} - {error_msg}",
+                file=sys.stderr
+            )
+            print(
+                "MT5ターミナルが起動していることを確認してください。",
+                file=sys.stderr
+            )
+            return False
+
+        version = mt5.version()
+        terminal_info = mt5.terminal_info()
+
+        if terminal_info:
+            print(f"MT5初期化成功: バージョン {version}")
+            print(f"ターミナル: {terminal_info.name}, ビルド {terminal_info.build}")
+            if getattr(terminal_info, "connected", True) is False:
+                print(
+                    "Warning: MT5 terminal is not connected. Please log in and ensure the terminal is online.",
+                    file=sys.stderr
+                )
+        else:
+            print(f"MT5初期化成功: バージョン {version}")
+
+        return True
+
+    def shutdown(self) -> None:
+        self.mt5.shutdown()
+
+    def resolve_symbol(self, symbol: str, timeframe: str) -> str:
+        """
+        MT5のシンボルを解決して気配値表示に追加
+
+        指定シンボルが見つからない場合はシンボルカタログから前方一致で候補を探し、
+        候補が1つだけの場合はそのシンボルを使用します（例: USDJPY → USDJPYm）。
+
+        Raises:
+            Exception: シンボルが見つからない、候補が複数ある、または選択に失敗した場合
+        """
+        mt5 = self.mt5
+        requested_symbol = symbol
+        symbol_info = mt5.symbol_info(requested_symbol)
+        if symbol_info is None:
+            catalog = self.symbol_catalog()
+            if not catalog.candidates(requested_symbol) and not self._catalog_refreshed:
+                # 保存済みのカタログに無いシンボルは、追加された可能性があるため取得し直す
+                catalog = self.symbol_catalog(refresh=True)
+            symbol = catalog.resolve(requested_symbol)
+            symbol_info = mt5.symbol_info(symbol)
+            if requested_symbol.lower() != symbol.lower():
+                print(
+                    f"警告: シンボルが見つかりません: {requested_symbol}。{symbol} を使用します。",
+                    file=sys.stderr,
+                )
+        if not symbol_info or not symbol_info.visible:
+            if not mt5.symbol_select(symbol, True):
+                error = mt5.last_error()
+                raise Exception(f"Failed to select symbol: {symbol}. Error: {error}")
+        return symbol
+
+    def server_name(self) -> str:
+        """接続先のトレードサーバー名（取得できない場合は空文字列）"""
+        account_info = self.mt5.account_info()
+        server = getattr(account_info, 'server', '')
+        return server if isinstance(server, str) else ''
+
+    def symbol_catalog(self, refresh: bool = False) -> SymbolCatalog:
+        """
+        シンボルカタログを返す
+
+        保存済みのカタログが新しい場合はそれを使用し、無い・古い・接続先サーバーが
+        異なる場合（または refresh=True の場合）のみ symbols_get() から作り直して保存します。
+
+        Args:
+            refresh: 保存済みのカタログを使わずに作り直す
+        """
+        if self._catalog is None and self.catalog_path and not refresh:
+            self._catalog = SymbolCatalog.load(self.catalog_path)
+        if self._catalog_refreshed and not refresh:
+            return self._catalog
+
+        server = self.server_name()
+        now = int(time.time())
+        if refresh or self._catalog is None or self._catalog.is_stale(server, now):
+            self._catalog = SymbolCatalog.from_mt5(self.mt5.symbols_get() or [], server, now)
+            self._catalog_refreshed = True
+            if self.catalog_path:
+                self._catalog.save(self.catalog_path)
+        return self._catalog
+
+    def copy_rates_range(
+        self,
+        symbol: str,
+        timeframe: str,
+        date_from: datetime,
+        date_to: datetime
+    ) -> Optional[Any]:
+        mt5 = self.mt5
+        # 時間軸をMT5定数に変換
+        timeframe_map = {
+            'M1': mt5.TIMEFRAME_M1,
+            'M5': mt5.TIMEFRAME_M5,
+            'M15': mt5.TIMEFRAME_M15,
+            'M30': mt5.TIMEFRAME_M30,
+            'H1': mt5.TIMEFRAME_H1,
+            'H4': mt5.TIMEFRAME_H4,
+            'D1': mt5.TIMEFRAME_D1
+        }
+        return mt5.copy_rates_range(symbol, timeframe_map[timeframe], date_from, date_to)
+
+    def copy_ticks_range(
+        self,
+        symbol: str,
+        date_from: datetime,
+        date_to: datetime
+    ) -> Optional[Any]:
+        # bid/ask が変化したティック（スプレッド・約定判定に必要な分）のみ取得
+        return self.mt5.copy_ticks_range(symbol, date_from, date_to, self.mt5.COPY_TICKS_INFO)
+
+    def symbol_point(self, symbol: str) -> Optional[float]:
+        info = self.mt5.symbol_info(symbol)
+        return float(info.point) if info is not None else None
+
+    def symbol_digits(self, symbol: str) -> Optional[int]:
+        info = self.mt5.symbol_info(symbol)
+        if info is not None:
+            return int(info.digits)
+        # ターミナルから取得できない場合は保存済みのシンボルカタログを使用
+        return self.symbol_catalog().digits(symbol)
+
+    def last_error(self) -> Any:
+        return self.mt5.last_error()
+
+
+def parse_csv_rates(path: str) -> ColumnarBars:
+    """
+    エクスポート済みのCSVをColumnarBarsに変換
+
+    ファイル全体をNumPyのCパーサー（np.loadtxt）で読み込み、列ごとに
+    一括で型変換します（行ごとのPythonループは使用しません）。
+
+    対応形式:
+        - MT5のエクスポート形式: <DATE> <TIME> <OPEN> <HIGH> <LOW> <CLOSE> <TICKVOL> <VOL> <SPREAD>
+          （日付は 2024.01.02、時刻は 00:00:00、タブ区切り）
+        - time,open,high,low,close[,tick_volume,spread,real_volume]
+          （time はUTCエポック秒またはISO 8601形式）
+
+    Args:
+        path: CSVファイルのパス
+
+    Returns:
+        time昇順のバーデータ
+
+    Raises:
+        ValueError: 必須列が無い、または値を変換できない場合
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        header = f.readline().strip()
+    delimiter = '\t' if '\t' in header else (';' if ';' in header else ',')
+    names = [
+        CSV_COLUMN_ALIASES.get(h.strip().strip('<>').lower(), h.strip().strip('<>').lower())
+        for h in header.split(delimiter)
+    ]
+    for required in ('open', 'high', 'low', 'close'):
+        if required not in names:
+            raise ValueError(f"CSVに必須列がありません: {required} ({path})")
+    if 'time' not in names and 'date' not in names:
+        raise ValueError(f"CSVに日時の列がありません ({path})")
+
+    table = np.loadtxt(
+        path,
+        delimiter=delimiter,
+        skiprows=1,
+        dtype=str,
+        ndmin=2,
+        encoding='utf-8-sig'
+    )
+    raw = {name: table[:, i] for i, name in enumerate(names)}
+
+    columns: Dict[str, np.ndarray] = {
+        'time': _parse_csv_times(raw.get('date'), raw.get('time'))
+    }
+    for name in RATE_COLUMNS[1:]:
+        dtype = RATE_DTYPES[name]
+        if name in raw:
+            values = raw[name].astype(np.float64)
+            columns[name] = values if dtype is np.float64 else values.astype(dtype)
+        else:
+            columns[name] = np.zeros(len(table), dtype=dtype)
+
+    bars = ColumnarBars(columns)
+    times = bars['time']
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        bars = bars.take(np.argsort(times, kind='stable'))
+    return bars
+
+
+def _parse_csv_times(dates: Optional[np.ndarray], times: Optional[np.ndarray]) -> np.ndarray:
+    """
+    CSVの日付・時刻列をUTCエポック秒に一括変換
+
+    MT5形式の日付（2024.01.02）の区切りだけを '-' に置き換えるため、時刻の小数秒
+    （2024-01-02T03:04:05.000）はそのまま解釈し、秒未満を切り捨てます。
+    """
+    if dates is None:
+        if times is not None and len(times) > 0 and np.char.isdigit(times).all():
+            return times.astype(np.int64)
+        text = times
+    elif times is None:
+        text = dates
+    else:
+        text = np.char.add(np.char.add(dates, ' '), times)
+    text = np.char.replace(np.ascontiguousarray(text, dtype=str), 'Z', '')
+    # 先頭10文字（日付）の '.' だけを置き換える（文字単位の2次元ビューで一括処理）
+    width = text.dtype.itemsize // 4
+    if len(text) > 0 and width > 0:
+        chars = text.view('U1').reshape(len(text), width)[:, :10]
+        chars[chars == '.'] = '-'
+    return text.astype('datetime64[ms]').astype(np.int64) // 1000
+
+
+def resolve_symbol_name(requested_symbol: str, names: List[str]) -> str:
+    """
+    MT5のシンボル解決と同じ規則で候補から名前を選ぶ
+
+    大文字小文字を無視した完全一致、次に前方一致の候補が1つだけの場合に解決します。
+
+    Raises:
+        Exception: 候補が無い、または複数ある場合
+    """
+    requested = requested_symbol.lower()
+    candidates = [name for name in names if name.lower().startswith(requested)]
+    for name in candidates:
+        if name.lower() == requested:
+            return name
+    if len(candidates) == 1:
+        return candidates[0]
+    if candidates:
+        raise Exception(
+            f"シンボルが見つかりません: {requested_symbol}。"
+            f"候補が複数あります: {', '.join(candidates[:5])}。"
+            "正確なシンボル名を指定してください。"
+        )
+    raise Exception(f"シンボルが見つかりません: {requested_symbol}。類似候補がありません。")
+
+
+class FileDataProvider(DataProvider):
+    """エクスポート済みのCSV/バイナリファイルから過去データを読み込み"""
+
+    name = 'ファイル'
+
+    def __init__(self, data_dir: str):
+        """
+        Args:
+            data_dir: データファイルを配置したディレクトリ
+        """
+        self.data_dir = data_dir
+        self._loaded: Dict[str, ColumnarBars] = {}
+        self._error: Optional[str] = None
+
+    def connect(self) -> bool:
+        if not os.path.isdir(self.data_dir):
+            print(f"データディレクトリが見つかりません: {self.data_dir}", file=sys.stderr)
+            return False
+        return True
+
+    def available_files(self, timeframe: str) -> Dict[str, str]:
+        """
+        時間軸に対応するデータファイルを列挙
+
+        Returns:
+            シンボル名 → パス
+        """
+        files: Dict[str, str] = {}
+        if not os.path.isdir(self.data_dir):
+            return files
+        suffix = f"_{timeframe}".lower()
+        for entry in sorted(os.listdir(self.data_dir)):
+            path = os.path.join(self.data_dir, entry)
+            stem, ext = os.path.splitext(entry)
+            if os.path.isdir(path):
+                stem, ext = entry, ''
+            elif ext.lower() not in ('.csv', '.npy'):
+                continue
+            if stem.lower().endswith(suffix) and len(stem) > len(suffix):
+                files.setdefault(stem[:-len(suffix)], path)
+        return files
+
+    def resolve_symbol(self, symbol: str, timeframe: str) -> str:
+        """
+        データファイル名からシンボルを解決
+
+        Raises:
+            Exception: 該当するファイルが無い、または候補が複数ある場合
+        """
+        resolved = resolve_symbol_name(symbol, list(self.available_files(timeframe)))
+        if resolved.lower() != symbol.lower():
+            print(
+                f"警告: シンボルが見つかりません: {symbol}。{resolved} を使用します。",
+                file=sys.stderr,
+            )
+        return resolved
+
+    def load(self, symbol: str, timeframe: str) -> ColumnarBars:
+        """
+        シンボル・時間軸のデータファイル全体を読み込み（読み込み結果は再利用）
+
+        Raises:
+            Exception: データファイルが無い場合
+            ValueError: ファイル形式が不正な場合
+        """
+        path = self.available_files(timeframe).get(symbol)
+        if path is None:
+            raise Exception(
+                f"データファイルが見つかりません: {symbol} {timeframe} ({self.data_dir})"
+            )
+        if path not in self._loaded:
+            if os.path.isdir(path):
+                bars = ColumnarBars.open(path)
+            elif path.lower().endswith('.npy'):
+                bars = ColumnarBars.wrap(np.load(path, mmap_mode='r', allow_pickle=False))
+            else:
+                bars = parse_csv_rates(path)
+            self._loaded[path] = bars
+        return self._loaded[path]
+
+    def copy_rates_range(
+        self,
+        symbol: str,
+        timeframe: str,
+        date_from: datetime,
+        date_to: datetime
+    ) -> Optional[Any]:
+        try:
+            bars = self.load(symbol, timeframe)
+        except Exception as e:
+            self._error = str(e)
+            return None
+        times = bars['time']
+        lo = int(np.searchsorted(times, to_epoch_seconds(date_from), side='left'))
+        hi = int(np.searchsorted(times, to_epoch_seconds(date_to), side='right'))
+        return bars[lo:hi]
+
+    def last_error(self) -> Any:
+        return self._error
+
+
+# データソース名 → 提供元クラス
+PROVIDER_CLASSES = {
+    'mt5': MT5DataProvider,
+    'file': FileDataProvider,
+}
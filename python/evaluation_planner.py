@@ -0,0 +1,283 @@
+"""
+Strategy Bricks 条件評価プランナー
+
+RequirementExpression を遅延評価します。ruleGroup 内の条件（AND）は、
+データのサンプルから推定したコストと成立率に基づいて安価で絞り込みの強い順に評価し、
+後続のブロックはそれまでの条件がすべて成立したバーでのみ計算します。
+ruleGroup 間（OR）も、前の ruleGroup が成立しなかったバーだけを後の ruleGroup で評価します。
+
+条件の評価順を入れ替えても結果（成立と方向）は RequirementExpression.evaluate と同じです。
+方向は常に設定ファイル上の条件の順で決めます。
+
+ブロックは「バー位置の配列を受け取り、その位置の BlockSignal を返す」カーネルとして渡します。
+コストと成立率は、既定では系列全体に均等に散らばったサンプルをカーネルで評価して推定します。
+インジケーターを系列全体で計算するカーネルでは、サンプルの評価だけで全ブロックの計算が
+走ってしまうため、別のデータ（系列の一部）で評価する推定用の関数を渡します（block_kernels.sample_estimators）。
+インジケーターの計算に過去のバーが必要なカーネルは covering_windows() で計算範囲を求められます。
+"""
+
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from composite_evaluator import (
+    DIRECTION_LONG,
+    DIRECTION_NEUTRAL,
+    DIRECTION_SHORT,
+    BlockSignal,
+    RequirementExpression,
+)
+
+# 指定したバー位置（昇順の整数配列）のみを評価するブロックのカーネル
+BlockKernel = Callable[[np.ndarray], BlockSignal]
+
+# コストと成立率の推定用にサンプルのバーでブロックを評価する関数（結果は推定にのみ使用）
+BlockEstimator = Callable[[], BlockSignal]
+
+# コストと成立率の推定に使うサンプルのバー数
+PLANNER_SAMPLE_BARS = 2000
+
+
+def covering_windows(indices: np.ndarray, lookback: int, alignment: int = 1) -> np.ndarray:
+    """
+    各バー位置とその直前 lookback 本を含む計算範囲
+
+    範囲の先頭は alignment の倍数の位置まで前に広げ、重なる・隣接する範囲は結合します。
+
+    Args:
+        indices: 昇順のバー位置
+        lookback: インジケーターの計算に必要な過去のバー数
+        alignment: 範囲の先頭を揃える間隔
+
+    Returns:
+        (start, end) の配列（end は含まない）
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    starts = np.maximum(indices - lookback, 0) // alignment * alignment
+    ends = indices + 1
+    # 前の範囲の終わりより後から始まる位置で範囲を区切る
+    breaks = np.flatnonzero(starts[1:] > ends[:-1]) + 1
+    first = np.concatenate(([0], breaks))
+    last = np.concatenate((breaks - 1, [len(indices) - 1]))
+    return np.column_stack((starts[first], ends[last]))
+
+
+class LazyBlock:
+    """必要になったバーのみ評価し、結果を全バー分保持するブロック"""
+
+    def __init__(
+        self,
+        block_id: str,
+        kernel: BlockKernel,
+        length: int,
+        estimator: Optional[BlockEstimator] = None
+    ):
+        """
+        Args:
+            block_id: ブロックid
+            kernel: ブロックのカーネル
+            length: バー数
+            estimator: コストと成立率の推定用の関数（省略時はカーネルでサンプルを評価）
+        """
+        self.block_id = block_id
+        self.kernel = kernel
+        self.estimator = estimator
+        self.passed = np.zeros(length, dtype=bool)
+        self.direction = np.full(length, DIRECTION_NEUTRAL, dtype=np.int8)
+        self.computed = np.zeros(length, dtype=bool)
+        self.cost = 0.0          # 1バーあたりの評価時間（秒）
+        self.pass_rate = 1.0     # サンプルでの成立率
+        self.requested_bars = 0  # 評価を求められたバー数（計算済みを含む）
+
+    def compute(self, indices: np.ndarray) -> float:
+        """
+        指定したバー位置を評価して保持
+
+        Returns:
+            評価にかかった時間（秒）
+        """
+        started = time.perf_counter()
+        signal = self.kernel(indices)
+        elapsed = time.perf_counter() - started
+        self.passed[indices] = signal.passed
+        self.direction[indices] = signal.direction
+        self.computed[indices] = True
+        return elapsed
+
+    def calibrate(self, sample: np.ndarray) -> None:
+        """
+        サンプルのバー位置を評価してコストと成立率を推定（結果はそのまま保持）
+
+        estimator がある場合は sample を使わず、estimator の評価結果から推定します（結果は保持しない）。
+        """
+        if self.estimator is not None:
+            started = time.perf_counter()
+            signal = self.estimator()
+            elapsed = time.perf_counter() - started
+            if len(signal.passed):
+                self.cost = elapsed / len(signal.passed)
+                self.pass_rate = float(signal.passed.mean())
+            return
+        if len(sample) == 0:
+            return
+        elapsed = self.compute(sample)
+        self.cost = elapsed / len(sample)
+        self.pass_rate = float(self.passed[sample].mean())
+
+    def evaluate(self, mask: np.ndarray) -> np.ndarray:
+        """
+        mask のバーで評価（未計算のバーのみカーネルを呼び出す）
+
+        Returns:
+            mask のうち成立したバーの真偽値配列
+        """
+        self.requested_bars += int(np.count_nonzero(mask))
+        pending = np.flatnonzero(mask & ~self.computed)
+        if len(pending):
+            self.compute(pending)
+        return self.passed & mask
+
+    @property
+    def evaluated_bars(self) -> int:
+        """カーネルで評価したバー数"""
+        return int(np.count_nonzero(self.computed))
+
+    @property
+    def computed_bars(self) -> int:
+        """
+        インジケーターを計算したバー数
+
+        カーネルが computed_bars（計算範囲の長さの合計）を持つ場合はその値、
+        持たない場合は評価したバー数です。
+        """
+        return int(getattr(self.kernel, 'computed_bars', self.evaluated_bars))
+
+    def rank(self) -> float:
+        """AND内の評価順の指標（小さいほど先に評価する）"""
+        rejection = 1.0 - self.pass_rate
+        return self.cost / rejection if rejection > 0 else float('inf')
+
+
+class EvaluationPlanner:
+    """コストと成立率に基づいて条件を遅延評価するプランナー"""
+
+    def __init__(
+        self,
+        kernels: Mapping[str, BlockKernel],
+        length: int,
+        sample_bars: int = PLANNER_SAMPLE_BARS,
+        estimators: Optional[Mapping[str, BlockEstimator]] = None
+    ):
+        """
+        Args:
+            kernels: ブロックidごとのカーネル
+            length: バー数
+            sample_bars: コストと成立率の推定に使うバー数
+            estimators: ブロックidごとのコストと成立率の推定用の関数（省略時はカーネルでサンプルを評価）
+        """
+        self.length = length
+        self.sample_bars = sample_bars
+        estimators = estimators or {}
+        self.blocks = {
+            block_id: LazyBlock(block_id, kernel, length, estimators.get(block_id))
+            for block_id, kernel in kernels.items()
+        }
+        self._calibrated = False
+
+    def calibrate(self) -> None:
+        """全ブロックを系列全体に均等に散らばったサンプルで評価してコストと成立率を推定"""
+        count = min(self.sample_bars, self.length)
+        sample = np.unique(np.linspace(0, self.length - 1, count).astype(np.int64)) \
+            if count > 0 else np.empty(0, dtype=np.int64)
+        for block in self.blocks.values():
+            block.calibrate(sample)
+        self._calibrated = True
+
+    def order(self, group: Tuple[str, ...]) -> List[str]:
+        """ruleGroup の条件の評価順（コスト /（1 - 成立率）の昇順、同順位は設定の順）"""
+        if not self._calibrated:
+            self.calibrate()
+        return sorted(group, key=lambda block_id: self.blocks[block_id].rank())
+
+    def evaluate(
+        self,
+        expression: RequirementExpression,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        全バーを遅延評価
+
+        Args:
+            expression: コンパイル済みの entryRequirement
+            mask: 評価するバー（省略時はすべてのバー）。mask 外のバーは不成立
+
+        Returns:
+            (成立の真偽値配列, 方向の配列)。mask のバーでは RequirementExpression.evaluate と同じ結果
+        """
+        matched = np.zeros(self.length, dtype=bool)
+        direction = np.full(self.length, DIRECTION_NEUTRAL, dtype=np.int8)
+        remaining = np.ones(self.length, dtype=bool) if mask is None else np.array(mask, dtype=bool)
+        for group in expression.groups:
+            alive = remaining.copy()
+            for block_id in self.order(group):
+                if not alive.any():
+                    break
+                alive = self.blocks[block_id].evaluate(alive)
+            if not alive.any():
+                continue
+            # 成立したバーでは全条件が計算済み。方向は設定の順で決める
+            group_direction = np.full(self.length, DIRECTION_NEUTRAL, dtype=np.int8)
+            for block_id in group:
+                block_direction = self.blocks[block_id].direction
+                group_direction = np.where(block_direction != DIRECTION_NEUTRAL, block_direction, group_direction)
+            direction = np.where(alive, group_direction, direction).astype(np.int8, copy=False)
+            matched |= alive
+            remaining &= ~alive
+        return matched, direction
+
+    def entry_signals(self, expression: RequirementExpression) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BUY・SELLのエントリーシグナル
+
+        Returns:
+            (BUY, SELL) の真偽値配列
+        """
+        matched, direction = self.evaluate(expression)
+        return matched & (direction == DIRECTION_LONG), matched & (direction == DIRECTION_SHORT)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        ブロックごとの計算・スキップしたバー数
+
+        computedBars はインジケーターを計算したバー数（重なった範囲は重複して数えます）、
+        skippedBars は計算しなかったバー数、evaluatedBars は結果を求めたバー数です。
+
+        Returns:
+            ブロックidごとの computedBars, skippedBars, evaluatedBars, requestedBars, passRate, costPerBar
+        """
+        return {
+            block_id: {
+                'computedBars': block.computed_bars,
+                'skippedBars': max(self.length - block.computed_bars, 0),
+                'evaluatedBars': block.evaluated_bars,
+                'requestedBars': block.requested_bars,
+                'passRate': block.pass_rate,
+                'costPerBar': block.cost,
+            }
+            for block_id, block in self.blocks.items()
+        }
+
+    def format_stats(self) -> List[str]:
+        """stats() を表示用の行に整形"""
+        lines = []
+        for block_id, entry in self.stats().items():
+            skipped = entry['skippedBars'] / self.length * 100 if self.length else 0.0
+            lines.append(
+                f"{block_id}: 計算 {entry['computedBars']:,} / {self.length:,} バー"
+                f"（スキップ {skipped:.1f}%、評価 {entry['evaluatedBars']:,} バー、成立率 {entry['passRate'] * 100:.1f}%）"
+            )
+        return lines
+
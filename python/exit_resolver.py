@@ -0,0 +1,507 @@
+"""
+Strategy Bricks SL/TP の決済判定
+
+riskModel（risk.fixedSLTP / risk.atrBased）から各トレードのSL・TPの価格を求め、
+エントリーの次のバー以降で高値・安値が最初にSLまたはTPに達したバーを求めます。
+exitModel の exit.trail / exit.breakEven はSLを有利な方向へ移動する規則（StopRules）、
+exit.weekendClose は指定した曜日・時刻の終値で決済するバーの配列（weekend_close_mask）です。
+
+探索は全トレードを同時に扱い、各トレードのエントリー後のバーを
+(トレード数, 幅) の窓として取り出して最初に達したバーを求めます。
+窓の中で決済しなかったトレードだけを、幅を倍にした次の窓で探索するため、
+計算量は保有期間の合計に比例し、バーごとのPythonループはありません。
+
+同じバーの中でSLとTPの両方に達した場合の順序はバーからは分からないため、
+tie_break で決めます。始値が既にSL・TPを越えている（窓を空けて始まった）場合は
+その価格に先に達したものとし、約定価格は始値とします。
+価格はバーの価格（Bid）で判定します。
+
+移動するSLは、エントリー価格と前のバーまでの有利な方向の極値（ロングは高値の最大、
+ショートは安値の最小）から各バーで求めます。極値は窓ごとの累積最大（np.maximum.accumulate）を
+前の窓の値に継ぎ足して求めるため、固定のSL/TPと同じく保有期間の合計に比例する計算量です。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from bar_store import TIMEFRAME_SECONDS
+from indicator_cache import IndicatorCache
+from indicators import average_true_range
+from resampler import resample_bars
+
+# SL/TPの既定値（pips、EAの DEFAULT_SL_PIPS / DEFAULT_TP_PIPS）
+DEFAULT_SL_PIPS = 30.0
+DEFAULT_TP_PIPS = 30.0
+
+# risk.atrBased の既定値（EAの CRiskAtrBased）
+DEFAULT_ATR_PARAMS = {
+    'atrPeriod': 100,
+    'atrTimeframe': 'H4',
+    'atrRatio': 5.0,
+    'buyTpRatio': 1.2,
+    'buySlRatio': 1.3,
+    'sellTpRatio': 1.2,
+    'sellSlRatio': 1.3,
+}
+
+# exit.trail の既定値（EAの CExitTrail）
+DEFAULT_TRAIL_PARAMS = {
+    'startPips': 20.0,
+    'trailPips': 10.0,
+    'useAtr': False,
+    'atrRatio': 0.5,
+    'atrPeriod': 14,
+}
+
+# exit.breakEven の既定値（EAの CExitBreakEven）
+DEFAULT_BREAK_EVEN_PARAMS = {
+    'triggerPips': 20.0,
+    'offsetPips': 0.0,
+}
+
+# exit.weekendClose の既定値（EAの CExitWeekendClose、dayOfWeek は 0=日曜）
+DEFAULT_WEEKEND_CLOSE_PARAMS = {
+    'dayOfWeek': 5,
+    'closeTime': '22:30',
+}
+
+# 1日・1週の秒数と、UTCエポック（1970-01-01 木曜）から最初の日曜 0:00 までの秒数
+DAY_SECONDS = 24 * 60 * 60
+WEEK_SECONDS = 7 * DAY_SECONDS
+EPOCH_SUNDAY_OFFSET = 3 * DAY_SECONDS
+
+# 同じバーでSLとTPの両方に達した場合の規則
+#   stopLoss: SLを先とする（保守的）
+#   takeProfit: TPを先とする
+#   nearestToOpen: 始値に近い方を先とする
+TIE_BREAKS = ('stopLoss', 'takeProfit', 'nearestToOpen')
+DEFAULT_TIE_BREAK = 'stopLoss'
+
+# 決済理由
+EXIT_NONE = 0
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_TRAILING_STOP = 3
+EXIT_BREAK_EVEN = 4
+EXIT_WEEKEND_CLOSE = 5
+EXIT_REASONS = {
+    EXIT_STOP_LOSS: 'stopLoss',
+    EXIT_TAKE_PROFIT: 'takeProfit',
+    EXIT_TRAILING_STOP: 'trailingStop',
+    EXIT_BREAK_EVEN: 'breakEven',
+    EXIT_WEEKEND_CLOSE: 'weekendClose',
+}
+
+# 最初の探索窓の幅（バー数）
+INITIAL_WINDOW_BARS = 64
+
+# 1回に取り出す窓の要素数の上限（トレード数 × 幅）
+MAX_WINDOW_CELLS = 1 << 22
+
+
+def pips_to_price(pips: Any, digits: int) -> Any:
+    """pipsを価格差に変換（EAの PipsToPrice と同じ規則）"""
+    multiplier = 10.0 if digits in (3, 5) else 1.0
+    return pips * 10.0 ** -digits * multiplier
+
+
+def atr_series(
+    bars: Any,
+    timeframe: str,
+    atr_timeframe: str,
+    period: int,
+    cache: Optional[IndicatorCache] = None
+) -> np.ndarray:
+    """
+    各バーの確定時点で参照できるATR
+
+    atr_timeframe が bars の時間軸より上位の場合は bars をリサンプルしてATRを計算し、
+    各バーの終了時刻までに確定した上位足の値（EAの shift=1）を割り当てます。
+    同じか下位の場合は bars の時間軸で計算します。
+    cache を渡した場合はATRをキャッシュから取得するため、filter.volatility.atrRange や
+    trend.adxThreshold と真の値幅・同じ期間のATRを共有します（上位足のバーもキャッシュに登録します）。
+
+    Args:
+        bars: バーデータ（ColumnarBars または構造化配列）
+        timeframe: bars の時間軸
+        atr_timeframe: ATRの時間軸
+        period: ATRの期間
+        cache: ブロックの評価と共有するインジケーターキャッシュ（bars を timeframe として保持）
+
+    Returns:
+        bars と同じ長さの配列（ATRが定まらないバーは NaN）
+    """
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    higher_seconds = TIMEFRAME_SECONDS.get(atr_timeframe, seconds)
+    if higher_seconds <= seconds:
+        if cache is not None:
+            return cache.get('ATR', timeframe, period=period)
+        return average_true_range(bars['high'], bars['low'], bars['close'], period)
+    if cache is None:
+        higher = resample_bars(bars, atr_timeframe)
+        atr = average_true_range(higher['high'], higher['low'], higher['close'], period)
+    else:
+        if atr_timeframe not in cache.bars_by_timeframe:
+            cache.bars_by_timeframe[atr_timeframe] = resample_bars(bars, atr_timeframe)
+        higher = cache.bars_by_timeframe[atr_timeframe]
+        atr = cache.get('ATR', atr_timeframe, period=period)
+    closed = np.asarray(higher['time'], dtype=np.int64) + higher_seconds
+    last = np.searchsorted(closed, np.asarray(bars['time'], dtype=np.int64) + seconds, side='right') - 1
+    return np.where(last >= 0, atr[np.maximum(last, 0)], np.nan)
+
+
+def protective_levels(
+    risk_model: Optional[Dict[str, Any]],
+    entry_prices: np.ndarray,
+    is_long: np.ndarray,
+    digits: int,
+    atr: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    トレードごとのSL・TPの価格
+
+    risk.fixedSLTP は slPips / tpPips、risk.atrBased は ATR × atrRatio × 売買別の倍率を
+    距離とします。距離が定まらない場合（ATRのウォームアップ期間、その他のリスクモデル）は
+    EAと同じく DEFAULT_SL_PIPS / DEFAULT_TP_PIPS を使用します。
+
+    Args:
+        risk_model: ストラテジーの riskModel（type と params）
+        entry_prices: エントリー価格
+        is_long: ロングの場合 True
+        digits: シンボルの桁数
+        atr: エントリーしたバーのATR（risk.atrBased の場合）
+
+    Returns:
+        (SLの価格, TPの価格) の配列
+    """
+    risk_model = risk_model or {}
+    params = risk_model.get('params', {})
+    entry_prices = np.asarray(entry_prices, dtype=np.float64)
+    is_long = np.asarray(is_long, dtype=bool)
+    default_stop = pips_to_price(DEFAULT_SL_PIPS, digits)
+    default_target = pips_to_price(DEFAULT_TP_PIPS, digits)
+    stop_distance = np.full(len(entry_prices), default_stop)
+    target_distance = np.full(len(entry_prices), default_target)
+
+    if risk_model.get('type') == 'risk.fixedSLTP':
+        sl_pips = float(params.get('slPips', DEFAULT_SL_PIPS))
+        tp_pips = float(params.get('tpPips', DEFAULT_TP_PIPS))
+        stop_distance[:] = pips_to_price(sl_pips if sl_pips > 0 else DEFAULT_SL_PIPS, digits)
+        target_distance[:] = pips_to_price(tp_pips if tp_pips > 0 else DEFAULT_TP_PIPS, digits)
+    elif risk_model.get('type') == 'risk.atrBased' and atr is not None:
+        value = {name: float(params.get(name, default)) for name, default in DEFAULT_ATR_PARAMS.items()
+                 if name != 'atrTimeframe'}
+        base = np.asarray(atr, dtype=np.float64) * value['atrRatio']
+        valid = base > 0
+        stop_ratio = np.where(is_long, value['buySlRatio'], value['sellSlRatio'])
+        target_ratio = np.where(is_long, value['buyTpRatio'], value['sellTpRatio'])
+        stop_distance = np.where(valid, base * stop_ratio, default_stop)
+        target_distance = np.where(valid, base * target_ratio, default_target)
+
+    side = np.where(is_long, 1.0, -1.0)
+    return entry_prices - side * stop_distance, entry_prices + side * target_distance
+
+
+class StopRules:
+    """
+    トレードごとのSLの移動規則（exit.trail / exit.breakEven）
+
+    距離はすべて価格差で、使用しない規則は NaN です。有利な方向の極値と
+    エントリー価格の差が trail_start 以上になると SL を「極値 - trail_distance」へ、
+    break_even_trigger 以上になると「エントリー価格 + break_even_offset」へ移動します
+    （ショートは逆方向）。SLは元のSLより不利な方向へは移動しません。
+    """
+
+    def __init__(
+        self,
+        entry_prices: np.ndarray,
+        trail_start: Any = np.nan,
+        trail_distance: Any = np.nan,
+        break_even_trigger: Any = np.nan,
+        break_even_offset: Any = np.nan
+    ):
+        """
+        Args:
+            entry_prices: エントリー価格
+            trail_start: トレールを開始する含み益
+            trail_distance: 極値からのトレール幅
+            break_even_trigger: 建値へ移動する含み益
+            break_even_offset: 建値からのオフセット
+        """
+        self.entry_prices = np.asarray(entry_prices, dtype=np.float64)
+        shape = self.entry_prices.shape
+        self.trail_start = np.broadcast_to(np.asarray(trail_start, dtype=np.float64), shape).copy()
+        self.trail_distance = np.broadcast_to(np.asarray(trail_distance, dtype=np.float64), shape).copy()
+        self.break_even_trigger = np.broadcast_to(np.asarray(break_even_trigger, dtype=np.float64), shape).copy()
+        self.break_even_offset = np.broadcast_to(np.asarray(break_even_offset, dtype=np.float64), shape).copy()
+
+    def moved_stop(self, rows: Any, is_long: Any, stop: Any, extreme: Any) -> Tuple[Any, Any]:
+        """
+        有利な方向の極値に対するSL
+
+        Args:
+            rows: トレードの位置（配列の場合は extreme と同じ形にブロードキャスト）
+            is_long: ロングの場合 True
+            stop: 元のSLの価格
+            extreme: 前のバーまでの有利な方向の極値（ロングは高値の最大、ショートは安値の最小）
+
+        Returns:
+            (SLの価格, SLの決済理由（EXIT_STOP_LOSS / EXIT_TRAILING_STOP / EXIT_BREAK_EVEN）)
+        """
+        # ショートは価格の符号を反転してロングと同じ向きで比較する
+        side = np.where(is_long, 1.0, -1.0)
+        entry = side * self.entry_prices[rows]
+        best = side * extreme
+        gain = best - entry
+        with np.errstate(invalid='ignore'):
+            trail = np.where(gain >= self.trail_start[rows], best - self.trail_distance[rows], -np.inf)
+            break_even = np.where(
+                gain >= self.break_even_trigger[rows], entry + self.break_even_offset[rows], -np.inf
+            )
+        initial = side * stop
+        moved = np.fmax(initial, np.maximum(trail, break_even))
+        reason = np.where(
+            moved > np.fmax(initial, -np.inf),
+            np.where(trail >= break_even, EXIT_TRAILING_STOP, EXIT_BREAK_EVEN),
+            EXIT_STOP_LOSS
+        ).astype(np.int8)
+        return side * moved, reason
+
+
+def exit_rules(
+    exit_model: Optional[Dict[str, Any]],
+    entry_prices: np.ndarray,
+    digits: int,
+    atr: Optional[np.ndarray] = None
+) -> StopRules:
+    """
+    exitModel からSLの移動規則を作成
+
+    exit.trail で useAtr が有効な場合は、EAと同じく開始値を ATR × atrRatio、
+    トレール幅を開始値の半分とします（ATRが定まらない場合は startPips / trailPips）。
+
+    Args:
+        exit_model: ストラテジーの exitModel（type と params）
+        entry_prices: エントリー価格
+        digits: シンボルの桁数
+        atr: エントリーしたバーのATR（exit.trail の useAtr の場合）
+    """
+    exit_model = exit_model or {}
+    rules = StopRules(entry_prices)
+    if exit_model.get('type') == 'exit.trail':
+        params = {**DEFAULT_TRAIL_PARAMS, **exit_model.get('params', {})}
+        rules.trail_start[:] = pips_to_price(float(params['startPips']), digits)
+        rules.trail_distance[:] = pips_to_price(float(params['trailPips']), digits)
+        if params['useAtr'] and atr is not None:
+            start = np.asarray(atr, dtype=np.float64) * float(params['atrRatio'])
+            valid = start > 0
+            rules.trail_start[valid] = start[valid]
+            rules.trail_distance[valid] = start[valid] * 0.5
+    elif exit_model.get('type') == 'exit.breakEven':
+        params = {**DEFAULT_BREAK_EVEN_PARAMS, **exit_model.get('params', {})}
+        rules.break_even_trigger[:] = pips_to_price(float(params['triggerPips']), digits)
+        rules.break_even_offset[:] = pips_to_price(float(params['offsetPips']), digits)
+    return rules
+
+
+def weekend_close_mask(times: np.ndarray, timeframe: str, day_of_week: int, close_time: str) -> np.ndarray:
+    """
+    exit.weekendClose で決済するバー
+
+    バーの終了時刻（次のバーでEAが評価する時刻）が指定した曜日の close_time 以降のバーと、
+    データの欠落で週の決済時刻をまたいだバーが True です。曜日・時刻はバーの時刻（サーバー時刻）で判定します。
+
+    Args:
+        times: バーの開始時刻（UTCエポック秒）
+        timeframe: 時間軸
+        day_of_week: 曜日（0=日曜、5=金曜）
+        close_time: 決済時刻（"HH:MM"）
+    """
+    hours, _, minutes = close_time.partition(':')
+    close_seconds = day_of_week * DAY_SECONDS + (int(hours) * 60 + int(minutes or 0)) * 60
+    closed_at = np.asarray(times, dtype=np.int64) + TIMEFRAME_SECONDS[timeframe]
+    since_sunday = closed_at - EPOCH_SUNDAY_OFFSET
+    week_seconds = since_sunday % WEEK_SECONDS
+    in_window = (week_seconds >= close_seconds) & (week_seconds < (day_of_week + 1) * DAY_SECONDS)
+    # 週の決済時刻を通過した回数が前のバーから増えたバー
+    passed = since_sunday // WEEK_SECONDS + (week_seconds >= close_seconds)
+    crossed = np.zeros(len(closed_at), dtype=bool)
+    crossed[1:] = passed[1:] > passed[:-1]
+    return in_window | crossed
+
+
+def bar_exit(
+    bar_open: float,
+    bar_high: float,
+    bar_low: float,
+    is_long: bool,
+    stop: float,
+    target: float,
+    tie_break: str = DEFAULT_TIE_BREAK
+) -> Tuple[int, float]:
+    """
+    1本のバーでのSL/TPの判定（バーごとに評価する参照実装用）
+
+    Returns:
+        (決済理由, 約定価格)。達しなかった場合は (EXIT_NONE, NaN)
+    """
+    if is_long:
+        stop_hit, target_hit = bar_low <= stop, bar_high >= target
+        stop_gap, target_gap = bar_open <= stop, bar_open >= target
+    else:
+        stop_hit, target_hit = bar_high >= stop, bar_low <= target
+        stop_gap, target_gap = bar_open >= stop, bar_open <= target
+    if not (stop_hit or target_hit):
+        return EXIT_NONE, float('nan')
+    if stop_hit and target_hit:
+        if stop_gap or target_gap:
+            use_stop = stop_gap
+        elif tie_break == 'nearestToOpen':
+            use_stop = abs(bar_open - stop) <= abs(bar_open - target)
+        else:
+            use_stop = tie_break == 'stopLoss'
+    else:
+        use_stop = stop_hit
+    if use_stop:
+        return EXIT_STOP_LOSS, min(bar_open, stop) if is_long else max(bar_open, stop)
+    return EXIT_TAKE_PROFIT, max(bar_open, target) if is_long else min(bar_open, target)
+
+
+def first_hits(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    entries: np.ndarray,
+    is_long: np.ndarray,
+    stop: np.ndarray,
+    target: np.ndarray,
+    end: Optional[np.ndarray] = None,
+    tie_break: str = DEFAULT_TIE_BREAK,
+    rules: Optional[StopRules] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    トレードごとに、エントリーの次のバーから end までで最初にSLまたはTPに達したバー
+
+    Args:
+        open_: 始値の系列
+        high: 高値の系列
+        low: 安値の系列
+        entries: エントリーしたバーの位置
+        is_long: ロングの場合 True
+        stop: SLの価格（NaN は判定しない）
+        target: TPの価格（NaN は判定しない）
+        end: 探索する最後のバーの位置（省略時は系列の末尾）
+        tie_break: 同じバーで両方に達した場合の規則（TIE_BREAKS のいずれか）
+        rules: SLの移動規則（省略時はSLを移動しない）
+
+    Returns:
+        (決済したバーの位置, 約定価格, 決済理由) の配列。
+        達しなかったトレードは位置が len(high)、価格が NaN、理由が EXIT_NONE
+
+    Raises:
+        ValueError: サポートされていない tie_break の場合
+    """
+    if tie_break not in TIE_BREAKS:
+        raise ValueError(f"サポートされていない tie_break: {tie_break}（{', '.join(TIE_BREAKS)}）")
+    count = len(high)
+    entries = np.asarray(entries, dtype=np.int64)
+    trades = len(entries)
+    index = np.full(trades, count, dtype=np.int64)
+    price = np.full(trades, np.nan)
+    reason = np.full(trades, EXIT_NONE, dtype=np.int8)
+    if trades == 0 or count == 0:
+        return index, price, reason
+
+    open_ = np.asarray(open_, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    is_long = np.asarray(is_long, dtype=bool)
+    stop = np.asarray(stop, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    last = np.full(trades, count - 1, dtype=np.int64) if end is None else np.minimum(end, count - 1)
+
+    start = entries + 1
+    # 前の窓までの有利な方向の極値（ショートは符号を反転した安値）
+    side = np.where(is_long, 1.0, -1.0)
+    carry = side * (rules.entry_prices if rules is not None else 0.0)
+    pending = np.flatnonzero(start <= last)
+    width = INITIAL_WINDOW_BARS
+    while len(pending):
+        rows_per_chunk = max(1, MAX_WINDOW_CELLS // width)
+        unresolved = []
+        for offset in range(0, len(pending), rows_per_chunk):
+            rows = pending[offset:offset + rows_per_chunk]
+            columns = start[rows, None] + np.arange(width)
+            valid = columns <= last[rows, None]
+            columns = np.minimum(columns, count - 1)
+            long = is_long[rows, None]
+            bar_high = high[columns]
+            bar_low = low[columns]
+            if rules is None:
+                bar_stop = np.broadcast_to(stop[rows, None], columns.shape)
+            else:
+                favorable = np.where(valid, np.where(long, bar_high, -bar_low), -np.inf)
+                running = np.maximum.accumulate(favorable, axis=1)
+                before = np.empty_like(running)
+                before[:, 0] = carry[rows]
+                np.maximum(running[:, :-1], carry[rows, None], out=before[:, 1:])
+                bar_stop, stop_reason = rules.moved_stop(
+                    rows[:, None], long, stop[rows, None], side[rows, None] * before
+                )
+            with np.errstate(invalid='ignore'):
+                stop_hit = valid & np.where(long, bar_low <= bar_stop, bar_high >= bar_stop)
+                target_hit = valid & np.where(long, bar_high >= target[rows, None], bar_low <= target[rows, None])
+            hit = stop_hit | target_hit
+            found = hit.any(axis=1)
+            first = np.argmax(hit, axis=1)
+
+            done = rows[found]
+            cells = (found, first[found])
+            bars = columns[cells]
+            index[done] = bars
+            price[done], reason[done] = _fill(
+                open_[bars], is_long[done], bar_stop[cells], target[done],
+                stop_hit[cells], target_hit[cells], tie_break
+            )
+            if rules is not None:
+                moved = reason[done] == EXIT_STOP_LOSS
+                reason[done[moved]] = stop_reason[cells][moved]
+
+            window_end = start[rows] + width
+            more = ~found & (window_end <= last[rows])
+            start[rows[more]] = window_end[more]
+            if rules is not None:
+                carry[rows[more]] = np.maximum(carry[rows[more]], running[more, -1])
+            unresolved.append(rows[more])
+        pending = np.concatenate(unresolved)
+        width *= 2
+    return index, price, reason
+
+
+def _fill(
+    bar_open: np.ndarray,
+    is_long: np.ndarray,
+    stop: np.ndarray,
+    target: np.ndarray,
+    stop_hit: np.ndarray,
+    target_hit: np.ndarray,
+    tie_break: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """決済したバーでの約定価格と決済理由"""
+    # 始値が既に越えている価格は、始値で先に約定
+    stop_gap = np.where(is_long, bar_open <= stop, bar_open >= stop)
+    target_gap = np.where(is_long, bar_open >= target, bar_open <= target)
+    if tie_break == 'stopLoss':
+        stop_first = ~target_gap
+    elif tie_break == 'takeProfit':
+        stop_first = stop_gap
+    else:
+        stop_first = stop_gap | (~target_gap & (np.abs(bar_open - stop) <= np.abs(bar_open - target)))
+    use_stop = stop_hit & (~target_hit | stop_first)
+    stop_price = np.where(is_long, np.minimum(bar_open, stop), np.maximum(bar_open, stop))
+    target_price = np.where(is_long, np.maximum(bar_open, target), np.minimum(bar_open, target))
+    return (
+        np.where(use_stop, stop_price, target_price),
+        np.where(use_stop, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT).astype(np.int8),
+    )
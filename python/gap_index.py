@@ -0,0 +1,318 @@
+"""
+Strategy Bricks データ欠損インデックス
+
+バー系列の「穴」（期待されるバー時刻にバーが無い期間）と、時間軸の境界に
+揃っていない・重複した不規則なバーを記録します。穴は種類ごとに分類されます:
+
+    missing: 取引時間中の欠損（取得漏れ、ブローカー側の欠損、祝日など）
+    weekend: 週末の休場（金曜12:00〜翌週月曜12:00に収まる穴）
+
+インデックスは取り込み時に1回だけ時刻列からベクトル演算で作成し
+（BarCache.append が追記ごとに更新してキャッシュの gaps.npz に保存）、
+「この期間は欠損無しか」の判定は二分探索と累積和により O(log n) で答えます。
+シミュレーターは reset_positions() でインジケーターをリセットすべきバー位置を受け取り、
+バーごとの時刻チェック無しで穴をまたいだ計算を避けられます。
+"""
+
+from typing import Any, BinaryIO, List, Optional, Tuple
+
+import numpy as np
+
+from bar_store import TIMEFRAME_SECONDS
+
+HOLE_MISSING = 0
+HOLE_WEEKEND = 1
+
+# 穴の種類コード → 名前
+HOLE_KINDS = ('missing', 'weekend')
+
+Interval = Tuple[int, int]
+
+DAY_SECONDS = 24 * 60 * 60
+WEEK_SECONDS = 7 * DAY_SECONDS
+
+# 週の開始（月曜00:00）からの秒数。この範囲に収まる穴を週末の休場とみなす
+# （ブローカーのサーバー時刻がUTCからずれていても金曜夜〜月曜朝の休場を含む幅）
+WEEKEND_CLOSE_OFFSET = 4 * DAY_SECONDS + 12 * 60 * 60   # 金曜12:00
+WEEKEND_OPEN_OFFSET = 7 * DAY_SECONDS + 12 * 60 * 60    # 翌週月曜12:00
+
+
+def classify_holes(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    穴を種類コードに分類
+
+    Args:
+        starts: 穴の開始（最初の欠けたバー時刻、UTCエポック秒）
+        ends: 穴の終了（含む）
+
+    Returns:
+        HOLE_MISSING / HOLE_WEEKEND の配列
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    # 1970-01-01 は木曜日のため3日ずらして月曜00:00を週の開始にする
+    week_start = starts - (starts + 3 * DAY_SECONDS) % WEEK_SECONDS
+    weekend = (
+        (starts - week_start >= WEEKEND_CLOSE_OFFSET)
+        & (ends < week_start + WEEKEND_OPEN_OFFSET)
+    )
+    return np.where(weekend, HOLE_WEEKEND, HOLE_MISSING).astype(np.int8)
+
+
+def find_holes(times: Any, timeframe_seconds: int, start_ts: int, end_ts: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    取得済み期間内の穴を求める
+
+    期間の先頭・末尾に期待されるバーの前後へ仮想バーを置き、隣接するバーの
+    間隔が1バーより長い箇所をすべて穴とします（期間の先頭・末尾の欠損も含む）。
+
+    Args:
+        times: 期間内のバー時刻（昇順）
+        timeframe_seconds: 1バーの秒数
+        start_ts: 取得済み期間の開始（含む）
+        end_ts: 取得済み期間の終了（含む）
+
+    Returns:
+        (穴の開始, 穴の終了) の配列。いずれも期間内に切り詰めた閉区間
+    """
+    tf = timeframe_seconds
+    first_expected = -(-start_ts // tf) * tf
+    last_expected = end_ts // tf * tf
+    times = np.asarray(times, dtype=np.int64)
+    bounds = np.concatenate(([first_expected - tf], times, [last_expected + tf]))
+    prev = bounds[:-1]
+    following = bounds[1:]
+    at = np.flatnonzero(following - prev > tf)
+    starts = prev[at] + tf
+    ends = np.minimum(following[at] - 1, end_ts)
+    keep = starts <= ends
+    return starts[keep], ends[keep]
+
+
+def find_irregular(times: Any, timeframe_seconds: int) -> np.ndarray:
+    """時間軸の境界に揃っていない、または直前のバー以前の時刻を持つバーの時刻を返す"""
+    times = np.asarray(times, dtype=np.int64)
+    if len(times) == 0:
+        return times
+    irregular = times % timeframe_seconds != 0
+    irregular[1:] |= np.diff(times) <= 0
+    return times[irregular]
+
+
+class GapIndex:
+    """取得済み期間・穴・不規則なバーの索引"""
+
+    def __init__(
+        self,
+        timeframe_seconds: int,
+        coverage: List[Interval],
+        hole_starts: Any,
+        hole_ends: Any,
+        hole_kinds: Any,
+        irregular: Any
+    ):
+        """
+        Args:
+            timeframe_seconds: 1バーの秒数
+            coverage: 取得済み期間（統合済み・昇順の閉区間）
+            hole_starts: 穴の開始（昇順）
+            hole_ends: 穴の終了（含む）
+            hole_kinds: 穴の種類コード
+            irregular: 不規則なバーの時刻（昇順）
+        """
+        self.timeframe_seconds = int(timeframe_seconds)
+        self.coverage = [(int(s), int(e)) for s, e in coverage]
+        self.hole_starts = np.asarray(hole_starts, dtype=np.int64)
+        self.hole_ends = np.asarray(hole_ends, dtype=np.int64)
+        self.hole_kinds = np.asarray(hole_kinds, dtype=np.int8)
+        self.irregular = np.asarray(irregular, dtype=np.int64)
+        self._coverage_starts = np.array([s for s, _ in self.coverage], dtype=np.int64)
+        self._coverage_ends = np.array([e for _, e in self.coverage], dtype=np.int64)
+        # 先頭からi個の穴に含まれる missing の数（区間内の件数を O(1) で引き算する）
+        self._missing_count = np.concatenate(
+            ([0], np.cumsum(self.hole_kinds == HOLE_MISSING))
+        )
+
+    @classmethod
+    def build(cls, times: Any, timeframe: str, coverage: List[Interval]) -> 'GapIndex':
+        """
+        バー時刻から索引を作成
+
+        Args:
+            times: バー時刻（昇順、取得済み期間外のバーは無視）
+            timeframe: 時間軸（例: M1）
+            coverage: 取得済み期間（統合済み・昇順の閉区間）
+        """
+        tf = TIMEFRAME_SECONDS[timeframe]
+        times = np.asarray(times, dtype=np.int64)
+        starts, ends, irregular = [], [], []
+        for c_start, c_end in coverage:
+            lo = int(np.searchsorted(times, c_start, side='left'))
+            hi = int(np.searchsorted(times, c_end, side='right'))
+            s, e = find_holes(times[lo:hi], tf, c_start, c_end)
+            starts.append(s)
+            ends.append(e)
+            irregular.append(find_irregular(times[lo:hi], tf))
+        starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+        ends = np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+        irregular = np.concatenate(irregular) if irregular else np.empty(0, dtype=np.int64)
+        return cls(tf, coverage, starts, ends, classify_holes(starts, ends), irregular)
+
+    @classmethod
+    def load(cls, path: str) -> 'GapIndex':
+        """save() で保存した索引を読み込み"""
+        with np.load(path) as data:
+            return cls(
+                int(data['timeframe_seconds']),
+                [tuple(c) for c in data['coverage'].tolist()],
+                data['hole_starts'],
+                data['hole_ends'],
+                data['hole_kinds'],
+                data['irregular']
+            )
+
+    def save(self, f: BinaryIO) -> None:
+        """索引を .npz 形式でファイルオブジェクトへ書き込み"""
+        np.savez(
+            f,
+            timeframe_seconds=np.int64(self.timeframe_seconds),
+            coverage=np.array(self.coverage, dtype=np.int64).reshape(-1, 2),
+            hole_starts=self.hole_starts,
+            hole_ends=self.hole_ends,
+            hole_kinds=self.hole_kinds,
+            irregular=self.irregular
+        )
+
+    def replace(
+        self,
+        start_ts: int,
+        end_ts: int,
+        times: Any,
+        coverage: List[Interval]
+    ) -> 'GapIndex':
+        """
+        期間 [start_ts, end_ts] の穴を再計算し、不規則なバーを追加した索引を返す
+
+        追記時に、追記した期間とその前後の既存バーまでの範囲だけを再計算します
+        （範囲外の穴はバーをまたがないため変わりません）。
+
+        Args:
+            start_ts: 再計算する期間の開始（既存バーの時刻または取得済み期間の開始）
+            end_ts: 再計算する期間の終了（既存バーの時刻または取得済み期間の終了）
+            times: 期間内のバー時刻（昇順）
+            coverage: 追記後の取得済み期間
+        """
+        starts, ends = find_holes(times, self.timeframe_seconds, start_ts, end_ts)
+        keep = (self.hole_ends < start_ts) | (self.hole_starts > end_ts)
+        hole_starts = np.concatenate((self.hole_starts[keep], starts))
+        order = np.argsort(hole_starts, kind='stable')
+        return GapIndex(
+            self.timeframe_seconds,
+            coverage,
+            hole_starts[order],
+            np.concatenate((self.hole_ends[keep], ends))[order],
+            np.concatenate((self.hole_kinds[keep], classify_holes(starts, ends)))[order],
+            np.union1d(self.irregular, find_irregular(times, self.timeframe_seconds))
+        )
+
+    def covering_interval(self, timestamp: int) -> Optional[Interval]:
+        """時刻を含む取得済み期間を返す（O(log n)、含まれない場合None）"""
+        i = int(np.searchsorted(self._coverage_starts, timestamp, side='right')) - 1
+        if i < 0 or int(self._coverage_ends[i]) < timestamp:
+            return None
+        return self.coverage[i]
+
+    def covers(self, start_ts: int, end_ts: int) -> bool:
+        """期間全体が取得済みかを返す（O(log n)）"""
+        interval = self.covering_interval(start_ts)
+        return interval is not None and interval[1] >= end_ts
+
+    def hole_range(self, start_ts: int, end_ts: int) -> Tuple[int, int]:
+        """期間と重なる穴のインデックス範囲 [lo, hi) を返す（O(log n)）"""
+        lo = int(np.searchsorted(self.hole_ends, start_ts, side='left'))
+        hi = int(np.searchsorted(self.hole_starts, end_ts, side='right'))
+        return lo, max(lo, hi)
+
+    def count_missing(self, start_ts: int, end_ts: int) -> int:
+        """期間と重なる missing の穴の数を返す（O(log n)）"""
+        lo, hi = self.hole_range(start_ts, end_ts)
+        return int(self._missing_count[hi] - self._missing_count[lo])
+
+    def is_complete(self, start_ts: int, end_ts: int) -> bool:
+        """
+        期間が取得済みで、週末以外の穴が無いかを返す（O(log n)）
+
+        Args:
+            start_ts: 期間の開始（UTCエポック秒、含む）
+            end_ts: 期間の終了（UTCエポック秒、含む）
+        """
+        return self.covers(start_ts, end_ts) and self.count_missing(start_ts, end_ts) == 0
+
+    def holes(
+        self,
+        start_ts: int,
+        end_ts: int,
+        kind: Optional[int] = HOLE_MISSING,
+        clip: bool = True
+    ) -> List[Interval]:
+        """
+        期間と重なる穴を返す
+
+        Args:
+            start_ts: 期間の開始（含む）
+            end_ts: 期間の終了（含む）
+            kind: 穴の種類コード（None の場合はすべて）
+            clip: 穴を期間内に切り詰める
+
+        Returns:
+            穴（閉区間）のリスト
+        """
+        lo, hi = self.hole_range(start_ts, end_ts)
+        selected = slice(lo, hi)
+        starts = self.hole_starts[selected]
+        ends = self.hole_ends[selected]
+        if clip:
+            starts = np.maximum(starts, start_ts)
+            ends = np.minimum(ends, end_ts)
+        if kind is not None:
+            mask = self.hole_kinds[selected] == kind
+            starts, ends = starts[mask], ends[mask]
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def reset_positions(self, times: Any, include_weekends: bool = False, min_bars: int = 1) -> np.ndarray:
+        """
+        穴の直後のバー位置（インジケーターの計算をやり直す位置）を返す
+
+        Args:
+            times: シミュレーターに渡すバー時刻（昇順）
+            include_weekends: 週末の休場もリセット対象にする
+            min_bars: リセット対象にする穴の最小の長さ（バー数）。
+                      これより短い取引時間中の欠損（数本の取得漏れなど）はまたいで計算します
+
+        Returns:
+            バー位置の昇順配列（先頭バーの0を含む）
+        """
+        times = np.asarray(times, dtype=np.int64)
+        mask = np.ones(len(self.hole_kinds), dtype=bool) if include_weekends \
+            else self.hole_kinds == HOLE_MISSING
+        lengths = (self.hole_ends - self.hole_starts) // self.timeframe_seconds + 1
+        mask &= lengths >= min_bars
+        positions = np.searchsorted(times, self.hole_ends[mask] + 1, side='left')
+        positions = positions[(positions > 0) & (positions < len(times))]
+        return np.unique(np.concatenate(([0], positions))).astype(np.int64)
+
+    def bars_since_reset(self, times: Any, include_weekends: bool = False, min_bars: int = 1) -> np.ndarray:
+        """
+        各バーについて直前のリセット位置からのバー数を返す
+
+        インジケーターの期間（例: 20バー）に満たないバーを、バーごとの
+        時刻チェック無しで判定するために使用します（引数は reset_positions と同じ）。
+        """
+        count = len(times)
+        positions = self.reset_positions(times, include_weekends, min_bars)
+        index = np.arange(count, dtype=np.int64)
+        if count == 0:
+            return index
+        run_start = positions[np.searchsorted(positions, index, side='right') - 1]
+        return index - run_start
+
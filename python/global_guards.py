@@ -0,0 +1,136 @@
+"""
+Strategy Bricks グローバルガード（globalGuards）
+
+設定JSONの globalGuards のうち、バーごとに判定できる条件を全バーの真偽値配列（マスク）として
+一度だけ計算し、全ストラテジーのエントリー条件に AND します:
+
+- session.windows: バーの評価時刻（バーの終了時刻）の時刻が時間帯のいずれかに入る
+  （終了時刻を含み、end < start の時間帯は日付をまたぐ。EAの CEnvSessionTimeWindow と同じ規則）
+- session.weekDays: 評価時刻の曜日が有効
+- maxSpreadPips: バーのスプレッド（spread 列、ポイント）をシンボルの桁数でpipsに換算した値が上限以下
+
+時刻・曜日はバーの時刻（サーバー時刻）のエポック秒から整数演算で求めるため、
+バーごとの datetime の生成はありません。
+
+useClosedBarOnly / noReentrySameBar はEAのMVPと同じく true 固定です
+（シグナルは常に確定足で評価し、決済したバーでは再エントリーしません）。
+maxPositionsTotal / maxPositionsPerSymbol は、同時に1ポジションのみ保有する
+シミュレーションでは常に満たされます。
+"""
+
+import sys
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from bar_store import TIMEFRAME_SECONDS
+from block_kernels import DEFAULT_MAX_SPREAD_PIPS, spread_pips
+from gap_index import DAY_SECONDS
+
+# 曜日のキー（0=日曜、EAの SessionConfig.weekDays と同じ順）
+WEEKDAY_KEYS = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+# 曜日を省略した場合の既定値（EAの ConfigLoader.ParseSession）
+DEFAULT_WEEKDAYS = {'sun': False, 'mon': True, 'tue': True, 'wed': True, 'thu': True, 'fri': True, 'sat': False}
+
+# UTCエポック（1970-01-01）の曜日（木曜）
+EPOCH_WEEKDAY = 4
+
+# true 固定の項目（false を指定しても true として扱う）
+FIXED_TRUE_GUARDS = ('useClosedBarOnly', 'noReentrySameBar')
+
+
+def parse_minutes(text: str) -> int:
+    """"HH:MM" を0:00からの分に変換"""
+    hours, _, minutes = text.partition(':')
+    return int(hours) * 60 + int(minutes or 0)
+
+
+def evaluation_times(times: np.ndarray, timeframe: str) -> np.ndarray:
+    """バーを評価する時刻（バーの終了時刻、次のバーの開始時刻）"""
+    return np.asarray(times, dtype=np.int64) + TIMEFRAME_SECONDS[timeframe]
+
+
+def weekday_mask(times: np.ndarray, week_days: Mapping[str, bool]) -> np.ndarray:
+    """
+    曜日が有効な時刻
+
+    Args:
+        times: エポック秒
+        week_days: 曜日キー（WEEKDAY_KEYS）→ 有効か（省略した曜日は DEFAULT_WEEKDAYS）
+    """
+    allowed = np.array([bool(week_days.get(key, DEFAULT_WEEKDAYS[key])) for key in WEEKDAY_KEYS])
+    weekday = (np.asarray(times, dtype=np.int64) // DAY_SECONDS + EPOCH_WEEKDAY) % 7
+    return allowed[weekday]
+
+
+def session_window_mask(times: np.ndarray, windows: List[Mapping[str, str]]) -> np.ndarray:
+    """
+    時刻がいずれかの時間帯に入るか（時間帯が無い場合はすべて True）
+
+    Args:
+        times: エポック秒
+        windows: {'start': "HH:MM", 'end': "HH:MM"} のリスト
+    """
+    minutes = np.asarray(times, dtype=np.int64) % DAY_SECONDS // 60
+    if not windows:
+        return np.ones(len(minutes), dtype=bool)
+    inside = np.zeros(len(minutes), dtype=bool)
+    for window in windows:
+        start = parse_minutes(window.get('start', '00:00'))
+        end = parse_minutes(window.get('end', '23:59'))
+        if end < start:
+            inside |= (minutes >= start) | (minutes <= end)
+        else:
+            inside |= (minutes >= start) & (minutes <= end)
+    return inside
+
+
+class GlobalGuards:
+    """globalGuards のバーごとの条件"""
+
+    def __init__(self, guards: Optional[Dict[str, Any]]):
+        """
+        Args:
+            guards: 設定JSONの globalGuards（None の場合はすべてのバーを許可）
+        """
+        self.enabled = guards is not None
+        guards = guards or {}
+        session = guards.get('session') or {}
+        self.max_spread_pips = float(guards.get('maxSpreadPips', DEFAULT_MAX_SPREAD_PIPS)) if self.enabled else None
+        self.session_enabled = bool(session.get('enabled', False))
+        self.windows = list(session.get('windows', []))
+        self.week_days = dict(session.get('weekDays') or {})
+        self.ignored = [name for name in FIXED_TRUE_GUARDS if guards.get(name, True) is False]
+
+    def mask(self, times: np.ndarray, spread: np.ndarray, timeframe: str, digits: int) -> np.ndarray:
+        """
+        エントリーを許可するバー
+
+        Args:
+            times: バーの開始時刻（エポック秒）
+            spread: バーのスプレッド（ポイント）
+            timeframe: 時間軸
+            digits: シンボルの桁数（BacktestEngine.resolve_digits で決めた値）
+
+        Returns:
+            times と同じ長さの真偽値配列
+        """
+        allowed = np.ones(len(times), dtype=bool)
+        if not self.enabled:
+            return allowed
+        allowed &= spread_pips(np.asarray(spread, dtype=np.float64), digits) <= self.max_spread_pips
+        if self.session_enabled:
+            evaluated = evaluation_times(times, timeframe)
+            allowed &= weekday_mask(evaluated, self.week_days)
+            allowed &= session_window_mask(evaluated, self.windows)
+        return allowed
+
+    def warn_ignored(self) -> None:
+        """true 固定の項目に false が指定されている場合に警告"""
+        if self.ignored:
+            print(
+                f"警告: globalGuards の {', '.join(self.ignored)} は true 固定のため false は無視します",
+                file=sys.stderr
+            )
+
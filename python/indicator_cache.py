@@ -0,0 +1,437 @@
+"""
+Strategy Bricks インジケーターキャッシュ
+
+EAの CIndicatorCache（キー例: MA_USDJPY_M1_200_EMA）と同じく、インジケーターの
+系列を (インジケーター, パラメーター, 適用価格, 時間軸) をキーとして保持し、
+1回の実行の中で同じ系列を一度だけ計算します。キャッシュは全ブロック・
+全ストラテジーで共有します。
+
+ボリンジャーバンドのように他のインジケーターから組み立てる系列は、
+構成要素（移動平均、標準偏差）もキャッシュ経由で取得するため、
+同じ期間の移動平均を使う別のブロックとも計算を共有します。
+
+キャッシュした配列は読み取り専用です。
+indicator_window は、系列の一部（窓）で計算しても系列全体と同じ値になる
+インジケーターについて、窓に含める過去のバー数を返します。
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from indicators import (
+    applied_price,
+    average_directional_index,
+    directional_movement,
+    ichimoku_lines,
+    moving_average,
+    standard_deviation,
+    stochastic,
+    true_range,
+    williams_percent_range,
+)
+from parabolic_sar import DEFAULT_SAR_MAXIMUM, DEFAULT_SAR_STEP, parabolic_sar
+from rolling_extrema import RollingExtrema
+from rolling_moments import bands, deviation_from
+
+# キャッシュのキー: (インジケーター, ((パラメーター名, 値), ...), 適用価格, 時間軸)
+IndicatorKey = Tuple[str, Tuple[Tuple[str, Any], ...], str, str]
+
+
+def make_key(indicator: str, timeframe: str, price: str = 'CLOSE', **params: Any) -> IndicatorKey:
+    """
+    キャッシュのキーを作成
+
+    パラメーターは名前順に並べ、文字列は大文字に揃えます
+    （maMethod="sma" と "SMA" は同じキーになります）。
+    """
+    normalized = tuple(sorted(
+        (name, value.upper() if isinstance(value, str) else value)
+        for name, value in params.items()
+    ))
+    return (indicator.upper(), normalized, price.upper(), timeframe)
+
+
+def key_name(key: IndicatorKey) -> str:
+    """表示用のキー名（例: MA_M1_20_SMA_CLOSE）"""
+    indicator, params, price, timeframe = key
+    values = [str(value) for _, value in params]
+    return "_".join([indicator, timeframe] + values + [price])
+
+
+def _moving_average(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> np.ndarray:
+    return moving_average(cache.price(timeframe, price), params['period'], params['method'])
+
+
+def _standard_deviation(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> np.ndarray:
+    if params['method'] == 'SMA':
+        return standard_deviation(cache.price(timeframe, price), params['period'])
+    # SMA以外の基準: SMA基準の標準偏差（窓の母分散）と窓の平均をキャッシュから再利用
+    deviation = cache.get('STDDEV', timeframe, price, period=params['period'], method='SMA')
+    mean = cache.get('MA', timeframe, price, period=params['period'], method='SMA')
+    center = cache.get('MA', timeframe, price, period=params['period'], method=params['method'])
+    return deviation_from(mean, deviation * deviation, center)
+
+
+def _bands(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> Tuple[np.ndarray, ...]:
+    # iBands: SMAの中心線 ± deviation × 同じ期間の標準偏差（deviation が違っても同じ系列を共有）
+    middle = cache.get('MA', timeframe, price, period=params['period'], method='SMA')
+    deviation = cache.get('STDDEV', timeframe, price, period=params['period'], method='SMA')
+    return bands(middle, deviation, params['deviation'])
+
+
+def _true_range(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> np.ndarray:
+    # 真の値幅・±DM は適用価格を使わず、高値・安値・終値から計算（ATR / ADX の全期間で共有）
+    return true_range(
+        cache.price(timeframe, 'HIGH'), cache.price(timeframe, 'LOW'), cache.price(timeframe, 'CLOSE')
+    )
+
+
+def _directional_movement(cache: 'IndicatorCache', timeframe: str, price: str,
+                          params: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    return directional_movement(cache.price(timeframe, 'HIGH'), cache.price(timeframe, 'LOW'))
+
+
+def _average_true_range(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> np.ndarray:
+    # iATR: 真の値幅の単純移動平均
+    if params['period'] < 1:
+        raise ValueError(f"ATRの期間は1以上で指定してください: {params['period']}")
+    return moving_average(cache.get('TR', timeframe), params['period'], 'SMA')
+
+
+def _average_directional_index(cache: 'IndicatorCache', timeframe: str, price: str,
+                               params: Dict[str, Any]) -> Tuple[np.ndarray, ...]:
+    # iADX（ADX, +DI, -DI）
+    return average_directional_index(cache.get('TR', timeframe), *cache.get('DM', timeframe), params['period'])
+
+
+def _parabolic_sar(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> Tuple[np.ndarray, ...]:
+    # iSAR は高値・安値から計算（SAR, ロングか, 反転したバーの位置）
+    return parabolic_sar(
+        cache.price(timeframe, 'HIGH'), cache.price(timeframe, 'LOW'), params['step'], params['maximum']
+    )
+
+
+def _extremum(highest: bool) -> Callable[['IndicatorCache', str, str, Dict[str, Any]], np.ndarray]:
+    def compute(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> np.ndarray:
+        return cache.extrema(timeframe, price, highest).window(params['period'])
+    return compute
+
+
+def _price_range(cache: 'IndicatorCache', timeframe: str, period: int,
+                 high: str = 'HIGH', low: str = 'LOW') -> Tuple[np.ndarray, np.ndarray]:
+    """直近 period 本の (最高値, 最安値)"""
+    return (cache.get('HIGHEST', timeframe, high, period=period), cache.get('LOWEST', timeframe, low, period=period))
+
+
+def _williams_percent_range(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> np.ndarray:
+    highest, lowest = _price_range(cache, timeframe, params['period'])
+    return williams_percent_range(highest, lowest, cache.price(timeframe, 'CLOSE'))
+
+
+def _stochastic(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> Tuple[np.ndarray, ...]:
+    # priceField: LOWHIGH は高値・安値、CLOSECLOSE は終値の最高値・最安値
+    field = ('CLOSE', 'CLOSE') if params['priceField'] == 'CLOSECLOSE' else ('HIGH', 'LOW')
+    highest, lowest = _price_range(cache, timeframe, params['kPeriod'], *field)
+    return stochastic(
+        highest, lowest, cache.price(timeframe, 'CLOSE'), params['dPeriod'], params['slowing'], params['method']
+    )
+
+
+def _ichimoku(cache: 'IndicatorCache', timeframe: str, price: str, params: Dict[str, Any]) -> Tuple[np.ndarray, ...]:
+    # 先行スパンはずらす前の値（ブロックが kijun 本前の位置を参照）
+    return ichimoku_lines(
+        _price_range(cache, timeframe, params['tenkan']),
+        _price_range(cache, timeframe, params['kijun']),
+        _price_range(cache, timeframe, params['senkouB']),
+    )
+
+
+# インジケーター → 計算関数（キャッシュ, 時間軸, 適用価格, パラメーター）
+# 戻り値は配列、または複数バッファーの場合はMT5のバッファー順の配列のタプル
+INDICATOR_FUNCTIONS: Dict[str, Callable[['IndicatorCache', str, str, Dict[str, Any]], Any]] = {
+    'MA': _moving_average,
+    'STDDEV': _standard_deviation,
+    'BB': _bands,
+    'TR': _true_range,
+    'DM': _directional_movement,
+    'ATR': _average_true_range,
+    'ADX': _average_directional_index,
+    'SAR': _parabolic_sar,
+    'HIGHEST': _extremum(highest=True),
+    'LOWEST': _extremum(highest=False),
+    'WPR': _williams_percent_range,
+    'STOCH': _stochastic,
+    'ICHIMOKU': _ichimoku,
+}
+
+# 系列の一部（窓）で計算しても系列全体と同じ値になる移動平均の種類（EMA・SMMAは漸化式）
+WINDOWED_MA_METHODS = ('SMA', 'LWMA')
+
+
+def _ma_window(params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    # MA・STDDEV（SMA基準の平均・分散と、LWMA基準の中心線）は period 本ごとのブロック単位の累積
+    if str(params['method']).upper() not in WINDOWED_MA_METHODS:
+        return None
+    return params['period'] - 1, params['period']
+
+
+def _stochastic_window(params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    # kPeriod 本の最高値・最安値 → slowing 本の和 → シグナルの dPeriod 本の移動平均
+    if str(params['method']).upper() not in WINDOWED_MA_METHODS:
+        return None
+    lookback = params['kPeriod'] + params['slowing'] + params['dPeriod'] - 3
+    return lookback, int(np.lcm(params['slowing'], params['dPeriod']))
+
+
+def _period_window(aligned: bool) -> Callable[[Dict[str, Any]], Tuple[int, int]]:
+    # 直近 period 本の値から計算。移動和を使う場合は period 本ごとのブロックに揃える
+    def window(params: Dict[str, Any]) -> Tuple[int, int]:
+        return params['period'] - 1, params['period'] if aligned else 1
+    return window
+
+
+def _ichimoku_window(params: Dict[str, Any]) -> Tuple[int, int]:
+    return max(params['tenkan'], params['kijun'], params['senkouB']) - 1, 1
+
+
+# インジケーター → 窓で計算するのに必要な (過去のバー数, 窓の先頭の揃え)
+# ATR は決済（risk.atrBased）と系列全体の値を共有するため含めません。WPR は値幅が0のバーで
+# 直前の値を引き継ぎますが、引き継ぎは窓の中に限られます（期間を超えて値幅が0の場合のみ系列全体と異なります）
+INDICATOR_WINDOWS: Dict[str, Callable[[Dict[str, Any]], Optional[Tuple[int, int]]]] = {
+    'MA': _ma_window,
+    'STDDEV': _ma_window,
+    'BB': _period_window(aligned=True),
+    'HIGHEST': _period_window(aligned=False),
+    'LOWEST': _period_window(aligned=False),
+    'WPR': _period_window(aligned=False),
+    'STOCH': _stochastic_window,
+    'ICHIMOKU': _ichimoku_window,
+}
+
+
+def indicator_window(indicator: str, params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """
+    インジケーターを系列の一部（窓）で計算するのに必要な過去のバー数と窓の先頭の揃え
+
+    バー i の値は、i - lookback 以前の alignment の倍数の位置から始まる窓で計算すると、
+    系列全体で計算した値と一致します（移動和は期間ごとのブロック単位の累積のため、
+    ブロックの境界を系列全体と揃えます）。
+
+    Returns:
+        (lookback, alignment)。漸化式で先頭から計算するインジケーター（EMA・SMMA、ADX、SAR）と ATR は None
+    """
+    window = INDICATOR_WINDOWS.get(indicator.upper())
+    return window(params) if window else None
+
+
+class IndicatorCache:
+    """(インジケーター, パラメーター, 適用価格, 時間軸) ごとに一度だけ計算するキャッシュ"""
+
+    def __init__(self, bars_by_timeframe: Mapping[str, Any]):
+        """
+        Args:
+            bars_by_timeframe: 時間軸 → バーデータ（ColumnarBars または構造化配列）
+        """
+        self.bars_by_timeframe = dict(bars_by_timeframe)
+        self._prices: Dict[Tuple[str, str], np.ndarray] = {}
+        self._extrema: Dict[Tuple[str, str, bool], RollingExtrema] = {}
+        self._values: Dict[IndicatorKey, Any] = {}
+        self._key_hits: Dict[IndicatorKey, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def price(self, timeframe: str, name: str) -> np.ndarray:
+        """
+        適用価格の系列（時間軸・適用価格ごとに一度だけ作成）
+
+        Raises:
+            KeyError: 時間軸のバーデータが無い場合
+            ValueError: サポートされていない適用価格の場合
+        """
+        key = (timeframe, name.upper())
+        if key not in self._prices:
+            values = applied_price(self.bars_by_timeframe[timeframe], name)
+            if values.flags.writeable:
+                values = values.view()
+                values.flags.writeable = False
+            self._prices[key] = values
+        return self._prices[key]
+
+    def extrema(self, timeframe: str, name: str, highest: bool) -> RollingExtrema:
+        """
+        適用価格の移動窓の最高値・最安値の表（時間軸・適用価格ごとに1つを全ての期間で共有）
+        """
+        key = (timeframe, name.upper(), highest)
+        if key not in self._extrema:
+            self._extrema[key] = RollingExtrema(self.price(timeframe, name), highest)
+        return self._extrema[key]
+
+    def get(self, indicator: str, timeframe: str, price: str = 'CLOSE', **params: Any) -> Any:
+        """
+        インジケーターの系列を取得（未計算の場合のみ計算）
+
+        Args:
+            indicator: インジケーター（INDICATOR_FUNCTIONS のキー）
+            timeframe: 時間軸
+            price: 適用価格
+            **params: インジケーターのパラメーター
+
+        Returns:
+            読み取り専用の配列、または配列のタプル
+
+        Raises:
+            ValueError: サポートされていないインジケーターの場合
+        """
+        key = make_key(indicator, timeframe, price, **params)
+        if key in self._values:
+            self.hits += 1
+            self._key_hits[key] += 1
+            return self._values[key]
+        function = INDICATOR_FUNCTIONS.get(key[0])
+        if function is None:
+            raise ValueError(f"サポートされていないインジケーター: {indicator}")
+        self.misses += 1
+        value = function(self, timeframe, key[2], dict(key[1]))
+        for array in value if isinstance(value, tuple) else (value,):
+            array.flags.writeable = False
+        self._values[key] = value
+        self._key_hits[key] = 0
+        return value
+
+    def prefetch(self, blocks: Iterable[Dict[str, Any]], timeframe: str) -> int:
+        """
+        設定JSONの blocks[] が使うインジケーターを計算
+
+        Args:
+            blocks: ブロック定義（typeId と params）
+            timeframe: 時間軸
+
+        Returns:
+            キャッシュへ要求したインジケーターの数（ヒットを含む）
+        """
+        requests = 0
+        for block in blocks:
+            for indicator, price, params in block_indicators(block):
+                self.get(indicator, timeframe, price, **params)
+                requests += 1
+        return requests
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        ヒット・ミスの統計
+
+        Returns:
+            hits, misses, entries と、キー名ごとのヒット数（keyHits）
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._values),
+            'keyHits': {key_name(key): count for key, count in self._key_hits.items()},
+        }
+
+    def format_stats(self) -> str:
+        """stats() を表示用に整形"""
+        requests = self.hits + self.misses
+        rate = self.hits / requests * 100 if requests else 0.0
+        return (
+            f"インジケーターキャッシュ: {requests} 回の要求、"
+            f"ヒット {self.hits} / ミス {self.misses}（ヒット率 {rate:.1f}%）"
+        )
+
+
+def _ma_relation(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('MA', 'CLOSE', {'period': int(params.get('period', 200)), 'method': params.get('maType', 'EMA')})]
+
+
+def _ma_cross(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    method = params.get('maMethod', 'EMA')
+    price = params.get('appliedPrice', 'CLOSE')
+    return [
+        ('MA', price, {'period': int(params.get('fastPeriod', 5)), 'method': method}),
+        ('MA', price, {'period': int(params.get('slowPeriod', 20)), 'method': method}),
+    ]
+
+
+def _bollinger(price_param: bool) -> Callable[[Dict[str, Any]], List[Tuple[str, str, Dict[str, Any]]]]:
+    def requests(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        price = params.get('appliedPrice', 'CLOSE') if price_param else 'CLOSE'
+        return [('BB', price, {
+            'period': int(params.get('period', 20)),
+            'deviation': float(params.get('deviation', 2.0)),
+        })]
+    return requests
+
+
+def _stddev_range(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('STDDEV', params.get('appliedPrice', 'CLOSE'), {
+        'period': int(params.get('maPeriod', 20)),
+        'method': params.get('maMethod', 'SMA'),
+    })]
+
+
+def _sar(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('SAR', 'CLOSE', {
+        'step': float(params.get('step', DEFAULT_SAR_STEP)),
+        'maximum': float(params.get('maximum', DEFAULT_SAR_MAXIMUM)),
+    })]
+
+
+def _atr_range(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('ATR', 'CLOSE', {'period': int(params.get('period', 14))})]
+
+
+def _adx_threshold(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('ADX', 'CLOSE', {'period': int(params.get('period', 14))})]
+
+
+def _ichimoku_cloud(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('ICHIMOKU', 'CLOSE', {
+        'tenkan': int(params.get('tenkan', 9)),
+        'kijun': int(params.get('kijun', 26)),
+        'senkouB': int(params.get('senkouB', 52)),
+    })]
+
+
+def _wpr_level(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [('WPR', 'CLOSE', {'period': int(params.get('period', 14))})]
+
+
+def _stoch_cross(params: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    # EAの CTriggerStochCross は EMA 以外を SMA、CLOSECLOSE 以外を LOWHIGH として扱う
+    return [('STOCH', 'CLOSE', {
+        'kPeriod': int(params.get('kPeriod', 5)),
+        'dPeriod': int(params.get('dPeriod', 3)),
+        'slowing': int(params.get('slowing', 3)),
+        'method': 'EMA' if str(params.get('maMethod', 'SMA')).upper() == 'EMA' else 'SMA',
+        'priceField': 'CLOSECLOSE' if str(params.get('priceField', 'LOWHIGH')).upper() == 'CLOSECLOSE' else 'LOWHIGH',
+    })]
+
+
+# ブロックのtypeId → 使用するインジケーター（EAの各ブロックと同じパラメーターの既定値）
+BLOCK_INDICATORS: Dict[str, Callable[[Dict[str, Any]], List[Tuple[str, str, Dict[str, Any]]]]] = {
+    'trend.maRelation': _ma_relation,
+    'trend.maCross': _ma_cross,
+    'trigger.bbReentry': _bollinger(price_param=False),
+    'trigger.bbBreakout': _bollinger(price_param=True),
+    'filter.volatility.stddevRange': _stddev_range,
+    'trend.sarDirection': _sar,
+    'trigger.sarFlip': _sar,
+    'filter.volatility.atrRange': _atr_range,
+    'trend.adxThreshold': _adx_threshold,
+    'trend.ichimokuCloud': _ichimoku_cloud,
+    'trigger.wprLevel': _wpr_level,
+    'trigger.stochCross': _stoch_cross,
+}
+
+
+def block_indicators(block: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    ブロックが使用するインジケーター
+
+    Returns:
+        (インジケーター, 適用価格, パラメーター) のリスト（インジケーターを使わないブロックは空）
+    """
+    requests = BLOCK_INDICATORS.get(block.get('typeId', ''))
+    return requests(block.get('params', {})) if requests else []
@@ -0,0 +1,291 @@
+"""
+Strategy Bricks インジケーター計算
+
+MT5の組み込みインジケーターと同じ値を、系列全体の配列として計算します。
+値が定まらない先頭のバー（ウォームアップ期間）は NaN です。
+
+各関数は価格配列を受け取り、同じ長さの配列を返します。同じ計算を何度も
+行わないよう、通常は IndicatorCache 経由で呼び出します。
+"""
+
+from typing import Any, Tuple
+
+import numpy as np
+
+from ma_kernels import ema, linear_recurrence, lwma, sliding_reduce, sma, smma
+from rolling_moments import deviation_from, rolling_moments
+
+# 適用価格（MT5の ENUM_APPLIED_PRICE に対応するバーの列、または列から求める価格）
+APPLIED_PRICES = ('CLOSE', 'OPEN', 'HIGH', 'LOW', 'MEDIAN', 'TYPICAL', 'WEIGHTED')
+
+# 移動平均の種類（MT5の ENUM_MA_METHOD）→ カーネル
+MA_KERNELS = {
+    'SMA': sma,
+    'EMA': ema,
+    'SMMA': smma,
+    'LWMA': lwma,
+}
+MA_METHODS = tuple(MA_KERNELS)
+
+
+def applied_price(bars: Any, name: str) -> np.ndarray:
+    """
+    適用価格の系列
+
+    MEDIAN は (高値 + 安値) / 2、TYPICAL は (高値 + 安値 + 終値) / 3、
+    WEIGHTED は (高値 + 安値 + 終値 × 2) / 4 です（MT5の PRICE_MEDIAN / PRICE_TYPICAL / PRICE_WEIGHTED）。
+    バー1本（構造化配列の要素など）を渡した場合はスカラーを返します。
+
+    Args:
+        bars: ColumnarBars または構造化配列
+        name: 適用価格（APPLIED_PRICES のいずれか、大文字小文字は無視）
+
+    Raises:
+        ValueError: サポートされていない適用価格の場合
+    """
+    key = name.upper()
+    if key not in APPLIED_PRICES:
+        raise ValueError(f"サポートされていない適用価格: {name}")
+    if key == 'MEDIAN':
+        return (np.asarray(bars['high'], dtype=np.float64) + bars['low']) / 2.0
+    if key == 'TYPICAL':
+        return (np.asarray(bars['high'], dtype=np.float64) + bars['low'] + bars['close']) / 3.0
+    if key == 'WEIGHTED':
+        return (np.asarray(bars['high'], dtype=np.float64) + bars['low'] + bars['close'] + bars['close']) / 4.0
+    return np.asarray(bars[key.lower()], dtype=np.float64)
+
+
+def moving_average(price: np.ndarray, period: int, method: str = 'SMA') -> np.ndarray:
+    """
+    移動平均（iMA）
+
+    EMAはMT5と同じく先頭のバーの価格を初期値とし、SMMAは先頭 period 本のSMAを初期値とします。
+    いずれも先頭 period - 1 本は NaN です。計算は ma_kernels のカーネルで、系列の長さに比例します。
+
+    Args:
+        price: 価格の系列
+        period: 期間
+        method: 移動平均の種類（MA_METHODS のいずれか、大文字小文字は無視）
+
+    Raises:
+        ValueError: 期間が1未満、またはサポートされていない種類の場合
+    """
+    if period < 1:
+        raise ValueError(f"移動平均の期間は1以上で指定してください: {period}")
+    kernel = MA_KERNELS.get(method.upper())
+    if kernel is None:
+        raise ValueError(f"サポートされていない移動平均の種類: {method}")
+    price = np.asarray(price, dtype=np.float64)
+    if len(price) < period:
+        return np.full(len(price), np.nan)
+    return kernel(price, period)
+
+
+def standard_deviation(price: np.ndarray, period: int, method: str = 'SMA') -> np.ndarray:
+    """
+    標準偏差（iStdDev）
+
+    直近 period 本の価格の、同じ期間の移動平均からの母標準偏差です。
+    窓の平均・母分散は rolling_moments で系列の長さに比例する計算量で求め、
+    基準がSMA以外の場合は (平均 - 基準)² を加えます。
+
+    Args:
+        price: 価格の系列
+        period: 期間
+        method: 基準とする移動平均の種類（MA_METHODS のいずれか）
+
+    Raises:
+        ValueError: 期間が1未満、またはサポートされていない種類の場合
+    """
+    if period < 1:
+        raise ValueError(f"標準偏差の期間は1以上で指定してください: {period}")
+    price = np.asarray(price, dtype=np.float64)
+    mean, variance = rolling_moments(price, period)
+    if method.upper() == 'SMA':
+        return np.sqrt(variance)
+    return deviation_from(mean, variance, moving_average(price, period, method))
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    真の値幅（高値・安値と前のバーの終値から求めた値幅、先頭のバーは高値 - 安値）
+
+    ATR と ADX が共有する中間の系列です（IndicatorCache の TR）。
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    values = high - low
+    if len(close) > 1:
+        values[1:] = np.maximum(high[1:], close[:-1]) - np.minimum(low[1:], close[:-1])
+    return values
+
+
+def directional_movement(high: np.ndarray, low: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    方向性の値動き（+DM, -DM）
+
+    高値の上昇幅と安値の下落幅の大きい方だけを残し（等しい場合は両方0）、先頭のバーは0です。
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    plus = np.zeros(len(high))
+    minus = np.zeros(len(high))
+    if len(high) > 1:
+        up = np.maximum(high[1:] - high[:-1], 0.0)
+        down = np.maximum(low[:-1] - low[1:], 0.0)
+        plus[1:] = np.where(up > down, up, 0.0)
+        minus[1:] = np.where(down > up, down, 0.0)
+    return plus, minus
+
+
+def average_true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """
+    ATR（iATR）
+
+    真の値幅（true_range）の単純移動平均です。
+
+    Args:
+        high: 高値の系列
+        low: 安値の系列
+        close: 終値の系列
+        period: 期間
+
+    Raises:
+        ValueError: 期間が1未満の場合
+    """
+    if period < 1:
+        raise ValueError(f"ATRの期間は1以上で指定してください: {period}")
+    return moving_average(true_range(high, low, close), period, 'SMA')
+
+
+def average_directional_index(
+    ranges: np.ndarray,
+    plus_dm: np.ndarray,
+    minus_dm: np.ndarray,
+    period: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ADX（iADX）
+
+    MT5の iADX と同じく、バーごとの 100 × ±DM / 真の値幅（真の値幅が0の場合は0）を
+    α = 2 / (期間 + 1) の指数平滑で ±DI とし、DX = 100 × |+DI - -DI| / (+DI + -DI) を
+    同じく指数平滑して ADX とします。平滑は先頭のバーの0から始めます。
+    ±DI は先頭 period 本、ADX は先頭 2 × period 本を NaN とします（MT5の描画開始位置）。
+
+    Args:
+        ranges: 真の値幅の系列（true_range）
+        plus_dm: +DM の系列（directional_movement）
+        minus_dm: -DM の系列
+        period: 期間
+
+    Returns:
+        (ADX, +DI, -DI)（MT5のバッファー順）
+
+    Raises:
+        ValueError: 期間が1未満の場合
+    """
+    if period < 1:
+        raise ValueError(f"ADXの期間は1以上で指定してください: {period}")
+    count = len(ranges)
+    alpha = 2.0 / (period + 1)
+    adx, plus_di, minus_di = np.zeros(count), np.zeros(count), np.zeros(count)
+    if count > 1:
+        ranges = np.asarray(ranges, dtype=np.float64)[1:]
+        defined = ranges != 0
+        divisor = np.where(defined, ranges, 1.0)
+        for smoothed, movement in ((plus_di, plus_dm), (minus_di, minus_dm)):
+            ratio = np.where(defined, 100.0 * np.asarray(movement, dtype=np.float64)[1:] / divisor, 0.0)
+            smoothed[1:] = linear_recurrence(alpha * ratio, 1.0 - alpha)
+        total = plus_di[1:] + minus_di[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dx = np.where(total != 0, 100.0 * np.abs(plus_di[1:] - minus_di[1:]) / total, 0.0)
+        adx[1:] = linear_recurrence(alpha * dx, 1.0 - alpha)
+    plus_di[:period] = np.nan
+    minus_di[:period] = np.nan
+    adx[:2 * period] = np.nan
+    return adx, plus_di, minus_di
+
+
+def williams_percent_range(highest: np.ndarray, lowest: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    ウィリアムズ%R（iWPR）
+
+    -100 × (期間の最高値 - 終値) / (期間の最高値 - 期間の最安値) です。最高値と最安値が
+    等しいバーはMT5と同じく前のバーの値を引き継ぎます。
+
+    Args:
+        highest: 直近 period 本の高値の最高値
+        lowest: 直近 period 本の安値の最安値
+        close: 終値の系列
+    """
+    price_range = highest - lowest
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(price_range != 0, -100.0 * (highest - close) / price_range, np.nan)
+    # 値が無いバーは直前の値を引き継ぐ（ウォームアップ期間は NaN のまま）
+    filled = np.where(np.isnan(values), -1, np.arange(len(values)))
+    np.maximum.accumulate(filled, out=filled)
+    return np.where(filled >= 0, values[np.maximum(filled, 0)], np.nan)
+
+
+def stochastic(
+    highest: np.ndarray,
+    lowest: np.ndarray,
+    close: np.ndarray,
+    d_period: int,
+    slowing: int,
+    method: str = 'SMA'
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ストキャスティクス（iStochastic）
+
+    メインは 100 × Σ(終値 - 最安値) / Σ(最高値 - 最安値)（直近 slowing 本の和、分母が0の場合は100）、
+    シグナルはメインの d_period 本の移動平均です。
+
+    Args:
+        highest: 直近 kPeriod 本の最高値（priceField が LOWHIGH なら高値、CLOSECLOSE なら終値）
+        lowest: 直近 kPeriod 本の最安値
+        close: 終値の系列
+        d_period: シグナルの期間
+        slowing: スローイング
+        method: シグナルの移動平均の種類
+
+    Returns:
+        (メイン, シグナル)
+    """
+    count = len(close)
+    main = np.full(count, np.nan)
+    signal = np.full(count, np.nan)
+    defined = np.flatnonzero(~np.isnan(lowest))
+    if len(defined) == 0 or count - defined[0] < slowing:
+        return main, signal
+    start = int(defined[0])
+    numerator = sliding_reduce(close[start:] - lowest[start:], slowing)
+    denominator = sliding_reduce(highest[start:] - lowest[start:], slowing)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        main[start + slowing - 1:] = np.where(denominator != 0, 100.0 * numerator / denominator, 100.0)
+    valid = start + slowing - 1
+    signal[valid:] = moving_average(main[valid:], d_period, method)
+    return main, signal
+
+
+def ichimoku_lines(
+    tenkan_range: Tuple[np.ndarray, np.ndarray],
+    kijun_range: Tuple[np.ndarray, np.ndarray],
+    senkou_range: Tuple[np.ndarray, np.ndarray]
+) -> Tuple[np.ndarray, ...]:
+    """
+    一目均衡表（iIchimoku）の転換線・基準線・先行スパンA・先行スパンB
+
+    各線は期間の (最高値 + 最安値) / 2、先行スパンAは (転換線 + 基準線) / 2 です。
+    先行スパンはMT5では基準線の期間だけ先にずらして表示されますが、ここでは
+    ずらす前の値を返します（バー i の先行スパンは値の位置 i - kijun、ブロックが位置をずらして参照）。
+
+    Args:
+        tenkan_range: 転換線の期間の (最高値, 最安値)
+        kijun_range: 基準線の期間の (最高値, 最安値)
+        senkou_range: 先行スパンBの期間の (最高値, 最安値)
+    """
+    tenkan = (tenkan_range[0] + tenkan_range[1]) / 2.0
+    kijun = (kijun_range[0] + kijun_range[1]) / 2.0
+    return (tenkan, kijun, (tenkan + kijun) / 2.0, (senkou_range[0] + senkou_range[1]) / 2.0)
@@ -0,0 +1,151 @@
+"""
+Strategy Bricks 移動平均のカーネル
+
+移動平均（SMA / EMA / SMMA / LWMA）を系列全体の配列演算として計算します。
+いずれも計算量は系列の長さに比例し、期間には依存しません。
+
+- SMA / LWMA: 系列を期間と同じ長さのブロックに分け、ブロック内の前方・後方の累積和から
+  窓の和を求めます（van Herk / Gil-Werman 法）。累積和がブロック内で閉じるため、
+  系列全体の累積和の差を取る方法と違い、系列が長くても桁落ちしません。
+  LWMA は価格の和と「ブロック内の位置 × 価格」の和の2つから重み付きの和を求めます。
+- EMA / SMMA: 漸化式 y[t] = u[t] + r × y[t - 1] を、r のべき乗を倍々にしながら
+  ずらして足し込む並列スキャン（Hillis-Steele）で求めます。r のべき乗が無視できる
+  大きさになった時点で打ち切るため、ずらす回数は期間の対数程度です。
+
+値が定まらない先頭のバー（ウォームアップ期間）は NaN です（indicators.moving_average と同じ）。
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+# 漸化式のスキャンを打ち切る係数（r のべき乗がこれ未満になったら以降の寄与は無視できる）
+RECURRENCE_CUTOFF = np.finfo(np.float64).eps * 2.0 ** -10
+
+
+def block_scans(values: np.ndarray, period: int, ufunc: np.ufunc = np.add) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    長さ period のブロックごとの前方・後方の累積
+
+    Args:
+        values: 系列
+        period: ブロックの長さ
+        ufunc: 累積する演算（np.add / np.maximum / np.minimum）
+
+    Returns:
+        (prefix, suffix)。prefix[i] はブロックの先頭から i まで、suffix[i] は i からブロックの末尾までの累積
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    blocks = -(-count // period)
+    padded = np.zeros(blocks * period)
+    padded[:count] = values
+    padded = padded.reshape(blocks, period)
+    prefix = ufunc.accumulate(padded, axis=1).ravel()[:count]
+    suffix = ufunc.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()[:count]
+    return prefix, suffix
+
+
+def sliding_reduce(values: np.ndarray, period: int, ufunc: np.ufunc = np.add) -> np.ndarray:
+    """
+    長さ period の窓ごとの累積（窓の和・最大値・最小値）
+
+    窓 [t - period + 1, t] は、開始位置のブロックの後方の累積と終了位置のブロックの
+    前方の累積の2つで求まります（開始位置がブロックの先頭の場合は前方の累積のみ）。
+    パディングした末尾は後方の累積でも参照しません。
+
+    Returns:
+        長さ len(values) - period + 1 の配列（sliding_window_view(values, period) の各窓に対応）
+    """
+    prefix, suffix = block_scans(values, period, ufunc)
+    count = len(prefix)
+    if count < period:
+        return np.empty(0)
+    result = prefix[period - 1:].copy()
+    starts = np.arange(count - period + 1)
+    partial = starts % period != 0
+    result[partial] = ufunc(suffix[starts[partial]], result[partial])
+    return result
+
+
+def linear_recurrence(inputs: np.ndarray, ratio: float, initial: float = 0.0) -> np.ndarray:
+    """
+    漸化式 y[t] = inputs[t] + ratio × y[t - 1]（y[-1] = initial）
+
+    Args:
+        inputs: 入力の系列
+        ratio: 前の値に掛ける係数（0 <= ratio < 1）
+        initial: 系列の直前の値
+
+    Returns:
+        inputs と同じ長さの配列
+    """
+    result = np.array(inputs, dtype=np.float64)
+    count = len(result)
+    if count == 0:
+        return result
+    result[0] += ratio * initial
+    step, factor = 1, float(ratio)
+    while step < count and factor >= RECURRENCE_CUTOFF:
+        result[step:] += factor * result[:-step]
+        factor *= factor
+        step *= 2
+    return result
+
+
+def _warmup(values: np.ndarray, count: int, period: int) -> np.ndarray:
+    """先頭 period - 1 本を NaN にして系列の長さに揃える"""
+    result = np.full(count, np.nan)
+    result[period - 1:] = values
+    return result
+
+
+def sma(price: np.ndarray, period: int) -> np.ndarray:
+    """単純移動平均（窓の和 / 期間）"""
+    price = np.asarray(price, dtype=np.float64)
+    return _warmup(sliding_reduce(price, period) / period, len(price), period)
+
+
+def ema(price: np.ndarray, period: int) -> np.ndarray:
+    """指数移動平均（α = 2 / (期間 + 1)、先頭のバーの価格を初期値とする）"""
+    price = np.asarray(price, dtype=np.float64)
+    alpha = 2.0 / (period + 1)
+    smoothed = np.empty(len(price))
+    smoothed[0] = price[0]
+    smoothed[1:] = linear_recurrence(price[1:] * alpha, 1.0 - alpha, price[0])
+    return _warmup(smoothed[period - 1:], len(price), period)
+
+
+def smma(price: np.ndarray, period: int) -> np.ndarray:
+    """平滑移動平均（先頭 period 本のSMAを初期値とし、以降は (前の値 × (期間 - 1) + 価格) / 期間）"""
+    price = np.asarray(price, dtype=np.float64)
+    first = sliding_reduce(price[:period], period)[0] / period
+    smoothed = np.empty(len(price) - period + 1)
+    smoothed[0] = first
+    smoothed[1:] = linear_recurrence(price[period:] / period, (period - 1) / period, first)
+    return _warmup(smoothed, len(price), period)
+
+
+def lwma(price: np.ndarray, period: int) -> np.ndarray:
+    """
+    線形加重移動平均（窓の古い順に重み 1, 2, ..., 期間）
+
+    窓 [s, t] の重みは i - s + 1 です。終了位置のブロック（先頭 B から t まで）では
+    (ブロック内の位置) + (期間 - t % 期間)、開始位置のブロックの残り（s から）では
+    (ブロック内の位置) - t % 期間 となるため、価格の和と「ブロック内の位置 × 価格」の和の
+    前方・後方の累積から求まります。
+    """
+    price = np.asarray(price, dtype=np.float64)
+    count = len(price)
+    offset = np.arange(count) % period
+    prefix_sum, suffix_sum = block_scans(price, period)
+    prefix_moment, suffix_moment = block_scans(offset * price, period)
+    ends = np.arange(period - 1, count)
+    starts = ends - period + 1
+    end_offset = offset[ends]
+    weighted = prefix_moment[ends] + (period - end_offset) * prefix_sum[ends]
+    partial = starts % period != 0
+    weighted[partial] += (
+        suffix_moment[starts[partial]] - end_offset[partial] * suffix_sum[starts[partial]]
+    )
+    return _warmup(weighted / (period * (period + 1) / 2.0), count, period)
@@ -0,0 +1,266 @@
+"""
+Strategy Bricks ナンピン（nanpin.fixed）のシミュレーション
+
+最初のエントリー価格から intervalPips ごとに不利な方向へ並べた価格（段）に
+価格が達するたびに追加エントリーし、全段をまとめたポジション（バスケット）を
+加重平均建値に対するSL/TPで一括決済します。
+
+    段 k の価格 = エントリー価格 - k × intervalPips（ショートは +）
+    TP = 加重平均建値 + TP幅（前のバーまでに約定した段で求める）
+    SL = 最後の段（maxCount）の価格 - SL幅（シリーズ損切り、全段が約定した後に達する）
+
+段の約定は高値・安値で判定し、始値が既に段を越えている場合は始値で約定します。
+同じバーで段とTPの両方に達した場合はTPで先に決済したものとし、その段は含みません。
+
+トレードごとの段は (トレード数, 段数 + 1) の配列（約定したバーの位置・約定価格・ロット）に
+保持し、加重平均建値は段ごとのロットと「ロット × 約定価格」の累積和から求めます。
+段 k は段 k - 1 が約定したバー以降だけを exit_resolver.first_hits で探索し、決済は
+段が約定したバーで区切った区間ごとに固定のSL/TPとして探索するため、計算量は
+保有期間の合計に比例します。段は最大の段数で一度だけ求め、段数を変えた決済
+（段数のスイープ）は同じ段から求めます。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from exit_resolver import DEFAULT_TIE_BREAK, EXIT_NONE, EXIT_TAKE_PROFIT, first_hits, pips_to_price
+
+# nanpin.fixed の既定値（EAの CNanpinFixed）
+DEFAULT_NANPIN_PARAMS = {
+    'intervalPips': 10.0,
+    'maxCount': 5,
+    'lotAdjustMethod': 0,
+    'fixedIncrement': 0.01,
+    'multiplier': 2,
+}
+
+# ロット調整方法（lotAdjustMethod）
+#   0: 固定（全段が最初のロット）
+#   1: 倍々（前の段のロット × multiplier）
+#   2: 初期ロット追加（最初のロット + 段数 × fixedIncrement）
+LOT_ADJUST_FIXED = 0
+LOT_ADJUST_DOUBLE = 1
+LOT_ADJUST_ADD_INITIAL = 2
+LOT_ADJUST_METHODS = (LOT_ADJUST_FIXED, LOT_ADJUST_DOUBLE, LOT_ADJUST_ADD_INITIAL)
+
+
+def leg_lots(params: Dict[str, Any], base_lots: float, depth: int) -> np.ndarray:
+    """
+    段ごとのロット
+
+    Args:
+        params: nanpin.fixed のパラメーター（省略した項目は DEFAULT_NANPIN_PARAMS）
+        base_lots: 最初のエントリーのロット
+        depth: 段数（追加エントリーの回数）
+
+    Returns:
+        長さ depth + 1 の配列（先頭は最初のエントリー）
+
+    Raises:
+        ValueError: サポートされていないロット調整方法の場合
+    """
+    params = {**DEFAULT_NANPIN_PARAMS, **params}
+    method = int(params['lotAdjustMethod'])
+    legs = np.arange(depth + 1)
+    if method == LOT_ADJUST_FIXED:
+        return np.full(depth + 1, float(base_lots))
+    if method == LOT_ADJUST_DOUBLE:
+        return base_lots * float(params['multiplier']) ** legs
+    if method == LOT_ADJUST_ADD_INITIAL:
+        return base_lots + legs * float(params['fixedIncrement'])
+    raise ValueError(f"サポートされていないロット調整方法: {method}（{', '.join(map(str, LOT_ADJUST_METHODS))}）")
+
+
+def nanpin_settings(
+    nanpin_model: Optional[Dict[str, Any]],
+    digits: int,
+    base_lots: float = 1.0
+) -> Optional[Tuple[float, int, np.ndarray]]:
+    """
+    nanpinModel からナンピンの設定を作成
+
+    Args:
+        nanpin_model: ストラテジーの nanpinModel（type と params）
+        digits: シンボルの桁数
+        base_lots: 最初のエントリーのロット
+
+    Returns:
+        (段の間隔（価格差）, 段数, 段ごとのロット)。nanpin.fixed 以外の場合None
+    """
+    nanpin_model = nanpin_model or {}
+    if nanpin_model.get('type') != 'nanpin.fixed':
+        return None
+    params = {**DEFAULT_NANPIN_PARAMS, **nanpin_model.get('params', {})}
+    depth = max(int(params['maxCount']), 0)
+    return pips_to_price(float(params['intervalPips']), digits), depth, leg_lots(params, base_lots, depth)
+
+
+def ladder_levels(entry_prices: np.ndarray, is_long: np.ndarray, interval: Any, depth: int) -> np.ndarray:
+    """
+    段の価格
+
+    Returns:
+        (トレード数, depth + 1) の配列（先頭の列はエントリー価格）
+    """
+    side = np.where(np.asarray(is_long, dtype=bool), 1.0, -1.0)
+    steps = np.asarray(interval, dtype=np.float64).reshape(-1, 1) * np.arange(depth + 1)
+    return np.asarray(entry_prices, dtype=np.float64)[:, None] - side[:, None] * steps
+
+
+class NanpinLadders:
+    """
+    トレードごとのナンピンの段（最大の段数まで）
+
+    leg_index / leg_price は段が約定したバーの位置と約定価格で、約定しない段は
+    位置がバー数、価格が NaN です。total_lots / average は段 0〜k が約定した場合の
+    合計ロットと加重平均建値です（段は順に約定するため、約定した段数で引けます）。
+    """
+
+    def __init__(
+        self,
+        open_: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        entries: np.ndarray,
+        is_long: np.ndarray,
+        entry_prices: np.ndarray,
+        interval: Any,
+        lots: np.ndarray,
+        max_depth: int,
+        end: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            open_: 始値の系列
+            high: 高値の系列
+            low: 安値の系列
+            entries: 最初のエントリーのバーの位置
+            is_long: ロングの場合 True
+            entry_prices: 最初のエントリー価格
+            interval: 段の間隔（価格差）
+            lots: 段ごとのロット（長さ max_depth + 1、またはトレードごとの2次元配列）
+            max_depth: 最大の段数
+            end: 段を探索する最後のバーの位置（省略時は系列の末尾）
+        """
+        self.open = np.asarray(open_, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        count = len(self.high)
+        self.entries = np.asarray(entries, dtype=np.int64)
+        self.is_long = np.asarray(is_long, dtype=bool)
+        self.max_depth = int(max_depth)
+        trades = len(self.entries)
+        self.end = np.full(trades, count - 1, dtype=np.int64) if end is None else np.minimum(end, count - 1)
+        self.levels = ladder_levels(entry_prices, self.is_long, interval, self.max_depth)
+
+        shape = (trades, self.max_depth + 1)
+        self.leg_index = np.full(shape, count, dtype=np.int64)
+        self.leg_price = np.full(shape, np.nan)
+        self.leg_lots = np.broadcast_to(np.asarray(lots, dtype=np.float64), shape).copy()
+        self.leg_index[:, 0] = self.entries
+        self.leg_price[:, 0] = self.levels[:, 0]
+        no_target = np.full(trades, np.nan)
+        for k in range(1, self.max_depth + 1):
+            rows = np.flatnonzero(self.leg_index[:, k - 1] < count)
+            if len(rows) == 0:
+                break
+            # 段 k - 1 が約定したバーから探索（最初の段はエントリーの次のバーから）
+            search_from = self.leg_index[rows, k - 1] - (1 if k > 1 else 0)
+            index, price, _ = first_hits(
+                self.open, self.high, self.low, search_from, self.is_long[rows],
+                self.levels[rows, k], no_target[rows], self.end[rows]
+            )
+            self.leg_index[rows, k] = index
+            self.leg_price[rows, k] = price
+
+        self.total_lots = np.cumsum(self.leg_lots, axis=1)
+        self.average = np.cumsum(self.leg_lots * self.leg_price, axis=1) / self.total_lots
+
+    def basket_stop(self, depth: int, stop_distance: Any) -> np.ndarray:
+        """段数 depth の場合のシリーズ損切りの価格（最後の段の価格 - SL幅）"""
+        side = np.where(self.is_long, 1.0, -1.0)
+        return self.levels[:, depth] - side * stop_distance
+
+    def exits(
+        self,
+        depth: int,
+        stop_distance: Any,
+        target_distance: Any,
+        tie_break: str = DEFAULT_TIE_BREAK,
+        end: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        段数 depth の場合に、最初にバスケットのSLまたはTPに達したバー
+
+        段が約定したバーで区切った区間ごとに、その区間のTP（前の区間までの加重平均建値
+        + TP幅）と固定のSLで exit_resolver.first_hits を評価し、最初に達した区間を採用します。
+
+        Args:
+            depth: 段数（max_depth 以下）
+            stop_distance: SL幅（価格差、NaN は判定しない）
+            target_distance: TP幅（価格差、NaN は判定しない）
+            tie_break: 同じバーでSLとTPの両方に達した場合の規則
+            end: 探索する最後のバーの位置（省略時は段を探索した範囲）
+
+        Returns:
+            (決済したバーの位置, 約定価格, 決済理由) の配列（first_hits と同じ形式）
+
+        Raises:
+            ValueError: depth が max_depth より大きい場合
+        """
+        if not 0 <= depth <= self.max_depth:
+            raise ValueError(f"段数は0〜{self.max_depth}で指定してください: {depth}")
+        trades = len(self.entries)
+        segments = depth + 1
+        last = self.end if end is None else np.minimum(end, self.end)
+        side = np.where(self.is_long, 1.0, -1.0)
+        stop = self.basket_stop(depth, stop_distance)
+        target = self.average[:, :segments] + (side * target_distance)[:, None]
+        # 区間 k は段 k が約定したバーの次のバーから、段 k + 1 が約定したバーまで
+        segment_end = np.empty((trades, segments), dtype=np.int64)
+        segment_end[:, :depth] = self.leg_index[:, 1:segments]
+        segment_end[:, depth] = last
+        segment_end = np.minimum(segment_end, last[:, None])
+
+        index, price, reason = first_hits(
+            self.open, self.high, self.low, self.leg_index[:, :segments].ravel(),
+            np.repeat(self.is_long, segments), np.repeat(stop, segments), target.ravel(),
+            segment_end.ravel(), tie_break
+        )
+        hit = (reason != EXIT_NONE).reshape(trades, segments)
+        first = np.arange(trades) * segments + np.argmax(hit, axis=1)
+        found = hit.any(axis=1)
+        return (
+            np.where(found, index[first], len(self.high)),
+            np.where(found, price[first], np.nan),
+            np.where(found, reason[first], EXIT_NONE).astype(np.int8),
+        )
+
+    def basket(
+        self,
+        depth: int,
+        exit_index: np.ndarray,
+        reason: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        決済したバーでのバスケット
+
+        決済したバーまでに約定した段を含めます。TPで決済したバーで約定した段は含みません。
+
+        Args:
+            depth: 段数
+            exit_index: 決済したバーの位置
+            reason: 決済理由
+
+        Returns:
+            (追加エントリーの回数, 合計ロット, 加重平均建値) の配列
+        """
+        legs_index = self.leg_index[:, 1:depth + 1]
+        exit_index = np.asarray(exit_index)[:, None]
+        included = (legs_index < exit_index) | (
+            (legs_index == exit_index) & (np.asarray(reason) != EXIT_TAKE_PROFIT)[:, None]
+        )
+        legs = included.sum(axis=1)
+        rows = np.arange(len(self.entries))
+        return legs, self.total_lots[rows, legs], self.average[rows, legs]
@@ -0,0 +1,194 @@
+"""
+Strategy Bricks パラボリックSARのカーネル
+
+パラボリックSAR（iSAR）は加速因子（AF）・極値（EP）・反転の状態を持つ漸化式のため、
+バーごとに前のバーの状態から計算します。系列全体を1回走査して、SAR の系列と
+トレンドの方向（ロングか）、方向が反転したバーの位置をまとめて返し、IndicatorCache が
+(step, maximum) ごとに一度だけ計算します。trend.sarDirection と trigger.sarFlip は
+同じ結果を共有します。
+
+計算規則（Wilder の定義）:
+    SAR[i] はバー i の間に有効な値（バー i - 1 までの価格から求める）
+    ロング: 安値 <= SAR で反転。継続時は高値が EP を超えたら EP を更新し AF += step（上限 maximum）
+            次のSAR = SAR + AF × (EP - SAR)。ただし直近2本の安値を超えない
+    反転したバーの SAR は前のトレンドの EP（直近2本の高値・安値で制限）、AF は step、EP は反転したバーの安値/高値
+    ショートは高値・安値を入れ替えた対称の規則
+    最初の方向は先頭2本の値動き（+DM と -DM の大きい方）で決め、先頭のバーは NaN
+
+走査は配列の要素ではなく Python の float で行うため、1本あたりの処理は1マイクロ秒未満です
+（M1の数百万本でも1組の (step, maximum) あたり1秒程度）。
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+# trend.sarDirection / trigger.sarFlip の既定値（EAの各ブロック）
+DEFAULT_SAR_STEP = 0.02
+DEFAULT_SAR_MAXIMUM = 0.2
+
+
+def parabolic_sar(
+    high: np.ndarray,
+    low: np.ndarray,
+    step: float = DEFAULT_SAR_STEP,
+    maximum: float = DEFAULT_SAR_MAXIMUM
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    パラボリックSAR
+
+    Args:
+        high: 高値の系列
+        low: 安値の系列
+        step: AFの増分（初期値）
+        maximum: AFの上限
+
+    Returns:
+        (SAR, ロングの場合 True, 方向が反転したバーの位置)。
+        SAR と方向は high と同じ長さで、先頭のバー（2本未満の場合はすべて）は NaN / False
+
+    Raises:
+        ValueError: step または maximum が正でない場合
+    """
+    if step <= 0 or maximum <= 0:
+        raise ValueError(f"SARの step と maximum は正の値で指定してください: step={step}, maximum={maximum}")
+    highs: List[float] = np.asarray(high, dtype=np.float64).tolist()
+    lows: List[float] = np.asarray(low, dtype=np.float64).tolist()
+    count = len(highs)
+    sar_values = [np.nan] * count
+    directions = [False] * count
+    if count < 2:
+        return np.array(sar_values), np.array(directions, dtype=bool), np.empty(0, dtype=np.int64)
+
+    long, sar, extreme, af = initial_sar_state(highs[0], lows[0], highs[1], lows[1], step)
+    previous_high, previous_low = highs[0], lows[0]
+    # 組み込みの max / min より比較の方が速いため、制限は if で書く
+    for i in range(1, count):
+        bar_high = highs[i]
+        bar_low = lows[i]
+        if long:
+            if bar_low <= sar:
+                # ショートへ反転: 前のトレンドの EP から
+                long = False
+                sar = extreme
+                if sar < previous_high:
+                    sar = previous_high
+                if sar < bar_high:
+                    sar = bar_high
+                sar_values[i] = sar
+                af = step
+                extreme = bar_low
+                sar += af * (extreme - sar)
+                if sar < previous_high:
+                    sar = previous_high
+                if sar < bar_high:
+                    sar = bar_high
+            else:
+                sar_values[i] = sar
+                if bar_high > extreme:
+                    extreme = bar_high
+                    af += step
+                    if af > maximum:
+                        af = maximum
+                sar += af * (extreme - sar)
+                if sar > previous_low:
+                    sar = previous_low
+                if sar > bar_low:
+                    sar = bar_low
+        else:
+            if bar_high >= sar:
+                # ロングへ反転
+                long = True
+                sar = extreme
+                if sar > previous_low:
+                    sar = previous_low
+                if sar > bar_low:
+                    sar = bar_low
+                sar_values[i] = sar
+                af = step
+                extreme = bar_high
+                sar += af * (extreme - sar)
+                if sar > previous_low:
+                    sar = previous_low
+                if sar > bar_low:
+                    sar = bar_low
+            else:
+                sar_values[i] = sar
+                if bar_low < extreme:
+                    extreme = bar_low
+                    af += step
+                    if af > maximum:
+                        af = maximum
+                sar += af * (extreme - sar)
+                if sar < previous_high:
+                    sar = previous_high
+                if sar < bar_high:
+                    sar = bar_high
+        directions[i] = long
+        previous_high = bar_high
+        previous_low = bar_low
+
+    is_long = np.array(directions, dtype=bool)
+    flips = np.flatnonzero(is_long[2:] != is_long[1:-1]) + 2
+    return np.array(sar_values), is_long, flips
+
+
+def sar_step(
+    state: Tuple[bool, float, float, float],
+    previous_high: float,
+    previous_low: float,
+    bar_high: float,
+    bar_low: float,
+    step: float,
+    maximum: float
+) -> Tuple[float, Tuple[bool, float, float, float]]:
+    """
+    バー1本分のSARの更新（parabolic_sar のループと同じ規則、ストリーミング用）
+
+    parabolic_sar は速度のためこの関数を呼ばずに同じ処理をループ内に展開しています。
+
+    Args:
+        state: (ロングか, 次のバーのSAR, EP, AF)
+        previous_high: 1本前のバーの高値
+        previous_low: 1本前のバーの安値
+        bar_high: バーの高値
+        bar_low: バーの安値
+        step: AFの増分
+        maximum: AFの上限
+
+    Returns:
+        (バーで有効なSAR, 更新した状態)
+    """
+    long, sar, extreme, af = state
+    if long and bar_low <= sar:
+        value = max(extreme, previous_high, bar_high)
+        long, af, extreme = False, step, bar_low
+        sar = max(value + af * (extreme - value), previous_high, bar_high)
+    elif not long and bar_high >= sar:
+        value = min(extreme, previous_low, bar_low)
+        long, af, extreme = True, step, bar_high
+        sar = min(value + af * (extreme - value), previous_low, bar_low)
+    elif long:
+        value = sar
+        if bar_high > extreme:
+            extreme, af = bar_high, min(af + step, maximum)
+        sar = min(sar + af * (extreme - sar), previous_low, bar_low)
+    else:
+        value = sar
+        if bar_low < extreme:
+            extreme, af = bar_low, min(af + step, maximum)
+        sar = max(sar + af * (extreme - sar), previous_high, bar_high)
+    return value, (long, sar, extreme, af)
+
+
+def initial_sar_state(
+    first_high: float,
+    first_low: float,
+    second_high: float,
+    second_low: float,
+    step: float
+) -> Tuple[bool, float, float, float]:
+    """先頭2本の値動きから決める最初の状態 (ロングか, SAR, EP, AF)"""
+    down = first_low - second_low
+    long = not (down > 0 and down > second_high - first_high)
+    return (long, first_low, first_high, step) if long else (long, first_high, first_low, step)
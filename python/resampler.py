@@ -0,0 +1,61 @@
+"""
+Strategy Bricks バーのリサンプラー
+
+M1バーから上位時間軸（M5/M15/M30/H1/H4/D1）のバーを作成します。
+バーの時刻を時間軸の秒数で切り捨てたバケットの境界を求め、
+np.ufunc.reduceat によるセグメント集約で一括計算します（バーごとのループ無し）。
+
+集約規則（MT5の上位足と同じ）:
+    open: バケット内の最初のバーのopen
+    high/low: 最大/最小
+    close: 最後のバーのclose
+    tick_volume/real_volume: 合計
+    spread: 最小
+"""
+
+from typing import Any
+
+import numpy as np
+
+from bar_store import RATE_COLUMNS, RATE_DTYPES, TIMEFRAME_SECONDS, ColumnarBars
+
+
+def bucket_start(timestamp: int, timeframe_seconds: int) -> int:
+    """時刻を含むバケットの開始時刻（UTCエポック秒）"""
+    return timestamp // timeframe_seconds * timeframe_seconds
+
+
+def resample_bars(bars: Any, timeframe: str) -> ColumnarBars:
+    """
+    バーを上位時間軸へリサンプル
+
+    Args:
+        bars: time昇順のバー（ColumnarBarsまたは構造化配列）
+        timeframe: 出力する時間軸（例: H1）
+
+    Returns:
+        リサンプルしたバー（列はMT5のレート配列と同じ）
+    """
+    bars = ColumnarBars.wrap(bars)
+    if len(bars) == 0:
+        return ColumnarBars({name: np.empty(0, dtype=RATE_DTYPES[name]) for name in RATE_COLUMNS})
+
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    times = np.asarray(bars['time'], dtype=np.int64)
+    bucket = times // seconds * seconds
+    starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    ends = np.append(starts[1:], len(bucket)) - 1
+
+    columns = {
+        'time': bucket[starts],
+        'open': np.asarray(bars['open'])[starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': np.asarray(bars['close'])[ends],
+        'tick_volume': np.add.reduceat(bars['tick_volume'], starts),
+        'spread': np.minimum.reduceat(bars['spread'], starts),
+        'real_volume': np.add.reduceat(bars['real_volume'], starts),
+    }
+    return ColumnarBars({
+        name: np.asarray(columns[name], dtype=RATE_DTYPES[name]) for name in RATE_COLUMNS
+    })
@@ -0,0 +1,62 @@
+"""
+Strategy Bricks 移動窓の最高値・最安値
+
+一目均衡表（転換線・基準線・先行スパン）、ウィリアムズ%R、ストキャスティクスが使う
+直近 period 本の最高値・最安値を、スパーステーブルで求めます。
+
+スパーステーブルの段 j は「位置 i から 2^j 本」の最大値（最小値）の配列で、
+段 j は段 j - 1 の2つの区間を1回の配列演算で合わせて作ります。長さ period の窓は
+2^j <= period となる段の、窓の先頭から始まる区間と末尾で終わる区間の2つで覆えるため、
+どの期間も1回の配列演算で求まります。段は要求された最大の期間まで必要になった時点で追加し、
+同じ系列（時間軸・適用価格ごと）の表を1回の実行の全ての期間で共有します
+（IndicatorCache.extrema）。
+"""
+
+from typing import List
+
+import numpy as np
+
+
+class RollingExtrema:
+    """1つの系列の移動窓の最高値（または最安値）を求めるスパーステーブル"""
+
+    def __init__(self, values: np.ndarray, highest: bool):
+        """
+        Args:
+            values: 価格の系列
+            highest: 最高値の場合 True、最安値の場合 False
+        """
+        self.ufunc = np.maximum if highest else np.minimum
+        self.levels: List[np.ndarray] = [np.asarray(values, dtype=np.float64)]
+
+    def level(self, depth: int) -> np.ndarray:
+        """段 depth（位置 i から 2^depth 本の最高値・最安値、長さは系列の長さ - 2^depth + 1）"""
+        while len(self.levels) <= depth:
+            previous = self.levels[-1]
+            half = 1 << (len(self.levels) - 1)
+            self.levels.append(self.ufunc(previous[:len(previous) - half], previous[half:]))
+        return self.levels[depth]
+
+    def window(self, period: int) -> np.ndarray:
+        """
+        直近 period 本の最高値・最安値
+
+        Returns:
+            系列と同じ長さの配列（先頭 period - 1 本は NaN）
+
+        Raises:
+            ValueError: 期間が1未満の場合
+        """
+        if period < 1:
+            raise ValueError(f"期間は1以上で指定してください: {period}")
+        count = len(self.levels[0])
+        result = np.full(count, np.nan)
+        if count < period:
+            return result
+        depth = period.bit_length() - 1
+        table = self.level(depth)
+        windows = count - period + 1
+        # 窓 [s, s + period - 1] = 先頭から 2^depth 本と、末尾で終わる 2^depth 本
+        offset = period - (1 << depth)
+        result[period - 1:] = self.ufunc(table[:windows], table[offset:offset + windows])
+        return result
@@ -0,0 +1,94 @@
+"""
+Strategy Bricks 移動窓の平均・分散のカーネル
+
+ボリンジャーバンド（iBands）と標準偏差（iStdDev）が使う、直近 period 本の価格の
+平均と母分散を系列全体の配列演算として計算します。計算量は系列の長さに比例します。
+
+系列を期間と同じ長さのブロックに分け（ma_kernels.block_scans）、ブロックごとに
+先頭の価格を基準（アンカー）としてずらした価格の和・二乗和を前方・後方に累積します。
+窓は「開始位置のブロックの残り」と「終了位置のブロックの先頭から」の2つに分かれるため、
+それぞれの件数・平均・偏差平方和を求め、2つの集団の分散を合成する式（Chan の並列版
+Welford 法）で窓の分散にします。基準がブロックごとに付け直されるため、価格の大きさや
+系列の長さによる桁落ちがありません。
+
+バンドは平均と標準偏差から deviation ごとに求めるだけなので、同じ期間で deviation を
+変えたバンドは同じモーメントを共有します（IndicatorCache の BB は STDDEV / MA を再利用します）。
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+from ma_kernels import block_scans
+
+
+def rolling_moments(price: np.ndarray, period: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    直近 period 本の価格の平均と母分散
+
+    Args:
+        price: 価格の系列
+        period: 期間
+
+    Returns:
+        (平均, 母分散)。price と同じ長さで、先頭 period - 1 本は NaN
+
+    Raises:
+        ValueError: 期間が1未満の場合
+    """
+    if period < 1:
+        raise ValueError(f"期間は1以上で指定してください: {period}")
+    price = np.asarray(price, dtype=np.float64)
+    count = len(price)
+    mean = np.full(count, np.nan)
+    variance = np.full(count, np.nan)
+    if count < period:
+        return mean, variance
+
+    # ブロックの先頭の価格を基準にずらす
+    anchor = np.repeat(price[::period], period)[:count]
+    shifted = price - anchor
+    prefix_sum, suffix_sum = block_scans(shifted, period)
+    prefix_squares, suffix_squares = block_scans(shifted * shifted, period)
+
+    # 終了位置のブロックの先頭から終了位置まで
+    ends = np.arange(period - 1, count)
+    tail_count = ends % period + 1
+    tail_sum = prefix_sum[ends]
+    tail_mean = anchor[ends] + tail_sum / tail_count
+    tail_m2 = prefix_squares[ends] - tail_sum * tail_sum / tail_count
+    window_mean = tail_mean.copy()
+    window_m2 = tail_m2.copy()
+
+    # 開始位置のブロックの残り（開始位置がブロックの先頭の場合は無い）
+    starts = ends - period + 1
+    partial = np.flatnonzero(starts % period != 0)
+    head = starts[partial]
+    head_count = period - tail_count[partial]
+    head_sum = suffix_sum[head]
+    head_mean = anchor[head] + head_sum / head_count
+    head_m2 = suffix_squares[head] - head_sum * head_sum / head_count
+    delta = tail_mean[partial] - head_mean
+    window_mean[partial] = head_mean + delta * tail_count[partial] / period
+    window_m2[partial] = head_m2 + tail_m2[partial] + delta * delta * head_count * tail_count[partial] / period
+
+    mean[period - 1:] = window_mean
+    variance[period - 1:] = np.maximum(window_m2, 0.0) / period
+    return mean, variance
+
+
+def deviation_from(mean: np.ndarray, variance: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """
+    窓の価格の center からの二乗平均平方根
+
+    Σ(x - center)² / n = 母分散 + (平均 - center)² のため、窓をもう一度走査せずに求まります
+    （iStdDev の基準の移動平均が SMA 以外の場合）。
+    """
+    offset = mean - center
+    return np.sqrt(variance + offset * offset)
+
+
+def bands(middle: np.ndarray, deviation_series: np.ndarray, deviation: float) -> Tuple[np.ndarray, ...]:
+    """ボリンジャーバンドの (中心線, 上限, 下限)（中心線 ± deviation × 標準偏差）"""
+    width = deviation * deviation_series
+    return (middle, middle + width, middle - width)
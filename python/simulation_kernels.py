@@ -0,0 +1,122 @@
+"""
+Strategy Bricks シミュレーションカーネル
+
+simulate_strategy のベクトル化モードが使用する、系列全体に対する配列演算です。
+シグナルはバーごとの真偽値配列として計算し、ポジションの状態遷移は
+「次に条件を満たすバー」の索引をたどることでトレード数に比例する手数で求めます
+（バーごとのPythonループ無し）。
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+from ma_kernels import sma
+
+
+def next_true_index(mask: np.ndarray) -> np.ndarray:
+    """
+    各位置以降で最初に True となる位置
+
+    Args:
+        mask: 真偽値配列（長さ n）
+
+    Returns:
+        長さ n + 1 の配列。result[i] は i 以降の最初の True の位置（無い場合は n）
+    """
+    count = len(mask)
+    positions = np.where(mask, np.arange(count), count)
+    result = np.empty(count + 1, dtype=np.int64)
+    result[count] = count
+    result[:count] = np.minimum.accumulate(positions[::-1])[::-1]
+    return result
+
+
+def prior_mean(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    各バーの直前 period 本（当該バーを含まない）の平均
+
+    ma_kernels.sma（系列の長さに比例）を1本ずらした値です。値動きの無い窓は
+    check_entry_signal の values[index - period:index].mean() と同じく窓の値そのものとし、
+    丸め誤差で終値と平均の大小が入れ替わらないようにします。
+
+    Returns:
+        長さ n の配列（先頭 period 本は NaN）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    result = np.full(count, np.nan)
+    if count > period:
+        result[period:] = sma(values, period)[period - 1:-1]
+        # 窓の中の値の変化の回数（整数の累積和の差）が0の窓は値動きが無い
+        changes = np.concatenate(([0], np.cumsum(values[1:] != values[:-1])))
+        ends = np.arange(period, count)
+        flat = changes[ends - 1] == changes[ends - period]
+        result[ends[flat]] = values[ends[flat] - 1]
+    return result
+
+
+def pair_entries_exits(entry: np.ndarray, exit: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    同時に1ポジションのみ保有する場合のエントリー・エグジット位置
+
+    ポジションが無いバーでは entry を、保有中はエントリーの次のバー以降で exit を評価し、
+    エグジットしたバーでは再エントリーしません（simulate_strategy のループと同じ規則）。
+    期間末までエグジットしなかったポジションは含みません。
+
+    Args:
+        entry: エントリーシグナルの真偽値配列
+        exit: エグジットシグナルの真偽値配列
+
+    Returns:
+        (エントリー位置, エグジット位置) の配列
+    """
+    return chain_trades(entry, next_true_index(exit)[1:])
+
+
+def chain_trades(entry: np.ndarray, exit_index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    エントリーしたバーごとのエグジット位置から、同時に1ポジションのみ保有するトレードを求める
+
+    エントリー候補のバーごとに「エグジットした後の次のエントリー候補」を後続とし、
+    先頭の候補から後続をたどった列がトレードになります。後続の表を2倍の歩幅に
+    合成しながら（ポインタジャンプ）たどった候補の集合を広げるため、
+    Pythonの処理はトレード数ではなくその対数の回数の配列演算です。
+
+    Args:
+        entry: エントリーシグナルの真偽値配列（長さ n）
+        exit_index: バー i でエントリーした場合のエグジット位置（n 以上はエグジット無し）。
+                    entry が True のバーの値のみ参照します
+
+    Returns:
+        (エントリー位置, エグジット位置) の配列
+    """
+    count = len(entry)
+    candidates = np.flatnonzero(entry)
+    total = len(candidates)
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    exits = np.asarray(exit_index, dtype=np.int64)[candidates]
+    closed = exits < count
+    # 後続の候補の番号（total は「続きが無い」番兵、エグジットしない候補で列は終わる）
+    following = next_true_index(entry)[np.where(closed, exits, count - 1) + 1]
+    jump = np.append(np.where(closed, np.searchsorted(candidates, following), total), total)
+    visited = np.zeros(total + 1, dtype=bool)
+    visited[0] = True
+    # visited は先頭から 2^k 手以内にたどる候補。jump は 2^k 手先への表
+    while True:
+        reached = visited.copy()
+        reached[jump[visited]] = True
+        if np.array_equal(reached, visited):
+            break
+        visited = reached
+        jump = jump[jump]
+    selected = candidates[visited[:total] & closed]
+    return selected.astype(np.int64), np.asarray(exit_index, dtype=np.int64)[selected]
+
+
+def epoch_to_iso(times: np.ndarray) -> np.ndarray:
+    """UTCエポック秒を datetime.isoformat() と同じ形式（+00:00 付き）の文字列に変換"""
+    text = np.datetime_as_string(np.asarray(times, dtype='datetime64[s]'), unit='s')
+    return np.char.add(text, '+00:00')
@@ -0,0 +1,170 @@
+"""
+Strategy Bricks ストラテジー間の調停
+
+EAの CStrategyEngine（SortStrategies / EvaluateStrategies）と同じ規則で、
+複数のストラテジーのうちどれを採用するかを決めます:
+
+- 有効なストラテジーを priority の降順（同じ priority は設定の順）で評価
+- entryRequirement が成立しても方向が directionPolicy に合わない場合は採用しない
+- conflictPolicy が firstOnly のストラテジーを採用したバーでは、それより後の
+  ストラテジーを評価しない（all / bestScore は後続のストラテジーを妨げない）
+
+EAはバーごとにこの順で評価しますが、ここでは各ストラテジーのシグナルを系列全体で
+一度ずつ計算し、「それより優先のストラテジーが firstOnly で採用済み」のマスクを
+priority順に累積して全バーを一括で調停します。ブロックのシグナルは全ストラテジーで共有します。
+EvaluationPlanner を渡した場合は、各ストラテジーの entryRequirement を globalGuards が許可し、
+かつ優先のストラテジーが採用していないバーだけで遅延評価します。
+
+方向が NEUTRAL のまま採用されたストラテジー（directionPolicy が both の場合）は、
+後続のストラテジーを妨げますがエントリーは行いません。
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from composite_evaluator import (
+    DIRECTION_LONG,
+    DIRECTION_NEUTRAL,
+    DIRECTION_SHORT,
+    BlockSignal,
+    CompositeEvaluator,
+)
+from evaluation_planner import EvaluationPlanner
+
+# conflictPolicy（EAの ConflictPolicy）
+CONFLICT_POLICIES = ('firstOnly', 'bestScore', 'all')
+
+# directionPolicy → 採用する方向（EAの CheckDirectionPolicy）
+DIRECTION_POLICIES = {
+    'longOnly': (DIRECTION_LONG,),
+    'shortOnly': (DIRECTION_SHORT,),
+    'both': (DIRECTION_LONG, DIRECTION_SHORT, DIRECTION_NEUTRAL),
+}
+
+
+def sort_strategies(strategies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """有効なストラテジーを priority の降順に並べる（同じ priority は設定の順）"""
+    enabled = [s for s in strategies if s.get('enabled', True)]
+    return sorted(enabled, key=lambda s: -s.get('priority', 0))
+
+
+def strategy_policy(strategy: Dict[str, Any]) -> Tuple[Tuple[int, ...], bool]:
+    """
+    ストラテジーの調停規則
+
+    Returns:
+        (採用する方向, 採用したバーで後続のストラテジーを評価しないか)
+
+    Raises:
+        ValueError: サポートされていない conflictPolicy / directionPolicy の場合
+    """
+    conflict = strategy.get('conflictPolicy', 'firstOnly')
+    policy = strategy.get('directionPolicy', 'both')
+    if conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"サポートされていない conflictPolicy: {strategy['id']} ({conflict})")
+    if policy not in DIRECTION_POLICIES:
+        raise ValueError(f"サポートされていない directionPolicy: {strategy['id']} ({policy})")
+    return DIRECTION_POLICIES[policy], conflict == 'firstOnly'
+
+
+class StrategyArbitration:
+    """全バーの調停結果"""
+
+    def __init__(self, strategy_ids: List[str], adopted: np.ndarray, direction: np.ndarray):
+        """
+        Args:
+            strategy_ids: 評価順（priority の降順）のストラテジーid
+            adopted: (ストラテジー数, バー数) の採用の真偽値配列
+            direction: (ストラテジー数, バー数) の方向の配列
+        """
+        self.strategy_ids = strategy_ids
+        self.adopted = adopted
+        self.direction = direction
+        self._first_entry: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._entry_signals: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def entries(self, strategy_id: str) -> np.ndarray:
+        """ストラテジーが採用されたバー（方向が NEUTRAL のバーを除く）"""
+        row = self.strategy_ids.index(strategy_id)
+        return self.adopted[row] & (self.direction[row] != DIRECTION_NEUTRAL)
+
+    def first_entry(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        バーごとに最も優先度の高い、エントリーするストラテジー
+
+        Returns:
+            (ストラテジーの位置の配列（無い場合は -1）, 方向の配列)
+        """
+        if self._first_entry is None:
+            entering = self.adopted & (self.direction != DIRECTION_NEUTRAL)
+            length = entering.shape[1]
+            if len(self.strategy_ids) == 0:
+                position = np.full(length, -1, dtype=np.int64)
+                direction = np.full(length, DIRECTION_NEUTRAL, dtype=np.int8)
+            else:
+                first = np.argmax(entering, axis=0)
+                found = entering[first, np.arange(length)]
+                position = np.where(found, first, -1)
+                direction = np.where(found, self.direction[first, np.arange(length)], DIRECTION_NEUTRAL)
+            self._first_entry = (position, direction.astype(np.int8))
+        return self._first_entry
+
+    def entry_signals(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        単一ポジションのシミュレーション用のエントリーシグナル（最も優先度の高いストラテジーの方向）
+
+        Returns:
+            (BUY, SELL) の真偽値配列
+        """
+        if self._entry_signals is None:
+            _, direction = self.first_entry()
+            self._entry_signals = (direction == DIRECTION_LONG, direction == DIRECTION_SHORT)
+        return self._entry_signals
+
+
+def arbitrate(
+    config: Dict[str, Any],
+    signals: Optional[Mapping[str, BlockSignal]],
+    length: int,
+    evaluator: Optional[CompositeEvaluator] = None,
+    guard: Optional[np.ndarray] = None,
+    planner: Optional[EvaluationPlanner] = None
+) -> StrategyArbitration:
+    """
+    全ストラテジーを一括で評価して調停
+
+    Args:
+        config: ストラテジー設定JSON
+        signals: ブロックidごとの評価結果（evaluator.block_ids() の全ブロック、planner を渡す場合は不要）
+        length: バー数
+        evaluator: コンパイル済みの CompositeEvaluator（省略時は config から作成）
+        guard: 全ストラテジーの評価を許可するバー（globalGuards のマスク、省略時はすべてのバー）
+        planner: 条件を遅延評価するプランナー（省略時は signals で一括評価）
+
+    Raises:
+        ValueError: サポートされていない conflictPolicy / directionPolicy の場合
+    """
+    evaluator = evaluator if evaluator is not None else CompositeEvaluator(config)
+    strategies = sort_strategies(config.get('strategies', []))
+    adopted = np.zeros((len(strategies), length), dtype=bool)
+    direction = np.full((len(strategies), length), DIRECTION_NEUTRAL, dtype=np.int8)
+    # それより優先の firstOnly ストラテジーが採用済みのバー
+    claimed = np.zeros(length, dtype=bool)
+    for row, strategy in enumerate(strategies):
+        directions, first_only = strategy_policy(strategy)
+        requirement = evaluator.requirements[strategy['id']]
+        if planner is not None:
+            # 採用され得ないバー（ガード外・採用済み）では条件を評価しない
+            candidates = ~claimed if guard is None else guard & ~claimed
+            matched, strategy_direction = planner.evaluate(requirement, candidates)
+        else:
+            matched, strategy_direction = requirement.evaluate(signals, length)
+            if guard is not None:
+                matched = matched & guard
+        allowed = np.isin(strategy_direction, directions)
+        adopted[row] = matched & allowed & ~claimed
+        direction[row] = np.where(adopted[row], strategy_direction, DIRECTION_NEUTRAL)
+        if first_only:
+            claimed |= adopted[row]
+    return StrategyArbitration([s['id'] for s in strategies], adopted, direction)
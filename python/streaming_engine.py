@@ -0,0 +1,831 @@
+"""
+Strategy Bricks ストリーミングエンジン
+
+フォワードテストやライブリプレイ用に、確定したバーを1本ずつ受け取って
+エントリーシグナルを返すエンジンです。設定JSONの形式とブロックの判定は
+バッチ評価（composite_evaluator / block_kernels）と同じです。
+
+インジケーターは定数時間で更新できる状態（移動和、EMAの累積値、
+高値・安値の単調デック）を持ち、新しいバー1本の処理は過去のバー数に依存せず、
+インジケーター数とブロック数に比例します。同じパラメーターのインジケーターは
+IndicatorCache と同じキーで1つの状態を共有します。
+
+使用方法:
+    engine = StreamingEngine.from_file('strategy.json', timeframe='M1', digits=3)
+    for bar in bars:
+        for signal in engine.on_bar(bar):
+            print(signal['strategyId'], signal['type'])
+"""
+
+import json
+import math
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Tuple
+
+from block_kernels import (
+    DEFAULT_DIGITS,
+    DEFAULT_MAX_ATR,
+    DEFAULT_MAX_SPREAD_PIPS,
+    DEFAULT_MAX_STDDEV,
+    DEFAULT_MIN_ADX,
+    spread_pips,
+)
+from composite_evaluator import (
+    DIRECTION_LONG,
+    DIRECTION_NEUTRAL,
+    DIRECTION_SHORT,
+    CompositeEvaluator,
+    RequirementExpression,
+)
+from global_guards import GlobalGuards
+from indicator_cache import IndicatorKey, block_indicators, make_key
+from indicators import applied_price
+from parabolic_sar import initial_sar_state, sar_step
+from strategy_arbitration import sort_strategies, strategy_policy
+
+# ブロックの評価結果（成立, 方向）
+BlockResult = Tuple[bool, int]
+
+NAN = float('nan')
+
+
+class StreamSMA:
+    """単純移動平均の移動和（period 本ごとに窓の合計を計算し直して誤差の蓄積を防ぐ）"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window: Deque[float] = deque()
+        self.total = 0.0
+        self.updates = 0
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        self.window.append(price)
+        self.total += price
+        if len(self.window) > self.period:
+            self.total -= self.window.popleft()
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self.total = math.fsum(self.window)
+        self.previous = self.value
+        self.value = self.total / self.period if len(self.window) == self.period else NAN
+        return self.value
+
+
+class StreamEMA:
+    """指数移動平均（先頭のバーの価格を初期値とする、indicators.moving_average と同じ漸化式）"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.average = NAN
+        self.count = 0
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        if self.count == 0:
+            self.average = price
+        else:
+            self.average = price * self.alpha + self.average * (1.0 - self.alpha)
+        self.count += 1
+        self.previous = self.value
+        self.value = self.average if self.count >= self.period else NAN
+        return self.value
+
+
+class StreamSMMA:
+    """平滑移動平均（先頭 period 本のSMAを初期値とする、ma_kernels.smma と同じ漸化式）"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.ratio = (period - 1) / period
+        self.total = 0.0
+        self.average = NAN
+        self.count = 0
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        self.count += 1
+        if self.count < self.period:
+            self.total += price
+        elif self.count == self.period:
+            self.average = (self.total + price) / self.period
+        else:
+            self.average = price / self.period + self.average * self.ratio
+        self.previous = self.value
+        self.value = self.average
+        return self.value
+
+
+class StreamLWMA:
+    """
+    線形加重移動平均の移動和
+
+    窓が1本進むと重み付きの和は「期間 × 新しい価格 - 前の窓の和」だけ変わるため、
+    窓の和と重み付きの和の2つを定数時間で更新します（period 本ごとに計算し直す）。
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.divisor = period * (period + 1) / 2.0
+        self.window: Deque[float] = deque()
+        self.total = 0.0
+        self.weighted = 0.0
+        self.updates = 0
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        self.window.append(price)
+        if len(self.window) > self.period:
+            removed = self.window.popleft()
+            self.weighted += self.period * price - self.total
+            self.total += price - removed
+        else:
+            self.total += price
+        self.updates += 1
+        if len(self.window) == self.period and self.updates % self.period == 0:
+            self.total = math.fsum(self.window)
+            self.weighted = math.fsum((weight + 1) * value for weight, value in enumerate(self.window))
+        self.previous = self.value
+        self.value = self.weighted / self.divisor if len(self.window) == self.period else NAN
+        return self.value
+
+
+class StreamStdDev:
+    """
+    移動平均からの母標準偏差
+
+    窓の価格の和と二乗和を、基準価格からずらした値で保持します（価格の大きさによる桁落ちを防ぐため）。
+    period 本ごとに基準を最新の価格に付け直し、和と二乗和を窓から計算し直します
+    （rolling_moments のブロックごとの基準と同じく、価格が基準から離れて桁落ちしないように）。
+    """
+
+    def __init__(self, period: int, center: Any):
+        """
+        Args:
+            period: 期間
+            center: 基準とする移動平均の状態（同じバーで先に更新されていること）
+        """
+        self.period = period
+        self.center = center
+        self.window: Deque[float] = deque()
+        self.origin: Optional[float] = None
+        self.total = 0.0
+        self.squares = 0.0
+        self.updates = 0
+        self.value = NAN
+        self.previous = NAN
+        self.history: Deque[float] = deque(maxlen=1)
+
+    def keep(self, bars: int) -> None:
+        """直近 bars + 1 本の値を保持する（lagged(bars) で参照するブロック用）"""
+        if bars + 1 > (self.history.maxlen or 0):
+            self.history = deque(self.history, maxlen=bars + 1)
+
+    def lagged(self, bars: int) -> float:
+        """bars 本前のバーの値（keep(bars) で保持していること）"""
+        return self.history[-bars - 1] if len(self.history) > bars else NAN
+
+    def update(self, price: float) -> float:
+        if self.origin is None:
+            self.origin = price
+        self.window.append(price)
+        shifted = price - self.origin
+        self.total += shifted
+        self.squares += shifted * shifted
+        if len(self.window) > self.period:
+            removed = self.window.popleft() - self.origin
+            self.total -= removed
+            self.squares -= removed * removed
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self.origin = price
+            self.total = math.fsum(value - price for value in self.window)
+            self.squares = math.fsum((value - price) ** 2 for value in self.window)
+        self.previous = self.value
+        if len(self.window) < self.period or math.isnan(self.center.value):
+            self.value = NAN
+        else:
+            center = self.center.value - self.origin
+            mean = self.total / self.period
+            variance = self.squares / self.period - 2.0 * center * mean + center * center
+            self.value = math.sqrt(max(variance, 0.0))
+        self.history.append(self.value)
+        return self.value
+
+
+class StreamBands:
+    """ボリンジャーバンド（中心線, 上限, 下限）"""
+
+    def __init__(self, middle: Any, deviation_state: Any, deviation: float):
+        self.middle = middle
+        self.deviation_state = deviation_state
+        self.deviation = deviation
+        self.value: Tuple[float, float, float] = (NAN, NAN, NAN)
+        self.previous: Tuple[float, float, float] = (NAN, NAN, NAN)
+
+    def update(self, price: float) -> Tuple[float, float, float]:
+        middle = self.middle.value
+        width = self.deviation * self.deviation_state.value
+        self.previous = self.value
+        self.value = (middle, middle + width, middle - width)
+        return self.value
+
+
+class StreamExtremum:
+    """直近 period 本の最高値・最安値（単調デック、1本あたり償却O(1)）"""
+
+    def __init__(self, period: int, highest: bool):
+        self.period = period
+        self.highest = highest
+        self.candidates: Deque[Tuple[int, float]] = deque()
+        self.count = 0
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        dominated = (lambda value: value <= price) if self.highest else (lambda value: value >= price)
+        while self.candidates and dominated(self.candidates[-1][1]):
+            self.candidates.pop()
+        self.candidates.append((self.count, price))
+        if self.candidates[0][0] <= self.count - self.period:
+            self.candidates.popleft()
+        self.count += 1
+        self.previous = self.value
+        self.value = self.candidates[0][1] if self.count >= self.period else NAN
+        return self.value
+
+
+class StreamSAR:
+    """
+    パラボリックSAR（parabolic_sar と同じ規則で1本ずつ更新）
+
+    適用価格ではなくバーの高値・安値で更新するため update ではなく update_bar を持ちます。
+    """
+
+    def __init__(self, step: float, maximum: float):
+        self.step = step
+        self.maximum = maximum
+        self.state: Optional[Tuple[bool, float, float, float]] = None
+        self.last: Optional[Tuple[float, float]] = None
+        self.value = NAN
+        self.previous = NAN
+
+    def update_bar(self, bar: Mapping[str, Any]) -> float:
+        high, low = float(bar['high']), float(bar['low'])
+        self.previous = self.value
+        if self.last is not None:
+            if self.state is None:
+                self.state = initial_sar_state(*self.last, high, low, self.step)
+            self.value, self.state = sar_step(self.state, *self.last, high, low, self.step, self.maximum)
+        self.last = (high, low)
+        return self.value
+
+
+class StreamTrueRange:
+    """真の値幅（ATR / ADX で共有、StreamSAR と同じくバーの高値・安値・終値で update_bar）"""
+
+    def __init__(self):
+        self.last_close: Optional[float] = None
+        self.value = NAN
+        self.previous = NAN
+
+    def update_bar(self, bar: Mapping[str, Any]) -> float:
+        high, low, close = float(bar['high']), float(bar['low']), float(bar['close'])
+        self.previous = self.value
+        if self.last_close is None:
+            self.value = high - low
+        else:
+            self.value = max(high, self.last_close) - min(low, self.last_close)
+        self.last_close = close
+        return self.value
+
+
+class StreamDirectionalMovement:
+    """方向性の値動き（+DM, -DM）"""
+
+    def __init__(self):
+        self.last: Optional[Tuple[float, float]] = None
+        self.value: Tuple[float, float] = (0.0, 0.0)
+        self.previous = self.value
+
+    def update_bar(self, bar: Mapping[str, Any]) -> Tuple[float, float]:
+        high, low = float(bar['high']), float(bar['low'])
+        self.previous = self.value
+        if self.last is not None:
+            up = max(high - self.last[0], 0.0)
+            down = max(self.last[1] - low, 0.0)
+            self.value = (up if up > down else 0.0, down if down > up else 0.0)
+        self.last = (high, low)
+        return self.value
+
+
+class StreamATR:
+    """ATR（真の値幅の単純移動平均）"""
+
+    def __init__(self, true_range: Any, period: int):
+        self.true_range = true_range
+        self.average = StreamSMA(period)
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        self.previous = self.value
+        self.value = self.average.update(self.true_range.value)
+        return self.value
+
+
+class StreamADX:
+    """ADX（ADX, +DI, -DI、indicators.average_directional_index と同じ指数平滑）"""
+
+    def __init__(self, true_range: Any, movement: Any, period: int):
+        self.true_range = true_range
+        self.movement = movement
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.smoothed = (0.0, 0.0, 0.0)
+        self.count = 0
+        self.value: Tuple[float, float, float] = (NAN, NAN, NAN)
+        self.previous = self.value
+
+    def update(self, price: float) -> Tuple[float, float, float]:
+        self.count += 1
+        self.previous = self.value
+        if self.count > 1:
+            adx, plus_di, minus_di = self.smoothed
+            ranges = self.true_range.value
+            plus_dm, minus_dm = self.movement.value
+            plus = 100.0 * plus_dm / ranges if ranges != 0 else 0.0
+            minus = 100.0 * minus_dm / ranges if ranges != 0 else 0.0
+            plus_di = self.alpha * plus + (1.0 - self.alpha) * plus_di
+            minus_di = self.alpha * minus + (1.0 - self.alpha) * minus_di
+            total = plus_di + minus_di
+            dx = 100.0 * abs(plus_di - minus_di) / total if total != 0 else 0.0
+            adx = self.alpha * dx + (1.0 - self.alpha) * adx
+            self.smoothed = (adx, plus_di, minus_di)
+        ready = self.count > self.period
+        self.value = (
+            self.smoothed[0] if self.count > 2 * self.period else NAN,
+            self.smoothed[1] if ready else NAN,
+            self.smoothed[2] if ready else NAN,
+        )
+        return self.value
+
+
+class StreamWPR:
+    """ウィリアムズ%R（最高値と最安値が等しいバーは前の値を引き継ぐ）"""
+
+    def __init__(self, highest: Any, lowest: Any):
+        self.highest = highest
+        self.lowest = lowest
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, price: float) -> float:
+        self.previous = self.value
+        price_range = self.highest.value - self.lowest.value
+        if price_range != 0 and not math.isnan(price_range):
+            self.value = -100.0 * (self.highest.value - price) / price_range
+        return self.value
+
+
+class StreamStochastic:
+    """ストキャスティクス（メイン, シグナル）"""
+
+    def __init__(self, highest: Any, lowest: Any, slowing: int, signal: Any):
+        """
+        Args:
+            highest: 直近 kPeriod 本の最高値の状態
+            lowest: 直近 kPeriod 本の最安値の状態
+            slowing: スローイング
+            signal: シグナルの移動平均の状態（メインが定まったバーから更新）
+        """
+        self.highest = highest
+        self.lowest = lowest
+        self.slowing = slowing
+        self.signal = signal
+        self.window: Deque[Tuple[float, float]] = deque(maxlen=slowing)
+        self.value: Tuple[float, float] = (NAN, NAN)
+        self.previous: Tuple[float, float] = (NAN, NAN)
+
+    def update(self, price: float) -> Tuple[float, float]:
+        self.previous = self.value
+        if math.isnan(self.lowest.value):
+            return self.value
+        self.window.append((price - self.lowest.value, self.highest.value - self.lowest.value))
+        if len(self.window) < self.slowing:
+            return self.value
+        numerator = math.fsum(value for value, _ in self.window)
+        denominator = math.fsum(value for _, value in self.window)
+        main = 100.0 * numerator / denominator if denominator != 0 else 100.0
+        self.value = (main, self.signal.update(main))
+        return self.value
+
+
+class StreamIchimoku:
+    """一目均衡表（転換線, 基準線, 先行スパンA, 先行スパンB）。先行スパンは kijun 本前に計算した値"""
+
+    def __init__(self, tenkan: Tuple[Any, Any], kijun: Tuple[Any, Any], senkou: Tuple[Any, Any], shift: int):
+        self.ranges = (tenkan, kijun, senkou)
+        self.spans: Deque[Tuple[float, float]] = deque(maxlen=shift + 1)
+        self.value: Tuple[float, float, float, float] = (NAN, NAN, NAN, NAN)
+        self.previous = self.value
+
+    def update(self, price: float) -> Tuple[float, float, float, float]:
+        tenkan, kijun, senkou = ((high.value + low.value) / 2.0 for high, low in self.ranges)
+        self.spans.append(((tenkan + kijun) / 2.0, senkou))
+        span_a, span_b = self.spans[0] if len(self.spans) == self.spans.maxlen else (NAN, NAN)
+        self.previous = self.value
+        self.value = (tenkan, kijun, span_a, span_b)
+        return self.value
+
+
+# 適用価格ではなくバーの高値・安値・終値で更新する状態（update_bar）
+BAR_STATES = (StreamSAR, StreamTrueRange, StreamDirectionalMovement)
+
+
+def _stream_moving_average(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    method = params['method']
+    if method == 'SMA':
+        return StreamSMA(params['period'])
+    if method == 'EMA':
+        return StreamEMA(params['period'])
+    if method == 'SMMA':
+        return StreamSMMA(params['period'])
+    if method == 'LWMA':
+        return StreamLWMA(params['period'])
+    raise ValueError(f"サポートされていない移動平均の種類: {method}")
+
+
+def _stream_standard_deviation(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    center = engine.indicator('MA', price, period=params['period'], method=params['method'])
+    return StreamStdDev(params['period'], center)
+
+
+def _stream_bands(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    middle = engine.indicator('MA', price, period=params['period'], method='SMA')
+    deviation = engine.indicator('STDDEV', price, period=params['period'], method='SMA')
+    return StreamBands(middle, deviation, params['deviation'])
+
+
+def _stream_true_range(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamTrueRange()
+
+
+def _stream_directional_movement(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamDirectionalMovement()
+
+
+def _stream_atr(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamATR(engine.indicator('TR'), params['period'])
+
+
+def _stream_adx(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamADX(engine.indicator('TR'), engine.indicator('DM'), params['period'])
+
+
+def _stream_range(engine: 'StreamingEngine', period: int, high: str = 'HIGH', low: str = 'LOW') -> Tuple[Any, Any]:
+    return (engine.indicator('HIGHEST', high, period=period), engine.indicator('LOWEST', low, period=period))
+
+
+def _stream_wpr(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamWPR(*_stream_range(engine, params['period']))
+
+
+def _stream_stochastic(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    field = ('CLOSE', 'CLOSE') if params['priceField'] == 'CLOSECLOSE' else ('HIGH', 'LOW')
+    signal = _stream_moving_average(engine, price, {'period': params['dPeriod'], 'method': params['method']})
+    return StreamStochastic(*_stream_range(engine, params['kPeriod'], *field), params['slowing'], signal)
+
+
+def _stream_ichimoku(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamIchimoku(
+        _stream_range(engine, params['tenkan']),
+        _stream_range(engine, params['kijun']),
+        _stream_range(engine, params['senkouB']),
+        params['kijun'],
+    )
+
+
+def _stream_sar(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+    return StreamSAR(params['step'], params['maximum'])
+
+
+def _stream_extremum(highest: bool) -> Callable[['StreamingEngine', str, Dict[str, Any]], Any]:
+    def create(engine: 'StreamingEngine', price: str, params: Dict[str, Any]) -> Any:
+        return StreamExtremum(params['period'], highest)
+    return create
+
+
+# インジケーター → 状態の作成関数（INDICATOR_FUNCTIONS と同じキー）
+STREAM_INDICATORS: Dict[str, Callable[['StreamingEngine', str, Dict[str, Any]], Any]] = {
+    'MA': _stream_moving_average,
+    'STDDEV': _stream_standard_deviation,
+    'BB': _stream_bands,
+    'HIGHEST': _stream_extremum(highest=True),
+    'LOWEST': _stream_extremum(highest=False),
+    'SAR': _stream_sar,
+    'TR': _stream_true_range,
+    'DM': _stream_directional_movement,
+    'ATR': _stream_atr,
+    'ADX': _stream_adx,
+    'WPR': _stream_wpr,
+    'STOCH': _stream_stochastic,
+    'ICHIMOKU': _stream_ichimoku,
+}
+
+
+def _spread_max(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    limit = float(block.get('params', {}).get('maxSpreadPips', DEFAULT_MAX_SPREAD_PIPS))
+    return lambda: (spread_pips(engine.spread, engine.digits) <= limit, DIRECTION_NEUTRAL)
+
+
+def _ma_relation(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    relation = block.get('params', {}).get('relation', 'closeAbove')
+    ma, = engine.block_indicators(block)
+    if relation in ('closeAbove', 'above'):
+        return lambda: (engine.close > ma.value, DIRECTION_LONG)
+    if relation in ('closeBelow', 'below'):
+        return lambda: (engine.close < ma.value, DIRECTION_SHORT)
+    return lambda: (False, DIRECTION_NEUTRAL)
+
+
+def _ma_cross(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    fast, slow = engine.block_indicators(block)
+    if block.get('params', {}).get('direction', 'golden') == 'golden':
+        return lambda: (fast.value > slow.value, DIRECTION_LONG)
+    return lambda: (fast.value < slow.value, DIRECTION_SHORT)
+
+
+def _bb_reentry(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    params = block.get('params', {})
+    side = params.get('side') or params.get('direction', 'lowerToInside')
+    bands, = engine.block_indicators(block)
+    if side == 'lowerToInside':
+        return lambda: (
+            engine.previous_close < bands.previous[2] and engine.close >= bands.value[2], DIRECTION_LONG
+        )
+    if side == 'upperToInside':
+        return lambda: (
+            engine.previous_close > bands.previous[1] and engine.close <= bands.value[1], DIRECTION_SHORT
+        )
+    return lambda: (False, DIRECTION_NEUTRAL)
+
+
+def _bb_breakout(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    bands, = engine.block_indicators(block)
+    if block.get('params', {}).get('direction', 'upper') == 'upper':
+        return lambda: (
+            engine.previous_close <= bands.previous[1] and engine.close > bands.value[1], DIRECTION_LONG
+        )
+    return lambda: (
+        engine.previous_close >= bands.previous[2] and engine.close < bands.value[2], DIRECTION_SHORT
+    )
+
+
+def _stddev_range(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    params = block.get('params', {})
+    deviation, = engine.block_indicators(block)
+    lower = float(params.get('min', 0.0))
+    upper = float(params.get('max', DEFAULT_MAX_STDDEV))
+    shift = int(params.get('maShift', 0))
+    deviation.keep(shift)
+    return lambda: (lower <= deviation.lagged(shift) <= upper, DIRECTION_NEUTRAL)
+
+
+def _atr_range(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    params = block.get('params', {})
+    atr, = engine.block_indicators(block)
+    lower = float(params.get('minAtr', 0.0))
+    upper = float(params.get('maxAtr', DEFAULT_MAX_ATR))
+    return lambda: (lower <= atr.value <= upper, DIRECTION_NEUTRAL)
+
+
+def _adx_threshold(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    adx, = engine.block_indicators(block)
+    minimum = float(block.get('params', {}).get('minAdx', DEFAULT_MIN_ADX))
+
+    def evaluate() -> BlockResult:
+        value, plus_di, minus_di = adx.value
+        if plus_di > minus_di:
+            return (value >= minimum, DIRECTION_LONG)
+        if minus_di > plus_di:
+            return (value >= minimum, DIRECTION_SHORT)
+        return (value >= minimum, DIRECTION_NEUTRAL)
+    return evaluate
+
+
+def _sar_direction(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    sar, = engine.block_indicators(block)
+    if block.get('params', {}).get('direction', 'bullish') == 'bullish':
+        return lambda: (engine.close > sar.value, DIRECTION_LONG)
+    return lambda: (engine.close < sar.value, DIRECTION_SHORT)
+
+
+def _sar_flip(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    sar, = engine.block_indicators(block)
+
+    def evaluate() -> BlockResult:
+        if sar.previous > engine.previous_close and sar.value < engine.close:
+            return (True, DIRECTION_LONG)
+        if sar.previous < engine.previous_close and sar.value > engine.close:
+            return (True, DIRECTION_SHORT)
+        return (False, DIRECTION_NEUTRAL)
+    return evaluate
+
+
+def _ichimoku_cloud(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    ichimoku, = engine.block_indicators(block)
+    position = block.get('params', {}).get('position', 'above')
+
+    def evaluate() -> BlockResult:
+        span_a, span_b = ichimoku.value[2], ichimoku.value[3]
+        if math.isnan(span_a) or math.isnan(span_b):
+            return (False, DIRECTION_NEUTRAL)
+        if position == 'above':
+            return (engine.close > max(span_a, span_b), DIRECTION_LONG)
+        if position == 'below':
+            return (engine.close < min(span_a, span_b), DIRECTION_SHORT)
+        return (min(span_a, span_b) <= engine.close <= max(span_a, span_b), DIRECTION_NEUTRAL)
+    return evaluate
+
+
+def _wpr_level(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    params = block.get('params', {})
+    threshold = float(params.get('threshold', -20.0))
+    wpr, = engine.block_indicators(block)
+    if params.get('mode', 'overbought') == 'overbought':
+        return lambda: (wpr.previous > threshold and wpr.value <= threshold, DIRECTION_SHORT)
+    return lambda: (wpr.previous < threshold and wpr.value >= threshold, DIRECTION_LONG)
+
+
+def _stoch_cross(engine: 'StreamingEngine', block: Dict[str, Any]) -> Callable[[], BlockResult]:
+    stoch, = engine.block_indicators(block)
+    if block.get('params', {}).get('direction', 'golden') == 'golden':
+        return lambda: (stoch.previous[0] <= stoch.previous[1] and stoch.value[0] > stoch.value[1], DIRECTION_LONG)
+    return lambda: (stoch.previous[0] >= stoch.previous[1] and stoch.value[0] < stoch.value[1], DIRECTION_SHORT)
+
+
+# ブロックのtypeId → 評価関数の作成関数（BLOCK_KERNELS と同じ判定）
+STREAM_BLOCKS: Dict[str, Callable[['StreamingEngine', Dict[str, Any]], Callable[[], BlockResult]]] = {
+    'filter.spreadMax': _spread_max,
+    'trend.maRelation': _ma_relation,
+    'trend.maCross': _ma_cross,
+    'trigger.bbReentry': _bb_reentry,
+    'trigger.bbBreakout': _bb_breakout,
+    'filter.volatility.stddevRange': _stddev_range,
+    'filter.volatility.atrRange': _atr_range,
+    'trend.adxThreshold': _adx_threshold,
+    'trend.sarDirection': _sar_direction,
+    'trigger.sarFlip': _sar_flip,
+    'trend.ichimokuCloud': _ichimoku_cloud,
+    'trigger.wprLevel': _wpr_level,
+    'trigger.stochCross': _stoch_cross,
+}
+
+
+class StreamingEngine:
+    """確定したバーを1本ずつ評価するエンジン"""
+
+    def __init__(self, config: Dict[str, Any], timeframe: str = 'M1', digits: int = DEFAULT_DIGITS):
+        """
+        Args:
+            config: ストラテジー設定JSON
+            timeframe: 時間軸（インジケーターのキーに使用）
+            digits: シンボルの桁数（スプレッドのpips換算に使用）
+
+        Raises:
+            ValueError: 存在しないブロックの参照、サポートされていないブロック、
+                        または conflictPolicy / directionPolicy の場合
+        """
+        self.timeframe = timeframe
+        self.digits = digits
+        self.evaluator = CompositeEvaluator(config)
+        # EAと同じく priority の降順（同じ priority は設定の順）で評価
+        strategies = sort_strategies(config.get('strategies', []))
+        self.strategies: List[Tuple[str, RequirementExpression]] = [
+            (s['id'], self.evaluator.requirements[s['id']]) for s in strategies
+        ]
+        # ストラテジーid → (採用する方向, firstOnly)
+        self.policies: Dict[str, Tuple[Tuple[int, ...], bool]] = {s['id']: strategy_policy(s) for s in strategies}
+        self.guards = GlobalGuards(config.get('globalGuards'))
+        self._indicators: Dict[IndicatorKey, Any] = {}
+        self._prices: Dict[IndicatorKey, str] = {}
+        definitions = {block['id']: block for block in config.get('blocks', [])}
+        self.blocks: Dict[str, Callable[[], BlockResult]] = {}
+        for block_id in self.evaluator.block_ids():
+            block = definitions[block_id]
+            create = STREAM_BLOCKS.get(block.get('typeId', ''))
+            if create is None:
+                raise ValueError(f"サポートされていないブロック: {block_id} ({block.get('typeId')})")
+            self.blocks[block_id] = create(self, block)
+        self.bar_count = 0
+        self.close = NAN
+        self.previous_close = NAN
+        self.spread = 0.0
+
+    @classmethod
+    def from_file(cls, config_path: str, timeframe: str = 'M1', digits: int = DEFAULT_DIGITS) -> 'StreamingEngine':
+        """設定JSONファイルから作成"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), timeframe, digits)
+
+    def indicator(self, indicator: str, price: str = 'CLOSE', **params: Any) -> Any:
+        """
+        インジケーターの状態を取得（同じキーの状態は共有）
+
+        依存するインジケーターは先に登録されるため、登録順に更新すれば
+        同じバーの値を参照できます。
+        """
+        key = make_key(indicator, self.timeframe, price, **params)
+        if key not in self._indicators:
+            create = STREAM_INDICATORS.get(key[0])
+            if create is None:
+                raise ValueError(f"サポートされていないインジケーター: {indicator}")
+            state = create(self, key[2], dict(key[1]))
+            self._indicators[key] = state
+            self._prices[key] = key[2]
+        return self._indicators[key]
+
+    def block_indicators(self, block: Dict[str, Any]) -> List[Any]:
+        """ブロックが使うインジケーターの状態（block_indicators の順）"""
+        return [self.indicator(indicator, price, **params) for indicator, price, params in block_indicators(block)]
+
+    def on_bar(self, bar: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        """
+        確定したバーを1本処理してエントリーシグナルを返す
+
+        Args:
+            bar: time, open, high, low, close, spread などを持つバー
+                 （構造化配列の要素、BarRow、辞書のいずれか）
+
+        Returns:
+            採用されたストラテジーごとの {'strategyId', 'type' ('BUY'/'SELL'), 'time'}（priority の降順）。
+            調停は strategy_arbitration と同じ規則（directionPolicy、firstOnly、globalGuards）です。
+        """
+        self.bar_count += 1
+        self.previous_close, self.close = self.close, float(bar['close'])
+        self.spread = float(bar['spread']) if 'spread' in _fields(bar) else 0.0
+        prices: Dict[str, float] = {}
+        for key, state in self._indicators.items():
+            if isinstance(state, BAR_STATES):
+                state.update_bar(bar)
+                continue
+            name = self._prices[key]
+            if name not in prices:
+                prices[name] = float(applied_price(bar, name))
+            state.update(prices[name])
+
+        # globalGuards で許可されないバーではストラテジーを評価しない（インジケーターは更新する）
+        if not self.guards.mask([int(bar['time'])], [self.spread], self.timeframe, self.digits)[0]:
+            return []
+
+        results: Dict[str, BlockResult] = {}
+        signals = []
+        for strategy_id, requirement in self.strategies:
+            direction = self._evaluate(requirement, results)
+            directions, first_only = self.policies[strategy_id]
+            if direction is None or direction not in directions:
+                continue
+            if direction in (DIRECTION_LONG, DIRECTION_SHORT):
+                signals.append({
+                    'strategyId': strategy_id,
+                    'type': 'BUY' if direction == DIRECTION_LONG else 'SELL',
+                    'time': int(bar['time']),
+                })
+            if first_only:
+                break
+        return signals
+
+    def _evaluate(self, requirement: RequirementExpression, results: Dict[str, BlockResult]) -> Optional[int]:
+        """
+        1本分の短絡評価（CCompositeEvaluator.EvaluateOR と同じ規則）
+
+        Returns:
+            成立した場合は方向、不成立の場合None
+        """
+        for group in requirement.groups:
+            direction = DIRECTION_NEUTRAL
+            for block_id in group:
+                if block_id not in results:
+                    results[block_id] = self.blocks[block_id]()
+                passed, block_direction = results[block_id]
+                if not passed:
+                    break
+                if block_direction != DIRECTION_NEUTRAL:
+                    direction = block_direction
+            else:
+                return direction
+        return None
+
+
+def _fields(bar: Any) -> Any:
+    """バーのフィールド名"""
+    names = getattr(getattr(bar, 'dtype', None), 'names', None)
+    if names is not None:
+        return names
+    return bar.keys()
@@ -0,0 +1,146 @@
+"""
+Strategy Bricks シンボルカタログ
+
+ブローカーのシンボル一覧（名前、気配値表示の有無、桁数、ポイント）を保存し、
+要求シンボルからサフィックス付きのシンボル（例: USDJPY → USDJPYm）を解決します。
+
+MT5の symbols_get() は数千件のシンボルを返すことがあり、毎回の前方一致の走査は
+高コストです。カタログは小文字の名前をソートした配列を前方一致の索引として持ち、
+二分探索で候補を求めます。カタログはJSONファイルとして保存し、一定期間を過ぎた場合や
+接続先のサーバーが変わった場合にのみ symbols_get() から作り直します。
+
+ファイル形式:
+    {"formatVersion": 1, "server": "...", "updatedAt": <UTCエポック秒>,
+     "symbols": [{"name": "USDJPYm", "visible": true, "digits": 3, "point": 0.001}, ...]}
+"""
+
+import json
+import os
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional
+
+from bar_cache import atomic_write
+
+# カタログファイルのフォーマットバージョン（不一致の場合は作り直す）
+CATALOG_FORMAT_VERSION = 1
+
+# この秒数を過ぎたカタログは作り直す
+CATALOG_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+# 候補が複数ある場合のエラーメッセージに表示する件数
+CANDIDATE_PREVIEW = 5
+
+
+class SymbolCatalog:
+    """前方一致の索引を持つシンボル一覧"""
+
+    def __init__(self, symbols: List[Dict[str, Any]], server: str = '', updated_at: int = 0):
+        """
+        Args:
+            symbols: name, visible, digits, point を持つシンボル情報のリスト
+            server: 一覧を取得した接続先サーバー名
+            updated_at: 一覧を取得した時刻（UTCエポック秒）
+        """
+        self.server = server
+        self.updated_at = int(updated_at)
+        self.symbols = {s['name']: s for s in symbols}
+        entries = sorted((name.lower(), name) for name in self.symbols)
+        self._keys = [key for key, _ in entries]
+        self._names = [name for _, name in entries]
+
+    @classmethod
+    def from_mt5(cls, symbols: Iterable[Any], server: str, updated_at: int) -> 'SymbolCatalog':
+        """
+        symbols_get() の結果からカタログを作成
+
+        Args:
+            symbols: MT5のSymbolInfoのシーケンス
+            server: 接続先サーバー名
+            updated_at: 取得時刻（UTCエポック秒）
+        """
+        return cls([
+            {
+                'name': s.name,
+                'visible': bool(s.visible),
+                'digits': int(s.digits),
+                'point': float(s.point),
+            }
+            for s in symbols
+        ], server, updated_at)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['SymbolCatalog']:
+        """保存済みのカタログを読み込み（無い、または形式が異なる場合None）"""
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get('formatVersion') != CATALOG_FORMAT_VERSION:
+            return None
+        return cls(data['symbols'], data.get('server', ''), data.get('updatedAt', 0))
+
+    def save(self, path: str) -> None:
+        """カタログをJSONファイルへ保存"""
+        payload = json.dumps({
+            'formatVersion': CATALOG_FORMAT_VERSION,
+            'server': self.server,
+            'updatedAt': self.updated_at,
+            'symbols': [self.symbols[name] for name in self._names],
+        }, indent=2).encode('utf-8')
+        atomic_write(path, lambda f: f.write(payload))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def is_stale(self, server: str, now: int, max_age: int = CATALOG_MAX_AGE_SECONDS) -> bool:
+        """接続先サーバーが異なる、または max_age 秒より古い場合True"""
+        return self.server != server or now - self.updated_at > max_age
+
+    def digits(self, symbol: str) -> Optional[int]:
+        """シンボルの桁数（カタログに無い場合None）"""
+        entry = self.symbols.get(symbol)
+        if entry is None or entry.get('digits') is None:
+            return None
+        return int(entry['digits'])
+
+    def candidates(self, prefix: str) -> List[str]:
+        """
+        大文字小文字を無視して前方一致するシンボル名を返す（二分探索）
+
+        Returns:
+            名前の昇順（小文字での比較）のリスト
+        """
+        key = prefix.lower()
+        lo = bisect_left(self._keys, key)
+        hi = lo
+        while hi < len(self._keys) and self._keys[hi].startswith(key):
+            hi += 1
+        return self._names[lo:hi]
+
+    def resolve(self, requested_symbol: str) -> str:
+        """
+        MT5のシンボル解決と同じ規則で名前を選ぶ
+
+        大文字小文字を無視した完全一致、次に前方一致の候補が1つだけの場合に解決します。
+
+        Raises:
+            Exception: 候補が無い、または複数ある場合
+        """
+        candidates = self.candidates(requested_symbol)
+        if candidates and candidates[0].lower() == requested_symbol.lower():
+            return candidates[0]
+        if len(candidates) == 1:
+            return candidates[0]
+        if candidates:
+            preview = ", ".join(candidates[:CANDIDATE_PREVIEW])
+            more = "" if len(candidates) <= CANDIDATE_PREVIEW \
+                else f" (+{len(candidates) - CANDIDATE_PREVIEW} more)"
+            raise Exception(
+                f"シンボルが見つかりません: {requested_symbol}。"
+                f"候補が複数あります: {preview}{more}。"
+                "正確なシンボル名を指定してください。"
+            )
+        raise Exception(f"シンボルが見つかりません: {requested_symbol}。類似候補がありません。")
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Strategy Bricks 合成市場データ生成
+
+MT5ターミナル無しでエンジンを大規模データ（1000万バー以上）で検証・ベンチマークするため、
+シードから再現可能なバーとティックを生成します。
+
+- 価格過程: 幾何ブラウン運動（gbm）、またはドリフト・ボラティリティの異なる
+  複数のレジームを切り替えるレジームスイッチング（regime）
+- 週末: 月曜00:00〜土曜00:00（サーバー時刻）のみ取引し、週明けの始値には窓を空ける
+- スプレッド: 基準スプレッド + ボラティリティに応じた拡大 + ロールオーバー時間帯の拡大
+- 出来高: 時間帯ごとの倍率とボラティリティに応じたポアソン分布
+
+すべてバーごとのループ無しの配列演算で生成するため、M1の1000万バーも数秒で生成できます。
+同じ引数とシードからは常に同じデータが生成されます。
+
+バーは fetch_historical_data が返すデータと同じ列・dtype の bar_store.ColumnarBars、
+ティックは copy_ticks_range と同じ tick_store.TICK_DTYPE の構造化配列です。
+
+使用方法（--data-source file で読み込める列ファイルを出力）:
+    python synthetic_data.py --symbol USDJPY --timeframe M1 --bars 10000000
+                             --output-dir ../tmp/bars [--seed 1] [--process regime]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from bar_cache import safe_name, to_epoch_seconds
+from bar_store import RATE_COLUMNS, RATE_DTYPES, TIMEFRAME_SECONDS, ColumnarBars
+from gap_index import DAY_SECONDS, WEEK_SECONDS
+from tick_store import TICK_DTYPE
+
+# 価格過程（--process の選択肢）
+PROCESSES = ('gbm', 'regime')
+
+# 1週間の取引時間（月曜00:00〜土曜00:00）
+TRADING_WEEK_SECONDS = 5 * DAY_SECONDS
+
+# 年率のドリフト・ボラティリティを1バーへ換算する1年の取引時間
+TRADING_YEAR_SECONDS = 52 * TRADING_WEEK_SECONDS
+
+# 既定の開始時刻（2024-01-01 月曜00:00 UTC）
+DEFAULT_START_TS = 1704067200
+
+# レジームスイッチングの既定のレジーム（年率ドリフト, 年率ボラティリティ）
+DEFAULT_REGIMES = (
+    (0.0, 0.06),    # 低ボラティリティのレンジ
+    (0.0, 0.16),    # 高ボラティリティ
+    (0.4, 0.09),    # 上昇トレンド
+    (-0.4, 0.09),   # 下降トレンド
+)
+
+# 時（サーバー時刻）ごとの出来高の倍率（アジア時間は少なく、ロンドン・NYの重複で多い）
+HOURLY_VOLUME_PROFILE = np.array([
+    0.5, 0.5, 0.6, 0.7, 0.8, 0.8, 0.9, 1.0, 1.1, 1.4, 1.6, 1.5,
+    1.4, 1.5, 1.8, 2.0, 1.9, 1.6, 1.3, 1.0, 0.8, 0.7, 0.6, 0.4,
+])
+
+# ロールオーバー前後でスプレッドが拡大する時（サーバー時刻）
+ROLLOVER_HOURS = (23, 0)
+
+# MT5のティックフラグ（TICK_FLAG_BID | TICK_FLAG_ASK）
+TICK_FLAGS_BID_ASK = 6
+
+
+def trading_to_calendar(offsets: np.ndarray, origin: int, weekends: bool = True) -> np.ndarray:
+    """
+    取引時間上の経過秒を暦の時刻に変換
+
+    Args:
+        offsets: 週の開始（月曜00:00）origin からの取引時間上の経過秒
+        origin: 月曜00:00のUTCエポック秒
+        weekends: 週末（土曜00:00〜月曜00:00）を飛ばす
+
+    Returns:
+        UTCエポック秒の配列
+    """
+    if not weekends:
+        return origin + offsets
+    weeks, within = np.divmod(offsets, TRADING_WEEK_SECONDS)
+    return origin + weeks * WEEK_SECONDS + within
+
+
+def bar_times(start_ts: int, count: int, timeframe: str, weekends: bool = True) -> np.ndarray:
+    """
+    start_ts 以降の count 本のバー時刻
+
+    Args:
+        start_ts: 開始時刻（UTCエポック秒、時間軸の境界に切り上げ）
+        count: バー数
+        timeframe: 時間軸（例: M1）
+        weekends: 週末のバーを生成しない
+    """
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    first = -(-start_ts // seconds) * seconds
+    if not weekends:
+        return first + np.arange(count, dtype=np.int64) * seconds
+    origin = first - (first + 3 * DAY_SECONDS) % WEEK_SECONDS
+    into_week = first - origin
+    first_offset = min(into_week, TRADING_WEEK_SECONDS)
+    offsets = first_offset + np.arange(count, dtype=np.int64) * seconds
+    return trading_to_calendar(offsets, origin)
+
+
+def regime_path(
+    count: int,
+    rng: np.random.Generator,
+    regime_count: int,
+    persistence: float
+) -> np.ndarray:
+    """
+    レジーム番号の系列（各バーで persistence の確率で同じレジームに留まるマルコフ連鎖）
+
+    レジームの継続バー数を幾何分布から、次のレジームを現在以外から一様に選びます。
+    """
+    label_parts, duration_parts = [], []
+    total = 0
+    current = int(rng.integers(regime_count))
+    while total < count:
+        size = int(count * (1.0 - persistence)) + 16
+        moves = rng.integers(1, regime_count, size) if regime_count > 1 \
+            else np.zeros(size, dtype=np.int64)
+        labels = (current + np.concatenate(([0], np.cumsum(moves[:-1])))) % regime_count
+        durations = rng.geometric(1.0 - persistence, size)
+        label_parts.append(labels)
+        duration_parts.append(durations)
+        total += int(durations.sum())
+        current = int((labels[-1] + moves[-1]) % regime_count)
+    labels = np.concatenate(label_parts)
+    durations = np.concatenate(duration_parts)
+    return np.repeat(labels, durations)[:count]
+
+
+def bar_parameters(
+    count: int,
+    bar_seconds: int,
+    rng: np.random.Generator,
+    process: str,
+    drift: float,
+    volatility: float,
+    regimes: Sequence[Tuple[float, float]],
+    regime_persistence: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    バーごとの対数リターンの平均と標準偏差
+
+    Returns:
+        (平均, 標準偏差) の配列
+    """
+    dt = bar_seconds / TRADING_YEAR_SECONDS
+    if process == 'gbm':
+        mu = np.full(count, (drift - 0.5 * volatility ** 2) * dt)
+        sigma = np.full(count, volatility * np.sqrt(dt))
+        return mu, sigma
+    if process == 'regime':
+        table = np.asarray(regimes, dtype=np.float64)
+        labels = regime_path(count, rng, len(table), regime_persistence)
+        annual_mu = table[labels, 0]
+        annual_sigma = table[labels, 1]
+        return (annual_mu - 0.5 * annual_sigma ** 2) * dt, annual_sigma * np.sqrt(dt)
+    raise ValueError(f"サポートされていない価格過程: {process}（{', '.join(PROCESSES)} のいずれか）")
+
+
+def generate_bars(
+    count: int,
+    timeframe: str = 'M1',
+    start_ts: int = DEFAULT_START_TS,
+    seed: int = 0,
+    process: str = 'gbm',
+    start_price: float = 145.0,
+    drift: float = 0.0,
+    volatility: float = 0.08,
+    digits: int = 3,
+    spread_points: int = 10,
+    volume_per_minute: float = 60.0,
+    regimes: Sequence[Tuple[float, float]] = DEFAULT_REGIMES,
+    regime_persistence: float = 0.999,
+    weekends: bool = True
+) -> ColumnarBars:
+    """
+    合成バーを生成
+
+    Args:
+        count: バー数
+        timeframe: 時間軸（例: M1）
+        start_ts: 開始時刻（UTCエポック秒）
+        seed: 乱数シード
+        process: 価格過程（'gbm' または 'regime'）
+        start_price: 最初のバーの始値
+        drift: 年率ドリフト（gbm）
+        volatility: 年率ボラティリティ（gbm）
+        digits: 価格の小数桁数（ポイント = 10^-digits）
+        spread_points: 基準スプレッド（ポイント）
+        volume_per_minute: 1分あたりの平均ティック出来高
+        regimes: (年率ドリフト, 年率ボラティリティ) のリスト（regime）
+        regime_persistence: 各バーで同じレジームに留まる確率（regime）
+        weekends: 週末のバーを生成せず、週明けに窓を空ける
+
+    Returns:
+        time, open, high, low, close, tick_volume, spread, real_volume 列のColumnarBars
+    """
+    rng = np.random.default_rng(seed)
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    point = 10.0 ** -digits
+    times = bar_times(start_ts, count, timeframe, weekends)
+    if count == 0:
+        return ColumnarBars({name: np.empty(0, dtype=RATE_DTYPES[name]) for name in RATE_COLUMNS})
+
+    mu, sigma = bar_parameters(
+        count, seconds, rng, process, drift, volatility, regimes, regime_persistence
+    )
+    shocks = rng.standard_normal(count)
+    returns = mu + sigma * shocks
+
+    # 週明けのバーは休場中の変動を窓として始値に反映
+    gaps = np.zeros(count)
+    if weekends and count > 1:
+        after_weekend = np.flatnonzero(np.diff(times) > seconds) + 1
+        weekend_sigma = sigma[after_weekend] * np.sqrt(2 * DAY_SECONDS / seconds)
+        gaps[after_weekend] = weekend_sigma * rng.standard_normal(len(after_weekend))
+
+    log_close = np.log(start_price) + np.cumsum(gaps + returns)
+    close = np.exp(log_close)
+    open_ = np.empty(count)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    open_ *= np.exp(gaps)
+
+    wick = sigma * np.abs(rng.standard_normal((2, count)))
+    high = np.maximum(open_, close) * np.exp(wick[0])
+    low = np.minimum(open_, close) * np.exp(-wick[1])
+
+    hours = times // 3600 % 24
+    activity = np.abs(shocks)
+    rollover = (hours == ROLLOVER_HOURS[0]) | (hours == ROLLOVER_HOURS[1])
+    spread = spread_points * (
+        1.0 + 0.5 * activity + 2.0 * rollover + 0.2 * rng.standard_exponential(count)
+    )
+    volume = rng.poisson(
+        volume_per_minute * seconds / 60 * HOURLY_VOLUME_PROFILE[hours] * (0.5 + activity)
+    )
+
+    columns = {
+        'time': times,
+        'open': np.round(open_ / point) * point,
+        'high': np.round(high / point) * point,
+        'low': np.round(low / point) * point,
+        'close': np.round(close / point) * point,
+        'tick_volume': np.maximum(volume, 1),
+        'spread': np.rint(spread),
+        'real_volume': np.zeros(count),
+    }
+    return ColumnarBars({
+        name: np.asarray(columns[name], dtype=RATE_DTYPES[name]) for name in RATE_COLUMNS
+    })
+
+
+def generate_ticks(
+    count: int,
+    start_ts: int = DEFAULT_START_TS,
+    seed: int = 0,
+    start_price: float = 145.0,
+    volatility: float = 0.08,
+    digits: int = 3,
+    spread_points: int = 10,
+    mean_interval_ms: float = 500.0,
+    weekends: bool = True
+) -> np.ndarray:
+    """
+    合成ティック（bid/askの変化）を生成
+
+    ティックの間隔は指数分布、bidはポイント単位の整数のランダムウォークです。
+
+    Args:
+        count: ティック数
+        start_ts: 開始時刻（UTCエポック秒）
+        seed: 乱数シード
+        start_price: 最初のbid
+        volatility: 年率ボラティリティ
+        digits: 価格の小数桁数
+        spread_points: 平均スプレッド（ポイント）
+        mean_interval_ms: ティックの平均間隔（ミリ秒）
+        weekends: 週末のティックを生成しない
+
+    Returns:
+        tick_store.TICK_DTYPE の構造化配列
+    """
+    rng = np.random.default_rng(seed)
+    point = 10.0 ** -digits
+    ticks = np.zeros(count, dtype=TICK_DTYPE)
+    if count == 0:
+        return ticks
+
+    intervals = np.maximum(np.rint(rng.exponential(mean_interval_ms, count)), 1).astype(np.int64)
+    if weekends:
+        origin = start_ts - (start_ts + 3 * DAY_SECONDS) % WEEK_SECONDS
+        first = min(start_ts - origin, TRADING_WEEK_SECONDS) * 1000
+        offsets_ms = first + np.cumsum(intervals)
+        weeks, within = np.divmod(offsets_ms, TRADING_WEEK_SECONDS * 1000)
+        time_msc = origin * 1000 + weeks * WEEK_SECONDS * 1000 + within
+    else:
+        time_msc = start_ts * 1000 + np.cumsum(intervals)
+
+    step_sigma = volatility * start_price * np.sqrt(intervals / 1000 / TRADING_YEAR_SECONDS) / point
+    bid_points = int(round(start_price / point)) + np.cumsum(
+        np.rint(step_sigma * rng.standard_normal(count))
+    ).astype(np.int64)
+    spread = np.maximum(rng.poisson(spread_points, count), 0)
+
+    ticks['time_msc'] = time_msc
+    ticks['time'] = time_msc // 1000
+    ticks['bid'] = bid_points * point
+    ticks['ask'] = (bid_points + spread) * point
+    ticks['flags'] = TICK_FLAGS_BID_ASK
+    return ticks
+
+
+def main():
+    """コマンドラインエントリーポイント"""
+    parser = argparse.ArgumentParser(
+        description='Strategy Bricks 合成市場データ生成'
+    )
+    parser.add_argument('--symbol', required=True, help='シンボル名（出力ディレクトリ名に使用）')
+    parser.add_argument(
+        '--timeframe', required=True, choices=sorted(TIMEFRAME_SECONDS), help='時間軸'
+    )
+    parser.add_argument('--bars', type=int, required=True, help='生成するバー数')
+    parser.add_argument('--output-dir', required=True, help='出力ディレクトリ')
+    parser.add_argument('--start', help='開始日時（ISO形式、省略時は2024-01-01）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--process', choices=PROCESSES, default='gbm', help='価格過程')
+
+    args = parser.parse_args()
+    start_ts = DEFAULT_START_TS
+    if args.start:
+        start_ts = to_epoch_seconds(datetime.fromisoformat(args.start.replace('Z', '+00:00')))
+
+    started = time.perf_counter()
+    bars = generate_bars(
+        args.bars, args.timeframe, start_ts=start_ts, seed=args.seed, process=args.process
+    )
+    elapsed = time.perf_counter() - started
+
+    directory = os.path.join(args.output_dir, f"{safe_name(args.symbol)}_{args.timeframe}")
+    bars.save(directory)
+    print(f"合成データを生成しました: {len(bars)} バー（{elapsed:.2f} 秒）→ {directory}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Unit tests for BarCache and the cached fetch path of fetch_historical_data
+
+Validates: 同一条件の再取得でMT5へアクセスしないこと、オフライン実行、
+未取得期間のみの差分取得
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import BacktestEngine
+from bar_cache import BarCache, merge_intervals, subtract_intervals, to_epoch_seconds
+from bar_store import RATE_COLUMNS, ColumnarBars
+
+
+RATES_DTYPE = [('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+               ('close', 'f8'), ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8')]
+
+
+def make_rates(count: int) -> np.ndarray:
+    """Create simple M1 rates starting at 2024-01-01 00:00 UTC"""
+    base = 1704067200
+    return np.array([
+        (base + i * 60, 145.0 + i * 0.01, 145.5 + i * 0.01, 144.5 + i * 0.01,
+         145.2 + i * 0.01, 100 + i, 2, 0)
+        for i in range(count)
+    ], dtype=RATES_DTYPE)
+
+
+def store(cache: BarCache, symbol: str, start: datetime, end: datetime, rates: np.ndarray) -> None:
+    """Record [start, end] as covered with the given rates"""
+    cache.append(symbol, "M1", to_epoch_seconds(start), to_epoch_seconds(end), rates)
+
+
+class TestIntervals(unittest.TestCase):
+    """Test coverage interval helpers"""
+
+    def test_merge_overlapping_and_adjacent(self):
+        """Overlapping and adjacent (end + 1) intervals are merged"""
+        self.assertEqual(
+            merge_intervals([(10, 20), (0, 5), (6, 8), (15, 30), (40, 50)]),
+            [(0, 8), (10, 30), (40, 50)]
+        )
+
+    def test_subtract_returns_holes(self):
+        """Only the uncovered parts of the request are returned"""
+        covered = [(10, 20), (30, 40)]
+        self.assertEqual(subtract_intervals(0, 50, covered), [(0, 9), (21, 29), (41, 50)])
+        self.assertEqual(subtract_intervals(12, 18, covered), [])
+        self.assertEqual(subtract_intervals(15, 35, covered), [(21, 29)])
+        self.assertEqual(subtract_intervals(0, 5, []), [(0, 5)])
+
+
+class TestBarCache(unittest.TestCase):
+    """Test BarCache storage"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = BarCache(self.cache_dir)
+        self.start = datetime(2024, 1, 1)
+        self.end = datetime(2024, 3, 31)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_store_and_load_roundtrip(self):
+        """Stored rates are loaded back unchanged"""
+        rates = make_rates(50)
+        store(self.cache, "USDJPY", self.start, self.end, rates)
+
+        loaded = self.cache.load("USDJPY", "M1", self.start, self.end)
+
+        self.assertIsNotNone(loaded)
+        self.assertEqual(loaded.dtype, rates.dtype)
+        np.testing.assert_array_equal(loaded.to_records(), rates)
+
+    def test_load_is_memory_mapped(self):
+        """Loaded columns are contiguous read-only memory maps"""
+        store(self.cache, "USDJPY", self.start, self.end, make_rates(10))
+
+        loaded = self.cache.load("USDJPY", "M1", self.start, self.end)
+
+        self.assertIsInstance(loaded, ColumnarBars)
+        for name in RATE_COLUMNS:
+            self.assertIsInstance(loaded[name], np.memmap)
+            self.assertFalse(loaded[name].flags.writeable)
+            self.assertTrue(loaded[name].flags.c_contiguous)
+
+    def test_load_slices_without_copy(self):
+        """A sub-range of one segment is a view into the mapped column"""
+        store(self.cache, "USDJPY", self.start, self.end, make_rates(100))
+        full = self.cache.load("USDJPY", "M1", self.start, self.end)
+
+        part = self.cache.load(
+            "USDJPY", "M1", datetime(2024, 1, 1, 0, 10), datetime(2024, 1, 1, 0, 19)
+        )
+
+        self.assertEqual(len(part), 10)
+        self.assertIsInstance(part['close'], np.memmap)
+        self.assertFalse(part['close'].flags.owndata)
+        self.assertEqual(part[0]['time'], full['time'][10])
+
+    def test_load_missing_entry_returns_none(self):
+        """A different key is a cache miss"""
+        store(self.cache, "USDJPY", self.start, self.end, make_rates(10))
+
+        self.assertIsNone(self.cache.load("USDJPY", "M5", self.start, self.end))
+        self.assertIsNone(self.cache.load("EURUSD", "M1", self.start, self.end))
+        self.assertFalse(
+            self.cache.contains("USDJPY", "M1", self.start, datetime(2024, 4, 30))
+        )
+
+    def test_missing_ranges_after_append(self):
+        """Appending adjacent ranges leaves a single coverage interval"""
+        start_ts = to_epoch_seconds(self.start)
+        store(self.cache, "USDJPY", self.start, datetime(2024, 1, 31, 23, 59, 59), make_rates(10))
+        store(self.cache, "USDJPY", datetime(2024, 2, 1), self.end, None)
+
+        self.assertEqual(
+            self.cache.coverage("USDJPY", "M1"),
+            [(start_ts, to_epoch_seconds(self.end))]
+        )
+        self.assertTrue(self.cache.contains("USDJPY", "M1", self.start, self.end))
+        self.assertEqual(
+            self.cache.missing_ranges("USDJPY", "M1", self.start, datetime(2024, 4, 30)),
+            [(to_epoch_seconds(self.end) + 1, to_epoch_seconds(datetime(2024, 4, 30)))]
+        )
+
+    def test_load_merges_segments(self):
+        """Rates appended in several segments are loaded in time order"""
+        rates = make_rates(30)
+        split = int(rates['time'][10])
+        self.cache.append("USDJPY", "M1", split, split + 3600, rates[10:])
+        self.cache.append("USDJPY", "M1", int(rates['time'][0]), split - 1, rates[:10])
+
+        loaded = self.cache.load("USDJPY", "M1", self.start, self.end)
+
+        np.testing.assert_array_equal(loaded.to_records(), rates)
+
+    def test_compact_keeps_rates_and_coverage(self):
+        """Compaction merges segment files without changing the data"""
+        rates = make_rates(40)
+        for i in range(0, 40, 10):
+            t0 = int(rates['time'][i])
+            self.cache.append("USDJPY", "M1", t0, t0 + 599, rates[i:i + 10])
+        coverage = self.cache.coverage("USDJPY", "M1")
+
+        self.cache.compact("USDJPY", "M1")
+
+        entry = self.cache.entry_dir("USDJPY", "M1")
+        self.assertEqual(len([f for f in os.listdir(entry) if f.startswith('seg_')]), 1)
+        self.assertEqual(self.cache.coverage("USDJPY", "M1"), coverage)
+        np.testing.assert_array_equal(
+            self.cache.load("USDJPY", "M1", self.start, self.end).to_records(), rates
+        )
+
+    def test_find_symbol_resolves_suffix_variant(self):
+        """USDJPY resolves to the only cached prefix match"""
+        store(self.cache, "USDJPYm", self.start, self.end, make_rates(10))
+
+        self.assertEqual(self.cache.find_symbol("USDJPY"), "USDJPYm")
+        self.assertEqual(self.cache.find_symbol("usdjpym"), "USDJPYm")
+        self.assertIsNone(self.cache.find_symbol("EURUSD"))
+
+    def test_find_symbol_ambiguous_returns_none(self):
+        """Multiple prefix matches without an exact match are not resolved"""
+        store(self.cache, "USDJPYm", self.start, self.end, make_rates(10))
+        store(self.cache, "USDJPY.pro", self.start, self.end, make_rates(10))
+
+        self.assertIsNone(self.cache.find_symbol("USDJPY"))
+
+
+class TestFetchHistoricalDataWithCache(unittest.TestCase):
+    """Test fetch_historical_data with a cache directory"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M1",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json",
+            cache_dir=self.cache_dir
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    @patch('backtest_engine.mt5')
+    def test_second_fetch_is_served_from_cache(self, mock_mt5):
+        """The second fetch does not call MT5"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        mock_mt5.copy_rates_range.return_value = make_rates(20)
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()):
+            self.engine.fetch_historical_data()
+            self.engine.fetch_historical_data()
+
+        mock_mt5.copy_rates_range.assert_called_once()
+        self.assertEqual(len(self.engine.historical_data), 20)
+
+    @patch('backtest_engine.mt5')
+    def test_cached_fetch_prints_message(self, mock_mt5):
+        """Cache hits are reported on stdout"""
+        store(
+            BarCache(self.cache_dir), "USDJPY", self.engine.start_date, self.engine.end_date, make_rates(5)
+        )
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            with patch('sys.stderr', new=StringIO()):
+                self.engine.fetch_historical_data()
+
+        self.assertIn("キャッシュから過去データを読み込みました: 5 バー", fake_out.getvalue())
+        mock_mt5.copy_rates_range.assert_not_called()
+        mock_mt5.symbol_info.assert_not_called()
+
+    def test_requires_mt5(self):
+        """MT5 is only required when the cache cannot serve the request"""
+        self.assertTrue(self.engine.requires_mt5())
+
+        store(
+            BarCache(self.cache_dir), "USDJPYm", self.engine.start_date, self.engine.end_date, make_rates(5)
+        )
+
+        self.assertFalse(self.engine.requires_mt5())
+
+    def test_requires_mt5_without_cache(self):
+        """Without a cache directory MT5 is always required"""
+        engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M1",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json"
+        )
+        self.assertIsNone(engine.bar_cache)
+        self.assertTrue(engine.requires_mt5())
+
+    @patch('backtest_engine.mt5')
+    def test_offline_fetch_resolves_cached_symbol(self, mock_mt5):
+        """Offline fetch maps the requested symbol to the cached variant"""
+        store(
+            BarCache(self.cache_dir), "USDJPYm", self.engine.start_date, self.engine.end_date, make_rates(5)
+        )
+
+        with patch('sys.stdout', new=StringIO()):
+            with patch('sys.stderr', new=StringIO()) as fake_err:
+                self.engine.fetch_historical_data()
+
+        self.assertEqual(self.engine.symbol, "USDJPYm")
+        self.assertIn("USDJPYm を使用します", fake_err.getvalue())
+        mock_mt5.copy_rates_range.assert_not_called()
+
+    @patch('backtest_engine.mt5')
+    def test_run_skips_mt5_when_cached(self, mock_mt5):
+        """run() completes without initializing MT5 when data is cached"""
+        store(
+            BarCache(self.cache_dir), "USDJPY", self.engine.start_date, self.engine.end_date, make_rates(30)
+        )
+        output_fd, output_path = tempfile.mkstemp(suffix='.json')
+        os.close(output_fd)
+        config_fd, config_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(config_fd, 'w', encoding='utf-8') as f:
+            f.write(
+                '{"meta": {"formatVersion": "1.0", "name": "Cached", '
+                '"generatedBy": "Test", "generatedAt": "2024-01-01T00:00:00Z"}, '
+                '"globalGuards": {}, "strategies": [], "blocks": []}'
+            )
+        self.engine.config_path = config_path
+        self.engine.output_path = output_path
+
+        try:
+            with patch('sys.stdout', new=StringIO()):
+                with patch('sys.stderr', new=StringIO()):
+                    self.engine.run()
+        finally:
+            os.remove(config_path)
+            os.remove(output_path)
+
+        mock_mt5.initialize.assert_not_called()
+        mock_mt5.shutdown.assert_not_called()
+
+    @patch('backtest_engine.mt5')
+    def test_extended_range_fetches_only_missing_period(self, mock_mt5):
+        """Extending the end date downloads only the new period"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        rates = make_rates(30)
+        store(
+            BarCache(self.cache_dir), "USDJPY",
+            self.engine.start_date, datetime(2024, 1, 1, 0, 9, 59), rates[:10]
+        )
+        mock_mt5.copy_rates_range.return_value = rates[10:]
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            with patch('sys.stderr', new=StringIO()):
+                self.engine.fetch_historical_data()
+
+        mock_mt5.copy_rates_range.assert_called_once()
+        args = mock_mt5.copy_rates_range.call_args[0]
+        self.assertEqual(to_epoch_seconds(args[2]), int(rates['time'][10]))
+        self.assertEqual(to_epoch_seconds(args[3]), to_epoch_seconds(self.engine.end_date))
+        np.testing.assert_array_equal(self.engine.historical_data.to_records(), rates)
+        self.assertIn("MT5からの差分取得: 20 バー", fake_out.getvalue())
+        self.assertFalse(self.engine.requires_mt5())
+
+    @patch('backtest_engine.mt5')
+    def test_empty_period_is_recorded_as_covered(self, mock_mt5):
+        """A period without bars is not requested again"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        rates = make_rates(10)
+        store(
+            BarCache(self.cache_dir), "USDJPY",
+            self.engine.start_date, datetime(2024, 1, 1, 0, 9, 59), rates
+        )
+        mock_mt5.copy_rates_range.return_value = np.array([], dtype=RATES_DTYPE)
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()):
+            self.engine.fetch_historical_data()
+            self.engine.fetch_historical_data()
+
+        mock_mt5.copy_rates_range.assert_called_once()
+        self.assertEqual(len(self.engine.historical_data), 10)
+
+    @patch('backtest_engine.mt5')
+    def test_recent_period_is_covered_up_to_last_bar(self, mock_mt5):
+        """Bars that may still be forming are fetched again on the next run"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        now_ts = to_epoch_seconds(datetime.utcnow()) // 60 * 60
+        self.engine.start_date = datetime.utcfromtimestamp(now_ts - 600)
+        self.engine.end_date = datetime.utcfromtimestamp(now_ts + 3600)
+        rates = make_rates(10)
+        rates['time'] = now_ts - 600 + np.arange(10) * 60
+        mock_mt5.copy_rates_range.return_value = rates
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()):
+            self.engine.fetch_historical_data()
+
+        self.assertEqual(
+            BarCache(self.cache_dir).coverage("USDJPY", "M1"),
+            [(now_ts - 600, int(rates['time'][-1]) - 1)]
+        )
+        self.assertEqual(len(self.engine.historical_data), 9)
+
+    @patch('backtest_engine.mt5')
+    def test_chunked_top_up_is_compacted(self, mock_mt5):
+        """Chunked downloads are stored as one memory-mapped segment"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        rates = make_rates(3 * 24 * 60)
+        self.engine.end_date = datetime(2024, 1, 3, 23, 59)
+        self.engine.chunk_days = 1
+        mock_mt5.copy_rates_range.side_effect = lambda symbol, tf, date_from, date_to: rates[
+            (rates['time'] >= date_from.timestamp()) & (rates['time'] <= date_to.timestamp())
+        ]
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()):
+            self.engine.fetch_historical_data()
+
+        self.assertEqual(mock_mt5.copy_rates_range.call_count, 3)
+        entry = BarCache(self.cache_dir).entry_dir("USDJPY", "M1")
+        self.assertEqual(len([f for f in os.listdir(entry) if f.startswith('seg_')]), 1)
+        self.assertIsInstance(self.engine.historical_data['close'], np.memmap)
+        np.testing.assert_array_equal(self.engine.historical_data.to_records(), rates)
+
+
+if __name__ == '__main__':
+    unittest.main()
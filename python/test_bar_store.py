@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ColumnarBars
+
+Validates: 列ごとの配列としての参照、コピー無しのビュー、構造化配列との互換性
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import BacktestEngine
+from bar_store import RATE_COLUMNS, ColumnarBars
+
+
+RATES_DTYPE = [('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+               ('close', 'f8'), ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8')]
+
+
+def make_rates(count: int) -> np.ndarray:
+    """Create M1 rates with a saw-tooth close so both signals fire"""
+    base = 1704067200
+    return np.array([
+        (base + i * 60, 145.0, 145.5, 144.5, 145.0 + (i % 7) * 0.05, 100 + i, 2, 0)
+        for i in range(count)
+    ], dtype=RATES_DTYPE)
+
+
+class TestColumnarBars(unittest.TestCase):
+    """Test ColumnarBars access patterns"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_wrap_uses_field_views(self):
+        """Wrapping a structured array does not copy the fields"""
+        rates = make_rates(10)
+        bars = ColumnarBars.wrap(rates)
+
+        self.assertEqual(len(bars), 10)
+        self.assertEqual(bars.names, list(RATE_COLUMNS))
+        self.assertTrue(np.shares_memory(bars['close'], rates))
+
+    def test_row_and_slice_access(self):
+        """Rows and slices behave like the structured array"""
+        rates = make_rates(10)
+        bars = ColumnarBars.from_records(rates)
+
+        self.assertEqual(bars[3]['time'], rates[3]['time'])
+        self.assertEqual(bars[-1]['close'], rates[-1]['close'])
+        self.assertEqual(len(bars[2:5]), 3)
+        self.assertTrue(np.shares_memory(bars[2:5]['close'], bars['close']))
+        with self.assertRaises(IndexError):
+            bars[10]
+
+    def test_save_and_open_roundtrip(self):
+        """Columns saved to disk are reopened as read-only memory maps"""
+        rates = make_rates(20)
+        ColumnarBars.from_records(rates).save(self.tmp_dir)
+
+        bars = ColumnarBars.open(self.tmp_dir)
+
+        self.assertEqual(bars.names, list(RATE_COLUMNS))
+        self.assertIsInstance(bars['high'], np.memmap)
+        self.assertFalse(bars['high'].flags.writeable)
+        np.testing.assert_array_equal(bars.to_records(), rates)
+
+    def test_column_length_mismatch_raises_error(self):
+        """All columns must have the same length"""
+        with self.assertRaises(ValueError):
+            ColumnarBars({'time': np.arange(3), 'close': np.arange(4.0)})
+
+
+class TestSimulateWithColumnarBars(unittest.TestCase):
+    """simulate_strategy gives the same trades for both layouts"""
+
+    def make_engine(self):
+        return BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M1",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 1, 2),
+            output_path="test_output.json"
+        )
+
+    def test_same_trades_as_structured_array(self):
+        """Cached columnar data and MT5 structured arrays simulate identically"""
+        rates = make_rates(200)
+        structured = self.make_engine()
+        structured.historical_data = rates
+        columnar = self.make_engine()
+        columnar.historical_data = ColumnarBars.from_records(rates)
+
+        with patch('sys.stdout', new=StringIO()):
+            structured.simulate_strategy()
+            columnar.simulate_strategy()
+
+        self.assertGreater(len(structured.trades), 0)
+        self.assertEqual(columnar.trades, structured.trades)
+
+
+if __name__ == '__main__':
+    unittest.main()
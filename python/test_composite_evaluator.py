@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Unit tests for CompositeEvaluator
+
+Validates: バーごとの短絡評価（CCompositeEvaluator）との一致、方向の採用規則、ブロック参照の検証
+"""
+
+import unittest
+import sys
+import os
+import json
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from composite_evaluator import (
+    DIRECTION_LONG,
+    DIRECTION_NEUTRAL,
+    DIRECTION_SHORT,
+    BlockSignal,
+    CompositeEvaluator,
+    RequirementExpression,
+)
+
+EA_TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ea', 'tests')
+
+
+def reference_evaluate(groups, signals, index) -> tuple:
+    """Per-bar OR/AND short-circuit evaluation following CCompositeEvaluator"""
+    for group in groups:
+        direction = DIRECTION_NEUTRAL
+        success = True
+        for block_id in group:
+            signal = signals[block_id]
+            if not signal.passed[index]:
+                success = False
+                break
+            block_direction = int(signal.direction if signal.direction.ndim == 0 else signal.direction[index])
+            if block_direction != DIRECTION_NEUTRAL:
+                direction = block_direction
+        if success:
+            return True, direction
+    return False, DIRECTION_NEUTRAL
+
+
+def requirement(*groups) -> dict:
+    return {
+        'type': 'OR',
+        'ruleGroups': [
+            {'id': f"rg{i}", 'type': 'AND', 'conditions': [{'blockId': b} for b in group]}
+            for i, group in enumerate(groups)
+        ]
+    }
+
+
+class TestRequirementExpression(unittest.TestCase):
+    """Test whole-series evaluation against the per-bar reference"""
+
+    def setUp(self):
+        rng = np.random.default_rng(21)
+        self.length = 2000
+        self.signals = {
+            'trend#1': BlockSignal(rng.random(self.length) < 0.6, DIRECTION_LONG),
+            'trend#2': BlockSignal(rng.random(self.length) < 0.6, DIRECTION_SHORT),
+            'filter#1': BlockSignal(rng.random(self.length) < 0.8),
+            'trigger#1': BlockSignal(rng.random(self.length) < 0.3, rng.integers(0, 3, self.length)),
+            'trigger#2': BlockSignal(rng.random(self.length) < 0.3, rng.integers(0, 3, self.length)),
+        }
+
+    def test_matches_short_circuit_reference(self):
+        cases = [
+            [['filter#1', 'trend#1', 'trigger#1']],
+            [['filter#1', 'trend#1', 'trigger#1'], ['filter#1', 'trend#2', 'trigger#2']],
+            [['trigger#1', 'trend#2'], ['trend#1'], ['trigger#2', 'filter#1']],
+            [['trend#1', 'trend#2']],
+        ]
+        for groups in cases:
+            with self.subTest(groups=groups):
+                expression = RequirementExpression.compile(requirement(*groups), self.signals)
+
+                matched, direction = expression.evaluate(self.signals, self.length)
+
+                expected = [reference_evaluate(groups, self.signals, i) for i in range(self.length)]
+                self.assertEqual(matched.tolist(), [m for m, _ in expected])
+                self.assertEqual(direction.tolist(), [d for _, d in expected])
+
+    def test_entry_signals_split_by_direction(self):
+        """The last non-neutral direction in the group wins; neutral matches are not entries"""
+        expression = RequirementExpression.compile(
+            requirement(['trend#1', 'trend#2'], ['filter#1']), self.signals
+        )
+
+        buy, sell = expression.entry_signals(self.signals, self.length)
+
+        both = self.signals['trend#1'].passed & self.signals['trend#2'].passed
+        np.testing.assert_array_equal(sell, both)
+        np.testing.assert_array_equal(buy, np.zeros(self.length, dtype=bool))
+
+    def test_empty_requirement_and_empty_group(self):
+        """No rule groups never matches; a group without conditions always matches"""
+        never = RequirementExpression.compile({'ruleGroups': []}, [])
+        always = RequirementExpression.compile(requirement([]), [])
+
+        self.assertFalse(never.evaluate({}, 5)[0].any())
+        self.assertTrue(always.evaluate({}, 5)[0].all())
+
+    def test_unknown_block_reference_raises_error(self):
+        with self.assertRaises(ValueError) as context:
+            RequirementExpression.compile(requirement(['trend#1', 'trend#9']), self.signals, 'S1')
+        self.assertIn("trend#9", str(context.exception))
+        self.assertIn("S1/rg0", str(context.exception))
+
+
+class TestCompositeEvaluator(unittest.TestCase):
+    """Test compiling the strategies of a configuration file"""
+
+    def test_compile_ea_test_config(self):
+        with open(os.path.join(EA_TESTS_DIR, 'basic-strategy.json'), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        evaluator = CompositeEvaluator(config)
+
+        self.assertEqual(
+            evaluator.block_ids(),
+            ['filter.spreadMax#1', 'trend.maRelation#1', 'trigger.bbReentry#1']
+        )
+        self.assertEqual(evaluator.block_types['trend.maRelation#1'], 'trend.maRelation')
+        signals = {
+            'filter.spreadMax#1': BlockSignal([True, True, False]),
+            'trend.maRelation#1': BlockSignal([True, True, True], DIRECTION_LONG),
+            'trigger.bbReentry#1': BlockSignal([True, False, True], [DIRECTION_SHORT, DIRECTION_LONG, DIRECTION_LONG]),
+        }
+        buy, sell = evaluator.entry_signals('S1', signals, 3)
+        self.assertEqual(buy.tolist(), [False, False, False])
+        self.assertEqual(sell.tolist(), [True, False, False])
+
+    def test_blocks_shared_across_strategies_listed_once(self):
+        config = {
+            'strategies': [
+                {'id': 'S1', 'entryRequirement': requirement(['a', 'b'])},
+                {'id': 'S2', 'entryRequirement': requirement(['b', 'c'], ['a'])},
+            ],
+            'blocks': [{'id': block_id, 'typeId': 'x', 'params': {}} for block_id in 'abc'],
+        }
+
+        self.assertEqual(CompositeEvaluator(config).block_ids(), ['a', 'b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
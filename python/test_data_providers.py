@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Unit tests for data_providers and the file data source of BacktestEngine
+
+Validates: MT5が無い環境でのファイルからのバックテスト、CSV/バイナリの読み込み、シンボルの桁数の決定
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+import backtest_engine
+from backtest_engine import BacktestEngine
+from bar_store import ColumnarBars
+from data_providers import DataProvider, FileDataProvider, MT5DataProvider, parse_csv_rates
+from symbol_catalog import SymbolCatalog
+
+
+RATES_DTYPE = [('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+               ('close', 'f8'), ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8')]
+
+MT5_EXPORT_CSV = (
+    "<DATE>\t<TIME>\t<OPEN>\t<HIGH>\t<LOW>\t<CLOSE>\t<TICKVOL>\t<VOL>\t<SPREAD>\n"
+    "2024.01.02\t00:00:00\t141.000\t141.050\t140.950\t141.020\t120\t0\t3\n"
+    "2024.01.02\t00:01:00\t141.020\t141.080\t141.000\t141.060\t98\t0\t2\n"
+    "2024.01.02\t00:02:00\t141.060\t141.090\t141.010\t141.030\t105\t0\t2\n"
+)
+
+
+def make_rates(count: int) -> np.ndarray:
+    """Create simple M1 rates starting at 2024-01-01 00:00 UTC"""
+    base = 1704067200
+    return np.array([
+        (base + i * 60, 145.0 + i * 0.01, 145.5 + i * 0.01, 144.5 + i * 0.01,
+         145.2 + i * 0.01, 100 + i, 2, 0)
+        for i in range(count)
+    ], dtype=RATES_DTYPE)
+
+
+class TestParseCsvRates(unittest.TestCase):
+    """Test the vectorized CSV parser"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_mt5_export_format(self):
+        """Tab-separated MT5 exports with <DATE> and <TIME> columns"""
+        bars = parse_csv_rates(self.write("USDJPY_M1.csv", MT5_EXPORT_CSV))
+
+        self.assertEqual(len(bars), 3)
+        self.assertEqual(bars['time'][0], 1704153600)  # 2024-01-02 00:00 UTC
+        self.assertEqual(bars['time'][2] - bars['time'][0], 120)
+        self.assertAlmostEqual(bars['close'][1], 141.06)
+        self.assertEqual(bars['tick_volume'].tolist(), [120, 98, 105])
+        self.assertEqual(bars['spread'].tolist(), [3, 2, 2])
+        self.assertEqual(bars['spread'].dtype, np.int32)
+
+    def test_epoch_and_iso_time_columns(self):
+        """Generic CSV with epoch seconds or ISO 8601 timestamps"""
+        epoch = parse_csv_rates(self.write(
+            "a.csv",
+            "time,open,high,low,close\n1704067260,1,2,0.5,1.5\n1704067200,1,2,0.5,1.2\n"
+        ))
+        iso = parse_csv_rates(self.write(
+            "b.csv",
+            "time,open,high,low,close\n2024-01-01T00:00:00Z,1,2,0.5,1.2\n"
+        ))
+
+        self.assertEqual(epoch['time'].tolist(), [1704067200, 1704067260])
+        self.assertEqual(epoch['close'].tolist(), [1.2, 1.5])
+        self.assertEqual(epoch['tick_volume'].tolist(), [0, 0])
+        self.assertEqual(iso['time'].tolist(), [1704067200])
+
+    def test_fractional_second_timestamps(self):
+        """Only the date separators are rewritten, so fractional seconds still parse"""
+        bars = parse_csv_rates(self.write(
+            "d.csv",
+            "time,open,high,low,close\n2024-01-02T03:04:05.000,1,2,0.5,1.2\n2024.01.02 03:05:05.750,1,2,0.5,1.3\n"
+        ))
+
+        self.assertEqual(bars['time'].tolist(), [1704164645, 1704164705])
+
+    def test_missing_column_raises_error(self):
+        """Files without OHLC columns are rejected"""
+        with self.assertRaises(ValueError):
+            parse_csv_rates(self.write("c.csv", "time,open,high\n1,2,3\n"))
+
+
+class TestFileDataProvider(unittest.TestCase):
+    """Test FileDataProvider lookup and range selection"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.rates = make_rates(60)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_npy_file_range(self):
+        """Binary rate dumps are sliced to the requested range"""
+        np.save(os.path.join(self.data_dir, "USDJPY_M1.npy"), self.rates)
+        provider = FileDataProvider(self.data_dir)
+
+        rates = provider.copy_rates_range(
+            "USDJPY", "M1", datetime(2024, 1, 1, 0, 10), datetime(2024, 1, 1, 0, 19)
+        )
+
+        self.assertEqual(len(rates), 10)
+        self.assertEqual(rates[0]['time'], self.rates[10]['time'])
+
+    def test_columnar_directory(self):
+        """Directories written by ColumnarBars.save are opened as memory maps"""
+        ColumnarBars.from_records(self.rates).save(os.path.join(self.data_dir, "EURUSD_H1"))
+        provider = FileDataProvider(self.data_dir)
+
+        rates = provider.copy_rates_range(
+            "EURUSD", "H1", datetime(2024, 1, 1), datetime(2024, 1, 2)
+        )
+
+        self.assertIsInstance(rates['close'], np.memmap)
+        np.testing.assert_array_equal(rates.to_records(), self.rates)
+
+    def test_resolve_symbol_suffix(self):
+        """Symbols resolve with the MT5 prefix rule"""
+        np.save(os.path.join(self.data_dir, "USDJPYm_M1.npy"), self.rates)
+        provider = FileDataProvider(self.data_dir)
+
+        with patch('sys.stderr', new=StringIO()) as fake_err:
+            self.assertEqual(provider.resolve_symbol("USDJPY", "M1"), "USDJPYm")
+        self.assertIn("USDJPYm を使用します", fake_err.getvalue())
+        with self.assertRaises(Exception):
+            provider.resolve_symbol("EURUSD", "M1")
+
+    def test_provider_interface_is_abstract(self):
+        """Providers must implement copy_rates_range; files have no ticks"""
+        with self.assertRaises(TypeError):
+            DataProvider()
+        provider = FileDataProvider(self.data_dir)
+        self.assertFalse(provider.supports_ticks)
+        self.assertIsNone(provider.copy_ticks_range("USDJPY", datetime(2024, 1, 1), datetime(2024, 1, 2)))
+        self.assertTrue(MT5DataProvider.supports_ticks)
+
+    def test_missing_file_reports_error(self):
+        """A missing timeframe returns None with an error message"""
+        np.save(os.path.join(self.data_dir, "USDJPY_M1.npy"), self.rates)
+        provider = FileDataProvider(self.data_dir)
+
+        self.assertIsNone(
+            provider.copy_rates_range("USDJPY", "H1", datetime(2024, 1, 1), datetime(2024, 1, 2))
+        )
+        self.assertIn("データファイルが見つかりません", provider.last_error())
+
+
+class TestEngineFileDataSource(unittest.TestCase):
+    """Test BacktestEngine with data_source='file'"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.data_dir, "USDJPY_M1.csv"), 'w', encoding='utf-8') as f:
+            f.write(MT5_EXPORT_CSV)
+        self.engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M1",
+            start_date=datetime(2024, 1, 2),
+            end_date=datetime(2024, 1, 2, 0, 2),
+            output_path="test_output.json",
+            data_source="file",
+            data_dir=self.data_dir
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    @patch('backtest_engine.require_mt5')
+    def test_fetch_without_mt5(self, mock_require_mt5):
+        """Bars are read from the CSV without loading MetaTrader5"""
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            self.engine.fetch_historical_data()
+
+        mock_require_mt5.assert_not_called()
+        self.assertFalse(self.engine.requires_mt5())
+        self.assertEqual(len(self.engine.historical_data), 3)
+        self.assertIn("過去データを取得しました: 3 バー", fake_out.getvalue())
+
+    def test_digits_from_cached_symbol_catalog(self):
+        """A 3-digit symbol takes its digits from the catalog in the cache directory"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.engine.bar_cache = backtest_engine.BarCache(cache_dir)
+        SymbolCatalog(
+            [{'name': 'USDJPY', 'visible': True, 'digits': 3, 'point': 0.001}], 'Broker-Demo', 1700000000
+        ).save(self.engine.bar_cache.symbol_catalog_path())
+
+        with patch('sys.stdout', new=StringIO()):
+            self.engine.fetch_historical_data()
+
+        self.assertEqual(self.engine.digits, 3)
+
+    def test_digits_override_and_default(self):
+        """--digits wins over symbol info; unknown digits fall back to the default with a warning"""
+        self.engine.digits_override = 2
+        with patch('sys.stdout', new=StringIO()):
+            self.engine.fetch_historical_data()
+        self.assertEqual(self.engine.digits, 2)
+
+        self.engine.digits_override = None
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()) as fake_err:
+            self.engine.fetch_historical_data()
+        self.assertEqual(self.engine.digits, backtest_engine.DEFAULT_DIGITS)
+        self.assertIn("--digits で指定できます", fake_err.getvalue())
+
+    def test_missing_data_dir_raises_error(self):
+        """The file data source needs a data directory"""
+        self.engine.data_dir = None
+
+        with self.assertRaises(ValueError):
+            self.engine.get_data_provider()
+
+    def test_require_mt5_without_library(self):
+        """A missing MetaTrader5 library is reported when the MT5 source is used"""
+        with patch.object(backtest_engine, 'mt5', None):
+            with patch.dict(sys.modules, {'MetaTrader5': None}):
+                with self.assertRaises(Exception) as context:
+                    backtest_engine.require_mt5()
+
+        self.assertIn("MetaTrader5ライブラリがインストールされていません", str(context.exception))
+
+    @patch('backtest_engine.BacktestEngine')
+    def test_main_passes_data_source(self, mock_engine_class):
+        """--data-source and --data-dir are forwarded to the engine"""
+        test_args = [
+            'backtest_engine.py',
+            '--config', 'test_config.json',
+            '--symbol', 'USDJPY',
+            '--timeframe', 'M1',
+            '--start', '2024-01-01T00:00:00Z',
+            '--end', '2024-03-31T23:59:59Z',
+            '--output', 'test_output.json',
+            '--data-source', 'file',
+            '--data-dir', self.data_dir,
+            '--digits', '3'
+        ]
+
+        with patch('sys.argv', test_args):
+            backtest_engine.main()
+
+        call_args = mock_engine_class.call_args
+        self.assertEqual(call_args.kwargs['data_source'], 'file')
+        self.assertEqual(call_args.kwargs['data_dir'], self.data_dir)
+        self.assertEqual(call_args.kwargs['digits'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
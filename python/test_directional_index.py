@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the ATR / ADX kernels
+
+Validates: MT5の iADX と同じ手順のバーごとの計算との一致、真の値幅・±DM の期間間での共有、
+           filter.volatility.atrRange / trend.adxThreshold のバッチとストリーミングの一致
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from block_kernels import BlockContext, block_signals
+from composite_evaluator import DIRECTION_LONG, DIRECTION_NEUTRAL
+from indicator_cache import IndicatorCache
+from indicators import average_directional_index, average_true_range, directional_movement, true_range
+from streaming_engine import StreamingEngine
+from synthetic_data import generate_bars
+
+
+def stepped_adx(high, low, close, period) -> np.ndarray:
+    """MT5の ADX.mq5 と同じ手順でバーごとに計算する参照実装（ADX, +DI, -DI の列）"""
+    alpha = 2.0 / (period + 1)
+    rows = [(0.0, 0.0, 0.0)]
+    for i in range(1, len(high)):
+        plus = max(high[i] - high[i - 1], 0.0)
+        minus = max(low[i - 1] - low[i], 0.0)
+        if plus > minus:
+            minus = 0.0
+        elif plus < minus:
+            plus = 0.0
+        else:
+            plus = minus = 0.0
+        ranges = max(abs(high[i] - low[i]), abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        plus, minus = (100.0 * plus / ranges, 100.0 * minus / ranges) if ranges != 0 else (0.0, 0.0)
+        adx, plus_di, minus_di = rows[-1]
+        plus_di = plus * alpha + plus_di * (1.0 - alpha)
+        minus_di = minus * alpha + minus_di * (1.0 - alpha)
+        total = plus_di + minus_di
+        dx = 100.0 * abs(plus_di - minus_di) / total if total != 0 else 0.0
+        rows.append((dx * alpha + adx * (1.0 - alpha), plus_di, minus_di))
+    return np.array(rows)
+
+
+class TestDirectionalIndex(unittest.TestCase):
+    """ADX from the shared true range and directional movement"""
+
+    def setUp(self):
+        self.bars = generate_bars(2000, timeframe='H1', seed=41, digits=3)
+        self.high, self.low, self.close = self.bars['high'], self.bars['low'], self.bars['close']
+
+    def test_matches_per_bar_reference(self):
+        ranges = true_range(self.high, self.low, self.close)
+        plus_dm, minus_dm = directional_movement(self.high, self.low)
+        for period in (1, 7, 14, 30):
+            with self.subTest(period=period):
+                adx, plus_di, minus_di = average_directional_index(ranges, plus_dm, minus_dm, period)
+
+                expected = stepped_adx(self.high.tolist(), self.low.tolist(), self.close.tolist(), period)
+                self.assertTrue(np.isnan(plus_di[:period]).all() and np.isnan(adx[:2 * period]).all())
+                np.testing.assert_allclose(adx[2 * period:], expected[2 * period:, 0], rtol=1e-10)
+                np.testing.assert_allclose(plus_di[period:], expected[period:, 1], rtol=1e-10)
+                np.testing.assert_allclose(minus_di[period:], expected[period:, 2], rtol=1e-10)
+
+    def test_flat_bars_have_zero_movement(self):
+        flat = np.full(40, 1.5)
+
+        adx, plus_di, minus_di = average_directional_index(
+            true_range(flat, flat, flat), *directional_movement(flat, flat), 5
+        )
+
+        self.assertEqual(adx[10:].tolist(), [0.0] * 30)
+        self.assertEqual(plus_di[5:].tolist(), minus_di[5:].tolist())
+        with self.assertRaises(ValueError):
+            average_directional_index(flat, flat, flat, 0)
+
+    def test_periods_share_true_range(self):
+        cache = IndicatorCache({'H1': self.bars})
+
+        for period in (7, 14, 21):
+            cache.get('ATR', 'H1', period=period)
+            cache.get('ADX', 'H1', period=period)
+
+        # ATR / ADX 3期間ずつ + 真の値幅 + ±DM
+        self.assertEqual(cache.misses, 8)
+        self.assertEqual(cache.stats()['keyHits']['TR_H1_CLOSE'], 5)
+        np.testing.assert_array_equal(
+            cache.get('ATR', 'H1', period=14), average_true_range(self.high, self.low, self.close, 14)
+        )
+
+
+class TestRangeBlocks(unittest.TestCase):
+    """filter.volatility.atrRange and trend.adxThreshold in batch and streaming"""
+
+    def setUp(self):
+        self.bars = generate_bars(3000, timeframe='H1', seed=43, digits=3)
+        self.atr = average_true_range(self.bars['high'], self.bars['low'], self.bars['close'], 14)
+
+    def config(self, blocks: list) -> dict:
+        return {
+            'strategies': [{
+                'id': 'S1', 'enabled': True, 'priority': 1, 'conflictPolicy': 'firstOnly', 'directionPolicy': 'both',
+                'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                    {'id': 'RG1', 'type': 'AND', 'conditions': [{'blockId': block['id']} for block in blocks]},
+                ]},
+            }],
+            'blocks': blocks,
+        }
+
+    def test_adx_direction_follows_larger_di(self):
+        block = {'id': 'trend.adxThreshold#1', 'typeId': 'trend.adxThreshold', 'params': {'minAdx': 20}}
+        context = BlockContext(self.bars, 'H1', digits=3)
+
+        signal = block_signals([block], [block['id']], context)[block['id']]
+
+        adx, plus_di, minus_di = context.cache.get('ADX', 'H1', period=14)
+        np.testing.assert_array_equal(signal.passed, adx >= 20)
+        self.assertTrue(signal.passed.any() and not signal.passed.all())
+        np.testing.assert_array_equal(signal.direction[28:] == DIRECTION_LONG, (plus_di > minus_di)[28:])
+        self.assertTrue((signal.direction[:14] == DIRECTION_NEUTRAL).all())
+
+    def test_streaming_matches_batch(self):
+        # 方向を持たない atrRange は方向を決める trend.maCross と組み合わせる
+        lower, upper = np.nanpercentile(self.atr, [20, 80]) * (1.0 + 1e-7)
+        cross = {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}}
+        cases = {
+            'atrRange': [{'id': 'filter.atrRange#1', 'typeId': 'filter.volatility.atrRange',
+                          'params': {'period': 14, 'minAtr': lower, 'maxAtr': upper}}, cross],
+            'adxThreshold': [{'id': 'trend.adxThreshold#1', 'typeId': 'trend.adxThreshold', 'params': {}}],
+            'adxThreshold(7)': [{'id': 'trend.adxThreshold#2', 'typeId': 'trend.adxThreshold',
+                                 'params': {'period': 7, 'minAdx': 30}}],
+        }
+        for name, blocks in cases.items():
+            with self.subTest(case=name):
+                context = BlockContext(self.bars, 'H1', digits=3)
+                signals = block_signals(blocks, [b['id'] for b in blocks], context)
+                passed = np.logical_and.reduce([signals[b['id']].passed for b in blocks])
+                engine = StreamingEngine(self.config(blocks), timeframe='H1', digits=3)
+
+                streamed = [engine.on_bar(bar) for bar in self.bars.to_records()]
+
+                self.assertTrue(passed.any())
+                direction = np.broadcast_to(signals[blocks[-1]['id']].direction, passed.shape)
+                expected = passed & (direction != DIRECTION_NEUTRAL)
+                np.testing.assert_array_equal([bool(s) for s in streamed], expected)
+                types = [s[0]['type'] for s in streamed if s]
+                self.assertEqual(types, ['BUY' if d == DIRECTION_LONG else 'SELL' for d in direction[expected]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Unit tests for EvaluationPlanner
+
+Validates: 遅延評価と一括評価の一致、コスト・成立率による評価順、スキップしたバー数の集計、
+           推定用の関数による評価順の推定、評価するバーのマスク、計算範囲の結合、
+           ブロックのカーネル（lazy_kernels）の範囲ごとの計算と一括計算の一致
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from block_kernels import BlockContext, block_signals, block_window, lazy_kernels
+from composite_evaluator import DIRECTION_LONG, DIRECTION_SHORT, BlockSignal, RequirementExpression
+from evaluation_planner import EvaluationPlanner, covering_windows
+from synthetic_data import generate_bars
+
+
+def requirement(*groups) -> dict:
+    return {
+        'ruleGroups': [
+            {'id': f"rg{i}", 'conditions': [{'blockId': b} for b in group]}
+            for i, group in enumerate(groups)
+        ]
+    }
+
+
+def array_kernel(signal: BlockSignal):
+    """Kernel returning precomputed values at the requested bars"""
+    def kernel(indices):
+        direction = signal.direction if signal.direction.ndim == 0 else signal.direction[indices]
+        return BlockSignal(signal.passed[indices], direction)
+    return kernel
+
+
+class TestEvaluationPlanner(unittest.TestCase):
+    """Test lazy evaluation against RequirementExpression.evaluate"""
+
+    def setUp(self):
+        rng = np.random.default_rng(13)
+        self.length = 50000
+        hours = np.arange(self.length) // 60 % 24
+        self.signals = {
+            'env.session#1': BlockSignal((hours >= 7) & (hours < 9)),
+            'filter.spreadMax#1': BlockSignal(rng.random(self.length) < 0.9),
+            'trend.adx#1': BlockSignal(rng.random(self.length) < 0.5, DIRECTION_LONG),
+            'trigger.sarFlip#1': BlockSignal(rng.random(self.length) < 0.2, rng.integers(0, 3, self.length)),
+        }
+        self.kernels = {block_id: array_kernel(signal) for block_id, signal in self.signals.items()}
+
+    def planner(self) -> EvaluationPlanner:
+        planner = EvaluationPlanner(self.kernels, self.length, sample_bars=1000)
+        planner.calibrate()
+        # Fixed costs so the order does not depend on timing
+        for block_id, cost in (('env.session#1', 1e-8), ('filter.spreadMax#1', 1e-8),
+                               ('trend.adx#1', 1e-6), ('trigger.sarFlip#1', 1e-6)):
+            planner.blocks[block_id].cost = cost
+        return planner
+
+    def test_same_result_as_eager_evaluation(self):
+        cases = [
+            [['trend.adx#1', 'trigger.sarFlip#1', 'filter.spreadMax#1', 'env.session#1']],
+            [['trigger.sarFlip#1', 'env.session#1'], ['trend.adx#1', 'filter.spreadMax#1']],
+            [['trend.adx#1'], []],
+        ]
+        for groups in cases:
+            with self.subTest(groups=groups):
+                expression = RequirementExpression.compile(requirement(*groups), self.signals)
+
+                matched, direction = self.planner().evaluate(expression)
+
+                expected_matched, expected_direction = expression.evaluate(self.signals, self.length)
+                np.testing.assert_array_equal(matched, expected_matched)
+                np.testing.assert_array_equal(direction, expected_direction)
+
+    def test_cheap_selective_condition_first(self):
+        planner = self.planner()
+
+        order = planner.order(('trend.adx#1', 'trigger.sarFlip#1', 'filter.spreadMax#1', 'env.session#1'))
+
+        self.assertEqual(order[0], 'env.session#1')
+        self.assertEqual(order[-1], 'trend.adx#1')
+
+    def test_expensive_blocks_skipped_outside_session(self):
+        """Expensive blocks are evaluated only on bars surviving the session window"""
+        planner = self.planner()
+        expression = RequirementExpression.compile(
+            requirement(['trend.adx#1', 'trigger.sarFlip#1', 'filter.spreadMax#1', 'env.session#1']),
+            self.signals
+        )
+
+        buy, sell = planner.entry_signals(expression)
+
+        stats = planner.stats()
+        session_bars = int(self.signals['env.session#1'].passed.sum())
+        self.assertEqual(stats['env.session#1']['evaluatedBars'], self.length)
+        self.assertLess(stats['trigger.sarFlip#1']['evaluatedBars'], session_bars + 1000)
+        self.assertLess(stats['trend.adx#1']['evaluatedBars'], stats['trigger.sarFlip#1']['evaluatedBars'])
+        self.assertEqual(
+            stats['trend.adx#1']['skippedBars'], self.length - stats['trend.adx#1']['evaluatedBars']
+        )
+        self.assertFalse((buy & sell).any())
+        self.assertIn("スキップ", planner.format_stats()[2])
+
+    def test_later_rule_groups_skip_matched_bars(self):
+        """A rule group is not evaluated on bars where an earlier group matched"""
+        signals = {
+            'always': BlockSignal(np.ones(self.length, dtype=bool), DIRECTION_SHORT),
+            'other': BlockSignal(np.ones(self.length, dtype=bool), DIRECTION_LONG),
+        }
+        planner = EvaluationPlanner(
+            {block_id: array_kernel(signal) for block_id, signal in signals.items()},
+            self.length, sample_bars=100
+        )
+        expression = RequirementExpression.compile(requirement(['always'], ['other']), signals)
+
+        buy, sell = planner.entry_signals(expression)
+
+        self.assertTrue(sell.all())
+        self.assertEqual(planner.stats()['other']['evaluatedBars'], 100)
+
+    def test_mask_limits_evaluated_bars(self):
+        mask = np.zeros(self.length, dtype=bool)
+        mask[1000:3000] = True
+        expression = RequirementExpression.compile(
+            requirement(['trigger.sarFlip#1', 'env.session#1'], ['trend.adx#1']), self.signals
+        )
+        planner = self.planner()
+        calibrated = planner.stats()['trend.adx#1']['evaluatedBars']
+
+        matched, direction = planner.evaluate(expression, mask)
+
+        expected_matched, expected_direction = expression.evaluate(self.signals, self.length)
+        np.testing.assert_array_equal(matched, expected_matched & mask)
+        np.testing.assert_array_equal(direction[matched], expected_direction[matched])
+        self.assertLessEqual(planner.stats()['trend.adx#1']['evaluatedBars'], calibrated + 2000)
+
+    def test_estimators_replace_sample_evaluation(self):
+        """With estimators, calibration does not call the kernels"""
+        calls = []
+
+        def recording_kernel(block_id):
+            kernel = self.kernels[block_id]
+
+            def evaluate(indices):
+                calls.append(block_id)
+                return kernel(indices)
+            return evaluate
+
+        estimators = {
+            'env.session#1': lambda: BlockSignal(np.zeros(100, dtype=bool)),
+            'trend.adx#1': lambda: BlockSignal(np.ones(100, dtype=bool), DIRECTION_LONG),
+        }
+        planner = EvaluationPlanner(
+            {block_id: recording_kernel(block_id) for block_id in estimators}, self.length, estimators=estimators
+        )
+
+        order = planner.order(('trend.adx#1', 'env.session#1'))
+
+        self.assertEqual(calls, [])
+        self.assertEqual(order, ['env.session#1', 'trend.adx#1'])
+        self.assertEqual(planner.stats()['env.session#1']['passRate'], 0.0)
+        self.assertEqual(planner.stats()['trend.adx#1']['evaluatedBars'], 0)
+
+    def test_computed_bars_reported_by_kernel(self):
+        """skippedBars follows the bars the kernel reports as computed"""
+        kernel = array_kernel(self.signals['trend.adx#1'])
+        planner = EvaluationPlanner({'trend.adx#1': kernel}, self.length, sample_bars=100)
+        planner.calibrate()
+        kernel.computed_bars = 450
+
+        stats = planner.stats()['trend.adx#1']
+
+        self.assertEqual(stats['computedBars'], 450)
+        self.assertEqual(stats['skippedBars'], self.length - 450)
+        self.assertEqual(stats['evaluatedBars'], 100)
+        self.assertIn("計算 450 / 50,000 バー", planner.format_stats()[0])
+
+
+class TestCoveringWindows(unittest.TestCase):
+    """Test covering_windows"""
+
+    def test_windows_cover_lookback(self):
+        indices = np.array([3, 5, 20, 21, 40])
+
+        windows = covering_windows(indices, 4)
+
+        self.assertEqual(windows.tolist(), [[0, 6], [16, 22], [36, 41]])
+
+    def test_windows_match_naive_union(self):
+        rng = np.random.default_rng(4)
+        indices = np.unique(rng.integers(0, 10000, 300))
+
+        for alignment in (1, 7):
+            with self.subTest(alignment=alignment):
+                windows = covering_windows(indices, 50, alignment)
+
+                covered = np.zeros(10000, dtype=bool)
+                for index in indices:
+                    covered[max(index - 50, 0) // alignment * alignment:index + 1] = True
+                expected = np.zeros(10000, dtype=bool)
+                for start, end in windows:
+                    expected[start:end] = True
+                np.testing.assert_array_equal(covered, expected)
+                self.assertTrue(np.all(windows[1:, 0] > windows[:-1, 1]))
+                self.assertTrue(np.all(windows[:, 0] % alignment == 0))
+
+    def test_empty(self):
+        self.assertEqual(covering_windows(np.array([], dtype=np.int64), 10).shape, (0, 2))
+
+
+class TestLazyKernels(unittest.TestCase):
+    """lazy_kernels compute windowable indicators only around the requested bars"""
+
+    BLOCKS = [
+        {'id': 'filter.spreadMax#1', 'typeId': 'filter.spreadMax', 'params': {'maxSpreadPips': 1.5}},
+        {'id': 'trend.maRelation#1', 'typeId': 'trend.maRelation', 'params': {'period': 50, 'maType': 'SMA'}},
+        {'id': 'trend.maRelation#2', 'typeId': 'trend.maRelation', 'params': {'period': 37, 'maType': 'LWMA'}},
+        {'id': 'trend.maCross#1', 'typeId': 'trend.maCross',
+         'params': {'fastPeriod': 7, 'slowPeriod': 20, 'maMethod': 'SMA'}},
+        {'id': 'trigger.bbReentry#1', 'typeId': 'trigger.bbReentry', 'params': {'side': 'upperToInside', 'period': 21}},
+        {'id': 'trigger.bbBreakout#1', 'typeId': 'trigger.bbBreakout', 'params': {'direction': 'lower'}},
+        {'id': 'filter.volatility.stddevRange#1', 'typeId': 'filter.volatility.stddevRange',
+         'params': {'maPeriod': 13, 'maShift': 3, 'min': 0.05, 'max': 0.3}},
+        {'id': 'filter.volatility.stddevRange#2', 'typeId': 'filter.volatility.stddevRange',
+         'params': {'maPeriod': 13, 'maMethod': 'LWMA', 'min': 0.05, 'max': 0.3}},
+        {'id': 'filter.volatility.atrRange#1', 'typeId': 'filter.volatility.atrRange',
+         'params': {'period': 14, 'minAtr': 0.1, 'maxAtr': 0.3}},
+        {'id': 'trend.ichimokuCloud#1', 'typeId': 'trend.ichimokuCloud', 'params': {'position': 'above'}},
+        {'id': 'trend.ichimokuCloud#2', 'typeId': 'trend.ichimokuCloud', 'params': {'position': 'inside'}},
+        {'id': 'trigger.wprLevel#1', 'typeId': 'trigger.wprLevel', 'params': {'threshold': -80, 'mode': 'oversold'}},
+        {'id': 'trigger.stochCross#1', 'typeId': 'trigger.stochCross',
+         'params': {'kPeriod': 9, 'dPeriod': 4, 'slowing': 3}},
+        {'id': 'trend.adxThreshold#1', 'typeId': 'trend.adxThreshold', 'params': {}},
+        {'id': 'trend.maRelation#3', 'typeId': 'trend.maRelation', 'params': {'period': 20, 'maType': 'EMA'}},
+    ]
+
+    def setUp(self):
+        self.bars = generate_bars(5000, timeframe='H1', seed=3, digits=3)
+        self.block_ids = [block['id'] for block in self.BLOCKS]
+        self.expected = block_signals(self.BLOCKS, self.block_ids, BlockContext(self.bars, 'H1', 3))
+
+    def test_windowed_kernels_match_block_signals(self):
+        rng = np.random.default_rng(11)
+        for trial in range(10):
+            indices = np.unique(rng.integers(0, len(self.bars), rng.integers(1, 800)))
+            kernels = lazy_kernels(self.BLOCKS, self.block_ids, BlockContext(self.bars, 'H1', 3))
+            for block_id in self.block_ids:
+                with self.subTest(trial=trial, block_id=block_id):
+                    signal = kernels[block_id](indices)
+
+                    expected = self.expected[block_id]
+                    expected_direction = expected.direction if expected.direction.ndim == 0 \
+                        else expected.direction[indices]
+                    np.testing.assert_array_equal(signal.passed, expected.passed[indices])
+                    np.testing.assert_array_equal(
+                        np.broadcast_to(signal.direction, indices.shape),
+                        np.broadcast_to(expected_direction, indices.shape)
+                    )
+
+    def test_recursive_blocks_use_full_series(self):
+        windows = {block['id']: block_window(block) for block in self.BLOCKS}
+
+        self.assertIsNone(windows['trend.adxThreshold#1'])
+        self.assertIsNone(windows['trend.maRelation#3'])
+        self.assertIsNone(windows['filter.volatility.atrRange#1'])
+        self.assertEqual(windows['trend.maRelation#1'], (49, 50))
+        self.assertEqual(windows['trigger.bbReentry#1'], (21, 21))
+        self.assertEqual(windows['trend.ichimokuCloud#1'], (77, 1))
+
+    def test_computed_bars_count_windows(self):
+        indices = np.arange(1000, 5000, 500)
+        kernels = lazy_kernels(self.BLOCKS, self.block_ids, BlockContext(self.bars, 'H1', 3))
+
+        kernels['trend.maRelation#1'](indices)
+        kernels['trend.adxThreshold#1'](indices)
+
+        # Each bar needs the 49 bars before it, extended back to a multiple of the period
+        self.assertEqual(kernels['trend.maRelation#1'].computed_bars, 51 * len(indices))
+        self.assertEqual(kernels['trend.adxThreshold#1'].computed_bars, len(self.bars))
+        self.assertEqual(kernels['trend.ichimokuCloud#1'].computed_bars, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Unit tests for exit_resolver
+
+Validates: SL/TP価格の計算（fixedSLTP / atrBased）、窓探索とバーごとの判定の一致、
+           同じバーでの順序規則と窓を空けた約定、BacktestEngine の loop / vectorized の一致
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime
+from io import StringIO
+from unittest.mock import Mock, patch
+from typing import Optional
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+import exit_resolver
+from backtest_engine import BacktestEngine
+from exit_resolver import (
+    EXIT_BREAK_EVEN,
+    EXIT_NONE,
+    EXIT_STOP_LOSS,
+    EXIT_TAKE_PROFIT,
+    EXIT_TRAILING_STOP,
+    TIE_BREAKS,
+    StopRules,
+    atr_series,
+    bar_exit,
+    exit_rules,
+    first_hits,
+    pips_to_price,
+    protective_levels,
+    weekend_close_mask,
+)
+from indicator_cache import IndicatorCache
+from indicators import average_true_range
+from resampler import resample_bars
+from synthetic_data import generate_bars
+
+
+def scan_exits(bars, entries, is_long, stop, target, end, tie_break):
+    """バーごとに bar_exit を評価する参照実装"""
+    result = []
+    for k, entry in enumerate(entries):
+        for j in range(entry + 1, min(end[k], len(bars['high']) - 1) + 1):
+            reason, price = bar_exit(
+                bars['open'][j], bars['high'][j], bars['low'][j], bool(is_long[k]), stop[k], target[k], tie_break
+            )
+            if reason != EXIT_NONE:
+                result.append((j, price, reason))
+                break
+        else:
+            result.append((len(bars['high']), None, EXIT_NONE))
+    return result
+
+
+class TestLevels(unittest.TestCase):
+    """SL/TP prices from riskModel"""
+
+    def test_pips_follow_digits(self):
+        self.assertAlmostEqual(pips_to_price(30, 3), 0.3)
+        self.assertAlmostEqual(pips_to_price(30, 5), 0.003)
+        self.assertAlmostEqual(pips_to_price(30, 2), 0.3)
+
+    def test_fixed_sltp(self):
+        risk = {'type': 'risk.fixedSLTP', 'params': {'slPips': 20, 'tpPips': 40}}
+
+        stop, target = protective_levels(risk, np.array([150.0, 150.0]), np.array([True, False]), 3)
+
+        np.testing.assert_allclose(stop, [149.8, 150.2])
+        np.testing.assert_allclose(target, [150.4, 149.6])
+
+    def test_atr_based_with_default_fallback(self):
+        risk = {'type': 'risk.atrBased', 'params': {'atrRatio': 2.0, 'buySlRatio': 1.0, 'buyTpRatio': 3.0,
+                                                      'sellSlRatio': 0.5, 'sellTpRatio': 1.5}}
+
+        stop, target = protective_levels(
+            risk, np.array([1.1, 1.1, 1.1]), np.array([True, False, True]), 5, np.array([0.001, 0.001, np.nan])
+        )
+
+        np.testing.assert_allclose(stop, [1.098, 1.101, 1.1 - 0.003])
+        np.testing.assert_allclose(target, [1.106, 1.097, 1.1 + 0.003])
+
+    def test_missing_risk_model_uses_ea_defaults(self):
+        stop, target = protective_levels(None, np.array([150.0]), np.array([True]), 3)
+
+        np.testing.assert_allclose((stop[0], target[0]), (149.7, 150.3))
+
+    def test_higher_timeframe_atr_uses_closed_bars(self):
+        bars = generate_bars(3000, timeframe='H1', seed=21)
+        higher = resample_bars(bars, 'H4')
+        expected_atr = average_true_range(higher['high'], higher['low'], higher['close'], 14)
+
+        atr = atr_series(bars, 'H1', 'H4', 14)
+
+        for i in (500, 1501, 2999):
+            bar_close = int(bars['time'][i]) + 3600
+            closed = np.flatnonzero(higher['time'] + 4 * 3600 <= bar_close)[-1]
+            self.assertEqual(atr[i], expected_atr[closed])
+        np.testing.assert_array_equal(
+            atr_series(bars, 'H1', 'H1', 14), average_true_range(bars['high'], bars['low'], bars['close'], 14)
+        )
+        cache = IndicatorCache({'H1': bars})
+        np.testing.assert_array_equal(atr_series(bars, 'H1', 'H4', 14, cache), atr)
+        np.testing.assert_array_equal(cache.get('ATR', 'H4', period=14), expected_atr)
+
+
+class TestFirstHits(unittest.TestCase):
+    """Windowed search equals the per-bar reference"""
+
+    def setUp(self):
+        self.bars = generate_bars(5000, timeframe='M15', seed=17, digits=3)
+        rng = np.random.default_rng(2)
+        self.entries = np.sort(rng.choice(len(self.bars) - 1, 300, replace=False))
+        self.is_long = rng.random(300) < 0.5
+        close = self.bars['close'][self.entries]
+        side = np.where(self.is_long, 1.0, -1.0)
+        self.stop = close - side * rng.uniform(0.02, 0.6, 300)
+        self.target = close + side * rng.uniform(0.02, 0.6, 300)
+        self.end = self.entries + rng.integers(1, 400, 300)
+
+    def test_matches_per_bar_reference(self):
+        for tie_break in TIE_BREAKS:
+            with self.subTest(tie_break=tie_break):
+                index, price, reason = first_hits(
+                    self.bars['open'], self.bars['high'], self.bars['low'], self.entries, self.is_long,
+                    self.stop, self.target, self.end, tie_break
+                )
+
+                expected = scan_exits(self.bars, self.entries, self.is_long, self.stop, self.target,
+                                      self.end, tie_break)
+                self.assertEqual(index.tolist(), [e[0] for e in expected])
+                self.assertEqual(reason.tolist(), [e[2] for e in expected])
+                hit = reason != EXIT_NONE
+                np.testing.assert_allclose(price[hit], [e[1] for e in expected if e[2] != EXIT_NONE])
+                self.assertTrue(np.all(np.isnan(price[~hit])))
+
+    def test_small_windows_and_chunks(self):
+        """Doubling windows and row chunks do not change the result"""
+        expected = first_hits(
+            self.bars['open'], self.bars['high'], self.bars['low'], self.entries, self.is_long, self.stop, self.target
+        )
+
+        with patch.object(exit_resolver, 'INITIAL_WINDOW_BARS', 1), patch.object(exit_resolver, 'MAX_WINDOW_CELLS', 7):
+            result = first_hits(
+                self.bars['open'], self.bars['high'], self.bars['low'], self.entries, self.is_long,
+                self.stop, self.target
+            )
+
+        for actual, wanted in zip(result, expected):
+            np.testing.assert_array_equal(actual, wanted)
+
+    def test_tie_break_rules(self):
+        # 1本のバーがSL (99) とTP (101) の両方を含む
+        bar = (100.6, 102.0, 98.0)
+        self.assertEqual(bar_exit(*bar, True, 99.0, 101.0, 'stopLoss'), (EXIT_STOP_LOSS, 99.0))
+        self.assertEqual(bar_exit(*bar, True, 99.0, 101.0, 'takeProfit'), (EXIT_TAKE_PROFIT, 101.0))
+        self.assertEqual(bar_exit(*bar, True, 99.0, 101.0, 'nearestToOpen'), (EXIT_TAKE_PROFIT, 101.0))
+        self.assertEqual(bar_exit(*bar, False, 101.0, 99.0, 'nearestToOpen'), (EXIT_STOP_LOSS, 101.0))
+
+    def test_gap_fills_at_open(self):
+        # 始値がSLを越えている場合は tie_break に関係なく始値で損切り
+        self.assertEqual(bar_exit(98.5, 101.5, 98.0, True, 99.0, 101.0, 'takeProfit'), (EXIT_STOP_LOSS, 98.5))
+        self.assertEqual(bar_exit(101.5, 101.6, 97.0, True, 99.0, 101.0, 'stopLoss'), (EXIT_TAKE_PROFIT, 101.5))
+
+        index, price, reason = first_hits(
+            np.array([100.0, 102.0]), np.array([100.5, 102.5]), np.array([99.5, 101.8]),
+            np.array([0]), np.array([False]), np.array([101.0]), np.array([99.0])
+        )
+        self.assertEqual((index[0], price[0], reason[0]), (1, 102.0, EXIT_STOP_LOSS))
+
+    def test_invalid_tie_break_raises_error(self):
+        with self.assertRaises(ValueError):
+            first_hits(self.bars['open'], self.bars['high'], self.bars['low'], self.entries, self.is_long,
+                       self.stop, self.target, tie_break='random')
+
+
+def scan_moving_stops(bars, entries, is_long, stop, target, rules, tie_break):
+    """トレードごと・バーごとに極値とSLを更新する参照実装"""
+    result = []
+    for k, entry in enumerate(entries):
+        long = bool(is_long[k])
+        best = rules.entry_prices[k]
+        for j in range(entry + 1, len(bars['high'])):
+            gain = (best - rules.entry_prices[k]) if long else (rules.entry_prices[k] - best)
+            side = 1.0 if long else -1.0
+            candidates = [(side * stop[k], EXIT_STOP_LOSS)]
+            if gain >= rules.trail_start[k]:
+                candidates.append((side * best - rules.trail_distance[k], EXIT_TRAILING_STOP))
+            if gain >= rules.break_even_trigger[k]:
+                candidates.append((side * rules.entry_prices[k] + rules.break_even_offset[k], EXIT_BREAK_EVEN))
+            level, stop_reason = max(candidates, key=lambda c: c[0])
+            reason, price = bar_exit(bars['open'][j], bars['high'][j], bars['low'][j], long,
+                                     side * level, target[k], tie_break)
+            if reason != EXIT_NONE:
+                result.append((j, price, stop_reason if reason == EXIT_STOP_LOSS else reason))
+                break
+            best = max(best, bars['high'][j]) if long else min(best, bars['low'][j])
+        else:
+            result.append((len(bars['high']), None, EXIT_NONE))
+    return result
+
+
+class TestMovingStops(unittest.TestCase):
+    """exit.trail / exit.breakEven running-extreme scans equal per-bar updates"""
+
+    def setUp(self):
+        self.bars = generate_bars(4000, timeframe='M15', seed=23, digits=3)
+        rng = np.random.default_rng(9)
+        self.entries = np.sort(rng.choice(len(self.bars) - 1, 200, replace=False))
+        self.is_long = rng.random(200) < 0.5
+        self.close = self.bars['close'][self.entries]
+        side = np.where(self.is_long, 1.0, -1.0)
+        self.stop = self.close - side * 0.4
+        self.target = self.close + side * rng.uniform(0.3, 1.5, 200)
+
+    def check(self, rules):
+        for tie_break in TIE_BREAKS:
+            with self.subTest(tie_break=tie_break):
+                index, price, reason = first_hits(
+                    self.bars['open'], self.bars['high'], self.bars['low'], self.entries, self.is_long,
+                    self.stop, self.target, tie_break=tie_break, rules=rules
+                )
+
+                expected = scan_moving_stops(self.bars, self.entries, self.is_long, self.stop, self.target,
+                                             rules, tie_break)
+                self.assertEqual(index.tolist(), [e[0] for e in expected])
+                self.assertEqual(reason.tolist(), [e[2] for e in expected])
+                hit = reason != EXIT_NONE
+                np.testing.assert_allclose(price[hit], [e[1] for e in expected if e[2] != EXIT_NONE])
+        return reason
+
+    def test_trailing_stop(self):
+        reason = self.check(exit_rules({'type': 'exit.trail', 'params': {'startPips': 15, 'trailPips': 10}},
+                                       self.close, 3))
+
+        self.assertIn(EXIT_TRAILING_STOP, reason.tolist())
+
+    def test_break_even(self):
+        reason = self.check(exit_rules({'type': 'exit.breakEven', 'params': {'triggerPips': 20, 'offsetPips': 2}},
+                                       self.close, 3))
+
+        self.assertIn(EXIT_BREAK_EVEN, reason.tolist())
+
+    def test_combined_rules_across_small_windows(self):
+        rules = StopRules(self.close, 0.2, 0.12, 0.1, 0.01)
+        with patch.object(exit_resolver, 'INITIAL_WINDOW_BARS', 2), patch.object(exit_resolver, 'MAX_WINDOW_CELLS', 50):
+            self.check(rules)
+
+    def test_trailing_stop_never_loosens(self):
+        rules = StopRules(np.array([100.0]), 1.0, 0.5)
+
+        stop, reason = rules.moved_stop(0, True, 99.0, 100.8)
+        self.assertEqual((float(stop), int(reason)), (99.0, EXIT_STOP_LOSS))
+        stop, reason = rules.moved_stop(0, True, 99.0, 102.0)
+        self.assertEqual((float(stop), int(reason)), (101.5, EXIT_TRAILING_STOP))
+        stop, reason = rules.moved_stop(0, False, 101.0, 98.0)
+        self.assertEqual((float(stop), int(reason)), (98.5, EXIT_TRAILING_STOP))
+
+    def test_atr_trail_follows_ea(self):
+        rules = exit_rules({'type': 'exit.trail', 'params': {'useAtr': True, 'atrRatio': 2.0}},
+                           np.array([150.0, 150.0]), 3, np.array([0.1, np.nan]))
+
+        np.testing.assert_allclose(rules.trail_start, [0.2, 0.2])
+        np.testing.assert_allclose(rules.trail_distance, [0.1, 0.1])
+
+
+class TestWeekendClose(unittest.TestCase):
+    """Calendar mask for exit.weekendClose"""
+
+    def test_friday_close_time(self):
+        bars = generate_bars(24 * 30, timeframe='H1', seed=3)
+        times = bars['time']
+
+        mask = weekend_close_mask(times, 'H1', 5, '22:30')
+
+        closed_at = times[mask] + 3600
+        weekdays = (closed_at // 86400 + 4) % 7
+        self.assertTrue(np.all(weekdays == 5))
+        self.assertTrue(np.all(closed_at % 86400 >= 22 * 3600 + 1800))
+        self.assertEqual(len(np.unique(closed_at // (7 * 86400))), mask.sum())
+
+    def test_gap_over_close_time(self):
+        # 金曜 21:00 の次のバーが月曜 0:00（2024-01-05 は金曜）
+        friday = 1704416400 + 21 * 3600 - 9 * 3600
+        times = np.array([friday - 3600, friday, friday + 3 * 86400 - 21 * 3600 + 3600])
+
+        mask = weekend_close_mask(times, 'H1', 5, '23:00')
+
+        self.assertEqual(mask.tolist(), [False, False, True])
+
+
+class TestEngineProtectiveExits(unittest.TestCase):
+    """BacktestEngine closes trades at SL/TP in both simulation modes"""
+
+    BLOCKS = [
+        {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}},
+        {'id': 'trend.maCross#2', 'typeId': 'trend.maCross',
+         'params': {'fastPeriod': 5, 'slowPeriod': 20, 'direction': 'dead'}},
+    ]
+
+    def config(self, long_risk: dict, short_risk: dict, exit_model: Optional[dict] = None) -> dict:
+        def strategy(strategy_id, block_id, priority, risk):
+            return {
+                'id': strategy_id, 'enabled': True, 'priority': priority,
+                'conflictPolicy': 'firstOnly', 'directionPolicy': 'both',
+                'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                    {'id': 'RG1', 'type': 'AND', 'conditions': [{'blockId': block_id}]}
+                ]},
+                'riskModel': risk,
+                'exitModel': exit_model or {'type': 'exit.none', 'params': {}},
+            }
+        return {
+            'strategies': [strategy('LONG', 'trend.maCross#1', 10, long_risk),
+                           strategy('SHORT', 'trend.maCross#2', 5, short_risk)],
+            'blocks': self.BLOCKS,
+        }
+
+    def run_engine(self, mode: str, config: dict, tie_break: str = 'stopLoss',
+                   digits: Optional[int] = 3) -> BacktestEngine:
+        engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M15",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json",
+            simulation_mode=mode,
+            digits=digits,
+            tie_break=tie_break
+        )
+        if digits is None:
+            # シンボル情報の桁数（3桁のシンボル）
+            engine._data_provider = Mock(symbol_digits=Mock(return_value=3))
+            with patch('sys.stdout', new=StringIO()):
+                engine.resolve_digits()
+        engine.strategy_config = config
+        engine.historical_data = generate_bars(6000, timeframe='M15', seed=5, digits=3).to_records()
+        with patch('sys.stdout', new=StringIO()):
+            engine.simulate_strategy()
+        return engine
+
+    def test_loop_and_vectorized_agree(self):
+        configs = {
+            'fixed': self.config({'type': 'risk.fixedSLTP', 'params': {'slPips': 8, 'tpPips': 12}},
+                                 {'type': 'risk.fixedSLTP', 'params': {'slPips': 10, 'tpPips': 5}}),
+            'atr': self.config({'type': 'risk.atrBased', 'params': {'atrPeriod': 14, 'atrTimeframe': 'H1',
+                                                                    'atrRatio': 1.0}},
+                               {'type': 'exit.none', 'params': {}}),
+        }
+        for name, config in configs.items():
+            for tie_break in TIE_BREAKS:
+                with self.subTest(config=name, tie_break=tie_break):
+                    vectorized = self.run_engine('vectorized', config, tie_break)
+                    loop = self.run_engine('loop', config, tie_break)
+
+                    self.assertGreater(len(vectorized.trades), 20)
+                    self.assertEqual(vectorized.trades, loop.trades)
+
+    def test_atr_shared_between_filter_and_risk_model(self):
+        risk = {'type': 'risk.atrBased', 'params': {'atrPeriod': 14, 'atrTimeframe': 'M15', 'atrRatio': 1.0}}
+        config = self.config(risk, risk)
+        config['blocks'] = self.BLOCKS + [{'id': 'filter.atrRange#1', 'typeId': 'filter.volatility.atrRange',
+                                           'params': {'period': 14, 'minAtr': 0.0, 'maxAtr': 100.0}}]
+        for strategy in config['strategies']:
+            strategy['entryRequirement']['ruleGroups'][0]['conditions'].append({'blockId': 'filter.atrRange#1'})
+
+        engine = self.run_engine('vectorized', config)
+
+        cache = engine.indicator_cache()
+        self.assertGreater(len(engine.trades), 20)
+        self.assertEqual(cache.stats()['keyHits']['ATR_M15_14_CLOSE'], 1)
+        self.assertIs(engine.exit_series('ATR', 'M15', 14), cache.get('ATR', 'M15', period=14))
+
+    def test_exit_models_loop_and_vectorized_agree(self):
+        risk = {'type': 'risk.fixedSLTP', 'params': {'slPips': 15, 'tpPips': 40}}
+        exit_models = {
+            'trailingStop': {'type': 'exit.trail', 'params': {'startPips': 6, 'trailPips': 4}},
+            'breakEven': {'type': 'exit.breakEven', 'params': {'triggerPips': 6, 'offsetPips': 1}},
+            'weekendClose': {'type': 'exit.weekendClose', 'params': {'dayOfWeek': 5, 'closeTime': '20:00'}},
+        }
+        for reason, exit_model in exit_models.items():
+            with self.subTest(exit_model=exit_model['type']):
+                config = self.config(risk, risk, exit_model)
+                config['strategies'][0]['entryRequirement']['ruleGroups'][0]['conditions'] = [
+                    {'blockId': 'trend.maCross#1'}
+                ]
+
+                vectorized = self.run_engine('vectorized', config)
+                loop = self.run_engine('loop', config)
+
+                self.assertEqual(vectorized.trades, loop.trades)
+                self.assertIn(reason, {t['exitReason'] for t in vectorized.trades})
+
+    def test_exit_reasons_and_prices(self):
+        config = self.config({'type': 'risk.fixedSLTP', 'params': {'slPips': 8, 'tpPips': 12}},
+                             {'type': 'risk.fixedSLTP', 'params': {'slPips': 8, 'tpPips': 12}})
+
+        trades = self.run_engine('vectorized', config).trades
+
+        reasons = {t['exitReason'] for t in trades}
+        self.assertEqual(reasons, {'stopLoss', 'takeProfit', 'signal'})
+        for trade in trades:
+            if trade['exitReason'] == 'takeProfit':
+                self.assertGreaterEqual(trade['profitLoss'], 0.12 - 1e-9)
+            elif trade['exitReason'] == 'stopLoss':
+                self.assertLessEqual(trade['profitLoss'], -0.08 + 1e-9)
+
+    def test_digits_from_symbol_info(self):
+        """SL/TP distances use the 3 digits reported for the symbol"""
+        config = self.config({'type': 'risk.fixedSLTP', 'params': {'slPips': 8, 'tpPips': 12}},
+                             {'type': 'risk.fixedSLTP', 'params': {'slPips': 8, 'tpPips': 12}})
+
+        engine = self.run_engine('vectorized', config, digits=None)
+
+        self.assertEqual(engine.digits, 3)
+        self.assertEqual(engine.trades, self.run_engine('vectorized', config).trades)
+        losses = [t['profitLoss'] for t in engine.trades if t['exitReason'] == 'stopLoss']
+        # 8 pips = 0.08（5桁として換算すると 0.0008）。ギャップでは始値で決済するため損失はそれ以上
+        self.assertAlmostEqual(max(losses), -0.08, places=6)
+
+    def test_invalid_tie_break_raises_error(self):
+        with self.assertRaises(ValueError):
+            self.run_engine('vectorized', self.config({}, {}), tie_break='random')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -322,5 +322,81 @@ class TestFetchHistoricalData(unittest.TestCase):
         )
 
 
+class TestChunkedFetch(unittest.TestCase):
+    """Test fetch_historical_data with chunk_days"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="H1",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json",
+            chunk_days=30
+        )
+        base = 1704067200  # 2024-01-01 00:00 UTC
+        count = 90 * 24 + 1
+        self.all_rates = np.zeros(count, dtype=[
+            ('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+            ('close', 'f8'), ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8')
+        ])
+        self.all_rates['time'] = base + np.arange(count) * 3600
+        self.all_rates['close'] = 145.0 + np.arange(count) * 0.001
+    
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        """Return the bars inside [date_from, date_to]"""
+        times = self.all_rates['time']
+        mask = (times >= date_from.timestamp()) & (times <= date_to.timestamp())
+        return self.all_rates[mask].copy()
+    
+    @patch('backtest_engine.mt5')
+    def test_fetches_contiguous_windows(self, mock_mt5):
+        """The range is requested in consecutive windows of chunk_days"""
+        mock_mt5.TIMEFRAME_H1 = 16385
+        mock_mt5.copy_rates_range.side_effect = self.copy_rates_range
+        
+        with patch('sys.stdout', new=StringIO()):
+            self.engine.fetch_historical_data()
+        
+        calls = [c[0] for c in mock_mt5.copy_rates_range.call_args_list]
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(calls[0][2].timestamp(), self.all_rates['time'][0])
+        for previous, current in zip(calls, calls[1:]):
+            self.assertEqual(current[2].timestamp(), previous[3].timestamp() + 1)
+            self.assertLessEqual(
+                (previous[3] - previous[2]).total_seconds(), 30 * 24 * 3600
+            )
+        self.assertEqual(calls[-1][3].timestamp(), self.all_rates['time'][-1])
+    
+    @patch('backtest_engine.mt5')
+    def test_chunks_are_joined_into_memory_map(self, mock_mt5):
+        """Without a cache the chunks are spilled to disk and memory-mapped"""
+        mock_mt5.TIMEFRAME_H1 = 16385
+        mock_mt5.copy_rates_range.side_effect = self.copy_rates_range
+        
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            self.engine.fetch_historical_data()
+        
+        self.assertIsInstance(self.engine.historical_data, np.memmap)
+        np.testing.assert_array_equal(self.engine.historical_data, self.all_rates)
+        self.assertIn("バー/秒", fake_out.getvalue())
+        self.assertIn(f"過去データを取得しました: {len(self.all_rates)} バー", fake_out.getvalue())
+    
+    @patch('backtest_engine.mt5')
+    def test_chunk_failure_raises_error(self, mock_mt5):
+        """A failed window aborts the fetch"""
+        mock_mt5.TIMEFRAME_H1 = 16385
+        mock_mt5.copy_rates_range.side_effect = [self.all_rates[:10], None]
+        mock_mt5.last_error.return_value = (-1, "Timeout")
+        
+        with patch('sys.stdout', new=StringIO()):
+            with self.assertRaises(Exception) as context:
+                self.engine.fetch_historical_data()
+        
+        self.assertIn("データ取得失敗", str(context.exception))
+
+
 if __name__ == '__main__':
     unittest.main()
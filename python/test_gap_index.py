@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Unit tests for GapIndex and its maintenance in BarCache
+
+Validates: 週末・欠損の分類、O(log n)の期間完全性判定、追記ごとの索引更新、欠損後のインジケーターリセット
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import ENTRY_MA_PERIOD, BacktestEngine
+from bar_cache import BarCache, to_epoch_seconds
+from gap_index import HOLE_MISSING, HOLE_WEEKEND, GapIndex, classify_holes, find_holes
+
+
+RATES_DTYPE = [('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+               ('close', 'f8'), ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8')]
+
+
+def ts(*args) -> int:
+    return to_epoch_seconds(datetime(*args))
+
+
+def make_rates(times) -> np.ndarray:
+    """Create bars at the given times"""
+    rates = np.zeros(len(times), dtype=RATES_DTYPE)
+    rates['time'] = times
+    rates['close'] = 145.0 + np.arange(len(times)) * 0.01
+    return rates
+
+
+def forex_h1(start_ts: int, end_ts: int) -> np.ndarray:
+    """H1 bar times with the market closed from Friday 22:00 to Sunday 22:00 UTC"""
+    times = np.arange(start_ts, end_ts + 1, 3600)
+    seconds_in_week = (times + 3 * 86400) % (7 * 86400)
+    closed = (seconds_in_week >= 4 * 86400 + 22 * 3600) & (seconds_in_week < 6 * 86400 + 22 * 3600)
+    return times[~closed]
+
+
+def naive_holes(times, seconds: int, start_ts: int, end_ts: int) -> list:
+    """Reference hole search walking every expected bar time"""
+    present = set(int(t) for t in times)
+    holes = []
+    expected = -(-start_ts // seconds) * seconds
+    while expected <= end_ts:
+        if expected not in present:
+            if holes and holes[-1][1] == expected - 1:
+                holes[-1][1] = min(expected + seconds - 1, end_ts)
+            else:
+                holes.append([expected, min(expected + seconds - 1, end_ts)])
+        expected += seconds
+    return [tuple(h) for h in holes]
+
+
+class TestHoleDetection(unittest.TestCase):
+    """Test find_holes and classify_holes"""
+
+    def test_holes_match_reference(self):
+        """Leading, interior and trailing holes equal a per-bar walk"""
+        rng = np.random.default_rng(5)
+        times = np.arange(ts(2024, 1, 1, 0, 3), ts(2024, 1, 1, 12), 60)
+        times = times[rng.random(len(times)) > 0.2]
+        start, end = ts(2024, 1, 1), ts(2024, 1, 1, 13, 0, 30)
+
+        starts, ends = find_holes(times, 60, start, end)
+
+        self.assertEqual(list(zip(starts.tolist(), ends.tolist())), naive_holes(times, 60, start, end))
+
+    def test_weekend_and_missing_classification(self):
+        """Friday-evening to Monday-morning breaks are weekends, weekday holes are missing"""
+        kinds = classify_holes(
+            [ts(2024, 1, 5, 22), ts(2024, 1, 6), ts(2024, 1, 10, 3), ts(2024, 1, 5, 22)],
+            [ts(2024, 1, 7, 21, 59, 59), ts(2024, 1, 7, 23, 59, 59), ts(2024, 1, 10, 3, 59, 59),
+             ts(2024, 1, 8, 21, 59, 59)]
+        )
+
+        self.assertEqual(kinds.tolist(), [HOLE_WEEKEND, HOLE_WEEKEND, HOLE_MISSING, HOLE_MISSING])
+
+    def test_irregular_bars(self):
+        """Misaligned and repeated bar times are recorded"""
+        times = [ts(2024, 1, 2), ts(2024, 1, 2, 0, 1, 30), ts(2024, 1, 2, 0, 2), ts(2024, 1, 2, 0, 2)]
+
+        index = GapIndex.build(times, 'M1', [(times[0], times[-1] + 59)])
+
+        self.assertEqual(index.irregular.tolist(), [times[1], times[3]])
+
+
+class TestGapIndexQueries(unittest.TestCase):
+    """Test range queries on GapIndex"""
+
+    def setUp(self):
+        self.start = ts(2024, 1, 1)
+        self.end = ts(2024, 1, 31, 23, 59, 59)
+        times = forex_h1(self.start, self.end)
+        # 1月10日 03:00-05:59 のバーが欠損
+        self.times = times[(times < ts(2024, 1, 10, 3)) | (times >= ts(2024, 1, 10, 6))]
+        self.index = GapIndex.build(self.times, 'H1', [(self.start, self.end)])
+
+    def test_weekends_do_not_make_range_incomplete(self):
+        """Ranges spanning only weekend breaks are complete"""
+        self.assertTrue(self.index.is_complete(ts(2024, 1, 1), ts(2024, 1, 9, 23, 59)))
+        self.assertEqual(len(self.index.holes(self.start, self.end, kind=HOLE_WEEKEND)), 4)
+
+    def test_missing_hole_makes_range_incomplete(self):
+        """A weekday hole is reported with its bounds"""
+        self.assertFalse(self.index.is_complete(ts(2024, 1, 8), ts(2024, 1, 12)))
+        self.assertEqual(self.index.count_missing(self.start, self.end), 1)
+        self.assertEqual(
+            self.index.holes(self.start, self.end),
+            [(ts(2024, 1, 10, 3), ts(2024, 1, 10, 5, 59, 59))]
+        )
+
+    def test_uncovered_range_is_incomplete(self):
+        """Ranges outside the coverage are never complete"""
+        self.assertFalse(self.index.covers(ts(2023, 12, 31), ts(2024, 1, 2)))
+        self.assertFalse(self.index.is_complete(ts(2024, 1, 30), ts(2024, 2, 2)))
+
+    def test_bars_since_reset(self):
+        """Counters restart after missing holes only"""
+        since = self.index.bars_since_reset(self.times)
+        after_hole = int(np.searchsorted(self.times, ts(2024, 1, 10, 6)))
+        after_weekend = int(np.searchsorted(self.times, ts(2024, 1, 7, 22)))
+
+        self.assertEqual(since[after_hole], 0)
+        self.assertEqual(since[after_hole - 1], after_hole - 1)
+        self.assertEqual(since[after_weekend], after_weekend)
+        self.assertEqual(
+            self.index.bars_since_reset(self.times, include_weekends=True)[after_weekend], 0
+        )
+        # 3本の穴は min_bars=3 ならリセット、4 ならまたいで数える
+        self.assertEqual(self.index.bars_since_reset(self.times, min_bars=3)[after_hole], 0)
+        self.assertEqual(self.index.bars_since_reset(self.times, min_bars=4)[after_hole], after_hole)
+
+
+class TestBarCacheGapIndex(unittest.TestCase):
+    """Test the gap index maintained by BarCache.append"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = BarCache(self.cache_dir)
+        rng = np.random.default_rng(11)
+        times = forex_h1(ts(2024, 1, 1), ts(2024, 3, 31, 23))
+        self.rates = make_rates(times[rng.random(len(times)) > 0.02])
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def assert_same_index(self, actual: GapIndex, expected: GapIndex):
+        self.assertEqual(actual.coverage, expected.coverage)
+        np.testing.assert_array_equal(actual.hole_starts, expected.hole_starts)
+        np.testing.assert_array_equal(actual.hole_ends, expected.hole_ends)
+        np.testing.assert_array_equal(actual.hole_kinds, expected.hole_kinds)
+
+    def test_incremental_index_matches_rebuild(self):
+        """Appending windows in any order keeps the index equal to a full rebuild"""
+        windows = [
+            (ts(2024, 2, 1), ts(2024, 2, 29, 23, 59, 59)),
+            (ts(2024, 1, 1), ts(2024, 1, 15, 23, 59, 59)),
+            (ts(2024, 3, 10), ts(2024, 3, 31, 23, 59, 59)),
+            (ts(2024, 1, 16), ts(2024, 1, 31, 23, 59, 59)),
+            (ts(2024, 3, 1), ts(2024, 3, 9, 23, 59, 59)),
+        ]
+        for start, end in windows:
+            self.cache.append("USDJPY", "H1", start, end, self.rates)
+            self.assert_same_index(
+                self.cache.gap_index("USDJPY", "H1"),
+                self.cache.rebuild_gap_index("USDJPY", "H1")
+            )
+
+        expected = GapIndex.build(self.rates['time'], 'H1', [(ts(2024, 1, 1), ts(2024, 3, 31, 23, 59, 59))])
+        self.assert_same_index(self.cache.gap_index("USDJPY", "H1"), expected)
+
+    def test_index_is_persisted(self):
+        """The index is written at ingest and rebuilt when it is stale"""
+        self.cache.append("USDJPY", "H1", ts(2024, 1, 1), ts(2024, 1, 31, 23, 59, 59), self.rates)
+        path = os.path.join(self.cache.entry_dir("USDJPY", "H1"), 'gaps.npz')
+        self.assertTrue(os.path.isfile(path))
+
+        os.remove(path)
+        index = self.cache.gap_index("USDJPY", "H1")
+
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(index.coverage, [(ts(2024, 1, 1), ts(2024, 1, 31, 23, 59, 59))])
+
+
+class TestEngineGapHandling(unittest.TestCase):
+    """Test range validation and indicator resets in BacktestEngine"""
+
+    def setUp(self):
+        self.engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M1",
+            start_date=datetime(2024, 1, 2),
+            end_date=datetime(2024, 1, 2, 1, 59),
+            output_path="test_output.json"
+        )
+        self.times = np.arange(ts(2024, 1, 2), ts(2024, 1, 2, 2), 60)
+        # 00:30-00:59 のバーが欠損（移動平均の期間より長い）
+        self.rates = make_rates(self.times[(self.times < ts(2024, 1, 2, 0, 30)) | (self.times >= ts(2024, 1, 2, 1))])
+
+    @patch('backtest_engine.mt5')
+    def test_interior_gap_warning(self, mock_mt5):
+        """Interior holes are reported separately from the range check"""
+        mock_mt5.copy_rates_range.return_value = self.rates
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()) as fake_err:
+            self.engine.fetch_historical_data()
+
+        self.assertNotIn("データ範囲が不完全です", fake_err.getvalue())
+        self.assertIn("データに欠損期間があります: 1 件", fake_err.getvalue())
+        self.assertFalse(self.engine.gap_index.is_complete(
+            to_epoch_seconds(self.engine.start_date), to_epoch_seconds(self.engine.end_date)
+        ))
+
+    def test_entry_signal_waits_after_gap(self):
+        """The moving average is not computed across a missing hole"""
+        self.engine.historical_data = self.rates
+        after_hole = int(np.searchsorted(self.rates['time'], ts(2024, 1, 2, 1)))
+
+        self.assertFalse(self.engine.check_entry_signal(self.rates[after_hole + 5], after_hole + 5, 'BUY'))
+        self.assertTrue(self.engine.check_entry_signal(self.rates[after_hole + 20], after_hole + 20, 'BUY'))
+
+    def test_single_missing_bar_does_not_suppress_entries(self):
+        """Short intraday holes are bridged like the baseline engine did"""
+        rates = make_rates(self.times[self.times != ts(2024, 1, 2, 1)])
+        self.engine.historical_data = rates
+
+        buy, _ = self.engine.entry_signal_arrays()
+
+        self.assertTrue(buy[ENTRY_MA_PERIOD:].all())
+        after_hole = int(np.searchsorted(rates['time'], ts(2024, 1, 2, 1)))
+        self.assertTrue(self.engine.check_entry_signal(rates[after_hole + 1], after_hole + 1, 'BUY'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Unit tests for global_guards
+
+Validates: 曜日・時間帯・スプレッドのマスクとバーごとの datetime 判定の一致、
+           BacktestEngine / StreamingEngine でのエントリーの制限
+"""
+
+import unittest
+import sys
+import os
+import copy
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from typing import Optional
+from unittest.mock import Mock, patch
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import BacktestEngine
+from global_guards import GlobalGuards, WEEKDAY_KEYS, session_window_mask, weekday_mask
+from streaming_engine import StreamingEngine
+from synthetic_data import generate_bars
+
+GUARDS = {
+    'timeframe': 'M1',
+    'useClosedBarOnly': True,
+    'noReentrySameBar': True,
+    'maxPositionsTotal': 1,
+    'maxPositionsPerSymbol': 1,
+    'maxSpreadPips': 1.8,
+    'session': {
+        'enabled': True,
+        'windows': [{'start': '07:00', 'end': '14:59'}, {'start': '22:00', 'end': '02:30'}],
+        'weekDays': {'mon': True, 'tue': False, 'wed': True, 'thu': True, 'fri': True},
+    },
+}
+
+
+def epoch(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def reference_allowed(times, spread, seconds, digits, guards) -> list:
+    """バーごとに datetime で判定する参照実装"""
+    session = guards['session']
+    result = []
+    for time, points in zip(times, spread):
+        at = datetime.fromtimestamp(int(time), tz=timezone.utc) + timedelta(seconds=seconds)
+        allowed = (points / 10.0 if digits in (3, 5) else points) <= guards['maxSpreadPips']
+        key = WEEKDAY_KEYS[(at.weekday() + 1) % 7]
+        allowed &= session['weekDays'].get(key, key not in ('sun', 'sat'))
+        minutes = at.hour * 60 + at.minute
+        inside = False
+        for window in session['windows']:
+            start = int(window['start'][:2]) * 60 + int(window['start'][3:])
+            end = int(window['end'][:2]) * 60 + int(window['end'][3:])
+            inside |= (start <= minutes <= end) if start <= end else (minutes >= start or minutes <= end)
+        result.append(bool(allowed and inside))
+    return result
+
+
+class TestGuardMasks(unittest.TestCase):
+    """Masks built from epoch arithmetic"""
+
+    def test_weekdays(self):
+        # 2024-01-07 は日曜
+        times = np.array([epoch(2024, 1, 7 + day, 12) for day in range(7)])
+
+        mask = weekday_mask(times, {'sun': True, 'wed': False})
+
+        self.assertEqual(mask.tolist(), [True, True, True, False, True, True, False])
+
+    def test_windows_include_end_and_wrap_midnight(self):
+        clock = ((6, 59), (7, 0), (14, 59), (15, 0), (23, 0), (2, 30), (2, 31))
+        times = np.array([epoch(2024, 1, 8, hour, minute) for hour, minute in clock])
+
+        mask = session_window_mask(times, GUARDS['session']['windows'])
+
+        self.assertEqual(mask.tolist(), [False, True, True, False, True, True, False])
+
+    def test_matches_per_bar_reference(self):
+        for timeframe, seconds in (('M1', 60), ('M15', 900), ('H1', 3600)):
+            with self.subTest(timeframe=timeframe):
+                bars = generate_bars(5000, timeframe=timeframe, seed=4, digits=3)
+
+                mask = GlobalGuards(GUARDS).mask(bars['time'], bars['spread'], timeframe, 3)
+
+                expected = reference_allowed(bars['time'], bars['spread'], seconds, 3, GUARDS)
+                self.assertEqual(mask.tolist(), expected)
+                self.assertTrue(0 < mask.sum() < len(mask))
+
+    def test_bar_is_evaluated_at_its_close(self):
+        times = np.array([epoch(2024, 1, 8, 6, 45), epoch(2024, 1, 8, 14, 45)])
+
+        mask = GlobalGuards(GUARDS).mask(times, np.zeros(2), 'M15', 3)
+
+        self.assertEqual(mask.tolist(), [True, False])
+
+    def test_disabled_session_checks_spread_only(self):
+        guards = copy.deepcopy(GUARDS)
+        guards['session']['enabled'] = False
+        times = np.array([epoch(2024, 1, 9, 3)] * 3)
+
+        mask = GlobalGuards(guards).mask(times, np.array([10, 18, 19]), 'M1', 5)
+
+        self.assertEqual(mask.tolist(), [True, True, False])
+
+    def test_spread_follows_digits(self):
+        """15 points are 1.5 pips on a 3-digit symbol and 15 pips on a 2-digit one"""
+        guards = {'maxSpreadPips': 2.0}
+        times = np.array([epoch(2024, 1, 9, 3)])
+
+        self.assertTrue(GlobalGuards(guards).mask(times, np.array([15]), 'M1', 3)[0])
+        self.assertFalse(GlobalGuards(guards).mask(times, np.array([15]), 'M1', 2)[0])
+
+    def test_missing_guards_allow_every_bar(self):
+        mask = GlobalGuards(None).mask(np.array([0, 60]), np.array([500, 500]), 'M1', 3)
+
+        self.assertTrue(mask.all())
+
+    def test_fixed_guards_warn_when_disabled(self):
+        guards = GlobalGuards({'noReentrySameBar': False})
+
+        with patch('sys.stderr', new=StringIO()) as stderr:
+            guards.warn_ignored()
+
+        self.assertIn('noReentrySameBar', stderr.getvalue())
+
+
+class TestEngineGuards(unittest.TestCase):
+    """Guards restrict entries of every strategy"""
+
+    CONFIG = {
+        'globalGuards': GUARDS,
+        'strategies': [{
+            'id': 'S1', 'enabled': True, 'priority': 10, 'conflictPolicy': 'firstOnly', 'directionPolicy': 'both',
+            'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                {'id': 'RG1', 'type': 'AND', 'conditions': [{'blockId': 'trend.maCross#1'}]},
+                {'id': 'RG2', 'type': 'AND', 'conditions': [{'blockId': 'trend.maCross#2'}]},
+            ]},
+        }],
+        'blocks': [
+            {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}},
+            {'id': 'trend.maCross#2', 'typeId': 'trend.maCross',
+             'params': {'fastPeriod': 5, 'slowPeriod': 20, 'direction': 'dead'}},
+        ],
+    }
+
+    def setUp(self):
+        self.bars = generate_bars(4000, timeframe='M15', seed=9, digits=3)
+
+    def run_engine(self, mode: str, config: dict, symbol_digits: Optional[int] = None) -> BacktestEngine:
+        engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M15",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json",
+            simulation_mode=mode,
+            digits=3 if symbol_digits is None else None
+        )
+        if symbol_digits is not None:
+            engine._data_provider = Mock(symbol_digits=Mock(return_value=symbol_digits))
+            with patch('sys.stdout', new=StringIO()):
+                engine.resolve_digits()
+        engine.strategy_config = config
+        engine.historical_data = self.bars.to_records()
+        with patch('sys.stdout', new=StringIO()):
+            engine.simulate_strategy()
+        return engine
+
+    def test_entries_respect_guards(self):
+        allowed = GlobalGuards(GUARDS).mask(self.bars['time'], self.bars['spread'], 'M15', 3)
+        unguarded = {k: v for k, v in self.CONFIG.items() if k != 'globalGuards'}
+
+        engine = self.run_engine('vectorized', self.CONFIG)
+
+        entries = engine.strategy_arbitration().entries('S1')
+        self.assertFalse(np.any(entries & ~allowed))
+        np.testing.assert_array_equal(
+            entries, self.run_engine('vectorized', unguarded).strategy_arbitration().entries('S1') & allowed
+        )
+        self.assertGreater(len(engine.trades), 10)
+
+    def test_spread_guard_uses_symbol_digits(self):
+        """maxSpreadPips converts spreads with the digits reported for the symbol"""
+        engine = self.run_engine('vectorized', self.CONFIG, symbol_digits=2)
+
+        allowed = GlobalGuards(GUARDS).mask(self.bars['time'], self.bars['spread'], 'M15', 2)
+        entries = engine.strategy_arbitration().entries('S1')
+        self.assertFalse(np.array_equal(allowed, GlobalGuards(GUARDS).mask(
+            self.bars['time'], self.bars['spread'], 'M15', 3
+        )))
+        self.assertFalse(np.any(entries & ~allowed))
+        np.testing.assert_array_equal(
+            entries, self.run_engine('vectorized', self.CONFIG, symbol_digits=5).strategy_arbitration().entries('S1')
+            & allowed
+        )
+
+    def test_loop_and_vectorized_agree(self):
+        self.assertEqual(self.run_engine('vectorized', self.CONFIG).trades, self.run_engine('loop', self.CONFIG).trades)
+
+    def test_streaming_skips_guarded_bars(self):
+        engine = StreamingEngine(self.CONFIG, timeframe='M15', digits=3)
+        streamed = [bool(engine.on_bar(self.bars[i])) for i in range(len(self.bars))]
+
+        batch = self.run_engine('vectorized', self.CONFIG).strategy_arbitration().entries('S1')
+
+        self.assertEqual(streamed, batch.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Unit tests for indicators and IndicatorCache
+
+Validates: 移動平均・標準偏差の値、キーの正規化、ブロック・ストラテジー間の重複排除、ヒット・ミスの統計
+"""
+
+import unittest
+import sys
+import os
+import json
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from indicator_cache import IndicatorCache, block_indicators, key_name, make_key
+from indicators import applied_price, moving_average, standard_deviation
+from synthetic_data import generate_bars
+
+EA_TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ea', 'tests')
+
+
+class TestIndicators(unittest.TestCase):
+    """Test indicator values against straightforward references"""
+
+    def setUp(self):
+        self.close = generate_bars(500, seed=6)['close']
+
+    def test_sma(self):
+        result = moving_average(self.close, 20, 'SMA')
+
+        self.assertTrue(np.all(np.isnan(result[:19])))
+        expected = [self.close[i - 19:i + 1].mean() for i in range(19, len(self.close))]
+        np.testing.assert_allclose(result[19:], expected, rtol=1e-12)
+
+    def test_ema_seeded_with_first_price(self):
+        result = moving_average(self.close, 10, 'ema')
+
+        expected = [self.close[0]]
+        for value in self.close[1:]:
+            expected.append(value * 2 / 11 + expected[-1] * 9 / 11)
+        self.assertTrue(np.all(np.isnan(result[:9])))
+        np.testing.assert_allclose(result[9:], expected[9:], rtol=1e-12)
+
+    def test_standard_deviation(self):
+        result = standard_deviation(self.close, 20)
+
+        expected = [self.close[i - 19:i + 1].std() for i in range(19, len(self.close))]
+        np.testing.assert_allclose(result[19:], expected, rtol=1e-9)
+
+    def test_standard_deviation_around_ema(self):
+        result = standard_deviation(self.close, 20, 'EMA')
+
+        ema = moving_average(self.close, 20, 'EMA')
+        expected = [np.sqrt(((self.close[i - 19:i + 1] - ema[i]) ** 2).mean()) for i in range(19, len(self.close))]
+        np.testing.assert_allclose(result[19:], expected, rtol=1e-9)
+
+    def test_invalid_arguments_raise_error(self):
+        with self.assertRaises(ValueError):
+            moving_average(self.close, 0)
+        with self.assertRaises(ValueError):
+            moving_average(self.close, 5, 'TEMA')
+        with self.assertRaises(ValueError):
+            applied_price(generate_bars(10), 'VWAP')
+
+
+class TestIndicatorCache(unittest.TestCase):
+    """Test caching and statistics"""
+
+    def setUp(self):
+        self.bars = generate_bars(2000, seed=7)
+        self.cache = IndicatorCache({'M1': self.bars, 'H1': generate_bars(200, timeframe='H1', seed=7)})
+
+    def test_same_key_computed_once(self):
+        first = self.cache.get('MA', 'M1', period=20, method='SMA')
+        second = self.cache.get('ma', 'M1', 'close', method='sma', period=20)
+
+        self.assertIs(first, second)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertFalse(first.flags.writeable)
+
+    def test_key_includes_price_and_timeframe(self):
+        self.cache.get('MA', 'M1', period=20, method='SMA')
+        self.cache.get('MA', 'M1', 'HIGH', period=20, method='SMA')
+        self.cache.get('MA', 'H1', period=20, method='SMA')
+
+        self.assertEqual(self.cache.misses, 3)
+        self.assertEqual(key_name(make_key('MA', 'M1', period=20, method='SMA')), 'MA_M1_SMA_20_CLOSE')
+
+    def test_bands_share_moving_average(self):
+        """Bollinger Bands reuse the cached SMA and standard deviation"""
+        middle = self.cache.get('MA', 'M1', period=20, method='SMA')
+
+        bands = self.cache.get('BB', 'M1', period=20, deviation=2.0)
+
+        self.assertIs(bands[0], middle)
+        np.testing.assert_allclose(
+            bands[1] - bands[0], 2.0 * standard_deviation(self.bars['close'], 20), equal_nan=True
+        )
+        self.assertEqual(self.cache.stats()['keyHits']['MA_M1_SMA_20_CLOSE'], 1)
+
+    def test_bars_are_not_made_read_only(self):
+        self.cache.get('MA', 'M1', period=5, method='SMA')
+
+        self.assertTrue(self.bars['close'].flags.writeable)
+
+    def test_unknown_indicator_raises_error(self):
+        with self.assertRaises(ValueError):
+            self.cache.get('VWAP', 'M1', period=5)
+
+    def test_single_blocks_config_hits_cache(self):
+        """Blocks of the 32 single-block strategies share MA/BB series"""
+        with open(os.path.join(EA_TESTS_DIR, 'test_single_blocks.json'), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        requests = self.cache.prefetch(config['blocks'], 'M1')
+
+        # MA(20,SMA) x6 blocks, EMA 5/20 x2 crosses, STDDEV(20), BB(20,2.0) x2, SAR(0.02,0.2) x2,
+        # ICHIMOKU / WPR / STOCH x1 each (misses include their HIGHEST/LOWEST 9,26,52 / 14 / 5),
+        # ATR(14) and ADX(14) sharing one TR (misses include TR and DM)
+        self.assertEqual(requests, 20)
+        self.assertEqual(self.cache.misses, 23)
+        self.assertEqual(self.cache.hits, 12)
+        self.assertIn("ヒット 12 / ミス 23", self.cache.format_stats())
+
+    def test_block_indicators_follow_ea_defaults(self):
+        self.assertEqual(
+            block_indicators({'typeId': 'trend.maRelation', 'params': {}}),
+            [('MA', 'CLOSE', {'period': 200, 'method': 'EMA'})]
+        )
+        self.assertEqual(block_indicators({'typeId': 'filter.spreadMax', 'params': {}}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ma_kernels
+
+Validates: SMA / EMA / SMMA / LWMA とバーごとの参照実装の一致、ブロックの境界、
+           長い系列での精度、派生した適用価格（MEDIAN / TYPICAL / WEIGHTED）
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from indicators import APPLIED_PRICES, MA_METHODS, applied_price, moving_average
+from ma_kernels import block_scans, linear_recurrence, sliding_reduce
+from synthetic_data import generate_bars
+
+
+def reference_average(price, period: int, method: str) -> list:
+    """MT5の iMA と同じ式をバーごとに計算する参照実装"""
+    result = [np.nan] * len(price)
+    if method == 'SMA':
+        for t in range(period - 1, len(price)):
+            result[t] = sum(price[t - period + 1:t + 1]) / period
+    elif method == 'EMA':
+        average = price[0]
+        for t, value in enumerate(price):
+            if t > 0:
+                average = value * 2 / (period + 1) + average * (1 - 2 / (period + 1))
+            if t >= period - 1:
+                result[t] = average
+    elif method == 'SMMA':
+        average = sum(price[:period]) / period
+        result[period - 1] = average
+        for t in range(period, len(price)):
+            average = (average * (period - 1) + price[t]) / period
+            result[t] = average
+    elif method == 'LWMA':
+        for t in range(period - 1, len(price)):
+            window = price[t - period + 1:t + 1]
+            result[t] = sum((k + 1) * v for k, v in enumerate(window)) / (period * (period + 1) / 2)
+    return result
+
+
+class TestBlockScans(unittest.TestCase):
+    """Window reductions from per-block prefix/suffix scans"""
+
+    def setUp(self):
+        self.values = np.random.default_rng(1).normal(size=103)
+
+    def test_window_sums_max_and_min(self):
+        for period in (1, 2, 7, 10, 103):
+            windows = sliding_window_view(self.values, period)
+            with self.subTest(period=period):
+                np.testing.assert_allclose(sliding_reduce(self.values, period), windows.sum(axis=1), rtol=1e-12)
+                np.testing.assert_array_equal(sliding_reduce(self.values, period, np.maximum), windows.max(axis=1))
+                np.testing.assert_array_equal(sliding_reduce(self.values, period, np.minimum), windows.min(axis=1))
+
+    def test_short_series(self):
+        self.assertEqual(len(sliding_reduce(self.values[:3], 5)), 0)
+
+    def test_scans_stay_inside_blocks(self):
+        prefix, suffix = block_scans(np.ones(10), 4)
+
+        self.assertEqual(prefix.tolist(), [1, 2, 3, 4, 1, 2, 3, 4, 1, 2])
+        self.assertEqual(suffix[:8].tolist(), [4, 3, 2, 1, 4, 3, 2, 1])
+
+
+class TestLinearRecurrence(unittest.TestCase):
+    """Blocked scan of y[t] = u[t] + r y[t-1]"""
+
+    def test_matches_sequential_loop(self):
+        inputs = np.random.default_rng(2).normal(size=500)
+        for ratio in (0.0, 0.5, 0.9, 0.999):
+            expected, value = [], 3.0
+            for u in inputs:
+                value = u + ratio * value
+                expected.append(value)
+            with self.subTest(ratio=ratio):
+                np.testing.assert_allclose(linear_recurrence(inputs, ratio, 3.0), expected, rtol=1e-12, atol=1e-12)
+
+    def test_empty_inputs(self):
+        self.assertEqual(len(linear_recurrence(np.empty(0), 0.5, 1.0)), 0)
+
+
+class TestMovingAverages(unittest.TestCase):
+    """Every method agrees with the per-bar reference"""
+
+    def setUp(self):
+        self.close = generate_bars(600, seed=8)['close']
+
+    def test_methods_match_reference(self):
+        for method in MA_METHODS:
+            for period in (1, 2, 13, 50, 600):
+                with self.subTest(method=method, period=period):
+                    result = moving_average(self.close, period, method)
+
+                    expected = reference_average(self.close.tolist(), period, method)
+                    np.testing.assert_allclose(result, expected, rtol=1e-12, equal_nan=True)
+                    self.assertTrue(np.isnan(result[:period - 1]).all())
+
+    def test_methods_are_case_insensitive(self):
+        np.testing.assert_array_equal(moving_average(self.close, 9, 'lwma'), moving_average(self.close, 9, 'LWMA'))
+
+    def test_long_series_keeps_precision(self):
+        # 累積和の差では桁落ちする大きさの価格と長さ
+        price = 150.0 + np.random.default_rng(4).normal(scale=1e-4, size=300_000).cumsum()
+
+        for method in ('SMA', 'LWMA'):
+            with self.subTest(method=method):
+                result = moving_average(price, 30, method)
+
+                tail = price[-30:]
+                weights = np.arange(1, 31) if method == 'LWMA' else np.ones(30)
+                self.assertAlmostEqual(result[-1], (weights * tail).sum() / weights.sum(), places=11)
+
+    def test_short_series_is_all_nan(self):
+        for method in MA_METHODS:
+            self.assertTrue(np.isnan(moving_average(self.close[:5], 10, method)).all())
+
+
+class TestAppliedPrices(unittest.TestCase):
+    """Derived applied prices"""
+
+    def setUp(self):
+        self.bars = generate_bars(50, seed=3)
+
+    def test_derived_prices(self):
+        high, low, close = self.bars['high'], self.bars['low'], self.bars['close']
+
+        np.testing.assert_allclose(applied_price(self.bars, 'MEDIAN'), (high + low) / 2)
+        np.testing.assert_allclose(applied_price(self.bars, 'typical'), (high + low + close) / 3)
+        np.testing.assert_allclose(applied_price(self.bars, 'WEIGHTED'), (high + low + 2 * close) / 4)
+
+    def test_single_bar_row(self):
+        rows = self.bars.to_records()
+        for name in APPLIED_PRICES:
+            with self.subTest(name=name):
+                self.assertEqual(float(applied_price(rows[7], name)), applied_price(self.bars, name)[7])
+
+
+if __name__ == '__main__':
+    unittest.main()
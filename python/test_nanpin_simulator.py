@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Unit tests for nanpin_simulator
+
+Validates: 段ごとのロット、段の約定とバスケットの決済のバーごとの判定との一致、
+           段数のスイープ、BacktestEngine の loop / vectorized の一致
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime
+from io import StringIO
+from unittest.mock import Mock, patch
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+import exit_resolver
+from backtest_engine import BacktestEngine
+from exit_resolver import EXIT_NONE, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, TIE_BREAKS, bar_exit
+from nanpin_simulator import NanpinLadders, leg_lots, nanpin_settings
+from synthetic_data import generate_bars
+
+
+def scan_basket(bars, entry, long, interval, lots, depth, stop_distance, target_distance, end, tie_break):
+    """バーごとに段の約定とバスケットのSL/TPを評価する参照実装"""
+    side = 1.0 if long else -1.0
+    entry_price = float(bars['close'][entry])
+    levels = [entry_price - side * k * interval for k in range(depth + 1)]
+    stop = levels[depth] - side * stop_distance
+    legs, size, cost = 0, lots[0], lots[0] * entry_price
+    for j in range(entry + 1, min(end, len(bars['high']) - 1) + 1):
+        bar_open, high, low = bars['open'][j], bars['high'][j], bars['low'][j]
+        fills = []
+        for level in levels[legs + 1:]:
+            if not ((low <= level) if long else (high >= level)):
+                break
+            fills.append(min(bar_open, level) if long else max(bar_open, level))
+        reason, price = bar_exit(bar_open, high, low, long, stop, cost / size + side * target_distance, tie_break)
+        if reason != EXIT_TAKE_PROFIT:
+            for fill in fills:
+                legs += 1
+                size += lots[legs]
+                cost += lots[legs] * fill
+        if reason != EXIT_NONE:
+            return j, price, reason, legs, size, cost / size
+    return len(bars['high']), None, EXIT_NONE, legs, size, cost / size
+
+
+class TestLegLots(unittest.TestCase):
+    """Lots per leg from lotAdjustMethod"""
+
+    def test_lot_adjust_methods(self):
+        np.testing.assert_allclose(leg_lots({'lotAdjustMethod': 0}, 1.0, 3), [1, 1, 1, 1])
+        np.testing.assert_allclose(leg_lots({'lotAdjustMethod': 1, 'multiplier': 3}, 0.1, 3), [0.1, 0.3, 0.9, 2.7])
+        np.testing.assert_allclose(leg_lots({'lotAdjustMethod': 2, 'fixedIncrement': 0.5}, 1.0, 2), [1, 1.5, 2])
+
+    def test_invalid_method_raises_error(self):
+        with self.assertRaises(ValueError):
+            leg_lots({'lotAdjustMethod': 7}, 1.0, 2)
+
+    def test_settings_follow_ea_defaults(self):
+        interval, depth, lots = nanpin_settings({'type': 'nanpin.fixed', 'params': {}}, 3)
+
+        self.assertAlmostEqual(interval, 0.1)
+        self.assertEqual(depth, 5)
+        self.assertEqual(len(lots), 6)
+        self.assertIsNone(nanpin_settings({'type': 'nanpin.off', 'params': {}}, 3))
+        self.assertIsNone(nanpin_settings(None, 3))
+
+
+class TestNanpinLadders(unittest.TestCase):
+    """Array ladders agree with the per-bar reference"""
+
+    def setUp(self):
+        self.bars = generate_bars(4000, timeframe='M15', seed=11, digits=3).to_records()
+        rng = np.random.default_rng(3)
+        self.entries = np.sort(rng.choice(np.arange(50, 3900), 150, replace=False))
+        self.is_long = rng.random(150) < 0.5
+        self.end = np.minimum(self.entries + rng.integers(5, 400, 150), len(self.bars) - 1)
+        self.interval = 0.05
+        self.lots = leg_lots({'lotAdjustMethod': 1}, 1.0, 6)
+
+    def ladders(self, depth, end=None):
+        bars = self.bars
+        return NanpinLadders(
+            bars['open'], bars['high'], bars['low'], self.entries, self.is_long,
+            bars['close'][self.entries], self.interval, self.lots[:depth + 1], depth,
+            self.end if end is None else end
+        )
+
+    def check(self, ladders, depth, tie_break):
+        index, price, reason = ladders.exits(depth, 0.08, 0.06, tie_break)
+        exit_at = np.where(reason == EXIT_NONE, self.end, index)
+        legs, lots, average = ladders.basket(depth, exit_at, reason)
+        for k, entry in enumerate(self.entries.tolist()):
+            expected = scan_basket(
+                self.bars, entry, bool(self.is_long[k]), self.interval, self.lots, depth, 0.08, 0.06,
+                int(self.end[k]), tie_break
+            )
+            self.assertEqual(int(index[k]), expected[0])
+            self.assertEqual(int(reason[k]), expected[2])
+            if expected[1] is not None:
+                self.assertEqual(float(price[k]), expected[1])
+            self.assertEqual((int(legs[k]), float(lots[k]), float(average[k])), expected[3:])
+
+    def test_matches_per_bar_reference(self):
+        for tie_break in TIE_BREAKS:
+            with self.subTest(tie_break=tie_break):
+                self.check(self.ladders(4), 4, tie_break)
+
+    def test_small_windows(self):
+        with patch.object(exit_resolver, 'INITIAL_WINDOW_BARS', 2), \
+                patch.object(exit_resolver, 'MAX_WINDOW_CELLS', 16):
+            self.check(self.ladders(3), 3, 'stopLoss')
+
+    def test_depth_sweep_reuses_deepest_ladder(self):
+        deepest = self.ladders(6)
+        for depth in range(7):
+            with self.subTest(depth=depth):
+                swept = deepest.exits(depth, 0.08, 0.06)
+                single = self.ladders(depth).exits(depth, 0.08, 0.06)
+                for actual, expected in zip(swept, single):
+                    np.testing.assert_array_equal(actual, expected)
+                self.check(deepest, depth, 'stopLoss')
+
+    def test_legs_fill_in_order(self):
+        ladders = self.ladders(6)
+        filled = ladders.leg_index < len(self.bars)
+
+        self.assertTrue(filled[:, 1:].any())
+        np.testing.assert_array_equal(np.diff(ladders.leg_index, axis=1) >= 0, np.ones((150, 6), dtype=bool))
+        np.testing.assert_array_equal(filled[:, 1:] <= filled[:, :-1], np.ones((150, 6), dtype=bool))
+
+    def test_series_stop_includes_every_leg(self):
+        ladders = self.ladders(3)
+        index, _, reason = ladders.exits(3, 0.08, 0.06)
+        legs, _, _ = ladders.basket(3, index, reason)
+
+        stopped = reason == EXIT_STOP_LOSS
+        self.assertTrue(stopped.any())
+        self.assertTrue((legs[stopped] == 3).all())
+
+    def test_invalid_depth_raises_error(self):
+        with self.assertRaises(ValueError):
+            self.ladders(2).exits(3, 0.08, 0.06)
+
+
+class TestEngineNanpin(unittest.TestCase):
+    """BacktestEngine simulates nanpin.fixed baskets in both simulation modes"""
+
+    def config(self, nanpin_params: dict) -> dict:
+        return {
+            'strategies': [{
+                'id': 'S1', 'enabled': True, 'priority': 10,
+                'conflictPolicy': 'firstOnly', 'directionPolicy': 'both',
+                'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                    {'id': 'RG1', 'type': 'AND', 'conditions': [{'blockId': 'trend.maCross#1'}]}
+                ]},
+                'riskModel': {'type': 'risk.fixedSLTP', 'params': {'slPips': 10, 'tpPips': 8}},
+                'exitModel': {'type': 'exit.weekendClose', 'params': {'dayOfWeek': 5, 'closeTime': '20:00'}},
+                'nanpinModel': {'type': 'nanpin.fixed', 'params': nanpin_params},
+            }],
+            'blocks': [{'id': 'trend.maCross#1', 'typeId': 'trend.maCross',
+                        'params': {'fastPeriod': 5, 'slowPeriod': 20}}],
+        }
+
+    def run_engine(self, mode: str, config: dict, tie_break: str = 'stopLoss') -> BacktestEngine:
+        engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M15",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json",
+            simulation_mode=mode,
+            digits=3,
+            tie_break=tie_break
+        )
+        engine.strategy_config = config
+        engine.historical_data = generate_bars(6000, timeframe='M15', seed=5, digits=3).to_records()
+        with patch('sys.stdout', new=StringIO()):
+            engine.simulate_strategy()
+        return engine
+
+    def test_loop_and_vectorized_agree(self):
+        for method in (0, 1, 2):
+            for tie_break in TIE_BREAKS:
+                with self.subTest(lotAdjustMethod=method, tie_break=tie_break):
+                    config = self.config({'intervalPips': 5, 'maxCount': 3, 'lotAdjustMethod': method,
+                                          'fixedIncrement': 0.5})
+
+                    vectorized = self.run_engine('vectorized', config, tie_break)
+                    loop = self.run_engine('loop', config, tie_break)
+
+                    self.assertGreater(len(vectorized.trades), 20)
+                    self.assertEqual(vectorized.trades, loop.trades)
+
+    def test_basket_profit_uses_average_price(self):
+        trades = self.run_engine('vectorized', self.config({'intervalPips': 5, 'maxCount': 3})).trades
+
+        laddered = [t for t in trades if t['positionSize'] > 1.0]
+        self.assertTrue(laddered)
+        self.assertEqual({t['exitReason'] for t in trades} - {'stopLoss', 'takeProfit', 'weekendClose', 'signal'},
+                         set())
+        for trade in laddered:
+            side = 1.0 if trade['type'] == 'BUY' else -1.0
+            self.assertAlmostEqual(
+                trade['profitLoss'], side * (trade['exitPrice'] - trade['averagePrice']) * trade['positionSize']
+            )
+            self.assertLessEqual(side * (trade['averagePrice'] - trade['entryPrice']), 1e-9)
+            if trade['exitReason'] == 'takeProfit':
+                self.assertGreaterEqual(trade['profitLoss'], 0.08 * trade['positionSize'] - 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
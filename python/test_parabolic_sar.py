@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for parabolic_sar
+
+Validates: バーごとの更新（sar_step）との一致、SARと高値・安値の位置関係、反転したバー、
+           trend.sarDirection / trigger.sarFlip のキャッシュ共有とバッチ・ストリーミングの一致
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from block_kernels import BlockContext, block_signals
+from composite_evaluator import DIRECTION_LONG, DIRECTION_SHORT
+from parabolic_sar import initial_sar_state, parabolic_sar, sar_step
+from streaming_engine import StreamingEngine
+from synthetic_data import generate_bars
+
+
+def stepped_sar(high, low, step, maximum) -> list:
+    """sar_step をバーごとに呼ぶ参照実装"""
+    values = [np.nan]
+    state = initial_sar_state(high[0], low[0], high[1], low[1], step)
+    for i in range(1, len(high)):
+        value, state = sar_step(state, high[i - 1], low[i - 1], high[i], low[i], step, maximum)
+        values.append(value)
+    return values
+
+
+class TestParabolicSar(unittest.TestCase):
+    """Single-pass SAR kernel"""
+
+    def setUp(self):
+        self.bars = generate_bars(5000, timeframe='M15', seed=17)
+
+    def test_matches_per_bar_update(self):
+        high, low = self.bars['high'], self.bars['low']
+        for step, maximum in ((0.02, 0.2), (0.01, 0.1), (0.05, 0.5)):
+            with self.subTest(step=step, maximum=maximum):
+                sar, _, _ = parabolic_sar(high, low, step, maximum)
+
+                np.testing.assert_array_equal(sar, stepped_sar(high.tolist(), low.tolist(), step, maximum))
+
+    def test_sar_stays_outside_the_bar(self):
+        high, low = self.bars['high'], self.bars['low']
+
+        sar, is_long, flips = parabolic_sar(high, low)
+
+        self.assertTrue(np.isnan(sar[0]))
+        self.assertTrue(np.all(sar[1:][is_long[1:]] <= low[1:][is_long[1:]]))
+        self.assertTrue(np.all(sar[1:][~is_long[1:]] >= high[1:][~is_long[1:]]))
+        np.testing.assert_array_equal(flips, np.flatnonzero(np.diff(is_long[1:])) + 2)
+        self.assertGreater(len(flips), 100)
+
+    def test_reverses_on_trend_change(self):
+        high = np.array([10.0, 11, 12, 13, 14, 15, 14, 13, 12, 11, 10])
+        low = high - 0.5
+
+        sar, is_long, flips = parabolic_sar(high, low)
+
+        self.assertEqual(is_long.tolist(), [False] + [True] * 7 + [False] * 3)
+        self.assertEqual(flips.tolist(), [8])
+        self.assertEqual(sar[1:3].tolist(), [9.5, 9.5])
+        # 反転したバーのSARは前のトレンドの極値（高値の最大）
+        self.assertEqual(sar[8], 15.0)
+
+    def test_short_series_and_invalid_params(self):
+        sar, is_long, flips = parabolic_sar(np.array([1.0]), np.array([0.5]))
+
+        self.assertTrue(np.isnan(sar).all())
+        self.assertEqual(len(flips), 0)
+        with self.assertRaises(ValueError):
+            parabolic_sar(self.bars['high'], self.bars['low'], 0.0, 0.2)
+
+
+class TestSarBlocks(unittest.TestCase):
+    """trend.sarDirection and trigger.sarFlip share one cached kernel result"""
+
+    BLOCKS = [
+        {'id': 'trend.sarDirection#1', 'typeId': 'trend.sarDirection', 'params': {'step': 0.02, 'maximum': 0.2}},
+        {'id': 'trend.sarDirection#2', 'typeId': 'trend.sarDirection', 'params': {'direction': 'bearish'}},
+        {'id': 'trigger.sarFlip#1', 'typeId': 'trigger.sarFlip', 'params': {}},
+    ]
+
+    def setUp(self):
+        self.bars = generate_bars(3000, timeframe='H1', seed=23, digits=3)
+
+    def test_blocks_share_cache(self):
+        context = BlockContext(self.bars, 'H1', digits=3)
+
+        signals = block_signals(self.BLOCKS, [b['id'] for b in self.BLOCKS], context)
+
+        self.assertEqual(context.cache.misses, 1)
+        sar, is_long, flips = context.cache.get('SAR', 'H1', step=0.02, maximum=0.2)
+        flip = signals['trigger.sarFlip#1']
+        np.testing.assert_array_equal(np.flatnonzero(flip.passed), flips)
+        np.testing.assert_array_equal(flip.direction[flips], np.where(is_long[flips], DIRECTION_LONG, DIRECTION_SHORT))
+        np.testing.assert_array_equal(signals['trend.sarDirection#1'].passed[1:], is_long[1:])
+        np.testing.assert_array_equal(signals['trend.sarDirection#2'].passed[1:], ~is_long[1:])
+
+    def test_streaming_matches_batch(self):
+        for block in self.BLOCKS:
+            config = {
+                'strategies': [{
+                    'id': 'S1', 'enabled': True, 'priority': 1, 'conflictPolicy': 'firstOnly',
+                    'directionPolicy': 'both',
+                    'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                        {'id': 'RG1', 'type': 'AND', 'conditions': [{'blockId': block['id']}]},
+                    ]},
+                }],
+                'blocks': [block],
+            }
+            with self.subTest(block=block['id']):
+                context = BlockContext(self.bars, 'H1', digits=3)
+                batch = block_signals([block], [block['id']], context)[block['id']]
+                engine = StreamingEngine(config, timeframe='H1', digits=3)
+
+                streamed = [engine.on_bar(bar) for bar in self.bars.to_records()]
+
+                np.testing.assert_array_equal([bool(s) for s in streamed], batch.passed)
+                expected = np.broadcast_to(batch.direction, batch.passed.shape)[batch.passed]
+                types = [s[0]['type'] for s in streamed if s]
+                self.assertEqual(types, ['BUY' if d == DIRECTION_LONG else 'SELL' for d in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
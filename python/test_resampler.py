@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Unit tests for resample_bars and deriving timeframes from cached M1
+
+Validates: 上位時間軸のOHLC/出来高/スプレッド集約、M1の1回の取得で全時間軸を生成
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import BacktestEngine
+from bar_cache import BarCache, to_epoch_seconds
+from bar_store import TIMEFRAME_SECONDS
+from resampler import resample_bars
+
+
+RATES_DTYPE = [('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+               ('close', 'f8'), ('tick_volume', 'i8'), ('spread', 'i4'), ('real_volume', 'i8')]
+
+
+def make_m1(count: int, start_ts: int = 1704067200, seed: int = 1, gaps: bool = True) -> np.ndarray:
+    """Create random M1 bars, optionally with missing minutes"""
+    rng = np.random.default_rng(seed)
+    times = start_ts + np.arange(count) * 60
+    if gaps:
+        times = times[rng.random(count) > 0.1]
+    n = len(times)
+    close = 145.0 + np.cumsum(rng.normal(0, 0.01, n))
+    open_ = np.concatenate([[145.0], close[:-1]])
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates['time'] = times
+    rates['open'] = open_
+    rates['close'] = close
+    rates['high'] = np.maximum(open_, close) + rng.random(n) * 0.01
+    rates['low'] = np.minimum(open_, close) - rng.random(n) * 0.01
+    rates['tick_volume'] = rng.integers(1, 200, n)
+    rates['spread'] = rng.integers(0, 20, n)
+    rates['real_volume'] = rng.integers(0, 5, n)
+    return rates
+
+
+def naive_resample(rates: np.ndarray, seconds: int) -> list:
+    """Reference resampling with a Python loop"""
+    bars = []
+    for r in rates:
+        bucket = int(r['time']) // seconds * seconds
+        if bars and bars[-1][0] == bucket:
+            t, o, h, l, c, v, s, rv = bars[-1]
+            bars[-1] = (t, o, max(h, r['high']), min(l, r['low']), r['close'],
+                        v + r['tick_volume'], min(s, r['spread']), rv + r['real_volume'])
+        else:
+            bars.append((bucket, r['open'], r['high'], r['low'], r['close'],
+                         r['tick_volume'], r['spread'], r['real_volume']))
+    return bars
+
+
+class TestResampleBars(unittest.TestCase):
+    """Test resample_bars against a reference loop"""
+
+    def test_all_timeframes_match_reference(self):
+        """Every supported timeframe matches the per-bar reference"""
+        rates = make_m1(3 * 24 * 60)
+
+        for timeframe, seconds in TIMEFRAME_SECONDS.items():
+            with self.subTest(timeframe=timeframe):
+                bars = resample_bars(rates, timeframe)
+                expected = naive_resample(rates, seconds)
+                self.assertEqual(bars.to_records().tolist(), expected)
+
+    def test_empty_input(self):
+        """Empty input yields an empty series"""
+        bars = resample_bars(np.array([], dtype=RATES_DTYPE), 'H1')
+
+        self.assertEqual(len(bars), 0)
+        self.assertEqual(bars['time'].dtype, np.int64)
+
+
+class TestDeriveFromM1(unittest.TestCase):
+    """Test fetch_historical_data with derive_from_m1"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.m1 = make_m1(3 * 24 * 60, gaps=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def make_engine(self, timeframe: str) -> BacktestEngine:
+        return BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe=timeframe,
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 1, 3, 23, 59),
+            output_path="test_output.json",
+            cache_dir=self.cache_dir,
+            derive_from_m1=True
+        )
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        times = self.m1['time']
+        return self.m1[(times >= date_from.timestamp()) & (times <= date_to.timestamp())]
+
+    @patch('backtest_engine.mt5')
+    def test_one_m1_download_serves_all_timeframes(self, mock_mt5):
+        """Only M1 is requested from MT5, once, for all timeframes"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        mock_mt5.copy_rates_range.side_effect = self.copy_rates_range
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()):
+            for timeframe in ('H1', 'M15', 'H4', 'D1'):
+                engine = self.make_engine(timeframe)
+                engine.fetch_historical_data()
+                expected = naive_resample(self.m1, TIMEFRAME_SECONDS[timeframe])
+                self.assertEqual(engine.historical_data.to_records().tolist(), expected)
+
+        mock_mt5.copy_rates_range.assert_called_once()
+        self.assertEqual(mock_mt5.copy_rates_range.call_args[0][1], 1)
+
+    @patch('backtest_engine.mt5')
+    def test_derived_series_is_cached(self, mock_mt5):
+        """The derived timeframe is stored and read back directly"""
+        cache = BarCache(self.cache_dir)
+        cache.append(
+            "USDJPY", "M1",
+            int(self.m1['time'][0]), int(self.m1['time'][-1]) + 59, self.m1
+        )
+        engine = self.make_engine('H1')
+
+        self.assertFalse(engine.requires_mt5())
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            engine.fetch_historical_data()
+        self.assertIn("M1からH1を生成しました: 72 バー", fake_out.getvalue())
+        self.assertTrue(cache.contains("USDJPY", "H1", engine.start_date, engine.end_date))
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            self.make_engine('H1').fetch_historical_data()
+        self.assertIn("キャッシュから過去データを読み込みました: 72 バー", fake_out.getvalue())
+        mock_mt5.copy_rates_range.assert_not_called()
+
+    @patch('backtest_engine.mt5')
+    def test_partial_last_bucket_fetches_missing_m1(self, mock_mt5):
+        """The M1 bars completing the last bucket are fetched before deriving"""
+        mock_mt5.TIMEFRAME_M1 = 1
+        mock_mt5.copy_rates_range.side_effect = self.copy_rates_range
+        cache = BarCache(self.cache_dir)
+        m1_end = to_epoch_seconds(datetime(2024, 1, 1, 10, 29, 59))
+        cache.append("USDJPY", "M1", int(self.m1['time'][0]), m1_end, self.m1)
+        engine = self.make_engine('H1')
+        engine.end_date = datetime(2024, 1, 1, 10, 0)
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()):
+            engine.fetch_historical_data()
+
+        args = mock_mt5.copy_rates_range.call_args[0]
+        self.assertEqual(to_epoch_seconds(args[2]), m1_end + 1)
+        self.assertEqual(to_epoch_seconds(args[3]), to_epoch_seconds(datetime(2024, 1, 1, 10, 59, 59)))
+        last = engine.historical_data[-1]
+        self.assertEqual(last['time'], to_epoch_seconds(datetime(2024, 1, 1, 10, 0)))
+        self.assertEqual(last['tick_volume'], self.m1['tick_volume'][600:660].sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
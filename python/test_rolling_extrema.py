@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Unit tests for rolling_extrema
+
+Validates: スパーステーブルと窓ごとの最高値・最安値の一致、1つの表の複数期間での共有、
+           WPR / ストキャスティクス / 一目均衡表と窓ごとの計算の一致、
+           trend.ichimokuCloud / trigger.wprLevel / trigger.stochCross のバッチとストリーミングの一致
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from block_kernels import BlockContext, block_signals
+from composite_evaluator import DIRECTION_LONG
+from indicator_cache import IndicatorCache
+from rolling_extrema import RollingExtrema
+from streaming_engine import StreamingEngine
+from synthetic_data import generate_bars
+
+
+def windowed(values: np.ndarray, period: int, reduce) -> np.ndarray:
+    """窓ごとに reduce を適用した参照値（先頭 period - 1 本は NaN）"""
+    result = np.full(len(values), np.nan)
+    if len(values) >= period:
+        result[period - 1:] = reduce(sliding_window_view(values, period), axis=1)
+    return result
+
+
+class TestRollingExtrema(unittest.TestCase):
+    """Sparse table windows agree with per-window max/min"""
+
+    def setUp(self):
+        self.high = generate_bars(600, seed=31)['high']
+
+    def test_matches_windows(self):
+        for highest, reduce in ((True, np.max), (False, np.min)):
+            table = RollingExtrema(self.high, highest)
+            for period in (1, 2, 3, 9, 14, 26, 52, 64, 100, 600, 601):
+                with self.subTest(highest=highest, period=period):
+                    np.testing.assert_array_equal(table.window(period), windowed(self.high, period, reduce))
+
+    def test_one_table_serves_all_periods(self):
+        table = RollingExtrema(self.high, True)
+
+        table.window(52)
+        levels = list(table.levels)
+        for period in (9, 26, 33, 52):
+            table.window(period)
+
+        # 52 本までの期間は段を追加せずに求まる
+        self.assertEqual(len(table.levels), 6)
+        self.assertTrue(all(a is b for a, b in zip(levels, table.levels)))
+
+    def test_invalid_period(self):
+        with self.assertRaises(ValueError):
+            RollingExtrema(self.high, True).window(0)
+
+
+class TestRangeIndicators(unittest.TestCase):
+    """WPR, Stochastic and Ichimoku built on the shared extrema"""
+
+    def setUp(self):
+        self.bars = generate_bars(1500, timeframe='H1', seed=33, digits=3)
+        self.cache = IndicatorCache({'H1': self.bars})
+        self.high, self.low, self.close = self.bars['high'], self.bars['low'], self.bars['close']
+
+    def test_williams_percent_range(self):
+        wpr = self.cache.get('WPR', 'H1', period=14)
+
+        highest = windowed(self.high, 14, np.max)
+        lowest = windowed(self.low, 14, np.min)
+        self.assertTrue(np.isnan(wpr[:13]).all())
+        np.testing.assert_allclose(wpr[13:], -100.0 * (highest - self.close)[13:] / (highest - lowest)[13:])
+
+    def test_stochastic(self):
+        main, signal = self.cache.get(
+            'STOCH', 'H1', kPeriod=5, dPeriod=3, slowing=3, method='SMA', priceField='LOWHIGH'
+        )
+
+        lowest = windowed(self.low, 5, np.min)
+        highest = windowed(self.high, 5, np.max)
+        numerator = windowed(self.close - lowest, 3, np.sum)
+        denominator = windowed(highest - lowest, 3, np.sum)
+        self.assertTrue(np.isnan(main[:6]).all())
+        np.testing.assert_allclose(main[6:], 100.0 * numerator[6:] / denominator[6:], rtol=1e-9)
+        np.testing.assert_allclose(signal[8:], windowed(main[6:], 3, np.mean)[2:], rtol=1e-9)
+
+    def test_ichimoku(self):
+        tenkan, kijun, span_a, span_b = self.cache.get('ICHIMOKU', 'H1', tenkan=9, kijun=26, senkouB=52)
+
+        def middle(period):
+            return (windowed(self.high, period, np.max) + windowed(self.low, period, np.min)) / 2.0
+        np.testing.assert_array_equal(tenkan, middle(9))
+        np.testing.assert_array_equal(kijun, middle(26))
+        np.testing.assert_array_equal(span_a, (middle(9) + middle(26)) / 2.0)
+        np.testing.assert_array_equal(span_b, middle(52))
+
+    def test_indicators_share_extrema(self):
+        self.cache.get('WPR', 'H1', period=26)
+        self.cache.get('ICHIMOKU', 'H1', tenkan=9, kijun=26, senkouB=52)
+        self.cache.get('STOCH', 'H1', kPeriod=9, dPeriod=3, slowing=3, method='SMA', priceField='LOWHIGH')
+
+        # 高値・安値の表は1つずつ、HIGHEST / LOWEST(26) と (9) はキャッシュから
+        self.assertEqual(len(self.cache._extrema), 2)
+        self.assertEqual(self.cache.hits, 4)
+        self.assertEqual(self.cache.stats()['keyHits']['HIGHEST_H1_26_HIGH'], 1)
+
+
+class TestRangeBlocks(unittest.TestCase):
+    """trend.ichimokuCloud, trigger.wprLevel and trigger.stochCross in batch and streaming"""
+
+    BLOCKS = [
+        {'id': 'trend.ichimokuCloud#1', 'typeId': 'trend.ichimokuCloud', 'params': {'position': 'above'}},
+        {'id': 'trend.ichimokuCloud#2', 'typeId': 'trend.ichimokuCloud', 'params': {'position': 'below'}},
+        {'id': 'trend.ichimokuCloud#3', 'typeId': 'trend.ichimokuCloud',
+         'params': {'tenkan': 7, 'kijun': 22, 'senkouB': 44, 'position': 'inside'}},
+        {'id': 'trigger.wprLevel#1', 'typeId': 'trigger.wprLevel', 'params': {}},
+        {'id': 'trigger.wprLevel#2', 'typeId': 'trigger.wprLevel',
+         'params': {'period': 10, 'threshold': -80, 'mode': 'oversold'}},
+        {'id': 'trigger.stochCross#1', 'typeId': 'trigger.stochCross', 'params': {}},
+        {'id': 'trigger.stochCross#2', 'typeId': 'trigger.stochCross',
+         'params': {'kPeriod': 14, 'maMethod': 'EMA', 'priceField': 'CLOSECLOSE', 'direction': 'dead'}},
+    ]
+
+    def setUp(self):
+        self.bars = generate_bars(3000, timeframe='H1', seed=35, digits=3)
+
+    def test_cloud_position_uses_shifted_spans(self):
+        context = BlockContext(self.bars, 'H1', digits=3)
+
+        signals = block_signals(self.BLOCKS[:2], [b['id'] for b in self.BLOCKS[:2]], context)
+
+        _, _, span_a, span_b = context.cache.get('ICHIMOKU', 'H1', tenkan=9, kijun=26, senkouB=52)
+        i = 1000
+        top = max(span_a[i - 26], span_b[i - 26])
+        self.assertEqual(signals['trend.ichimokuCloud#1'].passed[i], self.bars['close'][i] > top)
+        self.assertFalse(signals['trend.ichimokuCloud#1'].passed[:26 + 51].any())
+        self.assertFalse((signals['trend.ichimokuCloud#1'].passed & signals['trend.ichimokuCloud#2'].passed).any())
+        self.assertEqual(context.cache.misses, 7)
+
+    def test_streaming_matches_batch(self):
+        # 方向を持たない判定（雲の中）は方向を決める trend.maCross と組み合わせる
+        cross = {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}}
+        for block in self.BLOCKS:
+            blocks = [block, cross] if block['params'].get('position') == 'inside' else [block]
+            config = {
+                'strategies': [{
+                    'id': 'S1', 'enabled': True, 'priority': 1, 'conflictPolicy': 'firstOnly',
+                    'directionPolicy': 'both',
+                    'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                        {'id': 'RG1', 'type': 'AND', 'conditions': [{'blockId': b['id']} for b in blocks]},
+                    ]},
+                }],
+                'blocks': blocks,
+            }
+            with self.subTest(block=block['id']):
+                context = BlockContext(self.bars, 'H1', digits=3)
+                signals = block_signals(blocks, [b['id'] for b in blocks], context)
+                batch = signals[blocks[-1]['id']]
+                passed = np.logical_and.reduce([signals[b['id']].passed for b in blocks])
+                engine = StreamingEngine(config, timeframe='H1', digits=3)
+
+                streamed = [engine.on_bar(bar) for bar in self.bars.to_records()]
+
+                self.assertTrue(passed.any())
+                np.testing.assert_array_equal([bool(s) for s in streamed], passed)
+                expected = np.broadcast_to(batch.direction, passed.shape)[passed]
+                types = [s[0]['type'] for s in streamed if s]
+                self.assertEqual(types, ['BUY' if d == DIRECTION_LONG else 'SELL' for d in expected])
+
+if __name__ == '__main__':
+    unittest.main()
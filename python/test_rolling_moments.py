@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit tests for rolling_moments
+
+Validates: 移動窓の平均・母分散と窓ごとの計算の一致、長い系列での精度、
+           deviation のスイープでのモーメントの共有、filter.volatility.stddevRange のバッチとストリーミングの一致
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from block_kernels import BlockContext, block_signals
+from indicator_cache import IndicatorCache
+from indicators import standard_deviation
+from rolling_moments import rolling_moments
+from streaming_engine import StreamingEngine
+from synthetic_data import generate_bars
+
+
+class TestRollingMoments(unittest.TestCase):
+    """Block-anchored moments agree with per-window numpy"""
+
+    def setUp(self):
+        self.close = generate_bars(700, seed=15)['close']
+
+    def test_matches_windows(self):
+        for period in (1, 2, 9, 20, 700):
+            windows = sliding_window_view(self.close, period)
+            with self.subTest(period=period):
+                mean, variance = rolling_moments(self.close, period)
+
+                self.assertTrue(np.isnan(mean[:period - 1]).all())
+                np.testing.assert_allclose(mean[period - 1:], windows.mean(axis=1), rtol=1e-12)
+                np.testing.assert_allclose(variance[period - 1:], windows.var(axis=1), rtol=1e-9, atol=1e-18)
+
+    def test_long_drifting_series_keeps_precision(self):
+        # 価格が基準から大きく離れ、値幅に比べて価格が大きい系列
+        price = 150.0 + np.random.default_rng(5).normal(scale=2e-4, size=400_000).cumsum()
+
+        _, variance = rolling_moments(price, 20)
+
+        for end in (19, 123_456, len(price) - 1):
+            window = price[end - 19:end + 1]
+            self.assertAlmostEqual(variance[end] / window.var(), 1.0, places=9)
+
+    def test_short_series_and_invalid_period(self):
+        mean, variance = rolling_moments(self.close[:3], 5)
+
+        self.assertTrue(np.isnan(mean).all() and np.isnan(variance).all())
+        with self.assertRaises(ValueError):
+            rolling_moments(self.close, 0)
+
+    def test_deviation_around_other_averages(self):
+        for method in ('EMA', 'SMMA', 'LWMA'):
+            with self.subTest(method=method):
+                bars = generate_bars(700, timeframe='H1', seed=15)
+                cache = IndicatorCache({'H1': bars})
+
+                cached = cache.get('STDDEV', 'H1', 'CLOSE', period=20, method=method)
+
+                np.testing.assert_allclose(cached, standard_deviation(bars['close'], 20, method), rtol=1e-9)
+
+
+class TestBandSweep(unittest.TestCase):
+    """Bands for many deviations share one set of moments"""
+
+    def test_ten_deviations_reuse_moments(self):
+        bars = generate_bars(2000, timeframe='M15', seed=2)
+        cache = IndicatorCache({'M15': bars})
+        deviations = np.linspace(1.0, 3.25, 10)
+
+        sweep = [cache.get('BB', 'M15', 'CLOSE', period=20, deviation=float(d)) for d in deviations]
+
+        # BB 10本 + 中心線の移動平均 + 標準偏差
+        self.assertEqual(cache.misses, 12)
+        std = sliding_window_view(bars['close'], 20).std(axis=1)
+        for deviation, (middle, upper, lower) in zip(deviations, sweep):
+            np.testing.assert_allclose(upper[19:] - middle[19:], deviation * std, rtol=1e-9)
+            np.testing.assert_allclose(middle[19:] - lower[19:], deviation * std, rtol=1e-9)
+
+
+class TestStdDevRangeBlock(unittest.TestCase):
+    """filter.volatility.stddevRange in batch and streaming"""
+
+    def config(self, params: dict) -> dict:
+        return {
+            'strategies': [{
+                'id': 'S1', 'enabled': True, 'priority': 1, 'conflictPolicy': 'firstOnly', 'directionPolicy': 'both',
+                'entryRequirement': {'type': 'OR', 'ruleGroups': [
+                    {'id': 'RG1', 'type': 'AND', 'conditions': [
+                        {'blockId': 'filter.stddevRange#1'}, {'blockId': 'trend.maCross#1'},
+                    ]},
+                ]},
+            }],
+            'blocks': [
+                {'id': 'filter.stddevRange#1', 'typeId': 'filter.volatility.stddevRange', 'params': params},
+                {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}},
+            ],
+        }
+
+    def setUp(self):
+        self.bars = generate_bars(3000, timeframe='H1', seed=21, digits=3)
+
+    def test_range_and_shift(self):
+        std = standard_deviation(self.bars['close'], 20)
+        # 境界がちょうど標準偏差の値にならないようにずらす
+        lower, upper = np.nanpercentile(std, [25, 75]) * (1.0 + 1e-7)
+        for shift in (0, 3):
+            params = {'maPeriod': 20, 'maShift': shift, 'min': lower, 'max': upper}
+            with self.subTest(maShift=shift):
+                context = BlockContext(self.bars, 'H1', digits=3)
+                blocks = self.config(params)['blocks']
+
+                signals = block_signals(blocks, [block['id'] for block in blocks], context)
+                passed = signals['filter.stddevRange#1'].passed
+
+                expected = np.zeros(len(std), dtype=bool)
+                expected[19 + shift:] = (std[19:len(std) - shift] >= lower) & (std[19:len(std) - shift] <= upper)
+                np.testing.assert_array_equal(passed, expected)
+
+                engine = StreamingEngine(self.config(params), timeframe='H1', digits=3)
+                streamed = np.array([bool(engine.on_bar(bar)) for bar in self.bars.to_records()])
+                self.assertTrue(streamed.any())
+                np.testing.assert_array_equal(streamed, passed & signals['trend.maCross#1'].passed)
+
+
+if __name__ == '__main__':
+    unittest.main()
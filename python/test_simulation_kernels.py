@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the vectorized simulation mode
+
+Validates: シミュレーションカーネルと参照実装の一致、vectorized/loopモードで同じトレード、モード指定の検証
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timezone
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+import backtest_engine
+from backtest_engine import BacktestEngine
+from simulation_kernels import chain_trades, epoch_to_iso, next_true_index, pair_entries_exits, prior_mean
+from synthetic_data import generate_bars
+
+
+def naive_chain(entry, exit_index) -> tuple:
+    """Reference walk from each exit to the next entry"""
+    entries, exits = [], []
+    i = 0
+    while i < len(entry):
+        if not entry[i]:
+            i += 1
+            continue
+        if exit_index[i] >= len(entry):
+            break
+        entries.append(i)
+        exits.append(int(exit_index[i]))
+        i = int(exit_index[i]) + 1
+    return entries, exits
+
+
+def naive_pairs(entry, exit) -> tuple:
+    """Reference state machine walking every bar"""
+    entries, exits = [], []
+    position = None
+    for i in range(len(entry)):
+        if position is None:
+            if entry[i]:
+                position = i
+        elif exit[i]:
+            entries.append(position)
+            exits.append(i)
+            position = None
+    return entries, exits
+
+
+def make_engine(mode: str) -> BacktestEngine:
+    return BacktestEngine(
+        config_path="test_config.json",
+        symbol="USDJPY",
+        timeframe="M1",
+        start_date=datetime(2024, 1, 1),
+        end_date=datetime(2024, 3, 31),
+        output_path="test_output.json",
+        simulation_mode=mode
+    )
+
+
+class TestSimulationKernels(unittest.TestCase):
+    """Test the array kernels against per-bar references"""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(11)
+
+    def test_next_true_index(self):
+        mask = self.rng.random(500) < 0.05
+
+        result = next_true_index(mask)
+
+        self.assertEqual(len(result), 501)
+        for i in range(501):
+            following = np.flatnonzero(mask[i:])
+            self.assertEqual(result[i], i + following[0] if len(following) else 500)
+
+    def test_prior_mean_matches_slice_mean(self):
+        """values[i - period:i].mean() up to rounding, exactly on flat prices"""
+        values = np.round(145.0 + np.cumsum(self.rng.normal(0, 0.01, 2000)), 3)
+        values[500:600] = values[500]
+
+        result = prior_mean(values, 20)
+
+        self.assertTrue(np.all(np.isnan(result[:20])))
+        expected = np.array([values[i - 20:i].mean() for i in range(20, len(values))])
+        np.testing.assert_allclose(result[20:], expected, rtol=1e-12)
+        np.testing.assert_array_equal(result[520:601], values[500])
+        np.testing.assert_array_equal(values[520:600] > result[520:600], np.zeros(80, dtype=bool))
+
+    def test_chain_trades_matches_walk(self):
+        for density in (0.001, 0.05, 0.6):
+            with self.subTest(density=density):
+                entry = self.rng.random(5000) < density
+                exit_index = np.arange(5000) + self.rng.integers(1, 40, 5000)
+
+                entries, exits = chain_trades(entry, exit_index)
+
+                expected = naive_chain(entry, exit_index)
+                self.assertEqual(entries.tolist(), expected[0])
+                self.assertEqual(exits.tolist(), expected[1])
+        self.assertEqual(len(chain_trades(np.zeros(10, dtype=bool), np.arange(10))[0]), 0)
+
+    def test_pair_entries_exits_matches_state_machine(self):
+        for density in (0.01, 0.2, 0.9):
+            with self.subTest(density=density):
+                entry = self.rng.random(3000) < density
+                exit = self.rng.random(3000) < density
+
+                entries, exits = pair_entries_exits(entry, exit)
+
+                expected_entries, expected_exits = naive_pairs(entry, exit)
+                self.assertEqual(entries.tolist(), expected_entries)
+                self.assertEqual(exits.tolist(), expected_exits)
+
+    def test_epoch_to_iso(self):
+        times = np.array([0, 1704067200, 1711929599])
+
+        expected = [datetime.fromtimestamp(int(t), tz=timezone.utc).isoformat() for t in times]
+        self.assertEqual(epoch_to_iso(times).tolist(), expected)
+
+
+class TestSimulationModes(unittest.TestCase):
+    """Test that both simulation modes produce the same trades"""
+
+    def run_mode(self, mode: str, rates) -> list:
+        engine = make_engine(mode)
+        engine.historical_data = rates
+        with patch('sys.stdout', new=StringIO()):
+            engine.simulate_strategy()
+        return engine.trades
+
+    def test_vectorized_matches_loop(self):
+        """Identical trades on synthetic M1 data with a missing block of bars"""
+        rates = generate_bars(20000, seed=8).to_records()
+        rates = np.concatenate((rates[:7000], rates[7100:]))
+
+        vectorized = self.run_mode('vectorized', rates)
+        loop = self.run_mode('loop', rates)
+
+        self.assertGreater(len(loop), 100)
+        self.assertEqual(vectorized, loop)
+
+    def test_empty_data(self):
+        self.assertEqual(self.run_mode('vectorized', generate_bars(0).to_records()), [])
+
+    def test_unknown_mode_raises_error(self):
+        engine = make_engine('turbo')
+        engine.historical_data = generate_bars(100).to_records()
+
+        with self.assertRaises(ValueError):
+            engine.simulate_strategy()
+
+    @patch('backtest_engine.BacktestEngine')
+    def test_command_line_option(self, mock_engine_class):
+        """--simulation-mode is passed to the engine"""
+        test_args = [
+            'backtest_engine.py', '--config', 'config.json', '--symbol', 'USDJPY',
+            '--timeframe', 'M1', '--start', '2024-01-01T00:00:00Z',
+            '--end', '2024-01-31T23:59:59Z', '--output', 'results.json',
+            '--simulation-mode', 'loop'
+        ]
+        with patch('sys.argv', test_args):
+            backtest_engine.main()
+
+        self.assertEqual(mock_engine_class.call_args.kwargs['simulation_mode'], 'loop')
+
+
+if __name__ == '__main__':
+    unittest.main()
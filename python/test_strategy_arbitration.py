@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Unit tests for strategy arbitration
+
+Validates: priority・conflictPolicy・directionPolicy の一括調停とバーごとの評価（EAの EvaluateStrategies）の一致、
+           EvaluationPlanner による遅延評価と一括評価の一致、
+           BacktestEngine のエントリーシグナルとトレードのストラテジーid
+"""
+
+import unittest
+import sys
+import os
+import json
+from datetime import datetime
+from io import StringIO
+from unittest.mock import Mock, patch
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import BacktestEngine
+from block_kernels import BlockContext, block_signals
+from composite_evaluator import (
+    DIRECTION_LONG,
+    DIRECTION_NEUTRAL,
+    DIRECTION_SHORT,
+    BlockSignal,
+    CompositeEvaluator,
+)
+from evaluation_planner import EvaluationPlanner
+from global_guards import GlobalGuards
+from strategy_arbitration import DIRECTION_POLICIES, arbitrate, sort_strategies
+from synthetic_data import generate_bars
+
+EA_TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ea', 'tests')
+
+
+def strategy(strategy_id: str, *groups, priority: int = 1, conflict: str = 'firstOnly',
+             direction: str = 'both', enabled: bool = True) -> dict:
+    return {
+        'id': strategy_id,
+        'enabled': enabled,
+        'priority': priority,
+        'conflictPolicy': conflict,
+        'directionPolicy': direction,
+        'entryRequirement': {
+            'type': 'OR',
+            'ruleGroups': [
+                {'id': f"RG{i}", 'type': 'AND', 'conditions': [{'blockId': b} for b in group]}
+                for i, group in enumerate(groups)
+            ]
+        }
+    }
+
+
+def reference_arbitration(config, signals, length):
+    """EvaluateStrategies をバーごとに再現した参照実装: バー → 採用された (id, 方向) の列"""
+    evaluator = CompositeEvaluator(config)
+    result = []
+    for i in range(length):
+        adopted = []
+        for s in sort_strategies(config['strategies']):
+            matched = None
+            for group in evaluator.requirements[s['id']].groups:
+                direction = DIRECTION_NEUTRAL
+                for block_id in group:
+                    signal = signals[block_id]
+                    if not signal.passed[i]:
+                        break
+                    block_direction = int(np.broadcast_to(signal.direction, (length,))[i])
+                    if block_direction != DIRECTION_NEUTRAL:
+                        direction = block_direction
+                else:
+                    matched = direction
+                    break
+            if matched is None or matched not in DIRECTION_POLICIES[s.get('directionPolicy', 'both')]:
+                continue
+            adopted.append((s['id'], matched))
+            if s.get('conflictPolicy', 'firstOnly') == 'firstOnly':
+                break
+        result.append(adopted)
+    return result
+
+
+class TestArbitrate(unittest.TestCase):
+    """Masked one-pass arbitration equals the per-bar EA loop"""
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.length = 400
+        self.signals = {
+            'A': BlockSignal(rng.random(self.length) < 0.5),
+            'L': BlockSignal(rng.random(self.length) < 0.4, DIRECTION_LONG),
+            'S': BlockSignal(rng.random(self.length) < 0.4, DIRECTION_SHORT),
+            'X': BlockSignal(
+                rng.random(self.length) < 0.6,
+                rng.integers(0, 3, self.length).astype(np.int8)
+            ),
+        }
+
+    def arbitrated(self, config):
+        arbitration = arbitrate(config, self.signals, self.length)
+        result = []
+        for i in range(self.length):
+            result.append([
+                (strategy_id, int(arbitration.direction[row, i]))
+                for row, strategy_id in enumerate(arbitration.strategy_ids)
+                if arbitration.adopted[row, i]
+            ])
+        return result
+
+    def config(self, *strategies):
+        return {'strategies': list(strategies), 'blocks': [{'id': b, 'typeId': 'test'} for b in self.signals]}
+
+    def test_matches_per_bar_reference(self):
+        configs = [
+            self.config(
+                strategy('S1', ['A', 'L'], ['S'], priority=5),
+                strategy('S2', ['X'], priority=10, direction='longOnly'),
+                strategy('S3', ['S', 'X'], ['A'], conflict='all', direction='shortOnly', priority=7),
+                strategy('S4', ['L'], ['X', 'A'], priority=5, conflict='bestScore'),
+            ),
+            self.config(
+                strategy('S1', ['X'], conflict='all'),
+                strategy('S2', ['A'], priority=3, enabled=False),
+                strategy('S3', ['L', 'S'], ['A', 'S'], priority=2),
+            ),
+        ]
+        for index, config in enumerate(configs):
+            with self.subTest(config=index):
+                self.assertEqual(
+                    self.arbitrated(config), reference_arbitration(config, self.signals, self.length)
+                )
+
+    def test_first_only_blocks_lower_priority(self):
+        config = self.config(strategy('HIGH', ['L'], priority=10), strategy('LOW', ['S'], priority=1))
+
+        arbitration = arbitrate(config, self.signals, self.length)
+
+        self.assertEqual(arbitration.strategy_ids, ['HIGH', 'LOW'])
+        self.assertFalse(np.any(arbitration.adopted[0] & arbitration.adopted[1]))
+        np.testing.assert_array_equal(arbitration.adopted[1], self.signals['S'].passed & ~self.signals['L'].passed)
+
+    def test_rejected_direction_does_not_block(self):
+        """A match rejected by directionPolicy lets the next strategy be evaluated"""
+        config = self.config(
+            strategy('LONG', ['S'], priority=10, direction='longOnly'),
+            strategy('NEXT', ['S'], priority=1)
+        )
+
+        arbitration = arbitrate(config, self.signals, self.length)
+
+        self.assertFalse(np.any(arbitration.adopted[0]))
+        np.testing.assert_array_equal(arbitration.entries('NEXT'), self.signals['S'].passed)
+
+    def test_entry_signals_follow_highest_priority(self):
+        config = self.config(
+            strategy('S1', ['L'], priority=10, conflict='all'),
+            strategy('S2', ['S'], priority=1)
+        )
+
+        buy, sell = arbitrate(config, self.signals, self.length).entry_signals()
+
+        np.testing.assert_array_equal(buy, self.signals['L'].passed)
+        np.testing.assert_array_equal(sell, self.signals['S'].passed & ~self.signals['L'].passed)
+
+    def test_planner_matches_signals(self):
+        config = self.config(
+            strategy('S1', ['A', 'L'], ['S'], priority=5),
+            strategy('S2', ['X'], priority=10, direction='longOnly'),
+            strategy('S3', ['S', 'X'], ['A'], conflict='all', direction='shortOnly', priority=7),
+        )
+        guard = np.random.default_rng(5).random(self.length) < 0.7
+
+        def kernel(signal):
+            def evaluate(indices):
+                direction = signal.direction if signal.direction.ndim == 0 else signal.direction[indices]
+                return BlockSignal(signal.passed[indices], direction)
+            return evaluate
+        planner = EvaluationPlanner(
+            {block_id: kernel(signal) for block_id, signal in self.signals.items()}, self.length
+        )
+
+        lazy = arbitrate(config, None, self.length, guard=guard, planner=planner)
+
+        eager = arbitrate(config, self.signals, self.length, guard=guard)
+        np.testing.assert_array_equal(lazy.adopted, eager.adopted)
+        np.testing.assert_array_equal(lazy.direction, eager.direction)
+
+    def test_invalid_policy_raises_error(self):
+        for policy in ({'conflictPolicy': 'random'}, {'directionPolicy': 'sideways'}):
+            with self.subTest(policy=policy):
+                config = self.config({**strategy('S1', ['A']), **policy})
+                with self.assertRaises(ValueError):
+                    arbitrate(config, self.signals, self.length)
+
+
+class TestEngineArbitration(unittest.TestCase):
+    """BacktestEngine enters on the arbitrated signals of the configured strategies"""
+
+    CONFIG = {
+        'strategies': [
+            strategy('TREND', ['trend.maCross#1', 'trend.maRelation#1'], priority=10, direction='longOnly'),
+            strategy('REVERSAL', ['filter.spreadMax#1', 'trigger.bbReentry#1'], ['trigger.bbBreakout#1'], priority=5),
+        ],
+        'blocks': [
+            {'id': 'filter.spreadMax#1', 'typeId': 'filter.spreadMax', 'params': {'maxSpreadPips': 2.0}},
+            {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}},
+            {'id': 'trend.maRelation#1', 'typeId': 'trend.maRelation', 'params': {'period': 50, 'maType': 'SMA'}},
+            {'id': 'trigger.bbReentry#1', 'typeId': 'trigger.bbReentry', 'params': {'side': 'upperToInside'}},
+            {'id': 'trigger.bbBreakout#1', 'typeId': 'trigger.bbBreakout', 'params': {'direction': 'lower'}},
+        ],
+    }
+
+    def make_engine(self, mode: str, config: dict) -> BacktestEngine:
+        engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="H1",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 3, 31),
+            output_path="test_output.json",
+            simulation_mode=mode,
+            digits=3
+        )
+        engine.strategy_config = config
+        engine.historical_data = generate_bars(2000, timeframe='H1', seed=8, digits=3).to_records()
+        return engine
+
+    def run_engine(self, mode: str, config: dict) -> BacktestEngine:
+        engine = self.make_engine(mode, config)
+        with patch('sys.stdout', new=StringIO()):
+            engine.simulate_strategy()
+        return engine
+
+    def test_loop_and_vectorized_agree(self):
+        vectorized = self.run_engine('vectorized', self.CONFIG)
+        loop = self.run_engine('loop', self.CONFIG)
+
+        self.assertGreater(len(vectorized.trades), 10)
+        self.assertEqual(vectorized.trades, loop.trades)
+        self.assertEqual({t['strategyId'] for t in vectorized.trades}, {'TREND', 'REVERSAL'})
+        self.assertTrue(all(t['type'] == 'BUY' for t in vectorized.trades if t['strategyId'] == 'TREND'))
+
+    def test_entries_use_arbitrated_signals(self):
+        engine = self.make_engine('vectorized', self.CONFIG)
+
+        buy, sell = engine.entry_signal_arrays()
+
+        expected_buy, expected_sell = engine.strategy_arbitration().entry_signals()
+        np.testing.assert_array_equal(buy, expected_buy)
+        np.testing.assert_array_equal(sell, expected_sell)
+        self.assertFalse(np.any(buy & sell))
+
+    def test_planner_matches_eager_block_signals(self):
+        config = {**self.CONFIG, 'globalGuards': {'maxSpreadPips': 1.5}}
+        engine = self.make_engine('vectorized', config)
+
+        arbitration = engine.strategy_arbitration()
+
+        bars = engine.bar_columns()
+        evaluator = CompositeEvaluator(config)
+        signals = block_signals(config['blocks'], evaluator.block_ids(), BlockContext(bars, 'H1', 3))
+        allowed = GlobalGuards(config['globalGuards']).mask(bars['time'], bars['spread'], 'H1', 3)
+        expected = arbitrate(config, signals, len(bars), evaluator, allowed)
+        self.assertTrue(arbitration.adopted.any())
+        np.testing.assert_array_equal(arbitration.adopted, expected.adopted)
+        np.testing.assert_array_equal(arbitration.direction, expected.direction)
+
+    def test_blocks_not_computed_outside_guards(self):
+        """No indicator is computed when globalGuards reject every bar"""
+        config = {**self.CONFIG, 'globalGuards': {'maxSpreadPips': -1.0}}
+        engine = self.make_engine('vectorized', config)
+
+        arbitration = engine.strategy_arbitration()
+
+        self.assertFalse(arbitration.adopted.any())
+        self.assertEqual(engine.indicator_cache().misses, 0)
+        stats = engine.evaluation_planner().stats()
+        self.assertEqual({entry['evaluatedBars'] for entry in stats.values()}, {0})
+        self.assertEqual({entry['computedBars'] for entry in stats.values()}, {0})
+
+    def test_windowed_blocks_skip_rejected_bars(self):
+        """Bollinger band blocks compute indicators only around bars the guards allow"""
+        config = {**self.CONFIG, 'globalGuards': {'maxSpreadPips': 1.5}}
+        engine = self.make_engine('vectorized', config)
+
+        stats = engine.evaluation_planner().stats()
+
+        length = len(engine.historical_data)
+        self.assertLess(stats['trigger.bbBreakout#1']['computedBars'], length)
+        self.assertGreaterEqual(
+            stats['trigger.bbBreakout#1']['computedBars'], stats['trigger.bbBreakout#1']['evaluatedBars']
+        )
+        self.assertEqual(
+            stats['trigger.bbBreakout#1']['skippedBars'], length - stats['trigger.bbBreakout#1']['computedBars']
+        )
+        # maCross uses EMA (recursive), so it is computed over the full series
+        self.assertEqual(stats['trend.maCross#1']['computedBars'], length)
+
+    def test_simulation_prints_cache_stats(self):
+        engine = self.make_engine('vectorized', self.CONFIG)
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            engine.simulate_strategy()
+
+        self.assertIn(engine.indicator_cache().format_stats(), fake_out.getvalue())
+
+    def test_simulation_prints_planner_stats(self):
+        engine = self.make_engine('vectorized', self.CONFIG)
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            engine.simulate_strategy()
+
+        for line in engine.evaluation_planner().format_stats():
+            self.assertIn(line, fake_out.getvalue())
+
+    def test_unsupported_blocks_fall_back_with_warning(self):
+        with open(os.path.join(EA_TESTS_DIR, 'test_strategy_advanced.json'), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        with patch('sys.stderr', new=StringIO()) as fake_err:
+            engine = self.run_engine('vectorized', config)
+
+        self.assertIsNone(engine.strategy_arbitration())
+        self.assertIn("簡易シグナルを使用します", fake_err.getvalue())
+        self.assertTrue(all('strategyId' not in t for t in engine.trades))
+
+
+if __name__ == '__main__':
+    unittest.main()
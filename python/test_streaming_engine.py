@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Unit tests for StreamingEngine
+
+Validates: 増分インジケーターとバッチ計算の一致、on_bar() のシグナルとバッチ評価の一致、状態の共有と有界性
+"""
+
+import unittest
+import sys
+import os
+import json
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bar_store import ColumnarBars
+from block_kernels import BlockContext, block_signals
+from composite_evaluator import DIRECTION_LONG, CompositeEvaluator
+from indicators import moving_average, standard_deviation
+from strategy_arbitration import arbitrate
+from streaming_engine import (
+    StreamEMA, StreamExtremum, StreamingEngine, StreamLWMA, StreamSMA, StreamSMMA, StreamStdDev
+)
+from synthetic_data import generate_bars
+
+EA_TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ea', 'tests')
+
+
+def stream(state, values) -> np.ndarray:
+    return np.array([state.update(float(value)) for value in values])
+
+
+def strategy(strategy_id: str, *groups, priority: int = 1, conflict: str = 'firstOnly') -> dict:
+    return {
+        'id': strategy_id,
+        'enabled': True,
+        'priority': priority,
+        'conflictPolicy': conflict,
+        'entryRequirement': {
+            'type': 'OR',
+            'ruleGroups': [
+                {'id': f"RG{i}", 'type': 'AND', 'conditions': [{'blockId': b} for b in group]}
+                for i, group in enumerate(groups)
+            ]
+        }
+    }
+
+
+MIXED_CONFIG = {
+    'strategies': [
+        strategy('S1', ['filter.spreadMax#1', 'trend.maRelation#1', 'trigger.bbReentry#1'],
+                 ['trend.maCross#2', 'trigger.bbBreakout#2'], priority=5),
+        strategy('S2', ['trend.maCross#1'], priority=10, conflict='all'),
+        strategy('S3', ['trigger.bbBreakout#1'], ['trend.maRelation#2', 'trigger.bbBreakout#2']),
+    ],
+    'blocks': [
+        {'id': 'filter.spreadMax#1', 'typeId': 'filter.spreadMax', 'params': {'maxSpreadPips': 1.5}},
+        {'id': 'trend.maRelation#1', 'typeId': 'trend.maRelation', 'params': {'period': 50, 'maType': 'SMA'}},
+        {'id': 'trend.maRelation#2', 'typeId': 'trend.maRelation',
+         'params': {'period': 20, 'maType': 'EMA', 'relation': 'closeBelow'}},
+        {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}},
+        {'id': 'trend.maCross#2', 'typeId': 'trend.maCross',
+         'params': {'fastPeriod': 5, 'slowPeriod': 20, 'direction': 'dead'}},
+        {'id': 'trigger.bbReentry#1', 'typeId': 'trigger.bbReentry', 'params': {'period': 20, 'deviation': 2.0}},
+        {'id': 'trigger.bbBreakout#1', 'typeId': 'trigger.bbBreakout', 'params': {'period': 20, 'deviation': 2.0}},
+        {'id': 'trigger.bbBreakout#2', 'typeId': 'trigger.bbBreakout',
+         'params': {'period': 20, 'deviation': 1.5, 'direction': 'lower'}},
+    ],
+}
+
+
+class TestStreamIndicators(unittest.TestCase):
+    """Incremental indicator states reproduce the batch series"""
+
+    def setUp(self):
+        self.close = generate_bars(3000, timeframe='H1', seed=12)['close']
+
+    def test_sma(self):
+        state = StreamSMA(20)
+
+        np.testing.assert_allclose(stream(state, self.close), moving_average(self.close, 20), rtol=1e-12)
+        self.assertEqual(len(state.window), 20)
+
+    def test_ema(self):
+        np.testing.assert_allclose(
+            stream(StreamEMA(14), self.close), moving_average(self.close, 14, 'EMA'), rtol=1e-12
+        )
+
+    def test_smma_and_lwma(self):
+        for method, state in (('SMMA', StreamSMMA(14)), ('LWMA', StreamLWMA(14))):
+            with self.subTest(method=method):
+                np.testing.assert_allclose(
+                    stream(state, self.close), moving_average(self.close, 14, method), rtol=1e-12
+                )
+
+    def test_standard_deviation(self):
+        for method, center in (('SMA', StreamSMA(20)), ('EMA', StreamEMA(20))):
+            with self.subTest(method=method):
+                state = StreamStdDev(20, center)
+
+                values = [(center.update(float(v)), state.update(float(v)))[1] for v in self.close]
+
+                np.testing.assert_allclose(
+                    values, standard_deviation(self.close, 20, method), rtol=1e-6, equal_nan=True
+                )
+
+    def test_extremum_monotonic_deque(self):
+        highs = generate_bars(3000, timeframe='H1', seed=12)['high']
+        highest = StreamExtremum(26, highest=True)
+        lowest = StreamExtremum(26, highest=False)
+
+        np.testing.assert_array_equal(stream(highest, highs)[25:], sliding_window_view(highs, 26).max(axis=1))
+        np.testing.assert_array_equal(stream(lowest, highs)[25:], sliding_window_view(highs, 26).min(axis=1))
+        self.assertLessEqual(len(highest.candidates), 26)
+
+
+class TestStreamingEngine(unittest.TestCase):
+    """on_bar() gives the same signals as the batch evaluation"""
+
+    def setUp(self):
+        self.bars = generate_bars(4000, timeframe='H1', seed=31, digits=3, spread_points=12)
+
+    def batch_signals(self, config) -> set:
+        evaluator = CompositeEvaluator(config)
+        context = BlockContext(self.bars, 'H1', digits=3)
+        signals = block_signals(config['blocks'], evaluator.block_ids(), context)
+        arbitration = arbitrate(config, signals, len(self.bars), evaluator)
+        times = self.bars['time']
+        result = set()
+        for row, strategy_id in enumerate(arbitration.strategy_ids):
+            entries = arbitration.entries(strategy_id)
+            long = arbitration.direction[row] == DIRECTION_LONG
+            result |= {(strategy_id, 'BUY', int(t)) for t in times[entries & long]}
+            result |= {(strategy_id, 'SELL', int(t)) for t in times[entries & ~long]}
+        return result
+
+    def stream_signals(self, engine, bars) -> set:
+        return {
+            (signal['strategyId'], signal['type'], signal['time'])
+            for bar in bars for signal in engine.on_bar(bar)
+        }
+
+    def test_matches_batch_evaluation(self):
+        engine = StreamingEngine(MIXED_CONFIG, timeframe='H1', digits=3)
+
+        streamed = self.stream_signals(engine, self.bars)
+
+        expected = self.batch_signals(MIXED_CONFIG)
+        self.assertGreater(len(expected), 50)
+        self.assertEqual(streamed, expected)
+        self.assertEqual({s for s, _, _ in streamed}, {'S1', 'S2', 'S3'})
+
+    def test_accepts_structured_rows_and_dicts(self):
+        rows = self.bars.to_records()[:300]
+        first = StreamingEngine(MIXED_CONFIG, timeframe='H1', digits=3)
+        second = StreamingEngine(MIXED_CONFIG, timeframe='H1', digits=3)
+
+        from_rows = self.stream_signals(first, rows)
+        from_dicts = self.stream_signals(second, [{name: row[name] for name in rows.dtype.names} for row in rows])
+
+        self.assertEqual(from_rows, from_dicts)
+
+    def test_signals_in_priority_order(self):
+        engine = StreamingEngine(MIXED_CONFIG, timeframe='H1', digits=3)
+
+        self.assertEqual([strategy_id for strategy_id, _ in engine.strategies], ['S2', 'S1', 'S3'])
+
+    def test_indicator_state_shared(self):
+        """Blocks with the same parameters share one incremental state"""
+        engine = StreamingEngine(MIXED_CONFIG, timeframe='H1', digits=3)
+
+        # SMA50, EMA5, EMA20, SMA20, STDDEV20, BB(20,2.0), BB(20,1.5)
+        self.assertEqual(len(engine._indicators), 7)
+
+    def test_ea_config_file(self):
+        engine = StreamingEngine.from_file(
+            os.path.join(EA_TESTS_DIR, 'basic-strategy.json'), timeframe='H1', digits=3
+        )
+
+        signals = self.stream_signals(engine, ColumnarBars.wrap(self.bars)[:500])
+
+        with open(os.path.join(EA_TESTS_DIR, 'basic-strategy.json'), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        self.assertEqual(signals, {s for s in self.batch_signals(config) if s[2] <= int(self.bars['time'][499])})
+
+    def test_first_only_blocks_lower_priority(self):
+        """A firstOnly strategy hides lower-priority signals on the same bar"""
+        engine = StreamingEngine(MIXED_CONFIG, timeframe='H1', digits=3)
+
+        streamed = self.stream_signals(engine, self.bars)
+
+        s1_times = {t for s, _, t in streamed if s == 'S1'}
+        self.assertFalse(s1_times & {t for s, _, t in streamed if s == 'S3'})
+
+    def test_unsupported_block_raises_error(self):
+        config = {
+            'strategies': [strategy('S1', ['osc.momentum#1'])],
+            'blocks': [{'id': 'osc.momentum#1', 'typeId': 'osc.momentum', 'params': {}}],
+        }
+        with self.assertRaises(ValueError):
+            StreamingEngine(config)
+
+
+if __name__ == '__main__':
+    unittest.main()
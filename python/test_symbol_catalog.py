@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Unit tests for SymbolCatalog and symbol resolution in MT5DataProvider
+
+Validates: 前方一致の索引、カタログの保存と期限切れ時の再取得、symbols_get()の呼び出し回数、シンボルの桁数
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data_providers import MT5DataProvider
+from symbol_catalog import CATALOG_MAX_AGE_SECONDS, SymbolCatalog
+
+
+def make_symbol_info(name: str, visible: bool = True) -> Mock:
+    info = Mock(visible=visible, digits=3, point=0.001)
+    info.name = name
+    return info
+
+
+def broker_symbols(count: int, seed: int = 2) -> list:
+    """Random broker symbol names plus a few suffixed FX pairs"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    names = {"".join(rng.choice(letters, 6)) + rng.choice(["", "m", ".pro", "#"]) for _ in range(count)}
+    names |= {"USDJPYm", "EURUSDm", "EURUSD.pro", "GBPUSD"}
+    return [make_symbol_info(name) for name in sorted(names)]
+
+
+class TestSymbolCatalog(unittest.TestCase):
+    """Test prefix lookup and persistence"""
+
+    def setUp(self):
+        self.symbols = broker_symbols(3000)
+        self.catalog = SymbolCatalog.from_mt5(self.symbols, "Broker-Demo", 1700000000)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_candidates_match_linear_scan(self):
+        """The bisect index returns the same names as a full prefix scan"""
+        for prefix in ("usdjpy", "EURUSD", "a", "QX", "zzzzzzz", ""):
+            with self.subTest(prefix=prefix):
+                expected = sorted(
+                    (s.name for s in self.symbols if s.name.lower().startswith(prefix.lower())),
+                    key=str.lower
+                )
+                self.assertEqual(self.catalog.candidates(prefix), expected)
+
+    def test_resolve_rules(self):
+        """Exact match, single suffix variant, and ambiguous prefixes"""
+        self.assertEqual(self.catalog.resolve("gbpusd"), "GBPUSD")
+        self.assertEqual(self.catalog.resolve("USDJPY"), "USDJPYm")
+        with self.assertRaises(Exception) as context:
+            self.catalog.resolve("EURUSD")
+        self.assertIn("候補が複数あります", str(context.exception))
+        with self.assertRaises(Exception) as context:
+            self.catalog.resolve("XAUUSD")
+        self.assertIn("類似候補がありません", str(context.exception))
+
+    def test_save_and_load(self):
+        """A saved catalog is read back with its metadata"""
+        path = os.path.join(self.tmp_dir, "symbols.json")
+        self.catalog.save(path)
+
+        loaded = SymbolCatalog.load(path)
+
+        self.assertEqual(len(loaded), len(self.catalog))
+        self.assertEqual(loaded.symbols["USDJPYm"]["point"], 0.001)
+        self.assertFalse(loaded.is_stale("Broker-Demo", 1700000000 + 60))
+        self.assertTrue(loaded.is_stale("Broker-Demo", 1700000000 + CATALOG_MAX_AGE_SECONDS + 1))
+        self.assertTrue(loaded.is_stale("Other-Live", 1700000000 + 60))
+
+
+class TestMT5SymbolResolution(unittest.TestCase):
+    """Test MT5DataProvider.resolve_symbol with a persisted catalog"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "symbols.json")
+        self.mt5 = Mock()
+        self.mt5.symbols_get.return_value = broker_symbols(500)
+        self.mt5.account_info.return_value = Mock(server="Broker-Demo")
+        self.mt5.symbol_info.side_effect = lambda name: make_symbol_info(name) if name == "USDJPYm" else None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def resolve(self, symbol: str = "USDJPY") -> str:
+        with patch('sys.stderr', new=StringIO()):
+            return MT5DataProvider(self.mt5, self.path).resolve_symbol(symbol, "M1")
+
+    def test_catalog_is_reused_across_runs(self):
+        """symbols_get() is called once; later runs read the saved catalog"""
+        self.assertEqual(self.resolve(), "USDJPYm")
+        self.assertEqual(self.resolve(), "USDJPYm")
+
+        self.mt5.symbols_get.assert_called_once()
+        self.assertTrue(os.path.isfile(self.path))
+
+    def test_stale_catalog_is_refreshed(self):
+        """An old catalog is rebuilt from symbols_get()"""
+        SymbolCatalog.from_mt5(
+            [make_symbol_info("USDJPYm")], "Broker-Demo",
+            int(time.time()) - CATALOG_MAX_AGE_SECONDS - 10
+        ).save(self.path)
+
+        self.resolve()
+
+        self.mt5.symbols_get.assert_called_once()
+        self.assertGreater(len(SymbolCatalog.load(self.path)), 1)
+
+    def test_unknown_symbol_refreshes_once(self):
+        """A symbol missing from a fresh catalog triggers one refresh before failing"""
+        self.resolve()
+        self.mt5.symbols_get.reset_mock()
+
+        with self.assertRaises(Exception) as context:
+            self.resolve("XAUUSD")
+
+        self.mt5.symbols_get.assert_called_once()
+        self.assertIn("類似候補がありません", str(context.exception))
+
+    def test_symbol_digits(self):
+        """Digits come from symbol_info(), then from the saved catalog"""
+        provider = MT5DataProvider(self.mt5, self.path)
+
+        self.assertEqual(provider.symbol_digits("USDJPYm"), 3)
+        self.mt5.symbols_get.assert_not_called()
+        self.assertEqual(provider.symbol_digits("GBPUSD"), 3)
+        self.assertIsNone(provider.symbol_digits("XAUUSD"))
+        self.assertIsNone(SymbolCatalog([]).digits("GBPUSD"))
+
+
+if __name__ == '__main__':
+    unittest.main()
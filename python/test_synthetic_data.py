@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the synthetic market data generator
+
+Validates: シードによる再現性、レート配列と同じdtype、OHLCの整合性、週末の休場、レジームスイッチング
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+import synthetic_data
+from backtest_engine import BacktestEngine
+from bar_store import RATE_COLUMNS, RATE_DTYPES
+from gap_index import GapIndex
+from synthetic_data import (
+    TRADING_YEAR_SECONDS,
+    bar_times,
+    generate_bars,
+    generate_ticks,
+    regime_path,
+)
+from tick_store import TICK_DTYPE, decode_ticks, encode_ticks
+
+
+def weekday(times: np.ndarray) -> np.ndarray:
+    """Monday = 0"""
+    return (np.asarray(times) // 86400 + 3) % 7
+
+
+class TestGenerateBars(unittest.TestCase):
+    """Test generate_bars"""
+
+    def test_same_seed_same_data(self):
+        """Bars are reproducible from the seed"""
+        a = generate_bars(5000, seed=42, process='regime')
+        b = generate_bars(5000, seed=42, process='regime')
+        c = generate_bars(5000, seed=43, process='regime')
+
+        np.testing.assert_array_equal(a.to_records(), b.to_records())
+        self.assertFalse(np.array_equal(a['close'], c['close']))
+
+    def test_rates_dtype(self):
+        """Columns and dtypes match the rate arrays used by the engine"""
+        bars = generate_bars(100, timeframe='H1')
+
+        self.assertEqual(tuple(bars.names), RATE_COLUMNS)
+        for name in RATE_COLUMNS:
+            self.assertEqual(bars[name].dtype, RATE_DTYPES[name])
+
+    def test_ohlc_consistency(self):
+        """High/low bound open/close, prices sit on the point grid"""
+        bars = generate_bars(50000, seed=3, digits=3, spread_points=10)
+
+        self.assertTrue(np.all(bars['high'] >= np.maximum(bars['open'], bars['close'])))
+        self.assertTrue(np.all(bars['low'] <= np.minimum(bars['open'], bars['close'])))
+        np.testing.assert_allclose(bars['close'] * 1000, np.rint(bars['close'] * 1000), atol=1e-6)
+        self.assertTrue(np.all(bars['spread'] >= 10))
+        self.assertTrue(np.all(bars['tick_volume'] >= 1))
+
+    def test_weekend_breaks(self):
+        """No bars on weekends; the only holes are weekend breaks"""
+        bars = generate_bars(30 * 1440, seed=1)
+        times = bars['time']
+
+        self.assertTrue(np.all(weekday(times) < 5))
+        self.assertTrue(np.all(np.diff(times) > 0))
+        index = GapIndex.build(times, 'M1', [(int(times[0]), int(times[-1]))])
+        self.assertEqual(index.count_missing(int(times[0]), int(times[-1])), 0)
+        self.assertEqual(len(index.hole_starts), 5)
+
+    def test_start_on_weekend_moves_to_monday(self):
+        """Generation starting on a Saturday begins at the next Monday 00:00"""
+        saturday = int(datetime(2024, 1, 6, 13, 0).timestamp())
+
+        times = bar_times(saturday, 7, 'D1')
+
+        self.assertEqual(int(times[0]), int(datetime(2024, 1, 8).timestamp()))
+        self.assertEqual(weekday(times).tolist(), [0, 1, 2, 3, 4, 0, 1])
+
+    def test_gbm_volatility(self):
+        """Per-bar log-return volatility matches the annual volatility"""
+        bars = generate_bars(200000, timeframe='M5', seed=9, volatility=0.1, digits=5, weekends=False)
+
+        returns = np.diff(np.log(bars['close']))
+        expected = 0.1 * np.sqrt(300 / TRADING_YEAR_SECONDS)
+        self.assertAlmostEqual(returns.std() / expected, 1.0, delta=0.05)
+
+    def test_regime_switching_volatility(self):
+        """Regimes with different volatility produce different realized volatility"""
+        bars = generate_bars(
+            200000, seed=5, process='regime', digits=5, weekends=False,
+            regimes=((0.0, 0.02), (0.0, 0.2)), regime_persistence=0.9995
+        )
+
+        returns = np.abs(np.diff(np.log(bars['close'])))
+        window_vol = returns[:199000].reshape(-1, 1000).mean(axis=1)
+        self.assertGreater(window_vol.max() / window_vol.min(), 4.0)
+
+    def test_regime_path_persistence(self):
+        """The number of regime switches follows the persistence probability"""
+        labels = regime_path(1000000, np.random.default_rng(0), 3, 0.999)
+
+        switches = int(np.count_nonzero(np.diff(labels)))
+        self.assertEqual(len(labels), 1000000)
+        self.assertAlmostEqual(switches / 1000, 1.0, delta=0.1)
+
+    def test_unknown_process_raises_error(self):
+        with self.assertRaises(ValueError):
+            generate_bars(10, process='jump')
+
+
+class TestGenerateTicks(unittest.TestCase):
+    """Test generate_ticks"""
+
+    def test_ticks_layout(self):
+        """Ticks use the MT5 tick dtype, are ordered and skip weekends"""
+        ticks = generate_ticks(200000, seed=2, mean_interval_ms=5000)
+
+        self.assertEqual(ticks.dtype, TICK_DTYPE)
+        self.assertTrue(np.all(np.diff(ticks['time_msc']) > 0))
+        self.assertTrue(np.all(ticks['ask'] >= ticks['bid']))
+        self.assertTrue(np.all(weekday(ticks['time']) < 5))
+        self.assertGreater(ticks['time'][-1] - ticks['time'][0], 7 * 86400)
+
+    def test_ticks_encode_losslessly(self):
+        """Generated prices are on the point grid used by the tick store"""
+        ticks = generate_ticks(10000, seed=4)
+
+        decoded = decode_ticks(encode_ticks(ticks, 0.001))
+
+        np.testing.assert_allclose(decoded['bid_points'] * 0.001, ticks['bid'])
+        np.testing.assert_array_equal(decoded['time_msc'], ticks['time_msc'])
+
+
+class TestSyntheticDataCommand(unittest.TestCase):
+    """Test the command line entry point with the file data source"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_output_is_readable_by_engine(self):
+        """Generated files are backtested through --data-source file"""
+        test_args = [
+            'synthetic_data.py', '--symbol', 'USDJPY', '--timeframe', 'H1',
+            '--bars', '500', '--output-dir', self.data_dir, '--seed', '7'
+        ]
+        with patch('sys.argv', test_args), patch('sys.stdout', new=StringIO()) as fake_out:
+            synthetic_data.main()
+        self.assertIn("合成データを生成しました: 500 バー", fake_out.getvalue())
+
+        engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="H1",
+            start_date=datetime(2024, 1, 1),
+            end_date=datetime(2024, 1, 31),
+            output_path="test_output.json",
+            data_source="file",
+            data_dir=self.data_dir
+        )
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()) as fake_err:
+            engine.fetch_historical_data()
+
+        expected = generate_bars(500, timeframe='H1', seed=7)
+        np.testing.assert_array_equal(
+            engine.historical_data['close'], expected['close'][:len(engine.historical_data)]
+        )
+        self.assertNotIn("データに欠損期間があります", fake_err.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
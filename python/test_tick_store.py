@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Unit tests for TickStore and the tick-to-bar aggregator
+
+Validates: 差分符号化の可逆性、ブロック境界をまたぐバー集計、MT5からのティック取得、
+           ティックのスプレッドによるスプレッドフィルター
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, Mock
+from io import StringIO
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Mock MetaTrader5 before importing backtest_engine
+sys.modules['MetaTrader5'] = Mock()
+
+from backtest_engine import BacktestEngine
+from bar_cache import to_epoch_seconds
+from tick_store import TickBarAggregator, TickStore, aggregate_ticks, decode_ticks, encode_ticks
+
+
+TICK_DTYPE = [('time', 'i8'), ('bid', 'f8'), ('ask', 'f8'), ('last', 'f8'), ('volume', 'u8'),
+              ('time_msc', 'i8'), ('flags', 'u4'), ('volume_real', 'f8')]
+
+POINT = 0.001
+
+
+def make_ticks(count: int, start_ts: int = 1704153600, seed: int = 7) -> np.ndarray:
+    """Create random-walk USDJPY-like ticks starting at start_ts"""
+    rng = np.random.default_rng(seed)
+    time_msc = start_ts * 1000 + np.cumsum(rng.integers(50, 4000, count))
+    bid_points = 141000 + np.cumsum(rng.integers(-3, 4, count))
+    spread_points = rng.integers(2, 9, count)
+    ticks = np.zeros(count, dtype=TICK_DTYPE)
+    ticks['time_msc'] = time_msc
+    ticks['time'] = time_msc // 1000
+    ticks['bid'] = bid_points * POINT
+    ticks['ask'] = (bid_points + spread_points) * POINT
+    ticks['flags'] = 6
+    return ticks
+
+
+def naive_bars(ticks: np.ndarray, seconds: int) -> list:
+    """Reference aggregation with a Python loop"""
+    bars = []
+    for tick in ticks:
+        bucket = int(tick['time_msc']) // 1000 // seconds * seconds
+        bid = int(round(tick['bid'] / POINT))
+        spread = int(round(tick['ask'] / POINT)) - bid
+        if bars and bars[-1][0] == bucket:
+            t, o, h, l, c, v, s = bars[-1]
+            bars[-1] = (t, o, max(h, bid), min(l, bid), bid, v + 1, min(s, spread))
+        else:
+            bars.append((bucket, bid, bid, bid, bid, 1, spread))
+    return bars
+
+
+class TestTickEncoding(unittest.TestCase):
+    """Test delta encoding and vectorized aggregation"""
+
+    def test_encode_decode_roundtrip(self):
+        """Decoded ticks match the original integer-point prices"""
+        ticks = make_ticks(5000)
+
+        decoded = decode_ticks(encode_ticks(ticks, POINT))
+
+        np.testing.assert_array_equal(decoded['time_msc'], ticks['time_msc'])
+        np.testing.assert_array_equal(decoded['bid_points'], np.rint(ticks['bid'] / POINT))
+        np.testing.assert_array_equal(decoded['ask_points'], np.rint(ticks['ask'] / POINT))
+
+    def test_encoding_is_compact(self):
+        """Deltas are stored in narrow integer types"""
+        encoded = encode_ticks(make_ticks(5000), POINT)
+
+        bytes_per_tick = sum(encoded[name].itemsize for name in ('dt', 'dbid', 'spread', 'flags'))
+        self.assertLessEqual(bytes_per_tick, 5)
+
+    def test_aggregate_matches_reference(self):
+        """Vectorized aggregation equals a per-tick loop"""
+        ticks = make_ticks(3000)
+        decoded = decode_ticks(encode_ticks(ticks, POINT))
+
+        bars = aggregate_ticks(
+            decoded['time_msc'],
+            decoded['bid_points'],
+            decoded['ask_points'] - decoded['bid_points'],
+            60
+        )
+
+        actual = list(zip(*(bars[name].tolist() for name in
+                            ('time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread'))))
+        self.assertEqual(actual, naive_bars(ticks, 60))
+
+    def test_aggregator_merges_bars_across_blocks(self):
+        """Bars split between blocks are combined before they are emitted"""
+        ticks = make_ticks(3000)
+        decoded = decode_ticks(encode_ticks(ticks, POINT))
+        spread = decoded['ask_points'] - decoded['bid_points']
+        aggregator = TickBarAggregator(300, POINT)
+
+        parts = []
+        for lo, hi in ((0, 777), (777, 1500), (1500, 1501), (1501, 3000)):
+            parts.append(aggregator.add(
+                decoded['time_msc'][lo:hi], decoded['bid_points'][lo:hi], spread[lo:hi]
+            ))
+        parts.append(aggregator.flush())
+
+        times = np.concatenate([p['time'] for p in parts])
+        closes = np.concatenate([p['close'] for p in parts])
+        volumes = np.concatenate([p['tick_volume'] for p in parts])
+        expected = naive_bars(ticks, 300)
+        self.assertEqual(times.tolist(), [b[0] for b in expected])
+        np.testing.assert_allclose(closes, [b[4] * POINT for b in expected])
+        self.assertEqual(volumes.tolist(), [b[5] for b in expected])
+
+
+class TestTickStore(unittest.TestCase):
+    """Test TickStore persistence"""
+
+    def setUp(self):
+        self.tick_dir = tempfile.mkdtemp()
+        self.store = TickStore(self.tick_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tick_dir, ignore_errors=True)
+
+    def test_append_and_iterate_blocks(self):
+        """Ticks are read back block by block within the requested range"""
+        ticks = make_ticks(4000)
+        split = int(ticks['time'][2000])
+        self.store.append("USDJPY", int(ticks['time'][0]), split - 1, ticks, POINT)
+        self.store.append("USDJPY", split, int(ticks['time'][-1]), ticks, POINT)
+
+        blocks = list(self.store.iter_ticks(
+            "USDJPY", datetime(2024, 1, 2), datetime(2024, 1, 3)
+        ))
+
+        self.assertEqual(len(blocks), 2)
+        bid = np.concatenate([b['bid'] for b in blocks])
+        np.testing.assert_allclose(bid, ticks['bid'])
+        self.assertEqual(len(self.store.coverage("USDJPY")), 1)
+
+    def test_aggregate_bars_from_store(self):
+        """Stored ticks aggregate to the same bars as the reference"""
+        ticks = make_ticks(4000)
+        split = int(ticks['time'][1234])
+        self.store.append("USDJPY", int(ticks['time'][0]), split - 1, ticks, POINT)
+        self.store.append("USDJPY", split, int(ticks['time'][-1]), ticks, POINT)
+
+        bars = self.store.aggregate_bars("USDJPY", "M1", datetime(2024, 1, 2), datetime(2024, 1, 3))
+
+        expected = naive_bars(ticks, 60)
+        self.assertEqual(bars['time'].tolist(), [b[0] for b in expected])
+        self.assertEqual(bars['tick_volume'].tolist(), [b[5] for b in expected])
+        self.assertEqual(bars['spread'].tolist(), [b[6] for b in expected])
+        np.testing.assert_allclose(bars['high'], [b[2] * POINT for b in expected])
+
+    def test_close_spreads_from_store(self):
+        """Each bar takes the spread of its last tick, also across block boundaries"""
+        ticks = make_ticks(4000)
+        split = int(ticks['time'][1234])
+        self.store.append("USDJPY", int(ticks['time'][0]), split - 1, ticks, POINT)
+        self.store.append("USDJPY", split, int(ticks['time'][-1]), ticks, POINT)
+
+        times, spreads = self.store.close_spreads("USDJPY", "M1", datetime(2024, 1, 2), datetime(2024, 1, 3))
+
+        expected = {}
+        for tick in ticks:
+            expected[int(tick['time']) // 60 * 60] = int(round(tick['ask'] / POINT)) - int(round(tick['bid'] / POINT))
+        self.assertEqual(times.tolist(), list(expected))
+        self.assertEqual(spreads.tolist(), list(expected.values()))
+        self.assertIsNone(self.store.close_spreads("EURUSD", "M1", datetime(2024, 1, 2), datetime(2024, 1, 3)))
+
+    def test_point_mismatch_raises_error(self):
+        """A store keeps one point size per symbol"""
+        ticks = make_ticks(10)
+        self.store.append("USDJPY", int(ticks['time'][0]), int(ticks['time'][-1]), ticks, POINT)
+
+        with self.assertRaises(ValueError):
+            self.store.append("USDJPY", 0, 10, None, 0.01)
+
+
+class TestIngestTicks(unittest.TestCase):
+    """Test BacktestEngine.ingest_ticks"""
+
+    def setUp(self):
+        self.tick_dir = tempfile.mkdtemp()
+        self.engine = BacktestEngine(
+            config_path="test_config.json",
+            symbol="USDJPY",
+            timeframe="M1",
+            start_date=datetime(2024, 1, 2),
+            end_date=datetime(2024, 1, 2, 23, 59, 59),
+            output_path="test_output.json",
+            tick_dir=self.tick_dir
+        )
+        self.ticks = make_ticks(20000, seed=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.tick_dir, ignore_errors=True)
+
+    def copy_ticks_range(self, symbol, date_from, date_to, flags):
+        seconds = self.ticks['time']
+        return self.ticks[(seconds >= date_from.timestamp()) & (seconds <= date_to.timestamp())]
+
+    @patch('backtest_engine.mt5')
+    def test_ingest_in_windows(self, mock_mt5):
+        """Ticks are fetched in fixed windows and not fetched again"""
+        mock_mt5.COPY_TICKS_INFO = 2
+        mock_mt5.symbol_info.return_value = Mock(point=POINT)
+        mock_mt5.copy_ticks_range.side_effect = self.copy_ticks_range
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            stored = self.engine.ingest_ticks()
+            self.engine.ingest_ticks()
+
+        in_range = self.ticks['time'] <= to_epoch_seconds(self.engine.end_date)
+        self.assertEqual(stored, int(in_range.sum()))
+        self.assertEqual(mock_mt5.copy_ticks_range.call_count, 4)
+        self.assertEqual(mock_mt5.copy_ticks_range.call_args[0][3], 2)
+        self.assertIn("ティック/秒", fake_out.getvalue())
+        self.assertIn("ティックはすべて取得済みです", fake_out.getvalue())
+
+    @patch('backtest_engine.mt5')
+    def test_ingest_failure_raises_error(self, mock_mt5):
+        """A failed tick request aborts the ingestion"""
+        mock_mt5.symbol_info.return_value = Mock(point=POINT)
+        mock_mt5.copy_ticks_range.return_value = None
+        mock_mt5.last_error.return_value = (-1, "Timeout")
+
+        with patch('sys.stdout', new=StringIO()):
+            with self.assertRaises(Exception) as context:
+                self.engine.ingest_ticks()
+
+        self.assertIn("ティック取得失敗", str(context.exception))
+
+    def test_file_source_skips_ingestion(self):
+        """A provider without ticks warns instead of failing after the bars are loaded"""
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir, ignore_errors=True)
+        self.engine.data_source = 'file'
+        self.engine.data_dir = data_dir
+
+        with patch('sys.stdout', new=StringIO()), patch('sys.stderr', new=StringIO()) as fake_err:
+            stored = self.engine.ingest_ticks()
+
+        self.assertEqual(stored, 0)
+        self.assertIn("ティックに対応していない", fake_err.getvalue())
+
+    def test_spread_filter_uses_tick_spreads(self):
+        """filter.spreadMax and maxSpreadPips read the last tick spread of each bar"""
+        store = TickStore(self.tick_dir)
+        store.append("USDJPY", int(self.ticks['time'][0]), int(self.ticks['time'][-1]), self.ticks, POINT)
+        bars = store.aggregate_bars("USDJPY", "M1", datetime(2024, 1, 2), datetime(2024, 1, 3))
+        # バーの spread（ポイント）は上限（0.9 pips）を超える値にしておく
+        bars.columns['spread'][:] = 50
+        self.engine.digits = 3
+        self.engine.historical_data = bars
+        self.engine.strategy_config = {
+            'globalGuards': {'maxSpreadPips': 0.9},
+            'strategies': [{
+                'id': 'S1', 'enabled': True, 'priority': 1, 'conflictPolicy': 'firstOnly', 'directionPolicy': 'both',
+                'entryRequirement': {'type': 'OR', 'ruleGroups': [{'id': 'RG1', 'type': 'AND', 'conditions': [
+                    {'blockId': 'filter.spreadMax#1'}, {'blockId': 'trend.maCross#1'},
+                ]}]},
+            }],
+            'blocks': [
+                {'id': 'filter.spreadMax#1', 'typeId': 'filter.spreadMax', 'params': {'maxSpreadPips': 0.6}},
+                {'id': 'trend.maCross#1', 'typeId': 'trend.maCross', 'params': {'fastPeriod': 5, 'slowPeriod': 20}},
+            ],
+        }
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            spreads = self.engine.bar_spreads()
+            entries = self.engine.strategy_arbitration().entries('S1')
+
+        _, expected = store.close_spreads("USDJPY", "M1", datetime(2024, 1, 2), datetime(2024, 1, 3))
+        np.testing.assert_array_equal(spreads, expected)
+        self.assertTrue(entries.any())
+        self.assertTrue(np.all(spreads[entries] <= 6))
+        self.assertIn(f"ティックのスプレッドを使用します: {len(bars)} / {len(bars)} バー", fake_out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
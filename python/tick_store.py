@@ -0,0 +1,460 @@
+"""
+Strategy Bricks ティックストア
+
+MT5の copy_ticks_range で取得したティックを、差分符号化したコンパクトな形式で
+ローカルディスクに保存し、ブロック単位で読み出してバーへ集計します。
+
+符号化（ブロックごと）:
+    - 時刻: 先頭ティックのミリ秒時刻 + ミリ秒差分（整数）
+    - bid:  ポイント単位の整数。先頭値 + 差分
+    - ask:  bid とのポイント差（スプレッド）
+    - flags: MT5のティックフラグ
+    各配列は値域に収まる最小の整数型で保存します。MT5のティック構造体（1件約60バイト）に
+    対して、通常の為替ティックは1件あたり数バイトになります。
+
+ティックは取得ウィンドウごとに1ブロックとして追記し、読み出し・集計もブロック単位で
+行うため、四半期分（数千万件）のティックでもメモリ使用量は1ブロック分に抑えられます。
+
+ストア構成:
+    <tick_dir>/<SYMBOL>/manifest.json
+    <tick_dir>/<SYMBOL>/blk_<start>_<end>.npz
+    （start/end はUTCエポック秒、区間は両端を含む）
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from bar_cache import (
+    Interval,
+    atomic_write,
+    merge_intervals,
+    safe_name,
+    subtract_intervals,
+    to_epoch_seconds,
+)
+from bar_store import RATE_COLUMNS, RATE_DTYPES, TIMEFRAME_SECONDS, ColumnarBars
+
+# マニフェストのフォーマットバージョン（不一致の場合はストア無しとして扱う）
+TICK_FORMAT_VERSION = 1
+
+# MT5 の copy_ticks_range が返すティック配列のdtype
+TICK_DTYPE = np.dtype([
+    ('time', 'i8'), ('bid', 'f8'), ('ask', 'f8'), ('last', 'f8'), ('volume', 'u8'),
+    ('time_msc', 'i8'), ('flags', 'u4'), ('volume_real', 'f8'),
+])
+
+
+def narrow_int(values: np.ndarray) -> np.ndarray:
+    """値域に収まる最小の符号付き整数型へ変換"""
+    if len(values) == 0:
+        return values.astype(np.int8)
+    lo = int(values.min())
+    hi = int(values.max())
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+
+def point_digits(point: float) -> int:
+    """ポイントサイズから価格の小数桁数を求める（0.001 → 3）"""
+    return max(0, int(round(-math.log10(point))))
+
+
+def encode_ticks(ticks: Any, point: float) -> Dict[str, np.ndarray]:
+    """
+    ティック配列を差分符号化
+
+    Args:
+        ticks: copy_ticks_range の結果（time_msc/time, bid, ask, flags フィールド）
+        point: シンボルのポイントサイズ
+
+    Returns:
+        保存用の配列（first, dt, dbid, spread, flags）
+    """
+    names = ticks.dtype.names
+    if 'time_msc' in names:
+        time_msc = np.asarray(ticks['time_msc'], dtype=np.int64)
+    else:
+        time_msc = np.asarray(ticks['time'], dtype=np.int64) * 1000
+    bid = np.rint(np.asarray(ticks['bid'], dtype=np.float64) / point).astype(np.int64)
+    ask = np.rint(np.asarray(ticks['ask'], dtype=np.float64) / point).astype(np.int64)
+    flags = np.asarray(ticks['flags'], dtype=np.int64) if 'flags' in names \
+        else np.zeros(len(time_msc), dtype=np.int64)
+
+    return {
+        'first': np.array([time_msc[0], bid[0]], dtype=np.int64),
+        'dt': narrow_int(np.diff(time_msc, prepend=time_msc[0])),
+        'dbid': narrow_int(np.diff(bid, prepend=bid[0])),
+        'spread': narrow_int(ask - bid),
+        'flags': narrow_int(flags),
+    }
+
+
+def decode_ticks(block: Any) -> Dict[str, np.ndarray]:
+    """
+    差分符号化したブロックを復元
+
+    Returns:
+        time_msc, bid_points, ask_points, flags（いずれもint64）
+    """
+    first = block['first']
+    time_msc = np.cumsum(block['dt'], dtype=np.int64)
+    time_msc += first[0]
+    bid_points = np.cumsum(block['dbid'], dtype=np.int64)
+    bid_points += first[1]
+    return {
+        'time_msc': time_msc,
+        'bid_points': bid_points,
+        'ask_points': bid_points + block['spread'],
+        'flags': block['flags'].astype(np.int64),
+    }
+
+
+def aggregate_ticks(
+    time_msc: np.ndarray,
+    bid_points: np.ndarray,
+    spread_points: np.ndarray,
+    timeframe_seconds: int
+) -> Dict[str, np.ndarray]:
+    """
+    ティックをバーに集計（ベクトル化）
+
+    バーはMT5と同様にbidから作成し、spreadはバー内の最小スプレッド、
+    tick_volumeはティック数とします。価格はポイント単位の整数のまま返します。
+
+    Args:
+        time_msc: ティック時刻（ミリ秒、昇順）
+        bid_points: bid（ポイント単位）
+        spread_points: ask - bid（ポイント単位）
+        timeframe_seconds: 1バーの秒数
+
+    Returns:
+        time, open, high, low, close, tick_volume, spread の配列
+    """
+    if len(time_msc) == 0:
+        return {name: np.empty(0, dtype=np.int64) for name in
+                ('time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread')}
+    bucket = (time_msc // 1000) // timeframe_seconds * timeframe_seconds
+    starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    ends = np.append(starts[1:], len(bucket)) - 1
+    return {
+        'time': bucket[starts],
+        'open': bid_points[starts],
+        'high': np.maximum.reduceat(bid_points, starts),
+        'low': np.minimum.reduceat(bid_points, starts),
+        'close': bid_points[ends],
+        'tick_volume': np.diff(np.append(starts, len(bucket))),
+        'spread': np.minimum.reduceat(spread_points, starts),
+    }
+
+
+class TickBarAggregator:
+    """
+    ブロック単位で渡されるティックをバーへ集計
+
+    ブロック境界をまたぐバーは次のブロックと結合してから確定します。
+    保持するのは未確定のバー1本分のみです。
+    """
+
+    def __init__(self, timeframe_seconds: int, point: float):
+        self.timeframe_seconds = timeframe_seconds
+        self.point = point
+        self.digits = point_digits(point)
+        self._pending: Optional[Dict[str, np.ndarray]] = None
+
+    def add(self, time_msc: np.ndarray, bid_points: np.ndarray, spread_points: np.ndarray) -> ColumnarBars:
+        """
+        ティックを追加し、確定したバーを返す
+
+        Returns:
+            確定したバー（0本の場合あり）
+        """
+        bars = aggregate_ticks(time_msc, bid_points, spread_points, self.timeframe_seconds)
+        if len(bars['time']) == 0:
+            return self._to_bars(None)
+
+        pending = self._pending
+        if pending is not None and pending['time'][0] == bars['time'][0]:
+            bars['open'][0] = pending['open'][0]
+            bars['high'][0] = max(bars['high'][0], pending['high'][0])
+            bars['low'][0] = min(bars['low'][0], pending['low'][0])
+            bars['tick_volume'][0] += pending['tick_volume'][0]
+            bars['spread'][0] = min(bars['spread'][0], pending['spread'][0])
+            pending = None
+
+        self._pending = {name: values[-1:].copy() for name, values in bars.items()}
+        completed = {name: values[:-1] for name, values in bars.items()}
+        if pending is not None:
+            completed = {
+                name: np.concatenate([pending[name], completed[name]]) for name in completed
+            }
+        return self._to_bars(completed)
+
+    def flush(self) -> ColumnarBars:
+        """未確定のバーを確定して返す"""
+        pending = self._pending
+        self._pending = None
+        return self._to_bars(pending)
+
+    def _to_bars(self, bars: Optional[Dict[str, np.ndarray]]) -> ColumnarBars:
+        if bars is None:
+            return ColumnarBars({name: np.empty(0, dtype=RATE_DTYPES[name]) for name in RATE_COLUMNS})
+        columns = {}
+        for name in RATE_COLUMNS:
+            dtype = RATE_DTYPES[name]
+            if name in ('open', 'high', 'low', 'close'):
+                columns[name] = np.round(bars[name] * self.point, self.digits)
+            elif name == 'real_volume':
+                columns[name] = np.zeros(len(bars['time']), dtype=dtype)
+            else:
+                columns[name] = bars[name].astype(dtype)
+        return ColumnarBars(columns)
+
+
+class TickStore:
+    """シンボルごとにカバレッジ区間を管理するティックのディスクストア"""
+
+    def __init__(self, tick_dir: str):
+        """
+        ティックストアを初期化
+
+        Args:
+            tick_dir: ティックを保存するディレクトリ（存在しない場合は作成）
+        """
+        self.tick_dir = tick_dir
+
+    def symbol_dir(self, symbol: str) -> str:
+        """シンボルのストアディレクトリを返す"""
+        return os.path.join(self.tick_dir, safe_name(symbol))
+
+    def _manifest_path(self, symbol: str) -> str:
+        return os.path.join(self.symbol_dir(symbol), 'manifest.json')
+
+    def _read_manifest(self, symbol: str) -> Dict[str, Any]:
+        empty = {'formatVersion': TICK_FORMAT_VERSION, 'point': None, 'coverage': [], 'blocks': []}
+        path = self._manifest_path(symbol)
+        if not os.path.isfile(path):
+            return empty
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return empty
+        if manifest.get('formatVersion') != TICK_FORMAT_VERSION:
+            return empty
+        return manifest
+
+    def _write_manifest(self, symbol: str, manifest: Dict[str, Any]) -> None:
+        payload = json.dumps(manifest, indent=2).encode('utf-8')
+        atomic_write(self._manifest_path(symbol), lambda f: f.write(payload))
+
+    def point(self, symbol: str) -> Optional[float]:
+        """保存時のポイントサイズを返す"""
+        return self._read_manifest(symbol)['point']
+
+    def coverage(self, symbol: str) -> List[Interval]:
+        """取得済み期間（統合済み・昇順の閉区間、UTCエポック秒）を返す"""
+        return [(int(s), int(e)) for s, e in self._read_manifest(symbol)['coverage']]
+
+    def missing_ranges(self, symbol: str, start_date: datetime, end_date: datetime) -> List[Interval]:
+        """要求期間のうちストアに無い期間を返す"""
+        return subtract_intervals(
+            to_epoch_seconds(start_date),
+            to_epoch_seconds(end_date),
+            self.coverage(symbol)
+        )
+
+    def append(
+        self,
+        symbol: str,
+        start_ts: int,
+        end_ts: int,
+        ticks: Optional[Any],
+        point: float
+    ) -> int:
+        """
+        取得済み期間のティックを1ブロックとして追記
+
+        Args:
+            symbol: シンボル
+            start_ts: 取得期間の開始（UTCエポック秒、含む）
+            end_ts: 取得期間の終了（UTCエポック秒、含む）
+            ticks: copy_ticks_range の結果（None/空可）
+            point: シンボルのポイントサイズ
+
+        Returns:
+            保存したティック数
+
+        Raises:
+            ValueError: 既存のストアとポイントサイズが異なる場合
+        """
+        if end_ts < start_ts:
+            return 0
+
+        manifest = self._read_manifest(symbol)
+        if manifest['point'] is None:
+            manifest['point'] = point
+        elif not math.isclose(manifest['point'], point):
+            raise ValueError(
+                f"ポイントサイズが既存のティックストアと異なります: {point} != {manifest['point']}"
+            )
+        stored = 0
+
+        if ticks is not None and len(ticks) > 0:
+            ticks = np.asarray(ticks)
+            names = ticks.dtype.names
+            seconds = ticks['time_msc'] // 1000 if 'time_msc' in names else ticks['time']
+            rows = ticks[(seconds >= start_ts) & (seconds <= end_ts)]
+            if len(rows) > 0:
+                order_key = rows['time_msc'] if 'time_msc' in names else rows['time']
+                rows = rows[np.argsort(order_key, kind='stable')]
+                encoded = encode_ticks(rows, manifest['point'])
+                filename = f"blk_{start_ts}_{end_ts}.npz"
+                atomic_write(
+                    os.path.join(self.symbol_dir(symbol), filename),
+                    lambda f: np.savez(f, **encoded)
+                )
+                manifest['blocks'] = [b for b in manifest['blocks'] if b['file'] != filename]
+                manifest['blocks'].append({
+                    'file': filename,
+                    'start': start_ts,
+                    'end': end_ts,
+                    'rows': int(len(rows))
+                })
+                manifest['blocks'].sort(key=lambda b: b['start'])
+                stored = int(len(rows))
+
+        manifest['coverage'] = [
+            list(interval) for interval in merge_intervals(
+                [tuple(c) for c in manifest['coverage']] + [(start_ts, end_ts)]
+            )
+        ]
+        self._write_manifest(symbol, manifest)
+        return stored
+
+    def iter_encoded(
+        self,
+        symbol: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        期間内のティックをブロックごとに復元して返す（ポイント単位の整数）
+
+        Yields:
+            time_msc, bid_points, ask_points, flags
+        """
+        start_msc = to_epoch_seconds(start_date) * 1000
+        end_msc = to_epoch_seconds(end_date) * 1000 + 999
+        manifest = self._read_manifest(symbol)
+        directory = self.symbol_dir(symbol)
+
+        for block in manifest['blocks']:
+            if block['end'] * 1000 + 999 < start_msc or block['start'] * 1000 > end_msc:
+                continue
+            with np.load(os.path.join(directory, block['file']), allow_pickle=False) as data:
+                ticks = decode_ticks(data)
+            times = ticks['time_msc']
+            lo = int(np.searchsorted(times, start_msc, side='left'))
+            hi = int(np.searchsorted(times, end_msc, side='right'))
+            if hi > lo:
+                yield {name: values[lo:hi] for name, values in ticks.items()}
+
+    def iter_ticks(
+        self,
+        symbol: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Iterator[ColumnarBars]:
+        """
+        期間内のティックをブロックごとに価格へ復元して返す
+
+        Yields:
+            time_msc, bid, ask, flags の列を持つColumnarBars
+        """
+        point = self.point(symbol)
+        if point is None:
+            return
+        digits = point_digits(point)
+        for ticks in self.iter_encoded(symbol, start_date, end_date):
+            yield ColumnarBars({
+                'time_msc': ticks['time_msc'],
+                'bid': np.round(ticks['bid_points'] * point, digits),
+                'ask': np.round(ticks['ask_points'] * point, digits),
+                'flags': ticks['flags'],
+            })
+
+    def aggregate_bars(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Optional[ColumnarBars]:
+        """
+        期間内のティックをバーに集計
+
+        ブロック単位で集計するため、ティック全体をメモリへ展開しません。
+
+        Returns:
+            集計したバー。ティックが無い場合None
+        """
+        point = self.point(symbol)
+        if point is None:
+            return None
+        aggregator = TickBarAggregator(TIMEFRAME_SECONDS[timeframe], point)
+        parts = []
+        for ticks in self.iter_encoded(symbol, start_date, end_date):
+            bars = aggregator.add(
+                ticks['time_msc'],
+                ticks['bid_points'],
+                ticks['ask_points'] - ticks['bid_points']
+            )
+            if len(bars) > 0:
+                parts.append(bars)
+        bars = aggregator.flush()
+        if len(bars) > 0:
+            parts.append(bars)
+        if not parts:
+            return None
+        return ColumnarBars.concatenate(parts)
+
+    def close_spreads(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        期間内のバーごとの最後のティックのスプレッド
+
+        EAはバーの確定直後のティックで現在のスプレッドを参照するため、バー内の最小スプレッド
+        （MT5のバーの spread）よりもバー内の最後のティックのスプレッドがEAの判定に近い値です。
+        ブロック単位で集計するため、ティック全体をメモリへ展開しません。
+
+        Returns:
+            (バーの開始時刻, スプレッド（ポイント）) の配列。ティックが無い場合None
+        """
+        seconds = TIMEFRAME_SECONDS[timeframe]
+        times = []
+        spreads = []
+        for ticks in self.iter_encoded(symbol, start_date, end_date):
+            bucket = (ticks['time_msc'] // 1000) // seconds * seconds
+            last = np.flatnonzero(np.diff(bucket, append=bucket[-1] + seconds))
+            times.append(bucket[last])
+            spreads.append((ticks['ask_points'] - ticks['bid_points'])[last])
+        if not times:
+            return None
+        times = np.concatenate(times)
+        spreads = np.concatenate(spreads)
+        # ブロック境界をまたぐバーは後のブロック（バー内の最後のティック）の値を使う
+        keep = np.append(times[1:] != times[:-1], True)
+        return times[keep], spreads[keep]